@@ -16,12 +16,21 @@ def add_indexes():
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
     
+    # 按操作人/员工/类型筛选并按时间倒序，全量按时间倒序（与 schema.sql 一致）
     indexes = [
-        ('idx_audit_logs_operation_type', 'CREATE INDEX IF NOT EXISTS idx_audit_logs_operation_type ON audit_logs(operation_type)'),
-        ('idx_audit_logs_operator_id', 'CREATE INDEX IF NOT EXISTS idx_audit_logs_operator_id ON audit_logs(operator_id)'),
-        ('idx_audit_logs_created_at', 'CREATE INDEX IF NOT EXISTS idx_audit_logs_created_at ON audit_logs(created_at DESC)'),
-        ('idx_audit_logs_target_employee_id', 'CREATE INDEX IF NOT EXISTS idx_audit_logs_target_employee_id ON audit_logs(target_employee_id)'),
-        ('idx_audit_logs_operator_created', 'CREATE INDEX IF NOT EXISTS idx_audit_logs_operator_created ON audit_logs(operator_id, created_at DESC)')
+        ('idx_audit_operator', 'CREATE INDEX IF NOT EXISTS idx_audit_operator ON audit_logs(operator_id, created_at)'),
+        ('idx_audit_employee', 'CREATE INDEX IF NOT EXISTS idx_audit_employee ON audit_logs(target_employee_id, created_at)'),
+        ('idx_audit_type', 'CREATE INDEX IF NOT EXISTS idx_audit_type ON audit_logs(operation_type, created_at)'),
+        ('idx_audit_logs_created_at', 'CREATE INDEX IF NOT EXISTS idx_audit_logs_created_at ON audit_logs(created_at DESC)')
+    ]
+    
+    # 已合并的索引（被上面的索引前缀覆盖或未被使用，只会拖慢日志写入）
+    dropped = [
+        'idx_audit_logs_operation_type',
+        'idx_audit_logs_operator_id',
+        'idx_audit_logs_target_employee_id',
+        'idx_audit_logs_operator_created',
+        'idx_audit_module'
     ]
     
     for index_name, sql in indexes:
@@ -31,6 +40,10 @@ def add_indexes():
         except Exception as e:
             print(f"  ✗ 创建索引失败 {index_name}: {e}")
     
+    for index_name in dropped:
+        cursor.execute(f'DROP INDEX IF EXISTS {index_name}')
+        print(f"  ✓ 删除冗余索引: {index_name}")
+    
     conn.commit()
     conn.close()
     
@@ -1,11 +1,13 @@
 """
 呼叫中心职场管理系统 - 主应用
 """
-from flask import Flask, render_template, redirect, url_for
+from flask import Flask, render_template, redirect, url_for, request, jsonify
 from datetime import timedelta
+from werkzeug.local import LocalProxy
 from config import Config
 from core.database import close_db, get_db
 from core.auth import get_current_user
+from core import sql_monitor, cache, assets, templates
 
 # 创建 Flask 应用
 app = Flask(__name__)
@@ -14,12 +16,29 @@ app.config.from_object(Config)
 # 注册数据库关闭钩子
 app.teardown_appcontext(close_db)
 
+# SQL监控（按请求统计语句数、耗时与 N+1）
+sql_monitor.init_app(app)
+
+# 缓存标签在请求结束（事务提交后）二次失效
+cache.init_app(app)
+
+# 静态资源指纹与长期缓存
+assets.init_app(app)
+
+# 模板字节码缓存
+templates.init_app(app)
+
+# 导出依赖默认在首次导出时导入；导出专用 worker 启动时预加载
+if Config.EXPORT_PRELOAD:
+    from core.export import preload_export_libraries
+    preload_export_libraries()
+
 # 导入并注册 Blueprint
 from routes import (
     auth_routes, employee_routes, admin_routes, 
     export_routes, notification_routes, report_routes,
     manager_routes, admin_extended_routes, finance_routes,
-    tools_routes
+    tools_routes, job_routes
 )
 
 app.register_blueprint(auth_routes.bp)
@@ -32,6 +51,7 @@ app.register_blueprint(manager_routes.bp)
 app.register_blueprint(admin_extended_routes.bp)
 app.register_blueprint(finance_routes.bp)
 app.register_blueprint(tools_routes.bp)
+app.register_blueprint(job_routes.bp)
 
 
 @app.route('/check_users_tool')
@@ -55,9 +75,25 @@ def index():
     return redirect(url_for('auth.login'))
 
 
+@app.route('/healthz')
+def healthz():
+    """存活检查（不访问数据库）"""
+    return jsonify({'success': True, 'message': 'ok'})
+
+
+@app.route('/readyz')
+def readyz():
+    """就绪检查：数据库可用且预热完成，否则返回 503"""
+    from core.warmup import readiness
+    result = readiness()
+    return jsonify(result), (200 if result['success'] else 503)
+
+
 @app.after_request
 def add_no_cache_headers(response):
-    """添加禁用缓存的响应头，确保浏览器总是获取最新内容"""
+    """添加禁用缓存的响应头，确保浏览器总是获取最新内容（静态资源由 core.assets 设置缓存策略）"""
+    if request.endpoint == 'static':
+        return response
     response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, post-check=0, pre-check=0, max-age=0'
     response.headers['Pragma'] = 'no-cache'
     response.headers['Expires'] = '-1'
@@ -66,8 +102,8 @@ def add_no_cache_headers(response):
 
 @app.context_processor
 def inject_user():
-    """向所有模板注入当前用户"""
-    return dict(current_user=get_current_user())
+    """向所有模板注入当前用户（模板访问时才查询，不引用 current_user 的模板不查询）"""
+    return dict(current_user=LocalProxy(get_current_user))
 
 
 @app.template_filter('format_currency')
@@ -137,5 +173,10 @@ if __name__ == '__main__':
     print("  员工: a001 / 123456")
     print("=" * 60)
     
+    # 执行进程已退出的后台任务不会再执行
+    from core.jobs import recover_stale_jobs
+    with app.app_context():
+        recover_stale_jobs()
+    
     app.run(debug=True, host='0.0.0.0', port=8080)
 
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+静态资源构建
+1. 下载第三方前端库到 static/vendor（已存在则跳过，--force 重新下载）
+2. 为 CSS/JS 等生成 .gz / .br 预压缩文件（.br 需安装 brotli）
+3. 预编译全部模板到字节码缓存（Config.TEMPLATE_CACHE_DIR）
+
+用法：
+    python build_assets.py                    # 下载 + 预压缩 + 模板预编译
+    python build_assets.py --no-fetch         # 不下载（离线环境）
+    python build_assets.py --check-templates  # 只检查模板语法（CI），有错误时退出码为 1
+    python build_assets.py --check-vendor     # 只检查第三方前端库已提交且 sha384 一致（CI），不通过时退出码为 1
+
+下载的 static/vendor/* 应提交到仓库，离线部署不依赖 CDN；预压缩文件为构建产物，不提交。
+"""
+
+import argparse
+import os
+import sys
+
+from core.assets import VENDOR_ASSETS, HAS_BROTLI, fetch_vendor_assets, check_vendor_assets, build_precompressed
+
+STATIC_FOLDER = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'static')
+
+
+def _load_app():
+    from app import app
+    return app
+
+
+def check():
+    """模板语法检查：语法错误退出码 1；路由引用但不存在的模板只提示"""
+    from core.templates import check_templates
+
+    result = check_templates(_load_app())
+    for error in result['errors']:
+        print(f"  ✗ {error['template']}:{error['line']} {error['error']}")
+    for item in result['missing']:
+        print(f"  ⚠️  {item['file']} 引用的模板不存在：{item['template']}")
+    print(f"检查 {result['checked']} 个模板，语法错误 {len(result['errors'])} 个，缺失 {len(result['missing'])} 个")
+    return 1 if result['errors'] else 0
+
+
+def check_vendor():
+    """第三方前端库检查：文件缺失、未固定或不一致的 sha384 退出码 1"""
+    results = check_vendor_assets(STATIC_FOLDER)
+    for result in results:
+        asset = VENDOR_ASSETS[result['name']]
+        mark = '✗' if result['error'] else '✓'
+        print(f"  {mark} {result['name']}@{asset['version']} → static/{result['file']}")
+        if result['sha384']:
+            print(f"      {result['sha384']}")
+        if result['error']:
+            print(f"      {result['error']}")
+    failed = sum(1 for r in results if r['error'])
+    print(f"检查 {len(results)} 个前端库，不通过 {failed} 个")
+    return 1 if failed else 0
+
+
+def precompile():
+    """编译全部模板并写入字节码缓存"""
+    from core.templates import precompile_templates
+
+    result = precompile_templates(_load_app())
+    for error in result['errors']:
+        print(f"  ✗ {error['template']}: {error['error']}")
+    print(f"共编译 {result['compiled']} 个模板")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='静态资源构建')
+    parser.add_argument('--no-fetch', action='store_true', help='不下载第三方前端库')
+    parser.add_argument('--force', action='store_true', help='重新下载并重新压缩')
+    parser.add_argument('--check-templates', action='store_true', help='只检查模板语法')
+    parser.add_argument('--check-vendor', action='store_true', help='只检查第三方前端库已提交且 sha384 一致')
+    args = parser.parse_args()
+
+    if args.check_templates:
+        return check()
+    if args.check_vendor:
+        return check_vendor()
+
+    failed = False
+    if not args.no_fetch:
+        print("下载第三方前端库...")
+        for result in fetch_vendor_assets(STATIC_FOLDER, force=args.force):
+            asset = VENDOR_ASSETS[result['name']]
+            print(f"  [{result['status']}] {result['name']}@{asset['version']} → static/{result['file']}")
+            if result['sha384']:
+                print(f"      {result['sha384']}")
+            if result['message']:
+                print(f"      {result['message']}")
+            if result['status'] == 'failed':
+                failed = True
+
+    print(f"预压缩静态文件（gzip{' + brotli' if HAS_BROTLI else '，未安装 brotli'}）...")
+    written = build_precompressed(STATIC_FOLDER, force=args.force)
+    for path, size, compressed in written:
+        print(f"  ✓ {path}: {size} → {compressed} 字节")
+    print(f"共生成 {len(written)} 个文件")
+
+    print("预编译模板...")
+    result = precompile()
+    if result['errors']:
+        return 1
+
+    # 下载失败时页面回退到 CDN，不中断构建
+    if failed:
+        print("⚠️  部分前端库下载失败，页面将使用 CDN 地址")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
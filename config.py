@@ -12,6 +12,9 @@ class Config:
     # 数据库配置
     DATABASE = os.path.join(BASE_DIR, 'data', 'callcenter.db')
     
+    DB_PERSISTENT_CONNECTIONS = os.environ.get('DB_PERSISTENT_CONNECTIONS', '0') == '1'  # 线程内复用连接（生产模式 wsgi.py 默认开启）
+    DB_STATEMENT_CACHE_SIZE = 256  # 每个连接缓存的预编译语句数
+    
     # Session 配置
     SESSION_COOKIE_NAME = 'callcenter_session'
     SESSION_COOKIE_HTTPONLY = True
@@ -27,7 +30,41 @@ class Config:
     # 分页配置
     PAGE_SIZE = 20
     
+    # 导出配置
+    EXPORT_PRELOAD = os.environ.get('EXPORT_PRELOAD', '0') == '1'  # 启动时预加载导出依赖（导出专用 worker）
+    
+    # 后台任务配置
+    JOB_MAX_WORKERS = int(os.environ.get('JOB_MAX_WORKERS', 2))  # 任务线程数
+    
     # 日志配置
     LOG_LEVEL = 'INFO'
-
-
+    
+    # SQL监控配置
+    SQL_MONITOR_ENABLED = os.environ.get('SQL_MONITOR_ENABLED', '1') == '1'
+    SQL_MONITOR_HEADERS = os.environ.get('SQL_MONITOR_HEADERS', '0') == '1'  # 非调试模式也输出 X-SQL-* 响应头
+    SQL_N_PLUS_ONE_THRESHOLD = 20  # 同一语句在一次请求/任务内执行次数达到该值视为 N+1
+    SQL_SLOW_QUERY_MS = 200  # 慢查询阈值（毫秒）
+    SQL_MONITOR_LOG = os.path.join(BASE_DIR, 'logs', 'sql_monitor.log')
+    INDEX_ADVISOR_ENABLED = os.environ.get('INDEX_ADVISOR_ENABLED', '0') == '1'  # 记录语句形态供索引顾问分析
+    DB_MAINTENANCE_ENABLED = os.environ.get('DB_MAINTENANCE_ENABLED', '1') == '1'  # worker 内定时执行 ANALYZE/检查点等维护
+    DB_MAINTENANCE_TICK = int(os.environ.get('DB_MAINTENANCE_TICK', '60'))  # 维护到期检查间隔（秒）
+    
+    # 报表只读快照（报表与导出读取定期生成的副本，不与业绩录入争用主库）
+    REPORT_SNAPSHOT_ENABLED = os.environ.get('REPORT_SNAPSHOT_ENABLED', '0') == '1'
+    REPORT_SNAPSHOT_PATH = os.environ.get('REPORT_SNAPSHOT_PATH') or os.path.join(BASE_DIR, 'data', 'report_snapshot.db')
+    REPORT_SNAPSHOT_INTERVAL = int(os.environ.get('REPORT_SNAPSHOT_INTERVAL', '900'))  # 重建间隔（秒）
+    REPORT_SNAPSHOT_MAX_AGE = int(os.environ.get('REPORT_SNAPSHOT_MAX_AGE', '3600'))  # 超过该秒数视为过期，报表回退读取主库
+    
+    # 缓存配置
+    CACHE_ENABLED = os.environ.get('CACHE_ENABLED', '1') == '1'
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory')  # memory | sqlite（多 worker 部署）
+    CACHE_SQLITE_PATH = os.environ.get('CACHE_SQLITE_PATH') or os.path.join(BASE_DIR, 'data', 'cache.db')
+    CACHE_DEFAULT_TTL = 300  # 默认过期秒数
+    CACHE_MAX_ENTRIES = 1024  # 缓存项上限（LRU 淘汰）
+    
+    # 模板配置
+    TEMPLATE_BYTECODE_CACHE = os.environ.get('TEMPLATE_BYTECODE_CACHE', '1') == '1'  # 编译结果写入文件，重启/新 worker 免编译
+    TEMPLATE_CACHE_DIR = os.environ.get('TEMPLATE_CACHE_DIR') or os.path.join(BASE_DIR, 'data', 'jinja_cache')
+    
+    # 工资单冷归档：已归档年份迁出到按年的归档库
+    PAYROLL_ARCHIVE_DIR = os.environ.get('PAYROLL_ARCHIVE_DIR') or os.path.join(BASE_DIR, 'data', 'archive')
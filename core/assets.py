@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+静态资源模块
+按内容哈希为静态文件生成带指纹的URL，带指纹的请求返回长期缓存（immutable），
+并优先返回预压缩的 .br / .gz 文件。
+
+模板中照常使用 url_for('static', filename='css/main.css')，生成的地址自动带指纹：
+    /static/css/main.3f2a1b9c0d.css
+第三方前端库放在 static/vendor/（由 build_assets.py 下载），模板使用 vendor_url('chart.js')；
+本地文件缺失时回退到 CDN 地址。
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+from flask import request, send_from_directory, url_for
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+    HAS_BROTLI = True
+except ImportError:
+    HAS_BROTLI = False
+
+# 第三方前端库：{名称: {version, file（相对 static）, url（下载/回退地址）, sha384（可选，下载后校验）}}
+VENDOR_ASSETS = {
+    'chart.js': {
+        'version': '4.4.0',
+        'file': 'vendor/chart.umd.min.js',
+        'url': 'https://cdn.jsdelivr.net/npm/chart.js@4.4.0/dist/chart.umd.min.js',
+        'sha384': None
+    }
+}
+
+# 指纹长度（sha256 十六进制前缀）
+FINGERPRINT_LENGTH = 10
+
+# 带指纹的资源缓存一年
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# 未带指纹（或指纹已过期）的资源每次协商缓存
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+
+# 需要预压缩的文件类型；小于 MIN_COMPRESS_SIZE 字节的文件不压缩
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.json', '.txt', '.html', '.map')
+MIN_COMPRESS_SIZE = 1024
+
+# 预压缩文件后缀，按优先级排列
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+_FINGERPRINTED = re.compile(r'^(?P<stem>.+)\.(?P<digest>[0-9a-f]{%d})(?P<ext>\.[^./]+)$' % FINGERPRINT_LENGTH)
+
+
+class AssetManifest:
+    """
+    静态文件指纹表
+
+    按文件修改时间与大小缓存哈希，文件变化后自动重新计算，无需构建步骤
+    """
+
+    def __init__(self, static_folder):
+        self.static_folder = static_folder
+        self._digests = {}
+        self._lock = threading.Lock()
+
+    def _path(self, filename):
+        path = safe_join(self.static_folder, filename)
+        if path is None or not os.path.isfile(path):
+            return None
+        return path
+
+    def digest(self, filename):
+        """
+        文件内容哈希前缀
+
+        Returns:
+            str or None: 文件不存在时返回 None
+        """
+        path = self._path(filename)
+        if path is None:
+            return None
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+
+        cached = self._digests.get(filename)
+        if cached and cached[0] == signature:
+            return cached[1]
+
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(65536), b''):
+                sha.update(block)
+        value = sha.hexdigest()[:FINGERPRINT_LENGTH]
+        with self._lock:
+            self._digests[filename] = (signature, value)
+        return value
+
+    def fingerprint(self, filename):
+        """
+        带指纹的文件名（css/main.css → css/main.<哈希>.css），文件不存在时原样返回
+        """
+        value = self.digest(filename)
+        if value is None:
+            return filename
+        stem, ext = os.path.splitext(filename)
+        return f'{stem}.{value}{ext}'
+
+    def resolve(self, requested):
+        """
+        解析请求的文件名
+
+        Returns:
+            tuple: (原文件名, 是否为当前有效的指纹)
+        """
+        match = _FINGERPRINTED.match(requested)
+        if match and not self._path(requested):
+            original = match.group('stem') + match.group('ext')
+            if self._path(original):
+                return original, self.digest(original) == match.group('digest')
+        return requested, False
+
+
+_manifest = None
+
+
+def _pick_encoding(filename):
+    """客户端接受且已生成（不旧于原文件）的预压缩文件"""
+    path = safe_join(_manifest.static_folder, filename)
+    if path is None or not os.path.isfile(path):
+        return None, None
+    mtime = os.path.getmtime(path)
+    for encoding, suffix in ENCODINGS:
+        if request.accept_encodings.quality(encoding) <= 0:
+            continue
+        variant = path + suffix
+        if os.path.isfile(variant) and os.path.getmtime(variant) >= mtime:
+            return encoding, suffix
+    return None, None
+
+
+def send_static_asset(filename):
+    """
+    静态文件视图（替换 Flask 默认的 static 视图）
+
+    带有效指纹的请求返回 immutable 长期缓存；其余返回 no-cache（浏览器按 ETag 协商）
+    """
+    original, immutable = _manifest.resolve(filename)
+
+    encoding, suffix = _pick_encoding(original)
+    if encoding:
+        mimetype = mimetypes.guess_type(original)[0] or 'application/octet-stream'
+        response = send_from_directory(_manifest.static_folder, original + suffix, mimetype=mimetype)
+        response.headers['Content-Encoding'] = encoding
+    else:
+        response = send_from_directory(_manifest.static_folder, original)
+
+    if original.endswith(COMPRESSIBLE_EXTENSIONS):
+        response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL
+    response.headers.pop('Expires', None)
+    return response
+
+
+def vendor_url(name):
+    """
+    第三方前端库地址：已下载到 static/vendor 时返回带指纹的本地地址，否则返回 CDN 地址
+    """
+    asset = VENDOR_ASSETS[name]
+    if _manifest.digest(asset['file']) is None:
+        return asset['url']
+    return url_for('static', filename=asset['file'])
+
+
+def warm_fingerprints():
+    """
+    预先计算全部静态文件的指纹（生产模式 fork 之前调用，各 worker 共享）
+
+    Returns:
+        int: 计算的文件数
+    """
+    if _manifest is None:
+        return 0
+    count = 0
+    for path in _iter_static_files(_manifest.static_folder):
+        filename = os.path.relpath(path, _manifest.static_folder).replace(os.sep, '/')
+        if _manifest.digest(filename):
+            count += 1
+    return count
+
+
+def _fingerprint_static_url(endpoint, values):
+    if endpoint == 'static' and 'filename' in values:
+        values['filename'] = _manifest.fingerprint(values['filename'])
+
+
+# ==================== 构建 ====================
+
+def _iter_static_files(static_folder):
+    for root, _, files in os.walk(static_folder):
+        for name in files:
+            if name.endswith(tuple(suffix for _, suffix in ENCODINGS)):
+                continue
+            yield os.path.join(root, name)
+
+
+def build_precompressed(static_folder, force=False):
+    """
+    为可压缩的静态文件生成 .gz（以及安装了 brotli 时的 .br）
+
+    Args:
+        static_folder: 静态文件目录
+        force: 是否覆盖未过期的压缩文件
+
+    Returns:
+        list: 生成的文件 [(相对路径, 原大小, 压缩后大小)]
+    """
+    written = []
+    for path in _iter_static_files(static_folder):
+        if not path.endswith(COMPRESSIBLE_EXTENSIONS) or os.path.getsize(path) < MIN_COMPRESS_SIZE:
+            continue
+        mtime = os.path.getmtime(path)
+        with open(path, 'rb') as f:
+            content = f.read()
+
+        variants = [('.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+        if HAS_BROTLI:
+            variants.append(('.br', lambda data: brotli.compress(data, quality=11)))
+
+        for suffix, compress in variants:
+            target = path + suffix
+            if not force and os.path.isfile(target) and os.path.getmtime(target) >= mtime:
+                continue
+            data = compress(content)
+            # 压缩无收益时不生成，避免返回更大的文件
+            if len(data) >= len(content):
+                continue
+            with open(target, 'wb') as f:
+                f.write(data)
+            written.append((os.path.relpath(target, static_folder), len(content), len(data)))
+    return written
+
+
+def fetch_vendor_assets(static_folder, force=False):
+    """
+    下载 VENDOR_ASSETS 中的第三方前端库到 static/vendor
+
+    Returns:
+        list: [{'name', 'file', 'status': 'exists' | 'downloaded' | 'failed', 'sha384', 'message'}]
+    """
+    import base64
+    from urllib.request import urlopen
+
+    results = []
+    for name, asset in VENDOR_ASSETS.items():
+        path = os.path.join(static_folder, asset['file'])
+        result = {'name': name, 'file': asset['file'], 'sha384': None, 'message': ''}
+        if os.path.isfile(path) and not force:
+            with open(path, 'rb') as f:
+                content = f.read()
+            result['status'] = 'exists'
+        else:
+            try:
+                with urlopen(asset['url'], timeout=30) as resp:
+                    content = resp.read()
+            except Exception as e:
+                result.update(status='failed', message=f'下载失败：{e}')
+                results.append(result)
+                continue
+            result['status'] = 'downloaded'
+
+        digest = 'sha384-' + base64.b64encode(hashlib.sha384(content).digest()).decode()
+        result['sha384'] = digest
+        if asset.get('sha384') and asset['sha384'] != digest:
+            # 下载内容与固定的校验值不一致时不写入
+            result.update(status='failed', message=f"校验失败：期望 {asset['sha384']}")
+        elif result['status'] == 'downloaded':
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(content)
+        results.append(result)
+    return results
+
+
+def check_vendor_assets(static_folder):
+    """
+    检查第三方前端库已提交到 static/vendor 且与固定的 sha384 一致（CI：python build_assets.py --check-vendor）
+
+    Returns:
+        list: [{'name', 'file', 'sha384', 'error'}]，error 为 None 表示通过
+    """
+    import base64
+
+    results = []
+    for name, asset in VENDOR_ASSETS.items():
+        path = os.path.join(static_folder, asset['file'])
+        result = {'name': name, 'file': asset['file'], 'sha384': None, 'error': None}
+        results.append(result)
+        if not os.path.isfile(path):
+            result['error'] = '文件不存在（运行 python build_assets.py 下载后提交）'
+            continue
+        with open(path, 'rb') as f:
+            result['sha384'] = 'sha384-' + base64.b64encode(hashlib.sha384(f.read()).digest()).decode()
+        if not asset.get('sha384'):
+            result['error'] = '未固定 sha384（将上面的校验值写入 VENDOR_ASSETS）'
+        elif asset['sha384'] != result['sha384']:
+            result['error'] = f"校验失败：期望 {asset['sha384']}"
+    return results
+
+
+def init_app(app):
+    """替换 static 视图，url_for('static') 自动带指纹，注册模板函数 vendor_url"""
+    global _manifest
+    _manifest = AssetManifest(app.static_folder)
+    app.view_functions['static'] = send_static_asset
+    app.url_defaults(_fingerprint_static_url)
+    app.jinja_env.globals['vendor_url'] = vendor_url
@@ -8,7 +8,8 @@
 from datetime import datetime
 import json
 from core.database import query_db, get_db
-from flask import session, request
+from core.cache import cached, invalidate_tags, TAG_AUDIT_OPERATORS
+from flask import session, request, g, has_request_context
 
 # 操作类型中文映射
 OPERATION_TYPE_LABELS = {
@@ -18,7 +19,8 @@ OPERATION_TYPE_LABELS = {
     'calendar': '工作日',
     'payroll': '工资',
     'bank_info': '银行信息',
-    'status_change': '状态变更'
+    'status_change': '状态变更',
+    'performance': '业绩'
 }
 
 # 操作类型徽章颜色
@@ -29,10 +31,22 @@ OPERATION_TYPE_COLORS = {
     'calendar': 'secondary',
     'payroll': 'primary',
     'bank_info': 'info',
-    'status_change': 'secondary'
+    'status_change': 'secondary',
+    'performance': 'dark'
 }
 
 
+def _current_operator():
+    """当前操作人：请求中取session，后台任务中取任务提交人"""
+    if has_request_context():
+        return {
+            'user_id': session.get('user_id'),
+            'username': session.get('username'),
+            'role': session.get('role')
+        }
+    return g.get('job_operator') or {}
+
+
 def log_operation(
     operation_type,
     operation_module,
@@ -47,7 +61,8 @@ def log_operation(
     notes=None,
     operator_id=None,
     operator_name=None,
-    operator_role=None
+    operator_role=None,
+    commit=True
 ):
     """
     记录操作日志
@@ -67,17 +82,19 @@ def log_operation(
         operator_id: 操作人ID（可选，默认从session获取）
         operator_name: 操作人姓名（可选，默认从session获取）
         operator_role: 操作人角色（可选，默认从session获取）
+        commit: 是否立即提交（False 时与调用方的业务写入同一事务提交）
     
     Returns:
         int: 日志记录ID
     """
-    # 获取操作人信息
+    # 获取操作人信息（后台任务中没有session，使用任务提交人）
+    operator = _current_operator()
     if not operator_id:
-        operator_id = session.get('user_id')
+        operator_id = operator.get('user_id')
     if not operator_name:
-        operator_name = session.get('username')
+        operator_name = operator.get('username')
     if not operator_role:
-        operator_role = session.get('role')
+        operator_role = operator.get('role')
     
     # 获取请求信息
     ip_address = None
@@ -115,7 +132,11 @@ def log_operation(
         ip_address, user_agent
     ))
     
-    db.commit()
+    # 操作人筛选项可能新增
+    invalidate_tags(TAG_AUDIT_OPERATORS)
+    
+    if commit:
+        db.commit()
     return cursor.lastrowid
 
 
@@ -224,6 +245,40 @@ def log_calendar_change(date_str, is_workday, day_type, reason=None):
     )
 
 
+def log_calendar_batch_change(changes, reason=None, commit=True):
+    """
+    记录批量工作日配置变更（整批一条日志）
+    
+    Args:
+        changes: 实际变更的日期列表 [{'calendar_date', 'before', 'after'}, ...]
+        reason: 原因
+        commit: 是否立即提交
+    """
+    if len(changes) == 1:
+        change = changes[0]
+        return log_operation(
+            operation_type='calendar',
+            operation_module='work_calendar',
+            operation_action='configure',
+            notes=f'{change["calendar_date"]}: {"工作日" if change["after"]["is_workday"] else "假期"}（{change["after"]["day_type"]}）',
+            reason=reason,
+            commit=commit
+        )
+
+    to_workday = [c['calendar_date'] for c in changes if c['after']['is_workday'] == 1]
+    to_holiday = [c['calendar_date'] for c in changes if c['after']['is_workday'] == 0]
+
+    return log_operation(
+        operation_type='calendar',
+        operation_module='work_calendar',
+        operation_action='batch_configure',
+        changes_dict={'workday': to_workday, 'holiday': to_holiday},
+        notes=f'批量配置{len(changes)}天：工作日{len(to_workday)}天，假期{len(to_holiday)}天',
+        reason=reason,
+        commit=commit
+    )
+
+
 def log_payroll_generate(year_month, employee_count, total_amount):
     """记录工资单生成"""
     return log_operation(
@@ -248,6 +303,39 @@ def log_payroll_adjustment(payroll_id, employee_id, employee_name, adjustment_ty
     )
 
 
+def log_payroll_bulk_adjustment(adjustments, total_deductions, total_allowances,
+                                operator_id=None, operator_name=None, operator_role=None, commit=True):
+    """
+    记录批量工资调整（整批一条日志）
+
+    Args:
+        adjustments: 已执行的调整 [{'payroll_id', 'employee_no', 'adjustment_type', 'amount', 'reason'}, ...]
+        total_deductions: 扣款合计
+        total_allowances: 补贴合计
+        commit: 是否立即提交
+    """
+    payroll_ids = sorted({a['payroll_id'] for a in adjustments})
+    return log_operation(
+        operation_type='payroll',
+        operation_module='payroll_adjustments',
+        operation_action='bulk_adjust',
+        target_record_id=payroll_ids[0] if len(payroll_ids) == 1 else None,
+        changes_dict={
+            'payroll_ids': payroll_ids,
+            'items': [
+                [a['payroll_id'], a['employee_no'], a['adjustment_type'], a['amount'], a['reason']]
+                for a in adjustments
+            ]
+        },
+        notes=f'批量调整{len(adjustments)}条（{len(payroll_ids)}张工资单）：'
+              f'扣款¥{total_deductions:,.2f}，补贴¥{total_allowances:,.2f}',
+        operator_id=operator_id,
+        operator_name=operator_name,
+        operator_role=operator_role,
+        commit=commit
+    )
+
+
 def log_payroll_payment(payroll_id, employee_id, employee_name, payment_method, amount, status):
     """记录工资发放"""
     return log_operation(
@@ -273,6 +361,52 @@ def log_bank_verification(employee_id, employee_name, status, reason=None):
     )
 
 
+def log_bank_verifications(employees, status, reason=None,
+                           operator_id=None, operator_name=None, operator_role=None, commit=True):
+    """
+    批量记录银行信息审核（每名员工一条日志，一次 executemany 写入）
+
+    Args:
+        employees: 已审核的员工 [{'id', 'name'}, ...]
+        status: 审核结果 verified / rejected
+        reason: 审核备注
+        commit: 是否立即提交（False 时与调用方的状态更新同一事务提交）
+
+    Returns:
+        int: 写入的日志条数
+    """
+    operator = _current_operator()
+    operator_id = operator_id or operator.get('user_id')
+    operator_name = operator_name or operator.get('username')
+    operator_role = operator_role or operator.get('role')
+
+    ip_address = None
+    user_agent = None
+    if has_request_context():
+        ip_address = request.remote_addr
+        user_agent = request.headers.get('User-Agent', '')[:200]
+
+    db = get_db()
+    db.executemany('''
+        INSERT INTO audit_logs (
+            operation_type, operation_module, operation_action,
+            operator_id, operator_name, operator_role,
+            target_employee_id, target_employee_name,
+            reason, ip_address, user_agent
+        ) VALUES ('bank_info', 'employees', ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', [
+        (f'verify_{status}', operator_id, operator_name, operator_role,
+         e['id'], e['name'], reason, ip_address, user_agent)
+        for e in employees
+    ])
+
+    invalidate_tags(TAG_AUDIT_OPERATORS)
+
+    if commit:
+        db.commit()
+    return len(employees)
+
+
 def log_status_change(employee_id, employee_name, from_status, to_status, reason):
     """记录员工状态变更"""
     return log_operation(
@@ -482,19 +616,30 @@ def get_filter_options(is_admin=False):
     
     # 管理员可以看到所有操作人
     if is_admin:
-        operators = query_db('''
-            SELECT DISTINCT operator_id, operator_name 
-            FROM audit_logs 
-            ORDER BY operator_name
-        ''')
-        options['operators'] = [{'value': '', 'label': '全部操作人'}] + [
-            {'value': op['operator_id'], 'label': op['operator_name']}
-            for op in operators
-        ]
+        options['operators'] = [{'value': '', 'label': '全部操作人'}] + get_operator_options()
     
     return options
 
 
+@cached(ttl=3600, tags=[TAG_AUDIT_OPERATORS])
+def get_operator_options():
+    """
+    日志中出现过的操作人（写入日志时失效）
+    
+    Returns:
+        list: [{'value': operator_id, 'label': operator_name}]
+    """
+    operators = query_db('''
+        SELECT DISTINCT operator_id, operator_name 
+        FROM audit_logs 
+        ORDER BY operator_name
+    ''')
+    return [
+        {'value': op['operator_id'], 'label': op['operator_name']}
+        for op in operators
+    ]
+
+
 def format_log_for_display(log):
     """
     格式化日志用于显示
@@ -563,7 +708,8 @@ def generate_log_description(log):
         'calendar': '工作日配置',
         'payroll': '工资管理',
         'bank_info': '银行信息',
-        'status_change': '状态变更'
+        'status_change': '状态变更',
+        'performance': '业绩数据'
     }
     
     # 操作动作映射
@@ -573,6 +719,7 @@ def generate_log_description(log):
         'reject': '驳回',
         'override': '否决',
         'configure': '配置',
+        'batch_configure': '批量配置',
         'generate': '生成',
         'adjust_deduction': '扣款',
         'adjust_allowance': '补贴',
@@ -580,7 +727,9 @@ def generate_log_description(log):
         'payment_failed': '发放失败',
         'verify_verified': '审核通过',
         'verify_rejected': '审核拒绝',
-        'change_status': '变更'
+        'change_status': '变更',
+        'import': '导入',
+        'recompute': '重算'
     }
     
     type_str = type_map.get(op_type, op_type)
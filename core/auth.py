@@ -3,7 +3,7 @@
 """
 import hashlib
 from functools import wraps
-from flask import session, redirect, url_for, flash, request
+from flask import session, redirect, url_for, flash, request, g
 from core.database import query_db
 
 
@@ -46,16 +46,23 @@ def authenticate_user(username, password):
 
 
 def get_current_user():
-    """获取当前登录用户信息"""
-    if 'user_id' in session:
-        user = query_db(
-            'SELECT id, username, role, employee_id FROM users WHERE id = ?',
-            (session['user_id'],),
-            one=True
-        )
-        if user:
-            return dict(user)
-    return None
+    """获取当前登录用户信息（同一请求内只查询一次）"""
+    if 'user_id' not in session:
+        return None
+
+    user_id = session['user_id']
+    cached = g.get('_current_user')
+    if cached is not None and cached[0] == user_id:
+        return dict(cached[1]) if cached[1] else None
+
+    user = query_db(
+        'SELECT id, username, role, employee_id FROM users WHERE id = ?',
+        (user_id,),
+        one=True
+    )
+    user = dict(user) if user else None
+    g._current_user = (user_id, user)
+    return dict(user) if user else None
 
 
 def login_required(f):
@@ -107,6 +114,18 @@ def get_user_team(user):
     if user['role'] == 'admin':
         return None  # admin 可见全部
     
+    # 同一请求内只查询一次（报表读取快照时沿用切换前按主库解析的团队）
+    key = (user['id'], user['username'], user['role'])
+    cached = g.get('_user_team')
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    team = _resolve_user_team(user)
+    g._user_team = (key, team)
+    return team
+
+
+def _resolve_user_team(user):
+    """按 get_user_team 的规则查询团队"""
     if user['role'] == 'manager':
         # manager 需要查询其管理的团队
         # 简化实现：这里假设 manager 用户名关联了团队配置
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+银行信息审核
+财务工作台与管理后台的单条/批量审核共用：
+一条 UPDATE ... RETURNING 更新待审核的员工，审计日志批量写入，与状态更新同一事务提交。
+"""
+
+from core.database import get_db
+from core.audit import log_bank_verifications
+from core.performance_recalculator import SQL_CHUNK_SIZE
+
+# 审核动作 → 银行信息状态
+BANK_AUDIT_ACTIONS = {
+    'approve': 'verified',
+    'reject': 'rejected'
+}
+
+
+def audit_bank_info(employee_ids, action, notes, operator_id, operator_name=None, operator_role=None):
+    """
+    审核员工银行信息（只处理仍为待审核的员工）
+
+    Args:
+        employee_ids: 员工ID列表
+        action: 'approve' 或 'reject'
+        notes: 审核备注（拒绝原因）
+        operator_id: 审核人ID
+        operator_name: 审核人用户名
+        operator_role: 审核人角色
+
+    Returns:
+        dict: {
+            'success': bool,
+            'message': str,
+            'status': 'verified' | 'rejected',
+            'updated': [{'id', 'employee_no', 'name'}],
+            'skipped': [员工ID]（不存在或不是待审核）
+        }
+    """
+    new_status = BANK_AUDIT_ACTIONS.get(action)
+    if not new_status:
+        return {'success': False, 'message': '无效的操作类型'}
+
+    try:
+        requested = sorted({int(employee_id) for employee_id in employee_ids})
+    except (TypeError, ValueError):
+        return {'success': False, 'message': '员工ID格式不正确'}
+    if not requested:
+        return {'success': False, 'message': '未选择任何员工'}
+
+    db = get_db()
+    updated = []
+    try:
+        for i in range(0, len(requested), SQL_CHUNK_SIZE):
+            chunk = requested[i:i + SQL_CHUNK_SIZE]
+            rows = db.execute(f'''
+                UPDATE employees
+                SET bank_info_status = ?,
+                    bank_info_notes = ?,
+                    bank_verified_by = ?,
+                    bank_verified_at = CURRENT_TIMESTAMP
+                WHERE id IN ({','.join('?' * len(chunk))})
+                AND bank_info_status = 'pending'
+                RETURNING id, employee_no, name
+            ''', [new_status, notes, operator_id] + chunk).fetchall()
+            updated.extend(dict(row) for row in rows)
+
+        if updated:
+            log_bank_verifications(updated, new_status, notes,
+                                   operator_id=operator_id, operator_name=operator_name,
+                                   operator_role=operator_role, commit=False)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    updated.sort(key=lambda e: e['id'])
+    updated_ids = {e['id'] for e in updated}
+    skipped = [employee_id for employee_id in requested if employee_id not in updated_ids]
+    label = '审核通过' if new_status == 'verified' else '审核拒绝'
+    message = f'{label}{len(updated)}条银行信息'
+    if skipped:
+        message += f'，{len(skipped)}条已审核或不存在'
+
+    return {
+        'success': bool(updated),
+        'message': message if updated else '所选员工没有待审核的银行信息',
+        'status': new_status,
+        'updated': updated,
+        'skipped': skipped
+    }
@@ -1,20 +1,441 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
 """
-P3-11: 简单缓存实现
-使用functools.lru_cache
+缓存模块
+带过期时间（TTL）、容量上限（LRU 淘汰）和标签失效的查询结果缓存。
+
+标签用于按业务数据失效，写入数据的代码负责递增对应标签的版本：
+    performance:YYYY-MM   该月业绩
+    payroll:YYYY-MM       该月工资单
+    calendar              工作日配置
+    employees             员工状态/团队归属
+    team:<团队名>          某团队的员工
+    teams                 团队列表
+缓存项写入时记下所带标签的版本，读取时版本不一致即视为失效。
+
+存储后端：
+    memory   进程内（默认，单进程部署）
+    sqlite   共享 SQLite 文件（多 worker 部署，标签版本与缓存项跨进程共享）
+local=True 的缓存项存放在单独的进程内 LRU 区（适合调用频繁、计算很快的小结果），
+但标签版本仍取自配置的后端，因此其他进程的写入同样会使其失效。
+
+缓存值视为只读，调用方不要修改取回的对象。
 """
-from functools import lru_cache
-from datetime import datetime
 
-@lru_cache(maxsize=100)
-def cached_query(query_key, timestamp_hour):
-    """缓存查询结果（按小时）"""
-    pass
+import functools
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from flask import g, has_app_context
+from config import Config
+
+TAG_CALENDAR = 'calendar'
+TAG_EMPLOYEES = 'employees'
+TAG_TEAMS = 'teams'
+TAG_AUDIT_OPERATORS = 'audit_operators'
+
+_MISSING = object()
+
+
+def performance_tag(value):
+    """业绩标签（value 为日期或 'YYYY-MM'）"""
+    return f'performance:{str(value)[:7]}'
+
+
+def payroll_tag(year_month):
+    """工资单标签"""
+    return f'payroll:{str(year_month)[:7]}'
+
+
+def team_tag(team):
+    """团队标签"""
+    return f'team:{team}'
+
+
+# ==================== 存储后端 ====================
+
+class MemoryBackend:
+    """进程内存储：OrderedDict 实现 LRU，超出容量淘汰最久未使用的缓存项"""
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries or Config.CACHE_MAX_ENTRIES
+        self._entries = OrderedDict()
+        self._tags = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_tag_versions(self, tags):
+        with self._lock:
+            return {tag: self._tags.get(tag, 0) for tag in tags}
+
+    def bump_tags(self, tags):
+        with self._lock:
+            for tag in tags:
+                self._tags[tag] = self._tags.get(tag, 0) + 1
+
+    def size(self):
+        return len(self._entries)
+
+
+class SQLiteBackend:
+    """
+    共享 SQLite 文件存储（多进程可见）
+
+    缓存项按最近访问时间淘汰；为减少写入，访问时间最多每 TOUCH_INTERVAL 秒更新一次
+    """
+
+    TOUCH_INTERVAL = 60
+    # 每写入N次检查一次容量
+    PRUNE_EVERY = 100
+
+    def __init__(self, path=None, max_entries=None):
+        self.path = path or Config.CACHE_SQLITE_PATH
+        self.max_entries = max_entries or Config.CACHE_MAX_ENTRIES
+        self._local = threading.local()
+        self._writes = 0
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = self._conn()
+        conn.executescript('''
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                cache_key TEXT PRIMARY KEY,
+                payload BLOB NOT NULL,
+                expires_at REAL,
+                accessed_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_cache_entries_accessed ON cache_entries(accessed_at);
+            CREATE TABLE IF NOT EXISTS cache_tags (
+                tag TEXT PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0
+            );
+        ''')
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute(
+            'SELECT payload, accessed_at FROM cache_entries WHERE cache_key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if now - row[1] > self.TOUCH_INTERVAL:
+            self._conn().execute(
+                'UPDATE cache_entries SET accessed_at = ? WHERE cache_key = ?', (now, key)
+            )
+        return pickle.loads(row[0])
+
+    def set(self, key, entry):
+        conn = self._conn()
+        conn.execute('''
+            INSERT OR REPLACE INTO cache_entries (cache_key, payload, expires_at, accessed_at)
+            VALUES (?, ?, ?, ?)
+        ''', (key, pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL), entry[1], time.time()))
+
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            conn.execute('DELETE FROM cache_entries WHERE expires_at < ?', (time.time(),))
+            conn.execute('''
+                DELETE FROM cache_entries WHERE cache_key IN (
+                    SELECT cache_key FROM cache_entries
+                    ORDER BY accessed_at DESC
+                    LIMIT -1 OFFSET ?
+                )
+            ''', (self.max_entries,))
+
+    def delete(self, key):
+        self._conn().execute('DELETE FROM cache_entries WHERE cache_key = ?', (key,))
+
+    def clear(self):
+        self._conn().execute('DELETE FROM cache_entries')
+
+    def get_tag_versions(self, tags):
+        tags = list(tags)
+        versions = dict.fromkeys(tags, 0)
+        if tags:
+            rows = self._conn().execute(
+                f"SELECT tag, version FROM cache_tags WHERE tag IN ({','.join('?' * len(tags))})", tags
+            ).fetchall()
+            versions.update(rows)
+        return versions
+
+    def bump_tags(self, tags):
+        self._conn().executemany('''
+            INSERT INTO cache_tags (tag, version) VALUES (?, 1)
+            ON CONFLICT(tag) DO UPDATE SET version = version + 1
+        ''', [(tag,) for tag in tags])
+
+    def size(self):
+        return self._conn().execute('SELECT COUNT(*) FROM cache_entries').fetchone()[0]
+
+
+# 可选后端：{名称: 类}，可在启动时注册其他实现（需提供与 MemoryBackend 相同的方法）
+CACHE_BACKENDS = {
+    'memory': MemoryBackend,
+    'sqlite': SQLiteBackend
+}
+
+
+# ==================== 缓存 ====================
+
+class Cache:
+    """
+    缓存对象
+
+    缓存项格式：(value, expires_at, {tag: version})
+    """
+
+    def __init__(self, backend, local_backend=None):
+        self.backend = backend
+        self.local = local_backend or MemoryBackend()
+        self.hits = 0
+        self.misses = 0
+
+    def tag_versions(self, tags):
+        """当前标签版本（同一请求内只读取一次）"""
+        if not tags:
+            return {}
+        if not has_app_context():
+            return self.backend.get_tag_versions(tags)
+
+        known = g.setdefault('_cache_tag_versions', {})
+        missing = [tag for tag in tags if tag not in known]
+        if missing:
+            known.update(self.backend.get_tag_versions(missing))
+        return {tag: known[tag] for tag in tags}
+
+    def get(self, key, default=None, local=False):
+        store = self.local if local else self.backend
+        entry = store.get(key)
+        if entry is not None:
+            value, expires_at, versions = entry
+            if (expires_at is None or expires_at > time.time()) and \
+                    self.tag_versions(list(versions)) == versions:
+                self.hits += 1
+                return value
+            store.delete(key)
+        self.misses += 1
+        return default
+
+    def set(self, key, value, ttl=None, tags=(), local=False, versions=None):
+        ttl = Config.CACHE_DEFAULT_TTL if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl else None
+        store = self.local if local else self.backend
+        if versions is None:
+            versions = self.tag_versions(list(tags))
+        store.set(key, (value, expires_at, versions))
+
+    def delete(self, key):
+        self.backend.delete(key)
+        self.local.delete(key)
+
+    def invalidate_tags(self, tags):
+        tags = set(tag for tag in tags if tag)
+        if has_app_context():
+            # 请求/任务结束（事务提交后）再递增一次，避免提交前被并发请求缓存旧数据；
+            # 同一请求内已递增过的标签不再重复写后端（批量写入逐行调用）
+            dirty = g.setdefault('_cache_dirty_tags', set())
+            tags -= dirty
+            dirty.update(tags)
+            known = g.get('_cache_tag_versions')
+            if known:
+                for tag in tags:
+                    known.pop(tag, None)
+        if tags:
+            self.backend.bump_tags(tags)
+
+    def clear(self):
+        self.backend.clear()
+        self.local.clear()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """按 Config.CACHE_BACKEND 创建的全局缓存"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                backend_cls = CACHE_BACKENDS.get(Config.CACHE_BACKEND)
+                if backend_cls is None:
+                    raise ValueError(f'未知的缓存后端：{Config.CACHE_BACKEND}')
+                _cache = Cache(backend_cls())
+    return _cache
+
+
+def discard_cache():
+    """
+    丢弃全局缓存实例（不清空数据）
+
+    预加载应用的 fork 模式下，子进程启动时调用，避免继承父进程的 SQLite 连接与进程内缓存
+    """
+    global _cache
+    with _cache_lock:
+        _cache = None
+
+
+def cache_get(key, default=None, local=False):
+    """读取缓存"""
+    if not Config.CACHE_ENABLED:
+        return default
+    return get_cache().get(key, default, local=local)
+
+
+def cache_set(key, value, ttl=None, tags=(), local=False, versions=None):
+    """
+    写入缓存
+
+    Args:
+        key: 缓存键
+        value: 缓存值（sqlite 后端需可 pickle，不要缓存 sqlite3.Row）
+        ttl: 过期秒数，None 使用 Config.CACHE_DEFAULT_TTL，0 表示不过期（只按标签失效）
+        tags: 标签列表
+        local: 是否存放在进程内
+        versions: 计算 value 之前读取的标签版本（get_tag_versions），None 表示写入时的当前版本
+    """
+    if Config.CACHE_ENABLED:
+        get_cache().set(key, value, ttl=ttl, tags=tags, local=local, versions=versions)
+
+
+def cache_delete(key):
+    """删除缓存项"""
+    if Config.CACHE_ENABLED:
+        get_cache().delete(key)
+
+
+def get_tag_versions(*tags):
+    """当前标签版本（计算缓存值之前读取，写入时传给 cache_set(versions=...)）"""
+    if not Config.CACHE_ENABLED:
+        return {}
+    return get_cache().tag_versions(list(tags))
+
+
+def invalidate_tags(*tags):
+    """使带有任一标签的缓存失效（数据写入后调用）"""
+    if Config.CACHE_ENABLED:
+        get_cache().invalidate_tags(tags)
+
+
+def invalidate_employee_tags(*teams, employee_ids=()):
+    """
+    员工状态、在职或团队归属变更后调用
+
+    Args:
+        teams: 涉及的团队（调整团队时包括调出前的团队）
+        employee_ids: 涉及的员工ID，按其当前团队失效
+    """
+    teams = set(team for team in teams if team)
+    if employee_ids and Config.CACHE_ENABLED:
+        from core.database import query_db
+        ids = list(employee_ids)
+        rows = query_db(
+            f"SELECT DISTINCT team FROM employees WHERE id IN ({','.join('?' * len(ids))})", ids
+        )
+        teams.update(row['team'] for row in rows if row['team'])
+    invalidate_tags(TAG_EMPLOYEES, *(team_tag(team) for team in teams))
 
-def get_cache_key():
-    """获取当前小时的缓存键"""
-    return datetime.now().strftime('%Y%m%d%H')
 
-# 清除缓存
 def clear_cache():
-    cached_query.cache_clear()
+    """清空全部缓存"""
+    if Config.CACHE_ENABLED:
+        get_cache().clear()
+
+
+def cache_stats():
+    """缓存命中统计"""
+    if not Config.CACHE_ENABLED:
+        return {'enabled': False}
+    cache = get_cache()
+    total = cache.hits + cache.misses
+    return {
+        'enabled': True,
+        'backend': Config.CACHE_BACKEND,
+        'entries': cache.backend.size(),
+        'local_entries': cache.local.size(),
+        'hits': cache.hits,
+        'misses': cache.misses,
+        'hit_rate': round(cache.hits * 100.0 / total, 1) if total else 0.0
+    }
+
+
+def cached(ttl=None, tags=None, key=None, local=False):
+    """
+    缓存函数结果（装饰器）
+
+    Args:
+        ttl: 过期秒数（同 cache_set）
+        tags: 标签列表，或接收与被装饰函数相同参数、返回标签列表的函数
+        key: 接收相同参数、返回缓存键的函数；默认由函数名与参数生成
+        local: 是否存放在进程内
+
+    被装饰函数增加 uncached 属性，可绕过缓存直接调用。
+    读取报表快照（core.report_snapshot）的请求按快照生成时间单独缓存，不与主库结果混用。
+    """
+    def decorator(func):
+        prefix = f'{func.__module__}.{func.__qualname__}'
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not Config.CACHE_ENABLED:
+                return func(*args, **kwargs)
+
+            cache_key = key(*args, **kwargs) if key else f'{prefix}:{args!r}:{sorted(kwargs.items())!r}'
+            snapshot = g.get('report_snapshot') if has_app_context() else None
+            if snapshot:
+                cache_key += f":snapshot@{snapshot['built_ts']}"
+            value = cache_get(cache_key, _MISSING, local=local)
+            if value is _MISSING:
+                # 计算前记录标签版本：计算期间其他请求写入并失效标签时，本次结果按旧版本存放、读取时即失效
+                entry_tags = tags(*args, **kwargs) if callable(tags) else (tags or ())
+                versions = get_tag_versions(*entry_tags)
+                value = func(*args, **kwargs)
+                cache_set(cache_key, value, ttl=ttl, tags=entry_tags, local=local, versions=versions)
+            return value
+
+        wrapper.uncached = func
+        return wrapper
+    return decorator
+
+
+def _flush_dirty_tags(exc=None):
+    tags = g.pop('_cache_dirty_tags', None)
+    if tags and Config.CACHE_ENABLED:
+        get_cache().backend.bump_tags(tags)
+
 
+def init_app(app):
+    """注册应用上下文结束时的标签二次失效"""
+    app.teardown_appcontext(_flush_dirty_tags)
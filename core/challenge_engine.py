@@ -5,9 +5,11 @@
 处理A级员工的降级预警、保级挑战流程
 """
 
-from datetime import datetime, date, timedelta
+from datetime import datetime, timedelta
 from core.database import query_db, get_db
-from core.workday import get_recent_workdays, count_workdays_between, get_next_n_workdays
+from core.workday import get_next_n_workdays, resolve_as_of
+from core.cache import invalidate_employee_tags
+from core.status_engine import get_recent_workday_orders
 from core.audit import log_challenge_trigger, log_challenge_decision, log_challenge_result
 from core.notifications import create_notification
 
@@ -31,12 +33,75 @@ CHALLENGE_RULES = {
 }
 
 
+# ==================== 规则判断（纯函数） ====================
+
+def evaluate_demotion_alert(recent_orders, rules=None):
+    """
+    A级降级预警规则判断
+
+    Args:
+        recent_orders: 最近N个工作日有效出单数，可追溯工作日不足时为 None
+        rules: 规则配置（默认 CHALLENGE_RULES）
+
+    Returns:
+        dict: {'should_alert', 'recent_orders', 'threshold', 'reason'}
+    """
+    rule = (rules or CHALLENGE_RULES)['trigger_threshold']
+
+    if recent_orders is None:
+        return {
+            'should_alert': False,
+            'recent_orders': 0,
+            'threshold': rule['min_orders'],
+            'reason': f'工作日数不足{rule["recent_days"]}天'
+        }
+
+    # 判断是否低于阈值
+    should_alert = recent_orders <= rule['min_orders']
+
+    if should_alert:
+        reason = f'最近{rule["recent_days"]}个工作日出单{recent_orders}单，低于{rule["min_orders"]}单阈值'
+    else:
+        reason = f'最近{rule["recent_days"]}个工作日出单{recent_orders}单，表现良好'
+
+    return {
+        'should_alert': should_alert,
+        'recent_orders': recent_orders,
+        'threshold': rule['min_orders'],
+        'reason': reason
+    }
+
+
+def evaluate_challenge_result(total_orders, rules=None):
+    """
+    保级挑战结果判断（挑战期结束后）
+
+    Returns:
+        dict: {'completed', 'success', 'orders', 'target_orders', 'message'}
+    """
+    target_orders = (rules or CHALLENGE_RULES)['challenge_period']['target_orders']
+    success = total_orders >= target_orders
+
+    result_text = '成功' if success else '失败'
+    return {
+        'completed': True,
+        'success': success,
+        'orders': total_orders,
+        'target_orders': target_orders,
+        'message': f'挑战{result_text}：出单{total_orders}单（目标{target_orders}单）'
+    }
+
+
 # ==================== 降级检测函数 ====================
 
-def check_a_level_demotion_alert(employee_id):
+def check_a_level_demotion_alert(employee_id, as_of=None):
     """
     检查A级员工是否触发降级预警
     
+    Args:
+        employee_id: 员工ID
+        as_of: 基准日期（默认今天）
+    
     Returns:
         dict: {
             'should_alert': bool,
@@ -67,52 +132,19 @@ def check_a_level_demotion_alert(employee_id):
     
     # 获取最近N个工作日的出单数
     rule = CHALLENGE_RULES['trigger_threshold']
-    today = date.today()
-    recent_workdays = get_recent_workdays(today, rule['recent_days'], include_end=True)
-    
-    if len(recent_workdays) < rule['recent_days']:
-        return {
-            'should_alert': False,
-            'recent_orders': 0,
-            'threshold': rule['min_orders'],
-            'reason': f'工作日数不足{rule["recent_days"]}天'
-        }
-    
-    # 计算出单数
-    date_placeholders = ','.join('?' * len(recent_workdays))
-    date_strs = [d.strftime('%Y-%m-%d') for d in recent_workdays]
-    
-    result = query_db(f'''
-        SELECT SUM(orders_count) as total_orders
-        FROM performance
-        WHERE employee_id = ?
-        AND work_date IN ({date_placeholders})
-        AND is_valid_workday = 1
-    ''', [employee_id] + date_strs, one=True)
+    recent_orders = get_recent_workday_orders(employee_id, rule['recent_days'], as_of)
     
-    recent_orders = result['total_orders'] if result and result['total_orders'] else 0
-    
-    # 判断是否低于阈值
-    should_alert = recent_orders <= rule['min_orders']
-    
-    reason = ''
-    if should_alert:
-        reason = f'最近{rule["recent_days"]}个工作日出单{recent_orders}单，低于{rule["min_orders"]}单阈值'
-    else:
-        reason = f'最近{rule["recent_days"]}个工作日出单{recent_orders}单，表现良好'
-    
-    return {
-        'should_alert': should_alert,
-        'recent_orders': recent_orders,
-        'threshold': rule['min_orders'],
-        'reason': reason
-    }
+    return evaluate_demotion_alert(recent_orders)
 
 
-def trigger_demotion_alert(employee_id):
+def trigger_demotion_alert(employee_id, as_of=None):
     """
     触发降级预警流程
     
+    Args:
+        employee_id: 员工ID
+        as_of: 基准日期（默认今天），同时作为触发日期
+    
     Returns:
         dict: {'success': bool, 'challenge_id': int, 'message': str}
     """
@@ -138,8 +170,10 @@ def trigger_demotion_alert(employee_id):
     if pending:
         return {'success': False, 'message': '已有待处理的降级预警'}
     
+    as_of = resolve_as_of(as_of)
+    
     # 检查月度限制
-    current_month = date.today().strftime('%Y-%m')
+    current_month = as_of.strftime('%Y-%m')
     month_challenges = query_db('''
         SELECT COUNT(*) as count
         FROM demotion_challenges
@@ -155,7 +189,7 @@ def trigger_demotion_alert(employee_id):
         }
     
     # 执行检查
-    check_result = check_a_level_demotion_alert(employee_id)
+    check_result = check_a_level_demotion_alert(employee_id, as_of)
     
     if not check_result['should_alert']:
         return {'success': False, 'message': f'未触发降级条件：{check_result["reason"]}'}
@@ -164,7 +198,7 @@ def trigger_demotion_alert(employee_id):
     db = get_db()
     cursor = db.cursor()
     
-    trigger_date = date.today()
+    trigger_date = as_of
     
     cursor.execute('''
         INSERT INTO demotion_challenges (
@@ -233,12 +267,13 @@ def notify_challenge_triggered(employee, challenge_id, check_result):
         )
 
 
-def make_challenge_decision(challenge_id, decision, manager_id, manager_name, reason=None):
+def make_challenge_decision(challenge_id, decision, manager_id, manager_name, reason=None, as_of=None):
     """
     经理做出保级挑战决策
     
     Args:
         decision: 'downgrade' 直接降级 | 'challenge' 保级挑战 | 'cancelled' 取消预警
+        as_of: 决策日期（默认今天）
     
     Returns:
         dict: {'success': bool, 'message': str}
@@ -271,7 +306,7 @@ def make_challenge_decision(challenge_id, decision, manager_id, manager_name, re
     
     if decision == 'downgrade':
         # 直接降级到C级
-        effective_date = date.today() + timedelta(days=1)  # 次日生效（这里简化，实际应该用get_next_workday）
+        effective_date = resolve_as_of(as_of) + timedelta(days=1)  # 次日生效（这里简化，实际应该用get_next_workday）
         
         cursor.execute('''
             UPDATE demotion_challenges
@@ -298,6 +333,7 @@ def make_challenge_decision(challenge_id, decision, manager_id, manager_name, re
             effective_date,
             f'经理确认降级：{reason}'
         ))
+        invalidate_employee_tags(employee_ids=[challenge['employee_id']])
         
         message = f'已确认降级，将于{effective_date}生效'
         
@@ -309,7 +345,7 @@ def make_challenge_decision(challenge_id, decision, manager_id, manager_name, re
         from core.workday import get_next_n_workdays
         
         # 挑战周期：从次日开始的3个工作日
-        start_date = date.today()  # 这里实际应该使用get_next_workday
+        start_date = resolve_as_of(as_of)  # 这里实际应该使用get_next_workday
         challenge_workdays = get_next_n_workdays(start_date, CHALLENGE_RULES['challenge_period']['workdays'], include_start=False)
         
         if len(challenge_workdays) >= CHALLENGE_RULES['challenge_period']['workdays']:
@@ -424,10 +460,14 @@ def notify_challenge_cancelled(challenge, reason):
         )
 
 
-def check_challenge_completion(challenge_id):
+def check_challenge_completion(challenge_id, as_of=None):
     """
     检查保级挑战是否完成（挑战期结束后调用）
     
+    Args:
+        challenge_id: 挑战ID
+        as_of: 基准日期（默认今天）
+    
     Returns:
         dict: {'completed': bool, 'success': bool, 'orders': int, 'message': str}
     """
@@ -446,72 +486,58 @@ def check_challenge_completion(challenge_id):
     if challenge['challenge_result'] != 'ongoing':
         return {'completed': True, 'message': '挑战已完成'}
     
-    # 检查是否到达结束日期
-    today = date.today()
-    end_date = challenge['challenge_end_date']
-    if isinstance(end_date, str):
-        end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
+    as_of = resolve_as_of(as_of)
+    start_date = _to_date(challenge['challenge_start_date'])
+    end_date = _to_date(challenge['challenge_end_date'])
     
-    if today <= end_date:
+    if as_of <= end_date:
         # 还在挑战期内，统计当前出单数
-        start_date = challenge['challenge_start_date']
-        if isinstance(start_date, str):
-            start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
-        
-        # 统计挑战期间的出单数
-        result = query_db('''
-            SELECT SUM(orders_count) as total_orders
-            FROM performance
-            WHERE employee_id = ?
-            AND work_date BETWEEN ? AND ?
-            AND is_valid_workday = 1
-        ''', [challenge['employee_id'], start_date, today], one=True)
-        
-        current_orders = result['total_orders'] if result and result['total_orders'] else 0
+        current_orders = get_challenge_orders(challenge['employee_id'], start_date, as_of)
+        target_orders = CHALLENGE_RULES['challenge_period']['target_orders']
         
         return {
             'completed': False,
             'current_orders': current_orders,
-            'target_orders': CHALLENGE_RULES['challenge_period']['target_orders'],
-            'message': f'挑战进行中：当前{current_orders}单，目标{CHALLENGE_RULES["challenge_period"]["target_orders"]}单'
+            'target_orders': target_orders,
+            'message': f'挑战进行中：当前{current_orders}单，目标{target_orders}单'
         }
     
     # 挑战期已结束，统计最终结果
-    start_date = challenge['challenge_start_date']
-    if isinstance(start_date, str):
-        start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
+    total_orders = get_challenge_orders(challenge['employee_id'], start_date, end_date)
     
+    return evaluate_challenge_result(total_orders)
+
+
+def _to_date(value):
+    if isinstance(value, str):
+        return datetime.strptime(value[:10], '%Y-%m-%d').date()
+    return value
+
+
+def get_challenge_orders(employee_id, start_date, end_date):
+    """统计挑战期间（含首尾）的有效出单数"""
     result = query_db('''
         SELECT SUM(orders_count) as total_orders
         FROM performance
         WHERE employee_id = ?
         AND work_date BETWEEN ? AND ?
         AND is_valid_workday = 1
-    ''', [challenge['employee_id'], start_date, end_date], one=True)
-    
-    total_orders = result['total_orders'] if result and result['total_orders'] else 0
-    target_orders = CHALLENGE_RULES['challenge_period']['target_orders']
+    ''', [employee_id, start_date, end_date], one=True)
     
-    success = total_orders >= target_orders
-    
-    result_text = '成功' if success else '失败'
-    return {
-        'completed': True,
-        'success': success,
-        'orders': total_orders,
-        'target_orders': target_orders,
-        'message': f'挑战{result_text}：出单{total_orders}单（目标{target_orders}单）'
-    }
+    return result['total_orders'] if result and result['total_orders'] else 0
 
 
-def finalize_challenge(challenge_id, manager_id, manager_name):
+def finalize_challenge(challenge_id, manager_id, manager_name, as_of=None):
     """
     完成保级挑战（经理确认结果）
     
+    Args:
+        as_of: 基准日期（默认今天），降级次日生效
+    
     Returns:
         dict: {'success': bool, 'result': str, 'message': str}
     """
-    check_result = check_challenge_completion(challenge_id)
+    check_result = check_challenge_completion(challenge_id, as_of)
     
     if not check_result['completed']:
         return {'success': False, 'message': check_result['message']}
@@ -548,7 +574,7 @@ def finalize_challenge(challenge_id, manager_id, manager_name):
     
     if not success:
         # 挑战失败，降级到C级
-        effective_date = date.today() + timedelta(days=1)
+        effective_date = resolve_as_of(as_of) + timedelta(days=1)
         
         cursor.execute('''
             UPDATE demotion_challenges
@@ -574,6 +600,7 @@ def finalize_challenge(challenge_id, manager_id, manager_name):
             effective_date,
             f'保级挑战失败（{check_result["orders"]}单<{check_result["target_orders"]}单）'
         ))
+        invalidate_employee_tags(employee_ids=[challenge['employee_id']])
         
         message = f'保级挑战失败，将于{effective_date}降级为C级'
     else:
@@ -631,25 +658,37 @@ def notify_challenge_result(challenge, success, check_result):
         )
 
 
-def batch_check_challenges():
+def batch_check_challenges(progress=None, as_of=None, team=None):
     """
     批量检查所有进行中的保级挑战
     
+    Args:
+        progress: 进度回调 progress(done, total, message)（后台任务使用）
+        as_of: 基准日期（默认今天）
+        team: 只检查该团队员工的挑战（默认全部）
+    
     Returns:
         dict: {'completed_count': int, 'details': list}
     """
     # 获取所有进行中的挑战
-    ongoing_challenges = query_db('''
-        SELECT * FROM demotion_challenges
-        WHERE decision = 'challenge'
-        AND challenge_result = 'ongoing'
-    ''')
+    query = '''
+        SELECT dc.* FROM demotion_challenges dc
+        WHERE dc.decision = 'challenge'
+        AND dc.challenge_result = 'ongoing'
+    '''
+    params = []
+    if team:
+        query += ' AND dc.employee_id IN (SELECT id FROM employees WHERE team = ?)'
+        params.append(team)
+    ongoing_challenges = query_db(query, params)
     
     completed_count = 0
     details = []
     
-    for challenge in ongoing_challenges:
-        check_result = check_challenge_completion(challenge['id'])
+    for index, challenge in enumerate(ongoing_challenges, start=1):
+        if progress:
+            progress(index, len(ongoing_challenges), challenge['employee_name'])
+        check_result = check_challenge_completion(challenge['id'], as_of)
         if check_result['completed']:
             # 自动触发完成流程（需要经理确认，这里只是检测）
             details.append({
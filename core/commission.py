@@ -2,18 +2,64 @@
 日提成计算引擎
 """
 
+# 提成阶梯：(本档最高单数（累计）, 每单提成)，最后一档上限为 None
+COMMISSION_TIERS = (
+    (3, 10),      # 1-3单：10元/单
+    (5, 20),      # 4-5单：20元/单
+    (None, 30),   # ≥6单：30元/单
+)
 
-def calculate_daily_commission(orders_count):
+
+def normalize_commission_tiers(tiers=None):
+    """
+    校验并规范化提成阶梯
+
+    Args:
+        tiers: [(上限, 单价), ...]，上限递增，最后一档上限为 None；None 表示默认阶梯
+
+    Returns:
+        tuple: ((上限, 单价), ...)
+
+    Raises:
+        ValueError: 阶梯配置不合法
+    """
+    if tiers is None:
+        return COMMISSION_TIERS
+
+    normalized = []
+    previous = 0
+    for index, tier in enumerate(tiers):
+        upper, rate = tier
+        last = index == len(tiers) - 1
+        if upper is None:
+            if not last:
+                raise ValueError('只有最后一档的上限可以为空')
+        else:
+            upper = int(upper)
+            if upper <= previous:
+                raise ValueError('提成阶梯上限必须递增')
+            previous = upper
+        if float(rate) < 0:
+            raise ValueError('提成单价不能为负数')
+        normalized.append((upper, rate))
+
+    if not normalized or normalized[-1][0] is not None:
+        raise ValueError('最后一档的上限必须为空（不封顶）')
+    return tuple(normalized)
+
+
+def calculate_daily_commission(orders_count, tiers=None):
     """
     计算日提成（阶梯制）
     
-    规则：
+    规则（默认阶梯 COMMISSION_TIERS）：
     - 1-3单：10元/单
     - 4-5单：20元/单
     - ≥6单：30元/单
     
     Args:
         orders_count: 订单数量
+        tiers: 提成阶梯（默认 COMMISSION_TIERS）
         
     Returns:
         float: 当日提成金额
@@ -21,14 +67,44 @@ def calculate_daily_commission(orders_count):
     if orders_count <= 0:
         return 0
     
-    if orders_count <= 3:
-        return orders_count * 10
+    total = 0
+    lower = 0
+    for upper, rate in (tiers or COMMISSION_TIERS):
+        if upper is None or orders_count <= upper:
+            return total + (orders_count - lower) * rate
+        total += (upper - lower) * rate
+        lower = upper
+    return total
+
+
+def calculate_commission_array(orders, tiers=None):
+    """
+    向量化计算日提成（批量重算、规则仿真使用）
     
-    if orders_count <= 5:
-        return 3 * 10 + (orders_count - 3) * 20
+    按各档起点用 searchsorted 定位所在档位，
+    提成 = 该档之前各档累计金额 + 超出该档起点的单数 × 该档单价，结果与逐行调用
+    calculate_daily_commission 一致。
     
-    # ≥6单
-    return 3 * 10 + 2 * 20 + (orders_count - 5) * 30
+    Args:
+        orders: 出单数数组（任意形状）
+        tiers: 提成阶梯（默认 COMMISSION_TIERS）
+        
+    Returns:
+        ndarray: 与 orders 同形状的提成金额（float64）
+    """
+    import numpy as np
+    
+    tiers = normalize_commission_tiers(tiers)
+    orders = np.asarray(orders, dtype=np.int64)
+    
+    # 各档起点、单价及起点之前的累计金额
+    lowers = np.array([0] + [upper for upper, _ in tiers[:-1]], dtype=np.int64)
+    rates = np.array([rate for _, rate in tiers], dtype=np.float64)
+    base = np.concatenate(([0.0], np.cumsum(np.diff(lowers) * rates[:-1])))
+    
+    tier = np.clip(np.searchsorted(lowers, orders, side='left') - 1, 0, len(tiers) - 1)
+    amount = base[tier] + (orders - lowers[tier]) * rates[tier]
+    return np.where(orders > 0, amount, 0.0)
 
 
 def calculate_commission_detail(orders_count):
@@ -44,19 +120,20 @@ def calculate_commission_detail(orders_count):
     if orders_count <= 0:
         return "0单，提成0元"
     
-    if orders_count <= 3:
-        return f"{orders_count}单 × 10元/单 = {orders_count * 10}元"
+    parts = []
+    lower = 0
+    for upper, rate in COMMISSION_TIERS:
+        if upper is None or orders_count <= upper:
+            # 当前档只计到实际单数
+            if lower == 0:
+                return f"{orders_count}单 × {rate}元/单 = {orders_count * rate}元"
+            parts.append(f"第{lower + 1}-{orders_count}单({orders_count - lower}×{rate}元)")
+            break
+        amount = (upper - lower) * rate
+        parts.append(f"前{upper}单({amount}元)" if lower == 0 else f"第{lower + 1}-{upper}单({amount}元)")
+        lower = upper
     
-    if orders_count <= 5:
-        tier1 = 3 * 10
-        tier2 = (orders_count - 3) * 20
-        return f"前3单(30元) + 第4-{orders_count}单({orders_count-3}×20元) = {tier1 + tier2}元"
-    
-    # ≥6单
-    tier1 = 3 * 10
-    tier2 = 2 * 20
-    tier3 = (orders_count - 5) * 30
-    return f"前3单(30元) + 第4-5单(40元) + 第6-{orders_count}单({orders_count-5}×30元) = {tier1 + tier2 + tier3}元"
+    return f"{' + '.join(parts)} = {calculate_daily_commission(orders_count)}元"
 
 
 def calculate_total_commission(daily_records):
@@ -74,5 +151,3 @@ def calculate_total_commission(daily_records):
         orders = record.get('orders_count', 0)
         total += calculate_daily_commission(orders)
     return total
-
-
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+提成重算模块
+提成阶梯调整或历史业绩修正后，按日期范围/员工范围重新计算 performance.commission：
+整批向量化计算，只写回与库中不一致的行，并同步薪资台账的累计提成、
+作废受影响月份未确认的薪资快照
+"""
+
+import time
+from collections import defaultdict
+import numpy as np
+from core.database import get_db
+from core.commission import COMMISSION_TIERS, calculate_commission_array, normalize_commission_tiers
+from core.salary_ledger import adjust_commission
+from core.performance_recalculator import SQL_CHUNK_SIZE, invalidate_salary_snapshots
+from core.audit import log_operation
+from core.cache import invalidate_tags, performance_tag
+
+# 每批写回的行数
+WRITE_CHUNK_SIZE = 5000
+
+# 提成金额比较精度（REAL 列）
+COMMISSION_TOLERANCE = 0.005
+
+# 报告中返回的变更明细条数
+SAMPLE_SIZE = 20
+
+
+def _load_rows(db, start_date, end_date, employee_ids):
+    """读取需要重算的业绩行"""
+    conditions, params = [], []
+    if start_date:
+        conditions.append('work_date >= ?')
+        params.append(str(start_date)[:10])
+    if end_date:
+        conditions.append('work_date <= ?')
+        params.append(str(end_date)[:10])
+    where = ' AND '.join(conditions) or '1 = 1'
+
+    sql = f'''
+        SELECT id, employee_id, work_date, orders_count, commission
+        FROM performance
+        WHERE {where}
+    '''
+    if employee_ids is None:
+        return db.execute(sql, params).fetchall()
+
+    rows = []
+    employee_ids = sorted(set(employee_ids))
+    for i in range(0, len(employee_ids), SQL_CHUNK_SIZE):
+        chunk = employee_ids[i:i + SQL_CHUNK_SIZE]
+        rows.extend(db.execute(
+            sql + f" AND employee_id IN ({','.join('?' * len(chunk))})",
+            params + chunk
+        ).fetchall())
+    return rows
+
+
+def check_recompute_tiers(tiers=None, dry_run=False):
+    """
+    校验重算使用的提成阶梯
+
+    自定义阶梯没有持久化（提成录入仍按 COMMISSION_TIERS 计算），只能用于试算；
+    写库重算必须使用现行阶梯，否则库中提成与后续录入的提成口径不一致
+
+    Returns:
+        str or None: 错误信息，合法时为 None
+    """
+    try:
+        normalized = normalize_commission_tiers(tiers)
+    except (ValueError, TypeError) as e:
+        return f'提成阶梯配置不合法：{e}'
+    if not dry_run and normalized != COMMISSION_TIERS:
+        return '自定义提成阶梯只能试算（dry_run）：写库重算按现行提成阶梯进行'
+    return None
+
+
+def recompute_commission(start_date=None, end_date=None, employee_ids=None, tiers=None,
+                         dry_run=False, progress=None):
+    """
+    重算业绩提成
+
+    Args:
+        start_date: 起始日期（含），None 表示不限
+        end_date: 结束日期（含），None 表示不限
+        employee_ids: 只重算指定员工，None 表示全部
+        tiers: 提成阶梯（默认 core.commission.COMMISSION_TIERS；与现行阶梯不同时须 dry_run）
+        dry_run: 只计算差异，不写库
+        progress: 进度回调 progress(done, total, message)（后台任务使用）
+
+    Returns:
+        dict: {
+            'success', 'dry_run', 'rows_checked', 'rows_changed',
+            'commission_before', 'commission_after', 'commission_delta',
+            'by_month': [{'year_month', 'rows_changed', 'delta'}],
+            'affected_employees', 'ledger_rows_refreshed', 'invalidated_salaries',
+            'locked_salaries', 'stale_payrolls', 'samples', 'elapsed_ms', 'message'
+        }
+    """
+    started = time.perf_counter()
+    # 先校验阶梯，避免读完数据才报错
+    error = check_recompute_tiers(tiers, dry_run)
+    if error:
+        return {'success': False, 'message': error}
+
+    db = get_db()
+    rows = _load_rows(db, start_date, end_date, employee_ids)
+
+    # 1. 向量化计算并找出不一致的行
+    orders = np.fromiter((r['orders_count'] or 0 for r in rows), dtype=np.int64, count=len(rows))
+    stored = np.fromiter((r['commission'] or 0 for r in rows), dtype=np.float64, count=len(rows))
+    recalculated = calculate_commission_array(orders, tiers)
+    changed = np.flatnonzero(np.abs(recalculated - stored) > COMMISSION_TOLERANCE)
+
+    if progress:
+        progress(0, len(changed), f'{len(changed)}条业绩提成需要更新')
+
+    # 2. 按（员工, 月份）汇总提成变化
+    deltas = defaultdict(float)
+    month_rows = defaultdict(int)
+    updates = []
+    samples = []
+    for index in changed.tolist():
+        row = rows[index]
+        work_date = str(row['work_date'])[:10]
+        new_value = float(recalculated[index])
+        deltas[(row['employee_id'], work_date[:7])] += new_value - stored[index]
+        month_rows[work_date[:7]] += 1
+        updates.append((new_value, row['id']))
+        if len(samples) < SAMPLE_SIZE:
+            samples.append({
+                'employee_id': row['employee_id'],
+                'work_date': work_date,
+                'orders_count': int(orders[index]),
+                'old_commission': float(stored[index]),
+                'new_commission': new_value
+            })
+
+    ledger_deltas = [(emp_id, ym, round(delta, 2)) for (emp_id, ym), delta in deltas.items()]
+    affected_pairs = sorted(deltas.keys())
+    invalidated_salaries, locked_salaries, stale_payrolls = 0, [], []
+
+    # 3. 分批写回，刷新台账与薪资快照，同一事务提交
+    if updates and not dry_run:
+        for i in range(0, len(updates), WRITE_CHUNK_SIZE):
+            db.executemany(
+                'UPDATE performance SET commission = ? WHERE id = ?',
+                updates[i:i + WRITE_CHUNK_SIZE]
+            )
+            if progress:
+                progress(min(i + WRITE_CHUNK_SIZE, len(updates)), len(updates), '写回业绩提成')
+
+        adjust_commission(db, ledger_deltas)
+        invalidated_salaries, locked_salaries, stale_payrolls = invalidate_salary_snapshots(db, affected_pairs)
+        invalidate_tags(*(performance_tag(ym) for ym in month_rows))
+
+    commission_before = round(float(stored.sum()), 2)
+    commission_after = round(float(recalculated.sum()), 2)
+    by_month = [
+        {
+            'year_month': ym,
+            'rows_changed': month_rows[ym],
+            'delta': round(sum(d for (_, m), d in deltas.items() if m == ym), 2)
+        }
+        for ym in sorted(month_rows)
+    ]
+    message = (
+        f'检查{len(rows)}条业绩，{len(updates)}条提成'
+        f'{"需要" if dry_run else "已"}更新，合计变化{commission_after - commission_before:+.2f}元'
+    )
+
+    if updates and not dry_run:
+        log_operation(
+            operation_type='performance',
+            operation_module='commission_recompute',
+            operation_action='recompute',
+            changes_dict={
+                'start_date': str(start_date)[:10] if start_date else None,
+                'end_date': str(end_date)[:10] if end_date else None,
+                'employee_count': len(employee_ids) if employee_ids is not None else None,
+                'tiers': [list(t) for t in tiers] if tiers else None,
+                'rows_changed': len(updates),
+                'commission_delta': round(commission_after - commission_before, 2)
+            },
+            notes=message,
+            commit=False
+        )
+        db.commit()
+
+    return {
+        'success': True,
+        'dry_run': bool(dry_run),
+        'rows_checked': len(rows),
+        'rows_changed': len(updates),
+        'commission_before': commission_before,
+        'commission_after': commission_after,
+        'commission_delta': round(commission_after - commission_before, 2),
+        'by_month': by_month,
+        'affected_employees': len({emp_id for emp_id, _ in affected_pairs}),
+        'ledger_rows_refreshed': 0 if dry_run else len(ledger_deltas),
+        'invalidated_salaries': invalidated_salaries,
+        'locked_salaries': locked_salaries,
+        'stale_payrolls': stale_payrolls,
+        'samples': samples,
+        'elapsed_ms': int((time.perf_counter() - started) * 1000),
+        'message': message
+    }
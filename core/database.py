@@ -3,31 +3,67 @@
 """
 import sqlite3
 import os
+import threading
 from flask import g
 from config import Config
+from core.sql_monitor import MonitoredConnection
+
+
+# 持久连接模式下每个线程复用的连接（保留 SQLite 语句缓存与页缓存）
+_local = threading.local()
+
+
+def _connect():
+    """创建数据库连接"""
+    # 确保data目录存在
+    os.makedirs(os.path.dirname(Config.DATABASE), exist_ok=True)
+    
+    conn = sqlite3.connect(
+        Config.DATABASE,
+        detect_types=sqlite3.PARSE_DECLTYPES,
+        factory=MonitoredConnection if Config.SQL_MONITOR_ENABLED else sqlite3.Connection,
+        cached_statements=Config.DB_STATEMENT_CACHE_SIZE
+    )
+    conn.row_factory = sqlite3.Row  # 使结果可以通过列名访问
+    return conn
 
 
 def get_db():
     """获取数据库连接"""
     if 'db' not in g:
-        # 确保data目录存在
-        os.makedirs(os.path.dirname(Config.DATABASE), exist_ok=True)
-        
-        g.db = sqlite3.connect(
-            Config.DATABASE,
-            detect_types=sqlite3.PARSE_DECLTYPES
-        )
-        g.db.row_factory = sqlite3.Row  # 使结果可以通过列名访问
+        if Config.DB_PERSISTENT_CONNECTIONS:
+            conn = getattr(_local, 'conn', None)
+            if conn is None or _local.path != Config.DATABASE:
+                conn = _connect()
+                _local.conn, _local.path = conn, Config.DATABASE
+            g.db = conn
+        else:
+            g.db = _connect()
     return g.db
 
 
 def close_db(e=None):
-    """关闭数据库连接"""
+    """关闭数据库连接（持久连接模式下回滚未提交的事务后保留连接）"""
     db = g.pop('db', None)
-    if db is not None:
+    if db is None:
+        return
+    if Config.DB_PERSISTENT_CONNECTIONS and getattr(_local, 'conn', None) is db:
+        if db.in_transaction:
+            db.rollback()
+    else:
         db.close()
 
 
+def discard_thread_connections():
+    """
+    丢弃当前线程的持久连接
+
+    预加载应用的 fork 模式下，子进程启动时调用，避免与父进程共用同一个 SQLite 连接
+    """
+    _local.conn = None
+    _local.path = None
+
+
 def init_db():
     """初始化数据库表结构"""
     db = get_db()
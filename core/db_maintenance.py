@@ -0,0 +1,540 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SQLite 日常维护
+定时（每个 worker 一个后台线程，按 DB_MAINTENANCE_TICK 秒检查）或大批量写入后执行：
+    - checkpoint：WAL 检查点（PASSIVE 不阻塞读写；WAL 过大且已全部回写时 TRUNCATE 截断文件）
+    - optimize：PRAGMA optimize（按需重新收集统计信息，开销很小）
+    - analyze：ANALYZE（analysis_limit 限制每个索引的采样量），大批量写入过的表优先
+    - incremental_vacuum：auto_vacuum=INCREMENTAL 时分批归还空闲页（归档删除后文件不再只增不减）
+    - report_snapshot：REPORT_SNAPSHOT_ENABLED 时重建报表只读快照（core/report_snapshot.py）
+
+锁感知：维护连接只等待很短的 busy 超时，拿不到写锁时本次记为 deferred，下次检查再执行；
+每个任务在 db_maintenance_tasks 中持有租约，多 worker 同时检查时只有一个执行。
+导入业绩、生成工资单、批量调整、年度归档在同一事务中调用 note_bulk_write 记录写入行数，达到阈值时唤醒维护线程。
+
+用法：
+    python3 -m core.db_maintenance                 # 健康报告
+    python3 -m core.db_maintenance --run           # 执行到期的维护任务
+    python3 -m core.db_maintenance --run analyze --force
+    python3 -m core.db_maintenance --enable-incremental-vacuum   # 一次性 VACUUM（锁库，停机窗口执行）
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# 维护任务：执行间隔（秒）
+MAINTENANCE_TASKS = {
+    'checkpoint': {'label': 'WAL 检查点', 'interval': 300},
+    'optimize': {'label': 'PRAGMA optimize', 'interval': 3600},
+    'analyze': {'label': '统计信息（ANALYZE）', 'interval': 86400},
+    'incremental_vacuum': {'label': '回收空闲页', 'interval': 86400},
+    'report_snapshot': {'label': '报表只读快照', 'interval': Config.REPORT_SNAPSHOT_INTERVAL}
+}
+
+# 维护连接等待写锁的超时（秒）：线上写入优先，拿不到锁就推迟
+MAINTENANCE_BUSY_TIMEOUT = 0.2
+
+# 任务租约（秒）：执行中的 worker 崩溃后租约到期，其他 worker 可接手
+MAINTENANCE_LEASE_SECONDS = 600
+
+# 表累计写入行数达到该值时触发 ANALYZE
+ANALYZE_PENDING_ROWS = 5000
+
+# ANALYZE / optimize 每个索引的采样行数上限（0 为不限）
+ANALYSIS_LIMIT = 1000
+
+# WAL 超过该大小时立即检查点，已全部回写时截断文件
+WAL_CHECKPOINT_BYTES = 16 * 1024 * 1024
+WAL_TRUNCATE_BYTES = 64 * 1024 * 1024
+
+# 空闲页占比达到该值时回收；每次最多回收的页数（限制单次持锁时间）
+FREELIST_VACUUM_RATIO = 0.10
+INCREMENTAL_VACUUM_PAGES = 2000
+
+# 健康报告：空闲页占比告警阈值
+FREELIST_WARN_RATIO = 0.20
+
+# 大批量写入唤醒后等待的秒数（同一批导入的后续写入一起处理）
+BULK_WRITE_SETTLE_SECONDS = 5
+
+_AUTO_VACUUM_MODES = {0: 'none', 1: 'full', 2: 'incremental'}
+
+_wakeup = threading.Event()
+_scheduler = None
+_scheduler_lock = threading.Lock()
+_run_lock = threading.Lock()
+
+
+class MaintenanceDeferred(Exception):
+    """数据库正忙，任务推迟到下次检查"""
+
+
+def connect(db_path=None):
+    """维护专用连接：自动提交模式，busy 超时很短"""
+    conn = sqlite3.connect(db_path or Config.DATABASE, timeout=MAINTENANCE_BUSY_TIMEOUT, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _is_busy(error):
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+
+# ==================== 大批量写入登记 ====================
+
+def note_bulk_write(table, rows):
+    """
+    登记大批量写入（在调用方事务中执行，随业务写入一起提交）
+
+    Args:
+        table: 表名
+        rows: 写入/删除的行数
+    """
+    if not rows:
+        return
+    from core.database import get_db
+    try:
+        pending = get_db().execute('''
+            INSERT INTO db_maintenance_writes (table_name, pending_rows, last_write_at)
+            VALUES (?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(table_name) DO UPDATE SET
+                pending_rows = pending_rows + excluded.pending_rows,
+                last_write_at = excluded.last_write_at
+            RETURNING pending_rows
+        ''', (table, int(rows))).fetchone()[0]
+    except sqlite3.OperationalError as e:
+        # 未执行迁移 0006 的数据库：维护登记不影响业务写入
+        logger.warning('登记大批量写入失败（%s）：%s', table, e)
+        return
+    if pending >= ANALYZE_PENDING_ROWS:
+        request_maintenance()
+
+
+def request_maintenance():
+    """唤醒本进程的维护线程（未启动时由下次定时检查或命令行处理）"""
+    _wakeup.set()
+
+
+# ==================== 指标 ====================
+
+def get_database_metrics(conn, db_path=None):
+    """
+    数据库文件与维护相关指标
+
+    Returns:
+        dict: {'path', 'file_size', 'wal_size', 'page_size', 'page_count', 'freelist_count', 'freelist_ratio',
+               'auto_vacuum', 'journal_mode', 'wal_frames', 'analyzed_tables', 'unanalyzed_tables',
+               'pending_writes': [{'table', 'rows', 'last_write_at'}]}
+    """
+    path = db_path or Config.DATABASE
+    wal_path = path + '-wal'
+    page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+    page_count = conn.execute('PRAGMA page_count').fetchone()[0]
+    freelist = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    wal_size = os.path.getsize(wal_path) if os.path.exists(wal_path) else 0
+
+    indexed_tables = {row[0] for row in conn.execute(
+        "SELECT DISTINCT tbl_name FROM sqlite_master WHERE type = 'index' AND tbl_name NOT LIKE 'sqlite_%'"
+    ).fetchall()}
+    analyzed = set()
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone():
+        analyzed = {row[0] for row in conn.execute('SELECT DISTINCT tbl FROM sqlite_stat1').fetchall()}
+
+    pending = []
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'db_maintenance_writes'").fetchone():
+        pending = [
+            {'table': row['table_name'], 'rows': row['pending_rows'], 'last_write_at': row['last_write_at']}
+            for row in conn.execute('''
+                SELECT table_name, pending_rows, last_write_at FROM db_maintenance_writes
+                WHERE pending_rows > 0 ORDER BY pending_rows DESC
+            ''').fetchall()
+        ]
+
+    return {
+        'path': path,
+        'file_size': os.path.getsize(path) if os.path.exists(path) else 0,
+        'wal_size': wal_size,
+        'page_size': page_size,
+        'page_count': page_count,
+        'freelist_count': freelist,
+        'freelist_ratio': round(freelist / page_count, 4) if page_count else 0.0,
+        'auto_vacuum': _AUTO_VACUUM_MODES.get(conn.execute('PRAGMA auto_vacuum').fetchone()[0], 'none'),
+        'journal_mode': conn.execute('PRAGMA journal_mode').fetchone()[0],
+        # WAL 文件头 32 字节，每帧 24 字节帧头 + 一页
+        'wal_frames': max(0, (wal_size - 32) // (page_size + 24)) if wal_size else 0,
+        'analyzed_tables': len(analyzed & indexed_tables),
+        'unanalyzed_tables': sorted(indexed_tables - analyzed),
+        'pending_writes': pending
+    }
+
+
+# ==================== 任务 ====================
+
+def _task_checkpoint(conn, metrics, force):
+    if metrics['journal_mode'] != 'wal':
+        return 'skipped', {'reason': f"journal_mode={metrics['journal_mode']}"}
+    busy, frames, checkpointed = conn.execute('PRAGMA wal_checkpoint(PASSIVE)').fetchone()
+    mode = 'PASSIVE'
+    if metrics['wal_size'] >= WAL_TRUNCATE_BYTES and frames == checkpointed:
+        busy, frames, checkpointed = conn.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchone()
+        mode = 'TRUNCATE'
+    lag = max(0, frames - checkpointed)
+    detail = {'mode': mode, 'wal_frames': frames, 'checkpointed': checkpointed, 'lag_frames': lag}
+    # 有读事务持有旧快照时无法全部回写，下次检查继续
+    return ('ok' if not busy and not lag else 'partial'), detail
+
+
+def _task_optimize(conn, metrics, force):
+    conn.execute(f'PRAGMA analysis_limit = {ANALYSIS_LIMIT}')
+    conn.execute('PRAGMA optimize').fetchall()
+    return 'ok', {}
+
+
+def _task_analyze(conn, metrics, force):
+    tables = [item['table'] for item in metrics['pending_writes'] if item['rows'] >= ANALYZE_PENDING_ROWS]
+    full = force or not metrics['analyzed_tables'] or not tables
+    conn.execute(f'PRAGMA analysis_limit = {ANALYSIS_LIMIT}')
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        if full:
+            conn.execute('ANALYZE')
+            conn.execute('UPDATE db_maintenance_writes SET pending_rows = 0')
+        else:
+            for table in tables:
+                conn.execute(f'ANALYZE "{table}"')
+            conn.execute(
+                f"UPDATE db_maintenance_writes SET pending_rows = 0 WHERE table_name IN ({','.join('?' * len(tables))})",
+                tables
+            )
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    return 'ok', {'scope': 'all' if full else tables}
+
+
+def _task_incremental_vacuum(conn, metrics, force):
+    if metrics['auto_vacuum'] != 'incremental':
+        return 'skipped', {'reason': 'auto_vacuum 未启用 INCREMENTAL（python3 -m core.db_maintenance --enable-incremental-vacuum）'}
+    before = metrics['freelist_count']
+    if not before:
+        return 'ok', {'freed_pages': 0}
+    # execute() 只单步执行一次（只回收 1 页），executescript 执行到结束
+    conn.executescript(f'PRAGMA incremental_vacuum({min(before, INCREMENTAL_VACUUM_PAGES)});')
+    after = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    return 'ok', {'freed_pages': before - after, 'freelist_count': after}
+
+
+def _task_report_snapshot(conn, metrics, force):
+    from core.report_snapshot import build_report_snapshot
+    if not Config.REPORT_SNAPSHOT_ENABLED:
+        return 'skipped', {'reason': 'REPORT_SNAPSHOT_ENABLED=0'}
+    result = build_report_snapshot(metrics['path'])
+    return 'ok', {'built_at': result['built_at'], 'file_size': result['file_size']}
+
+
+_TASK_FUNCS = {
+    'checkpoint': _task_checkpoint,
+    'optimize': _task_optimize,
+    'analyze': _task_analyze,
+    'incremental_vacuum': _task_incremental_vacuum,
+    'report_snapshot': _task_report_snapshot
+}
+
+
+def _is_due(task, state, metrics, now):
+    """任务是否到期：超过执行间隔，或大批量写入/WAL 增长/空闲页达到阈值"""
+    last_run = state['last_run_ts'] if state else None
+    if last_run is None or now - last_run >= MAINTENANCE_TASKS[task]['interval']:
+        return True
+    if task == 'checkpoint':
+        return metrics['wal_size'] >= WAL_CHECKPOINT_BYTES
+    if task == 'analyze':
+        return any(item['rows'] >= ANALYZE_PENDING_ROWS for item in metrics['pending_writes'])
+    if task == 'incremental_vacuum':
+        return metrics['auto_vacuum'] == 'incremental' and metrics['freelist_ratio'] >= FREELIST_VACUUM_RATIO
+    if task == 'report_snapshot':
+        from core.report_snapshot import snapshot_path
+        return Config.REPORT_SNAPSHOT_ENABLED and not os.path.exists(snapshot_path(metrics['path']))
+    return False
+
+
+def _acquire_lease(conn, task, now):
+    """取得任务租约（其他进程持有未到期租约时返回 False）"""
+    cursor = conn.execute('''
+        INSERT INTO db_maintenance_tasks (task, lease_until) VALUES (?, ?)
+        ON CONFLICT(task) DO UPDATE SET lease_until = excluded.lease_until
+        WHERE lease_until IS NULL OR lease_until < ?
+    ''', (task, now + MAINTENANCE_LEASE_SECONDS, now))
+    return cursor.rowcount == 1
+
+
+def _finish_task(conn, task, status, duration_ms, detail, finished):
+    if status == 'deferred':
+        conn.execute('UPDATE db_maintenance_tasks SET lease_until = NULL WHERE task = ?', (task,))
+        return
+    conn.execute('''
+        UPDATE db_maintenance_tasks
+        SET last_run_ts = ?, last_status = ?, last_duration_ms = ?, last_detail = ?, lease_until = NULL
+        WHERE task = ?
+    ''', (finished, status, duration_ms, json.dumps(detail, ensure_ascii=False), task))
+
+
+def run_maintenance(tasks=None, force=False, db_path=None):
+    """
+    执行到期的维护任务
+
+    Args:
+        tasks: 只执行这些任务（默认全部）
+        force: 忽略到期判断
+        db_path: 数据库路径（默认 Config.DATABASE）
+
+    Returns:
+        dict: {'success': bool, 'message': str,
+               'results': [{'task', 'status': ok/partial/skipped/deferred/failed, 'duration_ms', 'detail'}]}
+    """
+    unknown = [task for task in (tasks or []) if task not in MAINTENANCE_TASKS]
+    if unknown:
+        return {'success': False, 'message': f"未知的维护任务：{', '.join(unknown)}"}
+
+    # 同一进程内只有一个维护执行（定时线程与手动触发）
+    if not _run_lock.acquire(blocking=False):
+        return {'success': False, 'message': '维护任务正在执行'}
+
+    results = []
+    conn = None
+    try:
+        conn = connect(db_path)
+        states = {row['task']: row for row in conn.execute('SELECT * FROM db_maintenance_tasks').fetchall()}
+        for task in tasks or MAINTENANCE_TASKS:
+            now = time.time()
+            metrics = get_database_metrics(conn, db_path)
+            if not force and not _is_due(task, states.get(task), metrics, now):
+                continue
+            try:
+                if not _acquire_lease(conn, task, now):
+                    continue
+            except sqlite3.OperationalError as e:
+                if not _is_busy(e):
+                    raise
+                results.append({'task': task, 'status': 'deferred', 'duration_ms': 0, 'detail': {}})
+                continue
+
+            started = time.perf_counter()
+            try:
+                status, detail = _TASK_FUNCS[task](conn, metrics, force)
+            except sqlite3.OperationalError as e:
+                if conn.in_transaction:
+                    conn.execute('ROLLBACK')
+                status, detail = ('deferred' if _is_busy(e) else 'failed'), {'error': str(e)}
+            except Exception as e:
+                if conn.in_transaction:
+                    conn.execute('ROLLBACK')
+                status, detail = 'failed', {'error': str(e)}
+                logger.exception('数据库维护任务 %s 失败', task)
+            duration_ms = int((time.perf_counter() - started) * 1000)
+            _finish_task(conn, task, status, duration_ms, detail, time.time())
+            results.append({'task': task, 'status': status, 'duration_ms': duration_ms, 'detail': detail})
+    finally:
+        if conn is not None:
+            conn.close()
+        _run_lock.release()
+
+    failed = [r['task'] for r in results if r['status'] == 'failed']
+    executed = [r['task'] for r in results if r['status'] in ('ok', 'partial')]
+    deferred = [r['task'] for r in results if r['status'] == 'deferred']
+    if failed:
+        message = f"维护任务失败：{', '.join(failed)}"
+    elif executed or deferred:
+        message = '；'.join(filter(None, [
+            executed and f"已执行：{', '.join(executed)}",
+            deferred and f"数据库忙，已推迟：{', '.join(deferred)}"
+        ]))
+    else:
+        message = '没有到期的维护任务'
+    return {'success': not failed, 'message': message, 'results': results}
+
+
+def enable_incremental_vacuum(db_path=None):
+    """
+    切换到 auto_vacuum=INCREMENTAL（需要一次完整 VACUUM，期间锁库，应在停机窗口执行）
+
+    Returns:
+        dict: {'success': bool, 'message': str, 'file_size_before', 'file_size_after'}
+    """
+    path = db_path or Config.DATABASE
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2:
+            return {'success': True, 'message': '已启用 INCREMENTAL，无需重复执行'}
+        before = os.path.getsize(path)
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        conn.execute('VACUUM')
+        after = os.path.getsize(path)
+    finally:
+        conn.close()
+    return {
+        'success': True,
+        'message': f'已启用增量回收，文件 {before / 1048576:.1f}MB → {after / 1048576:.1f}MB',
+        'file_size_before': before,
+        'file_size_after': after
+    }
+
+
+# ==================== 健康报告 ====================
+
+def get_health_report(db_path=None):
+    """
+    数据库维护健康报告
+
+    Returns:
+        dict: {'success': True, 'status': 'ok' | 'warning', 'metrics': {...},
+               'tasks': [{'task', 'label', 'interval', 'last_run_at', 'last_status', 'last_duration_ms',
+                          'detail', 'due'}],
+               'warnings': [str], 'report_snapshot': dict | None, 'scheduler': bool}
+    """
+    conn = connect(db_path)
+    try:
+        metrics = get_database_metrics(conn, db_path)
+        states = {row['task']: row for row in conn.execute('SELECT * FROM db_maintenance_tasks').fetchall()}
+    finally:
+        conn.close()
+
+    now = time.time()
+    tasks = []
+    warnings = []
+    for task, info in MAINTENANCE_TASKS.items():
+        state = states.get(task)
+        last_run = state['last_run_ts'] if state else None
+        detail = json.loads(state['last_detail']) if state and state['last_detail'] else {}
+        tasks.append({
+            'task': task,
+            'label': info['label'],
+            'interval': info['interval'],
+            'last_run_at': datetime.fromtimestamp(last_run).strftime('%Y-%m-%d %H:%M:%S') if last_run else None,
+            'last_status': state['last_status'] if state else None,
+            'last_duration_ms': state['last_duration_ms'] if state else None,
+            'detail': detail,
+            'due': _is_due(task, state, metrics, now)
+        })
+        if state and state['last_status'] == 'failed':
+            warnings.append(f"{info['label']}上次执行失败：{detail.get('error', '')}")
+        elif last_run and now - last_run > info['interval'] * 3:
+            warnings.append(f"{info['label']}已超过 {int((now - last_run) // 3600)} 小时未执行")
+
+    if metrics['freelist_ratio'] >= FREELIST_WARN_RATIO:
+        hint = '' if metrics['auto_vacuum'] == 'incremental' else '（auto_vacuum 未启用 INCREMENTAL，需在停机窗口执行 --enable-incremental-vacuum）'
+        warnings.append(f"空闲页占 {metrics['freelist_ratio']:.0%}{hint}")
+    if metrics['wal_size'] >= WAL_TRUNCATE_BYTES:
+        warnings.append(f"WAL 文件 {metrics['wal_size'] / 1048576:.1f}MB，检查点落后")
+    if not metrics['analyzed_tables']:
+        warnings.append('没有统计信息（从未执行 ANALYZE），查询计划可能选错索引')
+    for item in metrics['pending_writes']:
+        if item['rows'] >= ANALYZE_PENDING_ROWS:
+            warnings.append(f"{item['table']} 大批量写入 {item['rows']} 行后尚未更新统计信息")
+
+    snapshot = None
+    if Config.REPORT_SNAPSHOT_ENABLED:
+        from core.report_snapshot import get_snapshot_info, snapshot_path
+        snapshot = get_snapshot_info(snapshot_path(metrics['path']))
+        if snapshot is None or snapshot['stale']:
+            warnings.append('报表快照不存在或已过期，报表正在读取主库')
+
+    return {
+        'success': True,
+        'status': 'warning' if warnings else 'ok',
+        'metrics': metrics,
+        'tasks': tasks,
+        'warnings': warnings,
+        'report_snapshot': snapshot,
+        'scheduler': _scheduler is not None
+    }
+
+
+# ==================== 定时执行 ====================
+
+def _scheduler_loop():
+    while True:
+        if _wakeup.wait(Config.DB_MAINTENANCE_TICK):
+            _wakeup.clear()
+            time.sleep(BULK_WRITE_SETTLE_SECONDS)
+        try:
+            result = run_maintenance()
+            if result['results']:
+                logger.info('数据库维护：%s', result['message'])
+        except Exception:
+            logger.exception('数据库维护执行失败')
+
+
+def start_maintenance_scheduler():
+    """
+    启动本进程的维护线程（worker 初始化时调用；DB_MAINTENANCE_ENABLED=0 时不启动）
+
+    Returns:
+        bool: 是否已在运行
+    """
+    global _scheduler
+    if not Config.DB_MAINTENANCE_ENABLED:
+        return False
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = threading.Thread(target=_scheduler_loop, name='db-maintenance', daemon=True)
+            _scheduler.start()
+    return True
+
+
+def discard_scheduler():
+    """
+    丢弃维护线程引用（不等待）
+
+    预加载应用的 fork 模式下，子进程启动时调用：父进程的线程不会被复制到子进程
+    """
+    global _scheduler
+    with _scheduler_lock:
+        _scheduler = None
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='SQLite 维护：健康报告、ANALYZE、检查点、空闲页回收')
+    parser.add_argument('--db', help='数据库路径（默认 Config.DATABASE）')
+    parser.add_argument('--run', nargs='*', metavar='TASK', help=f"执行维护任务（{', '.join(MAINTENANCE_TASKS)}，默认全部到期任务）")
+    parser.add_argument('--force', action='store_true', help='忽略到期判断')
+    parser.add_argument('--enable-incremental-vacuum', action='store_true', help='切换到增量回收（执行一次 VACUUM，锁库）')
+    args = parser.parse_args()
+
+    if args.enable_incremental_vacuum:
+        print(enable_incremental_vacuum(args.db)['message'])
+    if args.run is not None:
+        result = run_maintenance(args.run or None, force=args.force, db_path=args.db)
+        for item in result.get('results', []):
+            print(f"  {item['task']:20} {item['status']:9} {item['duration_ms']:6}ms  {json.dumps(item['detail'], ensure_ascii=False)}")
+        print(result['message'])
+
+    report = get_health_report(args.db)
+    m = report['metrics']
+    print(f"\n文件 {m['file_size'] / 1048576:.1f}MB，WAL {m['wal_size'] / 1048576:.1f}MB（约 {m['wal_frames']} 帧），"
+          f"空闲页 {m['freelist_count']}/{m['page_count']}（{m['freelist_ratio']:.1%}），"
+          f"auto_vacuum={m['auto_vacuum']}，journal_mode={m['journal_mode']}，已分析 {m['analyzed_tables']} 张表")
+    for task in report['tasks']:
+        print(f"  {task['label']:20} 上次 {task['last_run_at'] or '从未执行'}  {task['last_status'] or ''}"
+              f"{'  [到期]' if task['due'] else ''}")
+    for warning in report['warnings']:
+        print(f"  ⚠️  {warning}")
+    if report['status'] == 'ok':
+        print('  ✅ 状态正常')
+
+
+if __name__ == '__main__':
+    main()
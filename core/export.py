@@ -1,24 +1,42 @@
 """
 数据导出模块 - Excel & PDF
+
+openpyxl / reportlab / PyPDF2 导入慢、占内存，只有少数用户导出，
+因此在导出函数内按需导入；导出专用 worker 可设置 EXPORT_PRELOAD=1 启动时预加载
 """
 import io
+import importlib
 from datetime import datetime
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import A4, letter
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
-from reportlab.platypus import Image
-try:
-    from PyPDF2 import PdfReader, PdfWriter
-    HAS_PYPDF2 = True
-except ImportError:
-    HAS_PYPDF2 = False
+from core.salary_engine import get_calculation_detail
+
+# 导出依赖的重型模块（preload_export_libraries 预加载）
+HEAVY_MODULES = (
+    'openpyxl',
+    'openpyxl.styles',
+    'reportlab.lib.colors',
+    'reportlab.lib.enums',
+    'reportlab.lib.pagesizes',
+    'reportlab.lib.styles',
+    'reportlab.lib.units',
+    'reportlab.platypus',
+    'PyPDF2'
+)
+
+
+def preload_export_libraries():
+    """
+    预加载导出依赖（导出专用 worker 启动时调用，首次导出不再承担导入耗时）
+    
+    Returns:
+        list: 未安装、无法导入的模块
+    """
+    missing = []
+    for name in HEAVY_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            missing.append(name)
+    return missing
 
 
 def export_employees_to_excel(employees):
@@ -31,6 +49,9 @@ def export_employees_to_excel(employees):
     Returns:
         BytesIO: Excel 文件字节流
     """
+    from openpyxl import Workbook
+    from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+    
     wb = Workbook()
     ws = wb.active
     ws.title = "员工数据"
@@ -100,6 +121,9 @@ def export_employees_to_excel(employees):
 
 def export_performance_to_excel(performance_list):
     """导出业绩数据到 Excel"""
+    from openpyxl import Workbook
+    from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+    
     wb = Workbook()
     ws = wb.active
     ws.title = "业绩数据"
@@ -167,6 +191,9 @@ def export_performance_to_excel(performance_list):
 
 def export_salary_to_excel(salary_list, year_month):
     """导出薪资数据到 Excel"""
+    from openpyxl import Workbook
+    from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+    
     wb = Workbook()
     ws = wb.active
     ws.title = f"{year_month}薪资"
@@ -285,6 +312,13 @@ def generate_salary_pdf(employee_data, salary_data, year_month, password=None, a
     Returns:
         BytesIO: PDF 文件字节流
     """
+    from reportlab.lib import colors
+    from reportlab.lib.enums import TA_CENTER
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.units import inch
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    
     buffer = io.BytesIO()
     doc = SimpleDocTemplate(
         buffer, 
@@ -413,7 +447,7 @@ def generate_salary_pdf(employee_data, salary_data, year_month, password=None, a
     story.append(Paragraph('<b>计算明细：</b>', detail_style))
     story.append(Spacer(1, 10))
     
-    detail_text = salary_data['calculation_detail'].replace('\n', '<br/>')
+    detail_text = get_calculation_detail(salary_data).replace('\n', '<br/>')
     story.append(Paragraph(detail_text, detail_style))
     
     story.append(Spacer(1, 40))
@@ -447,7 +481,14 @@ def generate_salary_pdf(employee_data, salary_data, year_month, password=None, a
     buffer.seek(0)
     
     # P2-10: 添加密码保护
-    if password and HAS_PYPDF2:
+    if password:
+        try:
+            from PyPDF2 import PdfReader, PdfWriter
+        except ImportError:
+            # 提示需要安装PyPDF2
+            print("警告：未安装PyPDF2，无法设置PDF密码保护")
+            return buffer
+        
         try:
             # 读取刚生成的PDF
             pdf_reader = PdfReader(buffer)
@@ -471,9 +512,6 @@ def generate_salary_pdf(employee_data, salary_data, year_month, password=None, a
             print(f"PDF加密失败: {str(e)}")
             buffer.seek(0)
             return buffer
-    elif password and not HAS_PYPDF2:
-        # 提示需要安装PyPDF2
-        print("警告：未安装PyPDF2，无法设置PDF密码保护")
     
     return buffer
 
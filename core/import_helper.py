@@ -5,7 +5,6 @@
 支持Excel批量导入业绩数据
 """
 
-import openpyxl
 from datetime import datetime
 from core.database import get_db, query_db
 import re
@@ -94,6 +93,8 @@ class ExcelImporter:
     
     def parse_excel(self, file_path):
         """解析Excel文件"""
+        import openpyxl  # 按需导入，避免拖慢启动
+        
         try:
             workbook = openpyxl.load_workbook(file_path)
             
@@ -171,7 +172,7 @@ class ExcelImporter:
         
         for item in validated_data:
             existing = query_db(
-                'SELECT id FROM performance WHERE employee_id = ? AND date = ?',
+                'SELECT id FROM performance WHERE employee_id = ? AND work_date = ?',
                 (item['employee_id'], item['date']),
                 one=True
             )
@@ -185,62 +186,61 @@ class ExcelImporter:
                 item['is_update'] = False
     
     def import_data(self, validated_data, user_id):
-        """导入数据到数据库"""
+        """导入数据到数据库（整批一个事务，逐行同步薪资台账；失败行回滚到行保存点，不留下部分写入）"""
         from core.database import get_db
-        from core.salary_engine import calculate_daily_commission
+        from core.commission import calculate_daily_commission
+        from core.salary_ledger import save_performance
         from core.audit import log_operation
+        from core.db_maintenance import note_bulk_write
         
         db = get_db()
+        created_count = 0
+        updated_count = 0
+        
+        # 显式开启整批事务：最外层保存点的 RELEASE 会直接提交
+        if not db.in_transaction:
+            db.execute('BEGIN')
         
         for item in validated_data:
+            db.execute('SAVEPOINT import_row')
             try:
-                # 计算提成
-                employee = query_db(
-                    'SELECT status FROM employees WHERE id = ?',
-                    (item['employee_id'],),
-                    one=True
-                )
+                commission = calculate_daily_commission(item['orders'])
                 
-                commission = calculate_daily_commission(
-                    item['orders'],
-                    employee['status']
+                updated = save_performance(
+                    db, item['employee_id'], item['date'],
+                    item['orders'], commission
                 )
                 
-                if item['is_update']:
-                    # 更新现有记录
-                    db.execute(
-                        '''UPDATE performance 
-                           SET orders = ?, commission = ?, updated_at = CURRENT_TIMESTAMP
-                           WHERE employee_id = ? AND date = ?''',
-                        (item['orders'], commission, item['employee_id'], item['date'])
-                    )
-                    action = 'update'
+                if updated:
+                    updated_count += 1
                 else:
-                    # 插入新记录
-                    db.execute(
-                        '''INSERT INTO performance (employee_id, date, orders, commission)
-                           VALUES (?, ?, ?, ?)''',
-                        (item['employee_id'], item['date'], item['orders'], commission)
-                    )
-                    action = 'create'
-                
-                db.commit()
-                
-                # 记录日志
-                log_operation(
-                    user_id=user_id,
-                    action=action,
-                    target_type='performance',
-                    target_id=item['employee_id'],
-                    details=f"Excel导入: {item['date']} - {item['orders']}单"
-                )
-                
+                    created_count += 1
                 self.success_count += 1
                 
             except Exception as e:
+                db.execute('ROLLBACK TO import_row')
                 self.errors.append(f"第{item['row_number']}行导入失败: {str(e)}")
                 self.fail_count += 1
-                db.rollback()
+            db.execute('RELEASE import_row')
+        
+        note_bulk_write('performance', self.success_count)
+        note_bulk_write('salary_ledger', self.success_count)
+        db.commit()
+        
+        # 记录日志（整批一条）
+        if self.success_count:
+            log_operation(
+                operation_type='performance',
+                operation_module='performance_import',
+                operation_action='import',
+                changes_dict={
+                    'created': created_count,
+                    'updated': updated_count,
+                    'failed': self.fail_count
+                },
+                notes=f"Excel导入业绩: 新增{created_count}条, 更新{updated_count}条",
+                operator_id=user_id
+            )
     
     def import_from_file(self, file_path, user_id):
         """从Excel文件导入数据"""
@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+索引顾问
+记录实际执行过的语句形态（经由 MonitoredCursor，INDEX_ADVISOR_ENABLED=1 或 enable_shape_recording() 开启），
+对每个形态执行 EXPLAIN QUERY PLAN，统计各索引被使用的次数，并找出：
+    - 冗余索引：键列是同表另一索引的前缀（含方向相反的重复索引），写入时白白多维护一棵 B 树
+    - 未使用索引：记录的语句形态中没有任何执行计划用到
+最后生成删除这些索引的迁移 SQL。
+
+用法：
+    python3 -m core.index_advisor --table audit_logs --shapes logs/query_shapes.json
+"""
+
+import json
+import re
+import sqlite3
+import threading
+from collections import Counter
+from datetime import datetime
+from config import Config
+
+# 记录的语句形态上限（超过后只累加已有形态的次数）
+MAX_QUERY_SHAPES = 5000
+
+# 不参与分析的语句（事务控制、DDL、PRAGMA 等）
+_SKIP_PREFIXES = ('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE', 'PRAGMA',
+                  'CREATE', 'DROP', 'ALTER', 'ATTACH', 'DETACH', 'ANALYZE', 'VACUUM', 'REINDEX', 'EXPLAIN')
+
+_SPACES = re.compile(r'\s+')
+_PLAN_INDEX = re.compile(r'USING (?:COVERING )?INDEX (\w+)')
+
+_recording = Config.INDEX_ADVISOR_ENABLED
+_shapes = {}
+_shapes_lock = threading.Lock()
+
+
+def enable_shape_recording(enabled=True):
+    """开启/关闭语句形态记录（工具脚本与基准测试使用）"""
+    global _recording
+    _recording = enabled
+
+
+def record_query_shape(sql, params):
+    """
+    记录一条已执行语句的形态（MonitoredCursor 调用）
+
+    语句文本保留字面量（部分索引的 WHERE 条件要靠字面量匹配），参数只记录个数/名称，分析时以 NULL 绑定。
+    """
+    if not _recording or params is None:
+        return
+    shape = _SPACES.sub(' ', sql).strip()
+    if shape.upper().startswith(_SKIP_PREFIXES):
+        return
+
+    if isinstance(params, dict):
+        binding = sorted(params)
+    else:
+        binding = len(params)
+    with _shapes_lock:
+        item = _shapes.get(shape)
+        if item is None:
+            if len(_shapes) >= MAX_QUERY_SHAPES:
+                return
+            item = _shapes[shape] = {'sql': shape, 'params': binding, 'count': 0}
+        item['count'] += 1
+
+
+def get_query_shapes():
+    """
+    Returns:
+        list: [{'sql', 'params': 参数个数或参数名列表, 'count'}]，按执行次数降序
+    """
+    with _shapes_lock:
+        shapes = [dict(item) for item in _shapes.values()]
+    shapes.sort(key=lambda s: -s['count'])
+    return shapes
+
+
+def reset_query_shapes():
+    """清空已记录的语句形态"""
+    with _shapes_lock:
+        _shapes.clear()
+
+
+def save_query_shapes(path):
+    """已记录的语句形态写入 JSON 文件（供命令行分析使用）"""
+    shapes = get_query_shapes()
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(shapes, f, ensure_ascii=False, indent=2)
+    return len(shapes)
+
+
+def get_index_inventory(db, table=None):
+    """
+    列出索引及其键列
+
+    Args:
+        db: 数据库连接
+        table: 只列出该表的索引（可选）
+
+    Returns:
+        list: [{'name', 'table', 'columns': [(列名, 是否降序)], 'unique', 'partial', 'sql'}]
+              自动索引（UNIQUE / PRIMARY KEY 约束）不可删除，不列出
+    """
+    sql = "SELECT name, tbl_name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL"
+    args = []
+    if table:
+        sql += ' AND tbl_name = ?'
+        args.append(table)
+    rows = db.execute(sql + ' ORDER BY tbl_name, name', args).fetchall()
+
+    inventory = []
+    for name, tbl_name, index_sql in rows:
+        flags = {row[1]: row for row in db.execute(f'PRAGMA index_list("{tbl_name}")').fetchall()}
+        columns = [
+            (row[2] if row[2] is not None else '<expr>', bool(row[3]))
+            for row in db.execute(f'PRAGMA index_xinfo("{name}")').fetchall()
+            if row[5]  # 只取键列（不含 rowid）
+        ]
+        flag = flags.get(name)
+        inventory.append({
+            'name': name,
+            'table': tbl_name,
+            'columns': columns,
+            'unique': bool(flag[2]) if flag else False,
+            'partial': bool(flag[4]) if flag else False,
+            'sql': index_sql
+        })
+    return inventory
+
+
+def explain_shape(db, shape):
+    """
+    单个语句形态的执行计划
+
+    Returns:
+        list or None: 计划明细（EXPLAIN QUERY PLAN 的 detail 列）；语句无法解释时返回 None
+    """
+    params = shape['params']
+    binding = {name: None for name in params} if isinstance(params, list) else [None] * params
+    try:
+        rows = db.execute('EXPLAIN QUERY PLAN ' + shape['sql'], binding).fetchall()
+    except sqlite3.Error:
+        return None
+    return [row[3] for row in rows]
+
+
+def normalize_plan(plan):
+    """执行计划去掉具体索引名（比较合并索引前后计划是否一致）"""
+    return [_PLAN_INDEX.sub(lambda m: m.group(0).replace(m.group(1), '<index>'), step) for step in plan]
+
+
+def _covers(longer, shorter):
+    """shorter 的键列是否为 longer 的前缀（整体方向相反也算，SQLite 可反向扫描）"""
+    if len(shorter) > len(longer) or '<expr>' in (c for c, _ in shorter):
+        return False
+    names_match = all(a[0] == b[0] for a, b in zip(shorter, longer))
+    if not names_match:
+        return False
+    same = all(a[1] == b[1] for a, b in zip(shorter, longer))
+    inverted = all(a[1] != b[1] for a, b in zip(shorter, longer))
+    return same or inverted
+
+
+def find_redundant_indexes(inventory, usage=None):
+    """
+    冗余索引：非唯一、非部分索引，键列是同表另一索引的前缀
+
+    键列完全相同的一组重复索引保留一个：优先保留执行计划用到的，其次保留升序的，再按名称。
+
+    Returns:
+        list: [{'name', 'table', 'columns', 'covered_by'}]
+    """
+    usage = usage or {}
+    redundant = []
+    dropped = set()
+
+    def keep_rank(index):
+        return (-usage.get(index['name'], 0), any(desc for _, desc in index['columns']), index['name'])
+
+    # 长索引先处理（短索引的 covered_by 只指向保留下来的索引），同长度时较差的先处理
+    ordered = sorted(sorted(inventory, key=keep_rank, reverse=True), key=lambda i: -len(i['columns']))
+    for index in ordered:
+        if index['unique'] or index['partial']:
+            continue
+        for other in sorted(inventory, key=keep_rank):
+            if other is index or other['table'] != index['table'] or other['name'] in dropped:
+                continue
+            if other['partial'] or not _covers(other['columns'], index['columns']):
+                continue
+            if len(other['columns']) == len(index['columns']) and keep_rank(other) > keep_rank(index):
+                continue
+            redundant.append({
+                'name': index['name'],
+                'table': index['table'],
+                'columns': [c for c, _ in index['columns']],
+                'covered_by': other['name']
+            })
+            dropped.add(index['name'])
+            break
+    redundant.sort(key=lambda r: (r['table'], r['name']))
+    return redundant
+
+
+def advise_indexes(db, shapes=None, table=None):
+    """
+    索引分析报告
+
+    Args:
+        db: 数据库连接
+        shapes: 语句形态列表（默认取当前进程记录的形态）
+        table: 只分析该表（可选）
+
+    Returns:
+        dict: {
+            'shapes': 参与分析的形态数,
+            'unexplained': 无法解释的形态数,
+            'indexes': [{'name', 'table', 'columns', 'unique', 'uses'}],
+            'redundant': [{'name', 'table', 'columns', 'covered_by'}],
+            'unused': [{'name', 'table', 'columns'}],
+            'plans': [{'sql', 'count', 'plan'}]（涉及所分析索引的形态）
+        }
+    """
+    if shapes is None:
+        shapes = get_query_shapes()
+    inventory = get_index_inventory(db, table)
+    names = {index['name'] for index in inventory}
+
+    usage = Counter()
+    plans = []
+    unexplained = 0
+    for shape in shapes:
+        plan = explain_shape(db, shape)
+        if plan is None:
+            unexplained += 1
+            continue
+        used = {m.group(1) for step in plan for m in _PLAN_INDEX.finditer(step)} & names
+        for name in used:
+            usage[name] += shape['count']
+        if used or (table and re.search(rf'\b{re.escape(table)}\b', shape['sql'])):
+            plans.append({'sql': shape['sql'], 'count': shape['count'], 'plan': plan})
+
+    redundant = find_redundant_indexes(inventory, usage)
+    redundant_names = {r['name'] for r in redundant}
+    unused = [
+        {'name': index['name'], 'table': index['table'], 'columns': [c for c, _ in index['columns']]}
+        for index in inventory
+        if not usage[index['name']] and not index['unique'] and index['name'] not in redundant_names
+    ]
+
+    return {
+        'shapes': len(shapes),
+        'unexplained': unexplained,
+        'indexes': [
+            {
+                'name': index['name'],
+                'table': index['table'],
+                'columns': [c for c, _ in index['columns']],
+                'unique': index['unique'],
+                'uses': usage[index['name']]
+            }
+            for index in inventory
+        ],
+        'redundant': redundant,
+        'unused': unused,
+        'plans': plans
+    }
+
+
+def build_index_migration(report, drop_unused=True):
+    """
+    根据分析报告生成迁移 SQL（DROP INDEX IF EXISTS，可重复执行）
+
+    Args:
+        report: advise_indexes 的返回值
+        drop_unused: 是否同时删除未使用的索引（记录的形态覆盖不全时应人工确认）
+
+    Returns:
+        str: 迁移 SQL；没有可删除的索引时返回空字符串
+    """
+    lines = []
+    for item in report['redundant']:
+        lines.append(f"-- {item['table']}({', '.join(item['columns'])}) 被 {item['covered_by']} 的前缀覆盖")
+        lines.append(f"DROP INDEX IF EXISTS {item['name']};")
+    if drop_unused:
+        for item in report['unused']:
+            lines.append(f"-- {item['table']}({', '.join(item['columns'])}) 在 {report['shapes']} 个语句形态中未被使用")
+            lines.append(f"DROP INDEX IF EXISTS {item['name']};")
+    if not lines:
+        return ''
+    header = f"-- 索引合并迁移（索引顾问生成于 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}）"
+    return '\n'.join([header] + lines) + '\n'
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='索引顾问：找出冗余/未使用的索引并生成迁移 SQL')
+    parser.add_argument('--db', default=Config.DATABASE, help='数据库路径')
+    parser.add_argument('--table', help='只分析该表')
+    parser.add_argument('--shapes', required=True, help='语句形态 JSON（save_query_shapes 输出）')
+    parser.add_argument('--keep-unused', action='store_true', help='迁移中不删除未使用的索引')
+    parser.add_argument('--output', help='迁移 SQL 输出文件（默认打印）')
+    args = parser.parse_args()
+
+    with open(args.shapes, 'r', encoding='utf-8') as f:
+        shapes = json.load(f)
+    db = sqlite3.connect(args.db)
+    try:
+        report = advise_indexes(db, shapes, args.table)
+    finally:
+        db.close()
+
+    print(f"语句形态 {report['shapes']} 个（无法解释 {report['unexplained']} 个）")
+    for index in report['indexes']:
+        print(f"  {index['name']:<40} {index['table']}({', '.join(index['columns'])})  使用 {index['uses']} 次")
+    print(f"冗余索引 {len(report['redundant'])} 个，未使用索引 {len(report['unused'])} 个")
+
+    migration = build_index_migration(report, drop_unused=not args.keep_unused)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(migration)
+        print(f'迁移已写入 {args.output}')
+    else:
+        print(migration or '-- 无需迁移')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,512 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+后台任务模块
+耗时的管理操作（工资单生成、年度归档、业绩重算、批量检查等）提交为后台任务，
+在进程内线程池中执行，任务状态、进度与结果持久化到 jobs 表。
+
+任务行记录执行进程（owner：主机名:pid），进程内的心跳线程定期刷新 heartbeat_at；
+服务启动时只把执行进程已退出或心跳超时的排队中/执行中任务标记为失败
+（平滑重载与多实例共用数据库时，其他进程仍在执行的任务不受影响）
+"""
+
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from flask import current_app, g, session, has_request_context
+from core.database import query_db, get_db
+from core.sql_monitor import begin_collection, finish_collection
+from core.cache import cache_get, cache_set, cache_delete
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# 已注册的任务类型：{job_type: {'func', 'label', 'roles'}}
+# 允许经理提交的任务按参数 team 限定在经理所在团队（提交路由强制写入）
+JOB_REGISTRY = {}
+
+JOB_STATUS_LABELS = {
+    'queued': '排队中',
+    'running': '执行中',
+    'succeeded': '已完成',
+    'failed': '失败'
+}
+
+# 运行中任务的实时进度（结束时写回 jobs 表）
+_progress = {}
+_progress_lock = threading.Lock()
+
+# 多 worker 部署时进度同步写入缓存，供其他 worker 的查询读取（按间隔节流）
+PROGRESS_SHARE_INTERVAL = 1.0
+PROGRESS_SHARE_TTL = 3600
+
+# 任务列表单次最多返回条数
+JOB_LIST_MAX_LIMIT = 200
+
+# 执行进程心跳间隔与超时（秒）：超时未刷新的排队中/执行中任务视为执行进程已退出
+JOB_HEARTBEAT_INTERVAL = 30
+JOB_HEARTBEAT_TIMEOUT = 120
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# 本进程提交、尚未结束的任务（心跳线程刷新这些任务的 heartbeat_at）
+_active_jobs = set()
+_heartbeat = None
+
+
+def register_job(job_type, label, roles=('admin',)):
+    """
+    注册任务类型（装饰器）
+
+    被注册的函数签名为 func(params, progress)，
+    progress(done, total, message=None) 用于上报进度，返回值须可JSON序列化。
+
+    Args:
+        job_type: 任务类型标识
+        label: 任务名称（显示用）
+        roles: 允许提交的角色
+    """
+    def decorator(func):
+        JOB_REGISTRY[job_type] = {'func': func, 'label': label, 'roles': tuple(roles)}
+        return func
+    return decorator
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=Config.JOB_MAX_WORKERS,
+                    thread_name_prefix='job'
+                )
+    return _executor
+
+
+def discard_executor():
+    """
+    丢弃任务线程池（不等待）
+
+    预加载应用的 fork 模式下，子进程启动时调用：父进程的线程不会被复制到子进程
+    """
+    global _executor, _heartbeat
+    with _executor_lock:
+        _executor = None
+        _heartbeat = None
+        _active_jobs.clear()
+
+
+def _process_owner():
+    """本进程标识（主机名:pid）"""
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def _heartbeat_loop(app):
+    """刷新本进程未结束任务的心跳；没有未结束的任务时退出"""
+    global _heartbeat
+    while True:
+        time.sleep(JOB_HEARTBEAT_INTERVAL)
+        with _executor_lock:
+            if _heartbeat is not threading.current_thread():
+                return  # 已被 discard_executor 丢弃
+            job_ids = list(_active_jobs)
+            if not job_ids:
+                _heartbeat = None
+                return
+        try:
+            with app.app_context():
+                db = get_db()
+                db.execute(f'''
+                    UPDATE jobs SET heartbeat_at = ?
+                    WHERE id IN ({','.join('?' * len(job_ids))}) AND status IN ('queued', 'running')
+                ''', [time.time()] + job_ids)
+                db.commit()
+        except Exception:
+            logger.exception('后台任务心跳写入失败')
+
+
+def _track_job(app, job_id):
+    """登记本进程的任务并确保心跳线程在运行"""
+    global _heartbeat
+    with _executor_lock:
+        _active_jobs.add(job_id)
+        if _heartbeat is None:
+            _heartbeat = threading.Thread(target=_heartbeat_loop, args=(app,), name='job-heartbeat', daemon=True)
+            _heartbeat.start()
+
+
+def _progress_cache_key(job_id):
+    return f'job_progress:{job_id}'
+
+
+def enqueue_job(job_type, params=None, idempotency_key=None):
+    """
+    提交后台任务
+
+    相同 idempotency_key 的任务只会创建一次，重复提交返回已有任务；
+    已失败（含执行进程已退出）的任务释放幂等键，同一键可重新提交。
+
+    Args:
+        job_type: 任务类型（须已注册）
+        params: 任务参数（dict）
+        idempotency_key: 幂等键（可选）
+
+    Returns:
+        dict: {'success': bool, 'job_id': int, 'duplicate': bool, 'message': str}
+    """
+    if job_type not in JOB_REGISTRY:
+        return {'success': False, 'message': f'未知的任务类型：{job_type}'}
+
+    db = get_db()
+    if idempotency_key:
+        existing = _find_job_by_key(idempotency_key)
+        if existing and existing['status'] in ('queued', 'running') and _is_orphaned(existing):
+            recover_stale_jobs([existing['id']])
+            existing = _find_job_by_key(idempotency_key)
+        if existing and existing['status'] != 'failed':
+            return _duplicate_job(existing)
+        if existing:
+            db.execute('UPDATE jobs SET idempotency_key = NULL WHERE id = ?', [existing['id']])
+
+    operator = _current_operator()
+
+    cursor = db.cursor()
+    try:
+        cursor.execute('''
+            INSERT INTO jobs (
+                job_type, params_json, status, idempotency_key, owner, heartbeat_at,
+                created_by, created_by_name, created_by_role
+            ) VALUES (?, ?, 'queued', ?, ?, ?, ?, ?, ?)
+        ''', (job_type, json.dumps(params or {}, ensure_ascii=False), idempotency_key,
+              _process_owner(), time.time(),
+              operator['user_id'], operator['username'], operator['role']))
+    except sqlite3.IntegrityError:
+        # 并发提交相同幂等键：另一请求已先插入
+        db.rollback()
+        return _duplicate_job(_find_job_by_key(idempotency_key))
+    db.commit()
+    job_id = cursor.lastrowid
+
+    app = current_app._get_current_object()
+    _track_job(app, job_id)
+    _get_executor().submit(_run_job, app, job_id)
+
+    return {
+        'success': True,
+        'job_id': job_id,
+        'duplicate': False,
+        'message': f'{JOB_REGISTRY[job_type]["label"]}已提交后台执行（任务#{job_id}）'
+    }
+
+
+def _find_job_by_key(idempotency_key):
+    return query_db(
+        'SELECT id, status, owner, heartbeat_at, created_at FROM jobs WHERE idempotency_key = ?',
+        [idempotency_key],
+        one=True
+    )
+
+
+def _duplicate_job(existing):
+    return {
+        'success': True,
+        'job_id': existing['id'],
+        'duplicate': True,
+        'message': f'任务已存在（#{existing["id"]}，{JOB_STATUS_LABELS[existing["status"]]}）'
+    }
+
+
+def _is_orphaned(job, now=None):
+    """
+    排队中/执行中的任务是否已失去执行进程
+
+    本进程的任务看是否仍在本进程登记；其他进程的任务看心跳是否超时，
+    同一主机上的进程另外检查 pid 是否存在（进程退出后不必等心跳超时）
+    """
+    now = now or time.time()
+    if job['owner'] == _process_owner():
+        with _executor_lock:
+            return job['id'] not in _active_jobs
+
+    heartbeat = job['heartbeat_at']
+    if heartbeat is None:
+        # 记录执行进程之前提交的任务：按创建时间判断
+        created_at = job['created_at']
+        if isinstance(created_at, str):
+            created_at = datetime.strptime(created_at[:19], '%Y-%m-%d %H:%M:%S')
+        heartbeat = created_at.replace(tzinfo=timezone.utc).timestamp()
+    if now - heartbeat > JOB_HEARTBEAT_TIMEOUT:
+        return True
+
+    host, _, pid = (job['owner'] or '').rpartition(':')
+    if host == socket.gethostname():
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return True
+        except (ValueError, OSError):
+            pass
+    return False
+
+
+def recover_stale_jobs(job_ids=None):
+    """
+    将执行进程已退出的排队中/执行中任务标记为失败（服务启动时调用）
+
+    任务在进程内线程池中执行，进程退出后这些任务不会再被执行；
+    标记为失败后释放幂等键，可重新提交。执行进程仍在运行（心跳未超时）的任务不受影响
+
+    Args:
+        job_ids: 只检查这些任务（默认全部排队中/执行中任务）
+
+    Returns:
+        int: 恢复的任务数
+    """
+    sql = "SELECT id, owner, heartbeat_at, created_at FROM jobs WHERE status IN ('queued', 'running')"
+    params = []
+    if job_ids:
+        sql += f" AND id IN ({','.join('?' * len(job_ids))})"
+        params.extend(job_ids)
+    now = time.time()
+    stale = [job['id'] for job in query_db(sql, params) if _is_orphaned(job, now)]
+    if not stale:
+        return 0
+
+    db = get_db()
+    cursor = db.execute(f'''
+        UPDATE jobs
+        SET status = 'failed', error = '执行进程已退出，任务已中断（可重新提交）',
+            finished_at = CURRENT_TIMESTAMP
+        WHERE id IN ({','.join('?' * len(stale))}) AND status IN ('queued', 'running')
+    ''', stale)
+    db.commit()
+    return cursor.rowcount
+
+
+def _current_operator():
+    """提交任务的操作人（任务执行时用于审计日志）"""
+    if has_request_context():
+        return {
+            'user_id': session.get('user_id'),
+            'username': session.get('username'),
+            'role': session.get('role')
+        }
+    return g.get('job_operator') or {'user_id': None, 'username': None, 'role': None}
+
+
+def _run_job(app, job_id):
+    """在工作线程中执行任务"""
+    with app.app_context():
+        db = get_db()
+        job = query_db('SELECT * FROM jobs WHERE id = ?', [job_id], one=True)
+        entry = JOB_REGISTRY[job['job_type']]
+        begin_collection(f"job:{job['job_type']}")
+
+        # 任务内的审计日志记到提交人名下
+        g.job_id = job_id
+        g.job_operator = {
+            'user_id': job['created_by'],
+            'username': job['created_by_name'],
+            'role': job['created_by_role']
+        }
+
+        db.execute('''
+            UPDATE jobs SET status = 'running', started_at = CURRENT_TIMESTAMP, heartbeat_at = ?
+            WHERE id = ?
+        ''', [time.time(), job_id])
+        db.commit()
+
+        shared_at = [0.0]
+
+        def progress(done, total, message=None):
+            live = {
+                'done': done,
+                'total': total,
+                'percent': round(done * 100.0 / total, 1) if total else 100.0,
+                'message': message
+            }
+            with _progress_lock:
+                _progress[job_id] = live
+            now = time.time()
+            if now - shared_at[0] >= PROGRESS_SHARE_INTERVAL:
+                shared_at[0] = now
+                cache_set(_progress_cache_key(job_id), live, ttl=PROGRESS_SHARE_TTL)
+
+        started = time.time()
+        try:
+            result = entry['func'](json.loads(job['params_json'] or '{}'), progress)
+            db.rollback()  # 丢弃任务函数未提交的残留
+            db.execute('''
+                UPDATE jobs
+                SET status = 'succeeded', progress = 100, result_json = ?,
+                    duration_ms = ?, finished_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (json.dumps(result, ensure_ascii=False, default=str),
+                  int((time.time() - started) * 1000), job_id))
+        except Exception as e:
+            db.rollback()
+            db.execute('''
+                UPDATE jobs
+                SET status = 'failed', error = ?, duration_ms = ?,
+                    finished_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (f'{e}\n{traceback.format_exc()}'[:4000],
+                  int((time.time() - started) * 1000), job_id))
+        finally:
+            db.commit()
+            finish_collection()
+            with _progress_lock:
+                _progress.pop(job_id, None)
+            with _executor_lock:
+                _active_jobs.discard(job_id)
+            cache_delete(_progress_cache_key(job_id))
+
+
+def get_job(job_id):
+    """
+    查询任务状态
+
+    Returns:
+        dict or None: 任务信息（含实时进度与结果）
+    """
+    job = query_db('SELECT * FROM jobs WHERE id = ?', [job_id], one=True)
+    if not job:
+        return None
+
+    data = format_job(job)
+
+    if data['status'] == 'running':
+        with _progress_lock:
+            live = _progress.get(job_id)
+        if live is None:
+            # 任务在其他 worker 进程中执行
+            live = cache_get(_progress_cache_key(job_id))
+    else:
+        live = None
+    if live:
+        data['progress'] = live['percent']
+        data['progress_detail'] = live
+
+    return data
+
+
+def format_job(job):
+    """将 jobs 行转换为可JSON序列化的字典"""
+    data = dict(job)
+    data['label'] = JOB_REGISTRY.get(job['job_type'], {}).get('label', job['job_type'])
+    data['status_label'] = JOB_STATUS_LABELS.get(job['status'], job['status'])
+    data['params'] = json.loads(data.pop('params_json') or '{}')
+    result_json = data.pop('result_json')
+    data['result'] = json.loads(result_json) if result_json else None
+    for key in ('created_at', 'started_at', 'finished_at'):
+        if data.get(key) is not None:
+            data[key] = str(data[key])
+    return data
+
+
+def list_jobs(limit=50, job_type=None, created_by=None):
+    """查询最近的任务列表（最多 JOB_LIST_MAX_LIMIT 条）"""
+    limit = max(1, min(int(limit), JOB_LIST_MAX_LIMIT))
+    sql = 'SELECT * FROM jobs WHERE 1=1'
+    params = []
+    if job_type:
+        sql += ' AND job_type = ?'
+        params.append(job_type)
+    if created_by:
+        sql += ' AND created_by = ?'
+        params.append(created_by)
+    sql += ' ORDER BY id DESC LIMIT ?'
+    params.append(limit)
+
+    return [format_job(job) for job in query_db(sql, params)]
+
+
+# ==================== 内置任务 ====================
+
+@register_job('generate_payroll', '生成工资单')
+def _job_generate_payroll(params, progress):
+    from core.payroll_engine import generate_payroll_for_month
+    operator = g.job_operator
+    return generate_payroll_for_month(
+        params['year_month'],
+        bool(params.get('overwrite')),
+        operator['user_id'],
+        operator['username'],
+        progress=progress
+    )
+
+
+@register_job('archive_payroll', '年度工资归档')
+def _job_archive_payroll(params, progress):
+    from core.payroll_engine import archive_payroll_year
+    operator = g.job_operator
+    return archive_payroll_year(
+        int(params['archive_year']),
+        operator['user_id'],
+        operator['username'],
+        progress=progress
+    )
+
+
+@register_job('recalculate_performance', '按工作日配置重算业绩')
+def _job_recalculate_performance(params, progress):
+    from core.performance_recalculator import recalculate_month_performance
+    return recalculate_month_performance(params['year_month'], progress=progress)
+
+
+@register_job('status_check', '员工状态流转检查', roles=('admin', 'manager'))
+def _job_status_check(params, progress):
+    from core.status_engine import batch_check_all_employees
+    changes = batch_check_all_employees(progress=progress, team=params.get('team'))
+    return {'success': True, 'change_count': len(changes), 'changes': changes}
+
+
+@register_job('promotion_check', '晋级资格批量检查')
+def _job_promotion_check(params, progress):
+    from core.promotion_engine import check_all_employees_for_promotion
+    result = check_all_employees_for_promotion(progress=progress)
+    result['success'] = True
+    return result
+
+
+@register_job('challenge_check', '保级挑战批量检查', roles=('admin', 'manager'))
+def _job_challenge_check(params, progress):
+    from core.challenge_engine import batch_check_challenges
+    result = batch_check_challenges(progress=progress, team=params.get('team'))
+    result['success'] = True
+    return result
+
+
+@register_job('rule_replay', '规则历史回放')
+def _job_rule_replay(params, progress):
+    from core.replay import replay_rules
+    return replay_rules(
+        params['start_date'],
+        params['end_date'],
+        employee_ids=params.get('employee_ids'),
+        rules=params.get('rules'),
+        max_events=int(params.get('max_events', 1000)),
+        progress=progress
+    )
+
+
+@register_job('recompute_commission', '重算业绩提成')
+def _job_recompute_commission(params, progress):
+    from core.commission_recompute import recompute_commission
+    return recompute_commission(
+        start_date=params.get('start_date'),
+        end_date=params.get('end_date'),
+        employee_ids=params.get('employee_ids'),
+        tiers=params.get('tiers'),
+        dry_run=bool(params.get('dry_run')),
+        progress=progress
+    )
@@ -0,0 +1,560 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+在线数据库迁移
+迁移按版本号登记在 schema_migrations 表中，每个迁移由若干步骤组成：
+    - script / sql：执行建表脚本或短小的 DDL（一个短事务）
+    - add_column：字段不存在时 ALTER TABLE ADD COLUMN（可重复执行）
+    - backfill：按 rowid 分批 UPDATE
+    - rebuild：重建表（修改 CHECK 约束等 ALTER TABLE 做不到的变更）：
+          建新表 → 触发器把线上写入同步到新表 → 按 rowid 分批复制 → 短事务内删旧表、改名、重建索引与触发器
+
+分批步骤每批一个 BEGIN IMMEDIATE 短事务，处理进度（rowid 游标）与数据在同一事务提交，
+批与批之间暂停让出写锁给线上请求；中途中断后重新执行从游标处继续。
+备份使用 SQLite 在线备份 API（按页分步复制，不阻塞写入，也不会复制到写了一半的文件）。
+
+用法：
+    python3 migrate_database.py            # 备份后执行全部待执行迁移
+    python3 migrate_database.py --status   # 查看迁移状态
+"""
+
+import os
+import sqlite3
+import time
+from datetime import datetime
+from config import Config
+
+# 分批步骤每批处理的行数
+MIGRATION_CHUNK_SIZE = 500
+
+# 批与批之间的暂停（秒），让出写锁
+MIGRATION_PAUSE_SECONDS = 0.05
+
+# 等待线上事务释放写锁的超时（秒）
+MIGRATION_BUSY_TIMEOUT = 30
+
+# 在线备份每步复制的页数与步间暂停（秒）
+BACKUP_PAGES_PER_STEP = 1024
+BACKUP_SLEEP_SECONDS = 0.01
+
+# 重建表时同步写入的触发器名前缀与新表后缀
+_MIRROR_PREFIX = '_migrate_mirror_'
+_REBUILD_SUFFIX = '_migrate_new'
+
+_MIGRATIONS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'running' CHECK(status IN ('running', 'applied')),
+        step_index INTEGER NOT NULL DEFAULT 0,
+        step_cursor INTEGER,
+        rows_done INTEGER NOT NULL DEFAULT 0,
+        error TEXT,
+        started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        applied_at TIMESTAMP
+    )
+'''
+
+
+# ==================== 步骤定义 ====================
+
+def script_step(path):
+    """执行 SQL 脚本文件（脚本须可重复执行：IF NOT EXISTS）"""
+    return {'type': 'script', 'path': path, 'label': f'执行 {path}'}
+
+
+def sql_step(sql, label=None):
+    """执行一条短小的 SQL（DDL、小表更新）"""
+    return {'type': 'sql', 'sql': sql, 'label': label or sql.strip().splitlines()[0][:60]}
+
+
+def add_column_step(table, column, definition):
+    """字段不存在时添加（表不存在时跳过）"""
+    return {'type': 'add_column', 'table': table, 'column': column, 'definition': definition,
+            'label': f'{table}.{column}'}
+
+
+def backfill_step(table, set_clause, where=None, params=(), label=None):
+    """
+    按 rowid 分批 UPDATE
+
+    Args:
+        table: 表名
+        set_clause: SET 子句（不含 SET）
+        where: 附加筛选条件（可选）
+        params: set_clause / where 中的参数（按出现顺序）
+        label: 进度显示名
+    """
+    return {'type': 'backfill', 'table': table, 'set': set_clause, 'where': where,
+            'params': tuple(params), 'label': label or f'回填 {table}'}
+
+
+def rebuild_step(table, create_sql, when=None, label=None):
+    """
+    在线重建表
+
+    Args:
+        table: 表名（须有 INTEGER PRIMARY KEY id）
+        create_sql: 新表建表语句，表名写作 {table}
+        when: 判断是否需要重建的函数 when(conn) -> bool（可选，默认总是重建）
+        label: 进度显示名
+    """
+    return {'type': 'rebuild', 'table': table, 'create_sql': create_sql, 'when': when,
+            'label': label or f'重建 {table}'}
+
+
+def _table_sql(conn, table):
+    row = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()
+    return row[0] if row else ''
+
+
+def _lacks(table, text):
+    """when 条件：表的建表语句中不包含 text（表不存在时不重建）"""
+    def check(conn):
+        sql = _table_sql(conn, table)
+        return bool(sql) and text not in sql
+    return check
+
+
+# ==================== 迁移列表 ====================
+
+NOTIFICATION_TYPES = (
+    'system', 'status_change', 'salary', 'performance', 'dispute', 'announcement',
+    'promotion_pending', 'promotion_approved', 'promotion_rejected',
+    'challenge_triggered', 'challenge_success', 'challenge_failed',
+    'calendar_changed', 'payroll_ready', 'payroll_paid'
+)
+
+EMPLOYEE_EXTENSION_COLUMNS = (
+    ('challenge_count_this_month', 'INTEGER DEFAULT 0'),
+    ('current_challenge_id', 'INTEGER'),
+    ('last_challenge_date', 'DATE'),
+    ('status_display', 'TEXT'),
+    ('bank_account_number', 'TEXT'),
+    ('bank_name', 'TEXT'),
+    ('bank_branch', 'TEXT'),
+    ('account_holder_name', 'TEXT'),
+    ('bank_info_status', "TEXT DEFAULT 'pending' CHECK(bank_info_status IN ('pending', 'verified', 'rejected'))"),
+    ('bank_info_notes', 'TEXT'),
+    ('bank_verified_by', 'INTEGER'),
+    ('bank_verified_at', 'TIMESTAMP')
+)
+
+MIGRATIONS = [
+    {
+        'version': '0001',
+        'name': '基线表结构（schema.sql：含工资台账、后台任务、代发批次、冷归档、工资单状态计数器及其触发器）',
+        'steps': [script_step('schema.sql')]
+    },
+    {
+        'version': '0002',
+        'name': '员工表扩展字段（保级挑战、银行信息）',
+        'steps': [add_column_step('employees', column, definition)
+                  for column, definition in EMPLOYEE_EXTENSION_COLUMNS]
+    },
+    {
+        'version': '0003',
+        'name': '用户角色增加 finance',
+        'steps': [rebuild_step('users', '''
+            CREATE TABLE {table} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT NOT NULL UNIQUE,
+                password TEXT NOT NULL,
+                role TEXT NOT NULL CHECK(role IN ('employee', 'manager', 'admin', 'finance')),
+                employee_id INTEGER,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (employee_id) REFERENCES employees(id)
+            )
+        ''', when=_lacks('users', "'finance'"))]
+    },
+    {
+        'version': '0004',
+        'name': '通知类型增加晋级/保级/日历/工资通知',
+        'steps': [rebuild_step('notifications', '''
+            CREATE TABLE {table} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                title TEXT NOT NULL,
+                content TEXT NOT NULL,
+                type TEXT DEFAULT 'system' CHECK(type IN (%s)),
+                link TEXT,
+                is_read INTEGER DEFAULT 0 CHECK(is_read IN (0, 1)),
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users(id)
+            )
+        ''' % ', '.join(f"'{t}'" for t in NOTIFICATION_TYPES), when=_lacks('notifications', "'payroll_paid'"))]
+    },
+    {
+        'version': '0005',
+        'name': '工资单 status_at_time 回填员工状态（修正前误存为薪资快照状态）',
+        'steps': [backfill_step(
+            'payroll_records',
+            'status_at_time = (SELECT e.status FROM employees e WHERE e.id = payroll_records.employee_id)',
+            where="IFNULL(status_at_time, '') NOT IN ('trainee', 'C', 'B', 'A', 'eliminated')",
+            label='回填 payroll_records.status_at_time'
+        )]
+    },
+    {
+        'version': '0006',
+        'name': '数据库维护任务状态与大批量写入登记',
+        'steps': [
+            sql_step('''
+                CREATE TABLE IF NOT EXISTS db_maintenance_tasks (
+                    task TEXT PRIMARY KEY,
+                    last_run_ts REAL,
+                    last_status TEXT,
+                    last_duration_ms INTEGER,
+                    last_detail TEXT,
+                    lease_until REAL
+                )
+            ''', label='创建 db_maintenance_tasks'),
+            sql_step('''
+                CREATE TABLE IF NOT EXISTS db_maintenance_writes (
+                    table_name TEXT PRIMARY KEY,
+                    pending_rows INTEGER NOT NULL DEFAULT 0,
+                    last_write_at TIMESTAMP
+                )
+            ''', label='创建 db_maintenance_writes')
+        ]
+    },
+    {
+        'version': '0007',
+        'name': '后台任务记录执行进程与心跳（重启时只恢复执行进程已退出的任务）',
+        'steps': [add_column_step('jobs', 'owner', 'TEXT'),
+                  add_column_step('jobs', 'heartbeat_at', 'REAL')]
+    }
+]
+
+
+# ==================== 执行 ====================
+
+def connect(db_path=None):
+    """
+    迁移专用连接：自动提交模式（事务由迁移显式控制），等待线上事务释放写锁
+    """
+    conn = sqlite3.connect(db_path or Config.DATABASE, timeout=MIGRATION_BUSY_TIMEOUT, isolation_level=None)
+    conn.execute(f'PRAGMA busy_timeout = {MIGRATION_BUSY_TIMEOUT * 1000}')
+    conn.execute(_MIGRATIONS_TABLE)
+    return conn
+
+
+def backup_database(dest_path, db_path=None, progress=None):
+    """
+    在线备份（sqlite3 backup API，按页分步复制，期间应用可继续写入）
+
+    Args:
+        dest_path: 备份文件路径
+        db_path: 源数据库（默认 Config.DATABASE）
+        progress: 进度回调 progress(已复制页数, 总页数)
+
+    Returns:
+        str: 备份文件路径
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(dest_path)), exist_ok=True)
+    source = sqlite3.connect(db_path or Config.DATABASE, timeout=MIGRATION_BUSY_TIMEOUT)
+    target = sqlite3.connect(dest_path)
+    try:
+        def on_step(status, remaining, total):
+            if progress:
+                progress(total - remaining, total)
+
+        source.backup(target, pages=BACKUP_PAGES_PER_STEP, progress=on_step, sleep=BACKUP_SLEEP_SECONDS)
+    finally:
+        target.close()
+        source.close()
+    return dest_path
+
+
+def default_backup_path(db_path=None):
+    """备份文件默认路径：<数据库>.<时间戳>.backup"""
+    return f"{db_path or Config.DATABASE}.{datetime.now().strftime('%Y%m%d%H%M%S')}.backup"
+
+
+def get_migration_status(conn):
+    """
+    Returns:
+        list: [{'version', 'name', 'status': 'pending' | 'running' | 'applied',
+                'steps', 'step_index', 'rows_done', 'error', 'applied_at'}]
+    """
+    recorded = {
+        row[0]: row for row in conn.execute(
+            'SELECT version, status, step_index, rows_done, error, applied_at FROM schema_migrations'
+        ).fetchall()
+    }
+    status = []
+    for migration in MIGRATIONS:
+        row = recorded.get(migration['version'])
+        status.append({
+            'version': migration['version'],
+            'name': migration['name'],
+            'status': row[1] if row else 'pending',
+            'steps': len(migration['steps']),
+            'step_index': row[2] if row else 0,
+            'rows_done': row[3] if row else 0,
+            'error': row[4] if row else None,
+            'applied_at': row[5] if row else None
+        })
+    return status
+
+
+def _columns(conn, table):
+    return [row[1] for row in conn.execute(f'PRAGMA table_info("{table}")').fetchall()]
+
+
+def _save_position(conn, version, step_index, cursor, rows=0):
+    conn.execute('''
+        UPDATE schema_migrations
+        SET step_index = ?, step_cursor = ?, rows_done = rows_done + ?, error = NULL
+        WHERE version = ?
+    ''', (step_index, cursor, rows, version))
+
+
+def _next_chunk(conn, table, cursor, chunk_size):
+    """
+    游标之后的一批行
+
+    Returns:
+        tuple: (该批最后一行的 rowid, 行数)；没有更多行时 rowid 为 None
+    """
+    return conn.execute(f'''
+        SELECT MAX(rowid), COUNT(*) FROM (
+            SELECT rowid FROM "{table}" WHERE rowid > ? ORDER BY rowid LIMIT ?
+        )
+    ''', (cursor, chunk_size)).fetchone()
+
+
+def _run_chunks(conn, version, step_index, table, cursor, chunk_size, pause, apply_chunk, report):
+    """
+    按 rowid 分批执行 apply_chunk(lower, upper) -> 写入行数，每批一个短事务，游标与数据一起提交
+
+    进度按扫描行数报告；执行期间新插入的行也会被处理（总数随之增加）
+    """
+    total = conn.execute(f'SELECT COUNT(*) FROM "{table}" WHERE rowid > ?', (cursor,)).fetchone()[0]
+    scanned = 0
+    while True:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            upper, count = _next_chunk(conn, table, cursor, chunk_size)
+            if upper is None:
+                conn.execute('ROLLBACK')
+                return
+            rows = apply_chunk(cursor, upper)
+            _save_position(conn, version, step_index, upper, rows)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        cursor = upper
+        scanned += count
+        total = max(total, scanned)
+        report(scanned, total)
+        if pause:
+            time.sleep(pause)
+
+
+def _run_backfill(conn, version, step_index, step, cursor, chunk_size, pause, report):
+    where = f"({step['where']}) AND " if step['where'] else ''
+    sql = f'''UPDATE "{step['table']}" SET {step['set']} WHERE {where}rowid > ? AND rowid <= ?'''
+
+    def apply_chunk(lower, upper):
+        return conn.execute(sql, step['params'] + (lower, upper)).rowcount
+
+    _run_chunks(conn, version, step_index, step['table'], cursor, chunk_size, pause, apply_chunk, report)
+
+
+def _start_rebuild(conn, version, step_index, table, create_sql):
+    """建新表并安装同步触发器（与游标初始化同一事务）"""
+    new_table = table + _REBUILD_SUFFIX
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        conn.execute(f'DROP TABLE IF EXISTS "{new_table}"')
+        conn.execute(create_sql.format(table=f'"{new_table}"'))
+        old_columns = _columns(conn, table)
+        columns = [c for c in _columns(conn, new_table) if c in old_columns]
+        if 'id' not in columns:
+            raise ValueError(f'{table} 缺少 id 列，无法在线重建')
+        column_list = ', '.join(f'"{c}"' for c in columns)
+        new_values = ', '.join(f'NEW."{c}"' for c in columns)
+        conn.execute(f'''
+            CREATE TRIGGER "{_MIRROR_PREFIX}{table}_insert" AFTER INSERT ON "{table}" BEGIN
+                INSERT OR REPLACE INTO "{new_table}" ({column_list}) VALUES ({new_values});
+            END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER "{_MIRROR_PREFIX}{table}_update" AFTER UPDATE ON "{table}" BEGIN
+                DELETE FROM "{new_table}" WHERE id = OLD.id;
+                INSERT OR REPLACE INTO "{new_table}" ({column_list}) VALUES ({new_values});
+            END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER "{_MIRROR_PREFIX}{table}_delete" AFTER DELETE ON "{table}" BEGIN
+                DELETE FROM "{new_table}" WHERE id = OLD.id;
+            END
+        ''')
+        _save_position(conn, version, step_index, 0)
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+
+
+def _finish_rebuild(conn, version, step_index, table):
+    """短事务内删除旧表、新表改名，重建旧表上的索引与触发器，保留自增序号"""
+    new_table = table + _REBUILD_SUFFIX
+    conn.execute('PRAGMA legacy_alter_table = ON')
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        dependents = [row[0] for row in conn.execute('''
+            SELECT sql FROM sqlite_master
+            WHERE tbl_name = ? AND type IN ('index', 'trigger') AND sql IS NOT NULL AND name NOT LIKE ?
+            ORDER BY type, name
+        ''', (table, _MIRROR_PREFIX + '%')).fetchall()]
+        sequence = conn.execute('SELECT seq FROM sqlite_sequence WHERE name = ?', (table,)).fetchone() \
+            if _table_sql(conn, 'sqlite_sequence') else None
+
+        conn.execute(f'DROP TABLE "{table}"')
+        conn.execute(f'ALTER TABLE "{new_table}" RENAME TO "{table}"')
+        for sql in dependents:
+            conn.execute(sql)
+        if sequence:
+            conn.execute('UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?', (sequence[0], table))
+
+        _save_position(conn, version, step_index + 1, None)
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    finally:
+        conn.execute('PRAGMA legacy_alter_table = OFF')
+
+
+def _run_rebuild(conn, version, step_index, step, cursor, chunk_size, pause, report):
+    table = step['table']
+    new_table = table + _REBUILD_SUFFIX
+    if cursor is None:
+        if step['when'] and not step['when'](conn):
+            report(0, 0)
+            _save_position(conn, version, step_index + 1, None)
+            return
+        _start_rebuild(conn, version, step_index, table, step['create_sql'])
+        cursor = 0
+
+    columns = [c for c in _columns(conn, new_table) if c in _columns(conn, table)]
+    column_list = ', '.join(f'"{c}"' for c in columns)
+    # 已由触发器同步的行（复制前被修改过）以新表为准
+    copy_sql = f'''
+        INSERT OR IGNORE INTO "{new_table}" ({column_list})
+        SELECT {column_list} FROM "{table}" WHERE rowid > ? AND rowid <= ?
+    '''
+
+    def apply_chunk(lower, upper):
+        return conn.execute(copy_sql, (lower, upper)).rowcount
+
+    _run_chunks(conn, version, step_index, table, cursor, chunk_size, pause, apply_chunk, report)
+    _finish_rebuild(conn, version, step_index, table)
+
+
+def _run_simple_step(conn, version, step_index, step):
+    """script / sql / add_column：一个事务内完成"""
+    if step['type'] == 'script':
+        with open(step['path'], 'r', encoding='utf-8') as f:
+            script = f.read()
+        # executescript 会先提交；脚本本身可重复执行，中断后重跑即可
+        conn.executescript(script)
+        conn.execute('BEGIN IMMEDIATE')
+    else:
+        conn.execute('BEGIN IMMEDIATE')
+    try:
+        if step['type'] == 'sql':
+            conn.execute(step['sql'])
+        elif step['type'] == 'add_column':
+            columns = _columns(conn, step['table'])
+            if columns and step['column'] not in columns:
+                conn.execute(f'''ALTER TABLE "{step['table']}" ADD COLUMN "{step['column']}" {step['definition']}''')
+        _save_position(conn, version, step_index + 1, None)
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+
+
+def apply_migrations(db_path=None, target=None, chunk_size=MIGRATION_CHUNK_SIZE,
+                     pause=MIGRATION_PAUSE_SECONDS, progress=None):
+    """
+    执行待执行的迁移（已中断的迁移从记录的步骤与游标处继续）
+
+    Args:
+        db_path: 数据库路径（默认 Config.DATABASE）
+        target: 执行到该版本为止（可选）
+        chunk_size: 分批步骤每批行数
+        pause: 批间暂停秒数
+        progress: 进度回调 progress(version, 步骤说明, 已处理, 总数)
+
+    Returns:
+        dict: {'success': bool, 'message': str, 'applied': [版本号], 'failed': 版本号 or None}
+    """
+    conn = connect(db_path)
+    applied = []
+    try:
+        recorded = {
+            row[0]: row for row in conn.execute(
+                'SELECT version, status, step_index, step_cursor FROM schema_migrations'
+            ).fetchall()
+        }
+        for migration in MIGRATIONS:
+            version = migration['version']
+            if target and version > target:
+                break
+            row = recorded.get(version)
+            if row and row[1] == 'applied':
+                continue
+            if row is None:
+                conn.execute('INSERT INTO schema_migrations (version, name) VALUES (?, ?)',
+                             (version, migration['name']))
+                step_index, cursor = 0, None
+            else:
+                step_index, cursor = row[2], row[3]
+
+            try:
+                for index in range(step_index, len(migration['steps'])):
+                    step = migration['steps'][index]
+
+                    def report(done, total, _label=step['label']):
+                        if progress:
+                            progress(version, _label, done, total)
+
+                    if step['type'] == 'backfill':
+                        _run_backfill(conn, version, index, step, cursor or 0, chunk_size, pause, report)
+                        _save_position(conn, version, index + 1, None)
+                    elif step['type'] == 'rebuild':
+                        _run_rebuild(conn, version, index, step, cursor, chunk_size, pause, report)
+                    else:
+                        _run_simple_step(conn, version, index, step)
+                        report(1, 1)
+                    cursor = None
+            except Exception as e:
+                if conn.in_transaction:
+                    conn.execute('ROLLBACK')
+                conn.execute('UPDATE schema_migrations SET error = ? WHERE version = ?', (str(e), version))
+                return {
+                    'success': False,
+                    'message': f"迁移 {version} 失败（可修复后重新执行，从中断处继续）：{e}",
+                    'applied': applied,
+                    'failed': version
+                }
+
+            conn.execute('''
+                UPDATE schema_migrations
+                SET status = 'applied', step_cursor = NULL, error = NULL, applied_at = CURRENT_TIMESTAMP
+                WHERE version = ?
+            ''', (version,))
+            applied.append(version)
+    finally:
+        conn.close()
+
+    return {
+        'success': True,
+        'message': f'已执行 {len(applied)} 个迁移' if applied else '没有待执行的迁移',
+        'applied': applied,
+        'failed': None
+    }
@@ -37,6 +37,31 @@ def create_notification(user_id, title, content, notification_type=NotificationT
     )
 
 
+def create_notifications(notifications, commit=True):
+    """
+    批量创建通知（一条 executemany）
+    
+    Args:
+        notifications: [(user_id, title, content, notification_type), ...]
+        commit: 是否立即提交（False 时与调用方的业务写入同一事务提交）
+        
+    Returns:
+        int: 创建的通知数
+    """
+    if not notifications:
+        return 0
+    db = get_db()
+    db.executemany(
+        '''INSERT INTO notifications 
+           (user_id, title, content, type, is_read, created_at)
+           VALUES (?, ?, ?, ?, 0, datetime('now', 'localtime'))''',
+        notifications
+    )
+    if commit:
+        db.commit()
+    return len(notifications)
+
+
 def get_user_notifications(user_id, limit=20, unread_only=False):
     """
     获取用户通知列表
@@ -0,0 +1,537 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+银行代发批次
+    1. create_payment_batch：将已确认（及待重试）的工资单一次性写入代发批次，记录收款信息快照
+    2. stream_payment_file：流式生成银行代发文件（CSV 或定长格式），大批次不占用内存
+    3. parse_bank_return_file + reconcile_payment_batch：导入银行回盘文件，
+       整批按集合操作标记 已发放/失败/待重试，写一条审计日志，失败通知批量写入
+"""
+
+import csv
+import io
+from datetime import date, datetime
+from core.database import query_db, get_db
+from core.cache import invalidate_tags, payroll_tag
+
+PAYMENT_FILE_FORMATS = ('csv', 'fixed')
+
+# 定长文件编码（银行系统通常为 GBK，字段宽度按字节计算）
+FIXED_WIDTH_ENCODING = 'gbk'
+
+# 定长文件布局：(字段, 字节宽度, 对齐) —— 'L' 左对齐补空格，'R' 右对齐补 0
+FIXED_WIDTH_HEADER = (
+    ('record_type', 1, 'L'),      # H
+    ('batch_no', 24, 'L'),
+    ('file_date', 8, 'L'),        # YYYYMMDD
+    ('record_count', 8, 'R'),
+    ('total_cents', 17, 'R')
+)
+FIXED_WIDTH_DETAIL = (
+    ('record_type', 1, 'L'),      # D
+    ('seq', 8, 'R'),
+    ('payroll_id', 12, 'R'),      # 回盘文件按批次号 + 工资单ID 匹配
+    ('bank_account_number', 32, 'L'),
+    ('account_holder_name', 40, 'L'),
+    ('amount_cents', 15, 'R'),
+    ('purpose', 20, 'L')
+)
+FIXED_WIDTH_TRAILER = (
+    ('record_type', 1, 'L'),      # T
+    ('record_count', 8, 'R'),
+    ('total_cents', 17, 'R')
+)
+# 回盘明细：代发明细 + 处理结果
+FIXED_WIDTH_RETURN_DETAIL = FIXED_WIDTH_DETAIL + (
+    ('result', 1, 'L'),           # S 成功 / F 失败 / R 待重试
+    ('bank_reference', 32, 'L'),
+    ('message', 60, 'L')
+)
+
+CSV_COLUMNS = ('batch_no', 'seq', 'payroll_id', 'employee_no', 'account_holder_name',
+               'bank_account_number', 'bank_name', 'amount', 'purpose')
+
+# 回盘结果取值 → 工资单状态
+RETURN_RESULT_ALIASES = {
+    's': 'paid', 'success': 'paid', 'paid': 'paid', '成功': 'paid',
+    'f': 'failed', 'fail': 'failed', 'failed': 'failed', '失败': 'failed',
+    'r': 'retry', 'retry': 'retry', '重试': 'retry', '待重试': 'retry'
+}
+
+# 可加入代发批次的工资单状态
+BATCHABLE_STATUSES = ('confirmed', 'retry')
+
+# 工资单在未回盘的代发批次中（代发金额已写入银行文件，回盘前不能调整或单笔标记发放），{} 为工资单ID列
+PENDING_BATCH_ITEM_SQL = "SELECT 1 FROM payment_batch_items i WHERE i.payroll_id = {} AND i.result = 'pending'"
+
+
+def _generate_batch_no(year_month):
+    return f"PAY{year_month.replace('-', '')}{datetime.now().strftime('%d%H%M%S%f')[:12]}"
+
+
+def create_payment_batch(year_month, operator_id=None, operator_name=None):
+    """
+    生成代发批次
+
+    已确认或待重试、且不在其他未回盘批次中的工资单整批写入；
+    银行卡未录入或户名与员工姓名不符的工资单跳过（与单笔银行转账的校验一致）。
+
+    Returns:
+        dict: {'success', 'message', 'batch_id', 'batch_no', 'record_count', 'total_amount',
+               'skipped': [{'payroll_id', 'employee_no', 'employee_name', 'reason'}]}
+    """
+    db = get_db()
+    placeholders = ','.join('?' * len(BATCHABLE_STATUSES))
+    candidates = f'''
+        FROM payroll_records p
+        JOIN employees e ON e.id = p.employee_id
+        WHERE p.year_month = ?
+        AND p.status IN ({placeholders})
+        AND p.is_archived = 0
+        AND NOT EXISTS ({PENDING_BATCH_ITEM_SQL.format('p.id')})
+    '''
+    params = [year_month, *BATCHABLE_STATUSES]
+    eligible = "e.bank_account_number IS NOT NULL AND e.bank_account_number != '' AND e.account_holder_name = e.name"
+
+    skipped = [
+        {
+            'payroll_id': row['id'],
+            'employee_no': row['employee_no'],
+            'employee_name': row['employee_name'],
+            'reason': '员工未录入银行卡信息' if not row['bank_account_number'] else '银行卡户名与员工姓名不符'
+        }
+        for row in db.execute(f'''
+            SELECT p.id, p.employee_no, p.employee_name, e.bank_account_number
+            {candidates} AND NOT ({eligible})
+            ORDER BY p.employee_no
+        ''', params).fetchall()
+    ]
+
+    batch_no = _generate_batch_no(year_month)
+    try:
+        cursor = db.execute('''
+            INSERT INTO payment_batches (batch_no, year_month, created_by, created_by_name)
+            VALUES (?, ?, ?, ?)
+        ''', (batch_no, year_month, operator_id, operator_name))
+        batch_id = cursor.lastrowid
+
+        db.execute(f'''
+            INSERT INTO payment_batch_items (
+                batch_id, payroll_id, employee_no, account_holder_name,
+                bank_account_number, bank_name, amount
+            )
+            SELECT ?, p.id, p.employee_no, e.account_holder_name,
+                   e.bank_account_number, e.bank_name, p.total_salary
+            {candidates} AND {eligible}
+            ORDER BY p.team, p.employee_no
+        ''', [batch_id] + params)
+
+        totals = db.execute('''
+            SELECT COUNT(*) AS cnt, COALESCE(SUM(amount), 0) AS total
+            FROM payment_batch_items WHERE batch_id = ?
+        ''', [batch_id]).fetchone()
+        if not totals['cnt']:
+            db.rollback()
+            return {
+                'success': False,
+                'message': f'{year_month}没有可代发的工资单' + (f'（{len(skipped)}条银行信息不完整）' if skipped else ''),
+                'skipped': skipped
+            }
+
+        db.execute('''
+            UPDATE payment_batches SET record_count = ?, total_amount = ? WHERE id = ?
+        ''', (totals['cnt'], round(totals['total'], 2), batch_id))
+
+        from core.audit import log_operation
+        log_operation(
+            operation_type='payroll',
+            operation_module='payment_batches',
+            operation_action='create_batch',
+            target_record_id=batch_id,
+            notes=f"{year_month}代发批次{batch_no}：{totals['cnt']}笔，¥{totals['total']:,.2f}，跳过{len(skipped)}笔",
+            operator_id=operator_id,
+            operator_name=operator_name,
+            commit=False
+        )
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        return {'success': False, 'message': f'生成代发批次失败: {str(e)}', 'skipped': skipped}
+
+    return {
+        'success': True,
+        'message': f"已生成代发批次{batch_no}：{totals['cnt']}笔，¥{totals['total']:,.2f}"
+                   + (f"，{len(skipped)}笔银行信息不完整已跳过" if skipped else ''),
+        'batch_id': batch_id,
+        'batch_no': batch_no,
+        'record_count': totals['cnt'],
+        'total_amount': round(totals['total'], 2),
+        'skipped': skipped
+    }
+
+
+def in_pending_batch(payroll_id):
+    """工资单是否在未回盘的代发批次中"""
+    return query_db(PENDING_BATCH_ITEM_SQL.format('?'), [payroll_id], one=True) is not None
+
+
+def get_payment_batch(batch_id):
+    """代发批次"""
+    return query_db('SELECT * FROM payment_batches WHERE id = ?', [batch_id], one=True)
+
+
+def list_payment_batches(year_month=None, limit=20):
+    """代发批次列表（按生成时间倒序）"""
+    if year_month:
+        return query_db('''
+            SELECT * FROM payment_batches WHERE year_month = ?
+            ORDER BY created_at DESC, id DESC LIMIT ?
+        ''', [year_month, limit])
+    return query_db('SELECT * FROM payment_batches ORDER BY id DESC LIMIT ?', [limit])
+
+
+# ==================== 代发文件 ====================
+
+def _cents(amount):
+    return int(round(amount * 100))
+
+
+def _fixed_field(value, width, align):
+    """按字节宽度填充；超长时截断（不截断半个汉字）"""
+    text = '' if value is None else str(value)
+    data = text.encode(FIXED_WIDTH_ENCODING, errors='replace')
+    while len(data) > width:
+        text = text[:-1]
+        data = text.encode(FIXED_WIDTH_ENCODING, errors='replace')
+    pad = width - len(data)
+    if align == 'R':
+        return b'0' * pad + data if text.lstrip('-').isdigit() else b' ' * pad + data
+    return data + b' ' * pad
+
+
+def _fixed_record(layout, values):
+    return b''.join(_fixed_field(values.get(name), width, align) for name, width, align in layout) + b'\r\n'
+
+
+def stream_payment_file(batch_id, file_format='csv'):
+    """
+    流式生成代发文件（逐行读取批次明细，不一次性加载）
+
+    Args:
+        batch_id: 批次ID
+        file_format: 'csv'（UTF-8 带 BOM）或 'fixed'（GBK 定长，含首尾记录）
+
+    Yields:
+        bytes: 文件内容块
+    """
+    batch = get_payment_batch(batch_id)
+    cursor = get_db().execute('''
+        SELECT payroll_id, employee_no, account_holder_name, bank_account_number, bank_name, amount
+        FROM payment_batch_items
+        WHERE batch_id = ? AND result = 'pending'
+        ORDER BY id
+    ''', [batch_id])
+    purpose = f"{batch['year_month']}工资"
+
+    if file_format == 'fixed':
+        # 首记录的笔数/金额需要先汇总
+        totals = get_db().execute('''
+            SELECT COUNT(*) AS cnt, COALESCE(SUM(amount), 0) AS total
+            FROM payment_batch_items WHERE batch_id = ? AND result = 'pending'
+        ''', [batch_id]).fetchone()
+        yield _fixed_record(FIXED_WIDTH_HEADER, {
+            'record_type': 'H', 'batch_no': batch['batch_no'],
+            'file_date': date.today().strftime('%Y%m%d'),
+            'record_count': totals['cnt'], 'total_cents': _cents(totals['total'])
+        })
+        seq = 0
+        for row in cursor:
+            seq += 1
+            yield _fixed_record(FIXED_WIDTH_DETAIL, {
+                'record_type': 'D', 'seq': seq, 'payroll_id': row['payroll_id'],
+                'bank_account_number': row['bank_account_number'],
+                'account_holder_name': row['account_holder_name'],
+                'amount_cents': _cents(row['amount']), 'purpose': purpose
+            })
+        yield _fixed_record(FIXED_WIDTH_TRAILER, {
+            'record_type': 'T', 'record_count': totals['cnt'], 'total_cents': _cents(totals['total'])
+        })
+        return
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    yield ('\ufeff' + buffer.getvalue()).encode('utf-8')
+    seq = 0
+    while True:
+        rows = cursor.fetchmany(500)
+        if not rows:
+            break
+        buffer.seek(0)
+        buffer.truncate()
+        for row in rows:
+            seq += 1
+            writer.writerow((
+                batch['batch_no'], seq, row['payroll_id'], row['employee_no'], row['account_holder_name'],
+                row['bank_account_number'], row['bank_name'] or '', f"{row['amount']:.2f}", purpose
+            ))
+        yield buffer.getvalue().encode('utf-8')
+
+
+# ==================== 回盘导入 ====================
+
+def _parse_fixed_return(content):
+    """解析定长回盘文件（只读取明细记录）"""
+    results = []
+    for line_no, line in enumerate(content.splitlines(), start=1):
+        if not line.startswith(b'D'):
+            continue
+        values, offset = {}, 0
+        for name, width, _ in FIXED_WIDTH_RETURN_DETAIL:
+            values[name] = line[offset:offset + width].decode(FIXED_WIDTH_ENCODING, errors='replace').strip()
+            offset += width
+        try:
+            amount = int(values['amount_cents'] or 0) / 100.0
+        except ValueError:
+            amount = None
+        results.append({
+            'line_no': line_no,
+            'payroll_id': values['payroll_id'],
+            'amount': amount,
+            'result': values['result'],
+            'bank_reference': values['bank_reference'] or None,
+            'message': values['message'] or None
+        })
+    return results
+
+
+def parse_bank_return_file(content, filename):
+    """
+    解析银行回盘文件
+
+    CSV: 表头至少包含 payroll_id, result（S/F/R、success/failed/retry 或 成功/失败/重试），
+         可选 amount, bank_reference, message
+    定长（.txt/.dat）: 明细记录为代发明细 + 结果(1) + 银行流水号(32) + 说明(60)
+
+    Returns:
+        list: [{'line_no', 'payroll_id', 'amount', 'result', 'bank_reference', 'message'}]
+
+    Raises:
+        ValueError: 文件格式错误
+    """
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+
+    if not filename.lower().endswith('.csv'):
+        rows = _parse_fixed_return(content)
+        if not rows:
+            raise ValueError('未找到回盘明细记录（定长文件明细行以 D 开头）')
+        return rows
+
+    reader = csv.DictReader(io.StringIO(content.decode('utf-8-sig')))
+    if not reader.fieldnames or 'payroll_id' not in reader.fieldnames or 'result' not in reader.fieldnames:
+        raise ValueError('回盘文件缺少 payroll_id 或 result 列')
+    rows = []
+    for line_no, row in enumerate(reader, start=2):
+        amount = (row.get('amount') or '').strip()
+        try:
+            amount = float(amount) if amount else None
+        except ValueError:
+            raise ValueError(f'第{line_no}行: 金额格式错误 {amount}')
+        rows.append({
+            'line_no': line_no,
+            'payroll_id': (row.get('payroll_id') or '').strip(),
+            'amount': amount,
+            'result': (row.get('result') or '').strip(),
+            'bank_reference': (row.get('bank_reference') or '').strip() or None,
+            'message': (row.get('message') or '').strip() or None
+        })
+    return rows
+
+
+def reconcile_payment_batch(batch_id, rows, payment_date=None, operator_id=None, operator_name=None):
+    """
+    导入回盘结果（单事务）
+
+    回盘行写入临时表后按集合更新：批次明细结果、工资单状态（已发放/失败/待重试）各一条 UPDATE，
+    整批一条审计日志，失败通知用 executemany 批量写入。
+    工资单ID不在本批次、回盘金额或工资单实发金额与代发金额不符、结果无法识别或已处理过的行不执行，
+    在报告中列出。
+
+    Args:
+        batch_id: 批次ID
+        rows: parse_bank_return_file 的结果
+        payment_date: 发放日期（默认今天）
+
+    Returns:
+        dict: {'success', 'message', 'paid', 'failed', 'retry', 'pending',
+               'rejected': [{'line_no', 'payroll_id', 'reason'}]}
+    """
+    from core.audit import log_operation
+    from core.notifications import create_notifications, NotificationType
+
+    batch = get_payment_batch(batch_id)
+    if not batch:
+        return {'success': False, 'message': '代发批次不存在'}
+    if not rows:
+        return {'success': False, 'message': '回盘文件中没有记录'}
+
+    payment_date = payment_date or date.today()
+    db = get_db()
+
+    rejected = []
+    accepted = {}
+    for row in rows:
+        outcome = RETURN_RESULT_ALIASES.get(str(row['result']).lower())
+        try:
+            payroll_id = int(row['payroll_id'])
+        except (TypeError, ValueError):
+            rejected.append({'line_no': row['line_no'], 'payroll_id': row['payroll_id'], 'reason': '工资单ID格式错误'})
+            continue
+        if not outcome:
+            rejected.append({'line_no': row['line_no'], 'payroll_id': payroll_id, 'reason': f"无法识别的结果：{row['result']}"})
+            continue
+        if payroll_id in accepted:
+            rejected.append({'line_no': row['line_no'], 'payroll_id': payroll_id, 'reason': '重复的回盘记录'})
+            continue
+        accepted[payroll_id] = (row['line_no'], payroll_id, outcome, row['amount'],
+                                row['bank_reference'], row['message'])
+
+    try:
+        db.execute('''
+            CREATE TEMP TABLE IF NOT EXISTS bank_return (
+                line_no INTEGER, payroll_id INTEGER PRIMARY KEY, outcome TEXT,
+                amount REAL, bank_reference TEXT, message TEXT
+            )
+        ''')
+        db.execute('DELETE FROM temp.bank_return')
+        db.executemany('INSERT INTO temp.bank_return VALUES (?, ?, ?, ?, ?, ?)', list(accepted.values()))
+
+        # 不在本批次待处理明细中、金额不符、或工资单实发金额已与代发金额不一致的回盘行
+        # （只移出这些行：重复行等未写入临时表）
+        mismatched = []
+        for row in db.execute('''
+            SELECT r.line_no, r.payroll_id, i.result, i.amount AS expected, r.amount, p.total_salary
+            FROM temp.bank_return r
+            LEFT JOIN payment_batch_items i ON i.batch_id = ? AND i.payroll_id = r.payroll_id
+            LEFT JOIN payroll_records p ON p.id = r.payroll_id
+            WHERE i.id IS NULL OR i.result != 'pending'
+               OR (r.amount IS NOT NULL AND ABS(r.amount - i.amount) >= 0.005)
+               OR p.id IS NULL OR ABS(p.total_salary - i.amount) >= 0.005
+        ''', [batch_id]).fetchall():
+            if row['result'] is None:
+                reason = '工资单不在本批次中'
+            elif row['result'] != 'pending':
+                reason = f"已处理过（{row['result']}）"
+            elif row['total_salary'] is None:
+                reason = '工资单不存在'
+            elif abs(row['total_salary'] - row['expected']) >= 0.005:
+                reason = f"工资单金额已变更：代发¥{row['expected']:.2f}，工资单¥{row['total_salary']:.2f}"
+            else:
+                reason = f"金额不符：代发¥{row['expected']:.2f}，回盘¥{row['amount']:.2f}"
+            rejected.append({'line_no': row['line_no'], 'payroll_id': row['payroll_id'], 'reason': reason})
+            mismatched.append((row['payroll_id'],))
+        if mismatched:
+            db.executemany('DELETE FROM temp.bank_return WHERE payroll_id = ?', mismatched)
+
+        db.execute('''
+            UPDATE payment_batch_items
+            SET result = (SELECT outcome FROM temp.bank_return r WHERE r.payroll_id = payment_batch_items.payroll_id),
+                bank_reference = (SELECT bank_reference FROM temp.bank_return r WHERE r.payroll_id = payment_batch_items.payroll_id),
+                failure_reason = (SELECT message FROM temp.bank_return r
+                                  WHERE r.payroll_id = payment_batch_items.payroll_id AND r.outcome != 'paid'),
+                updated_at = CURRENT_TIMESTAMP
+            WHERE batch_id = ? AND payroll_id IN (SELECT payroll_id FROM temp.bank_return)
+        ''', [batch_id])
+
+        placeholders = ','.join('?' * len(BATCHABLE_STATUSES))
+        db.execute(f'''
+            UPDATE payroll_records
+            SET status = 'paid',
+                payment_method = 'bank_transfer',
+                payment_date = ?,
+                payment_reference = COALESCE(
+                    (SELECT bank_reference FROM temp.bank_return r WHERE r.payroll_id = payroll_records.id), ?),
+                failure_reason = NULL,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id IN (SELECT payroll_id FROM temp.bank_return WHERE outcome = 'paid')
+            AND status IN ({placeholders})
+        ''', [payment_date, batch['batch_no'], *BATCHABLE_STATUSES])
+
+        db.execute(f'''
+            UPDATE payroll_records
+            SET status = (SELECT outcome FROM temp.bank_return r WHERE r.payroll_id = payroll_records.id),
+                payment_method = 'bank_transfer',
+                failure_reason = COALESCE(
+                    (SELECT message FROM temp.bank_return r WHERE r.payroll_id = payroll_records.id), '银行退回'),
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id IN (SELECT payroll_id FROM temp.bank_return WHERE outcome IN ('failed', 'retry'))
+            AND status IN ({placeholders})
+        ''', BATCHABLE_STATUSES)
+
+        counts = {r['result']: r['cnt'] for r in db.execute('''
+            SELECT result, COUNT(*) AS cnt FROM payment_batch_items WHERE batch_id = ? GROUP BY result
+        ''', [batch_id]).fetchall()}
+        db.execute('''
+            UPDATE payment_batches
+            SET status = ?, paid_count = ?, failed_count = ?, retry_count = ?,
+                reconciled_by = ?, reconciled_by_name = ?, reconciled_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', ('partial' if counts.get('pending') else 'reconciled',
+              counts.get('paid', 0), counts.get('failed', 0), counts.get('retry', 0),
+              operator_id, operator_name, batch_id))
+
+        # 失败/待重试通知管理员（批量写入）
+        failures = db.execute('''
+            SELECT p.employee_name, r.outcome, COALESCE(r.message, '银行退回') AS message
+            FROM temp.bank_return r
+            JOIN payroll_records p ON p.id = r.payroll_id
+            WHERE r.outcome IN ('failed', 'retry')
+            ORDER BY r.line_no
+        ''').fetchall()
+        if failures:
+            admins = [a['id'] for a in db.execute("SELECT id FROM users WHERE role = 'admin'").fetchall()]
+            create_notifications([
+                (admin_id, '工资发放失败', f"员工{f['employee_name']}的工资发放失败：{f['message']}", NotificationType.SALARY)
+                for admin_id in admins for f in failures
+            ], commit=False)
+
+        applied = db.execute('SELECT outcome, COUNT(*) AS cnt FROM temp.bank_return GROUP BY outcome').fetchall()
+        applied = {r['outcome']: r['cnt'] for r in applied}
+        log_operation(
+            operation_type='payroll',
+            operation_module='payment_batches',
+            operation_action='reconcile',
+            target_record_id=batch_id,
+            changes_dict={
+                'batch_no': batch['batch_no'],
+                'paid': applied.get('paid', 0),
+                'failed': applied.get('failed', 0),
+                'retry': applied.get('retry', 0),
+                'rejected': len(rejected)
+            },
+            notes=f"代发批次{batch['batch_no']}回盘：成功{applied.get('paid', 0)}笔，失败{applied.get('failed', 0)}笔，"
+                  f"待重试{applied.get('retry', 0)}笔，未匹配{len(rejected)}笔",
+            operator_id=operator_id,
+            operator_name=operator_name,
+            commit=False
+        )
+
+        db.execute('DELETE FROM temp.bank_return')
+        invalidate_tags(payroll_tag(batch['year_month']))
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        return {'success': False, 'message': f'回盘导入失败: {str(e)}'}
+
+    rejected.sort(key=lambda r: r['line_no'])
+    return {
+        'success': True,
+        'message': f"回盘导入完成：成功{applied.get('paid', 0)}笔，失败{applied.get('failed', 0)}笔，"
+                   f"待重试{applied.get('retry', 0)}笔，未匹配{len(rejected)}笔",
+        'paid': applied.get('paid', 0),
+        'failed': applied.get('failed', 0),
+        'retry': applied.get('retry', 0),
+        'pending': counts.get('pending', 0),
+        'rejected': rejected
+    }
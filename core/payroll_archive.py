@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+工资单冷归档
+已归档年份的工资单（及其调整记录）从主库迁出到按年的归档库 data/archive/payroll_<年>.db，
+主库 payroll_records 只保留未归档月份，财务查询不再随年份增长变慢。
+
+迁移流程（archive_payroll_year 调用）：
+    1. ATTACH 归档库，按主库的建表语句建表
+    2. 按 id 分批复制，每批提交并对比两侧的行校验值（sha256）
+    3. 全部一致后在一个事务中删除主库记录、写入 payroll_archive_files
+中途失败时主库数据不变，重新执行会覆盖归档库中已复制的批次。
+
+查看归档（get_archive_summary / get_archived_payrolls）通过 ATTACH 只读访问归档库。
+"""
+
+import hashlib
+import json
+import os
+from contextlib import contextmanager
+from config import Config
+from core.database import get_db, query_db
+from core.db_maintenance import note_bulk_write
+
+# 归档库挂载名
+ARCHIVE_SCHEMA = 'cold_archive'
+
+# 迁移到归档库的表（按工资单 id 关联的列）
+ARCHIVE_TABLES = (
+    ('payroll_records', 'id'),
+    ('payroll_adjustments', 'payroll_id')
+)
+
+# 每批迁移的工资单数
+ARCHIVE_CHUNK_SIZE = 500
+
+# 归档详情页最多显示的记录数
+ARCHIVE_PAGE_LIMIT = 200
+
+# 行校验值不包含的列（归档库中会改写）
+_CHECKSUM_EXCLUDED = {'is_archived', 'archive_year'}
+
+
+def archive_path(archive_year):
+    """归档库文件路径"""
+    return os.path.join(Config.PAYROLL_ARCHIVE_DIR, f'payroll_{int(archive_year)}.db')
+
+
+def _year_range(archive_year):
+    return f'{archive_year}-01', f'{archive_year}-12'
+
+
+def _columns(db, table, schema='main'):
+    return [row[1] for row in db.execute(f'PRAGMA {schema}.table_info({table})').fetchall()]
+
+
+@contextmanager
+def attached_archive(archive_year, create=False):
+    """
+    挂载归档库（ATTACH 不能在事务中执行，挂载前提交当前事务）
+
+    Args:
+        archive_year: 归档年份
+        create: 文件不存在时是否创建
+
+    Yields:
+        sqlite3.Connection or None: 已挂载归档库的连接；文件不存在且 create=False 时为 None
+    """
+    path = archive_path(archive_year)
+    if not create and not os.path.isfile(path):
+        yield None
+        return
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    db = get_db()
+    if db.in_transaction:
+        db.commit()
+    db.execute('ATTACH DATABASE ? AS ' + ARCHIVE_SCHEMA, (path,))
+    try:
+        yield db
+    finally:
+        if db.in_transaction:
+            db.rollback()
+        db.execute('DETACH DATABASE ' + ARCHIVE_SCHEMA)
+
+
+def _create_archive_tables(db):
+    """按主库当前的建表语句在归档库中建表（主库加列后归档库结构保持一致）"""
+    for table, key in ARCHIVE_TABLES:
+        row = db.execute(
+            "SELECT sql FROM main.sqlite_master WHERE type = 'table' AND name = ?", (table,)
+        ).fetchone()
+        body = row[0][row[0].index('('):]
+        db.execute(f'CREATE TABLE IF NOT EXISTS {ARCHIVE_SCHEMA}.{table} {body}')
+        if key != 'id':
+            db.execute(f'CREATE INDEX IF NOT EXISTS {ARCHIVE_SCHEMA}.idx_{table}_{key} ON {table}({key})')
+    db.execute(f'''
+        CREATE INDEX IF NOT EXISTS {ARCHIVE_SCHEMA}.idx_payroll_records_month
+        ON payroll_records(year_month, employee_no)
+    ''')
+    db.execute(f'''
+        CREATE TABLE IF NOT EXISTS {ARCHIVE_SCHEMA}.archive_meta (
+            archive_year INTEGER PRIMARY KEY,
+            record_count INTEGER NOT NULL,
+            adjustment_count INTEGER NOT NULL,
+            checksum TEXT NOT NULL,
+            summary_json TEXT,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def _update_checksum(db, digest, schema, table, key, columns, ids):
+    """按 key 排序读取一批记录并累加到 digest，返回行数"""
+    placeholders = ','.join('?' * len(ids))
+    order = 'id' if key == 'id' else f'{key}, id'
+    rows = db.execute(
+        f'SELECT {", ".join(columns)} FROM {schema}.{table} WHERE {key} IN ({placeholders}) ORDER BY {order}',
+        ids
+    ).fetchall()
+    for row in rows:
+        digest.update(json.dumps(list(row), ensure_ascii=False, default=str).encode('utf-8'))
+        digest.update(b'\n')
+    return len(rows)
+
+
+def move_payroll_year(archive_year, progress=None):
+    """
+    将指定年份的工资单与调整记录迁移到归档库（复制 → 校验 → 删除主库记录）
+
+    调用前应已确认该年份全部工资单已发放/取消；删除主库记录与写入 payroll_archive_files 在同一事务，
+    由调用方（archive_payroll_year）在该事务中写入 payroll_archives 后提交。
+
+    Args:
+        archive_year: 归档年份
+        progress: 进度回调 progress(done, total, message)
+
+    Returns:
+        dict: {'success', 'message', 'moved_count', 'adjustment_count', 'checksum', 'archive_file'}
+    """
+    db = get_db()
+    start, end = _year_range(archive_year)
+    payroll_ids = [row[0] for row in db.execute('''
+        SELECT id FROM payroll_records
+        WHERE year_month BETWEEN ? AND ?
+        ORDER BY id
+    ''', (start, end)).fetchall()]
+    if not payroll_ids:
+        return {'success': False, 'message': f'{archive_year}年没有需要迁移的工资记录'}
+
+    path = archive_path(archive_year)
+    columns = {table: [c for c in _columns(db, table) if c not in _CHECKSUM_EXCLUDED] for table, _ in ARCHIVE_TABLES}
+    digests = {side: hashlib.sha256() for side in ('main', ARCHIVE_SCHEMA)}
+    counts = {side: {table: 0 for table, _ in ARCHIVE_TABLES} for side in digests}
+    total_chunks = (len(payroll_ids) + ARCHIVE_CHUNK_SIZE - 1) // ARCHIVE_CHUNK_SIZE
+
+    with attached_archive(archive_year, create=True) as db:
+        _create_archive_tables(db)
+        db.commit()
+
+        for index in range(total_chunks):
+            chunk = payroll_ids[index * ARCHIVE_CHUNK_SIZE:(index + 1) * ARCHIVE_CHUNK_SIZE]
+            placeholders = ','.join('?' * len(chunk))
+            for table, key in ARCHIVE_TABLES:
+                column_list = ', '.join(_columns(db, table))
+                db.execute(f'''
+                    INSERT OR REPLACE INTO {ARCHIVE_SCHEMA}.{table} ({column_list})
+                    SELECT {column_list} FROM main.{table} WHERE {key} IN ({placeholders})
+                ''', chunk)
+            db.execute(f'''
+                UPDATE {ARCHIVE_SCHEMA}.payroll_records
+                SET is_archived = 1, archive_year = ?
+                WHERE id IN ({placeholders})
+            ''', [archive_year] + chunk)
+            db.commit()
+
+            chunk_digests = {}
+            for side in digests:
+                chunk_digests[side] = hashlib.sha256()
+                for table, key in ARCHIVE_TABLES:
+                    counts[side][table] += _update_checksum(db, chunk_digests[side], side, table, key,
+                                                            columns[table], chunk)
+                digests[side].update(chunk_digests[side].digest())
+            if chunk_digests['main'].digest() != chunk_digests[ARCHIVE_SCHEMA].digest():
+                return {'success': False, 'message': f'归档库校验失败（第{index + 1}批），主库数据未删除'}
+
+            if progress:
+                progress(index + 1, total_chunks + 1, f'已复制 {min((index + 1) * ARCHIVE_CHUNK_SIZE, len(payroll_ids))}/{len(payroll_ids)} 条')
+
+        # 归档库中该年份的记录数须与本次复制一致（排除此前失败残留的多余记录）
+        archived = db.execute(f'''
+            SELECT COUNT(*) FROM {ARCHIVE_SCHEMA}.payroll_records WHERE year_month BETWEEN ? AND ?
+        ''', (start, end)).fetchone()[0]
+        if counts['main'] != counts[ARCHIVE_SCHEMA] or archived != len(payroll_ids):
+            return {'success': False, 'message': '归档库记录数与主库不一致，主库数据未删除'}
+
+        checksum = digests['main'].hexdigest()
+        moved_count = counts['main']['payroll_records']
+        adjustment_count = counts['main']['payroll_adjustments']
+        summary = [dict(row) for row in db.execute(f'''
+            SELECT year_month, COUNT(DISTINCT employee_id) as total_employees,
+                   COUNT(*) as total_records, SUM(total_salary) as total_amount
+            FROM {ARCHIVE_SCHEMA}.payroll_records
+            GROUP BY year_month ORDER BY year_month
+        ''').fetchall()]
+        db.execute(f'''
+            INSERT OR REPLACE INTO {ARCHIVE_SCHEMA}.archive_meta
+                (archive_year, record_count, adjustment_count, checksum, summary_json)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (archive_year, moved_count, adjustment_count, checksum, json.dumps(summary, ensure_ascii=False)))
+        db.commit()
+
+    # 校验通过：删除主库记录（与调用方写入的归档记录同一事务）
+    for i in range(0, len(payroll_ids), ARCHIVE_CHUNK_SIZE):
+        chunk = payroll_ids[i:i + ARCHIVE_CHUNK_SIZE]
+        placeholders = ','.join('?' * len(chunk))
+        db.execute(f'DELETE FROM payroll_adjustments WHERE payroll_id IN ({placeholders})', chunk)
+        db.execute(f'DELETE FROM payroll_records WHERE id IN ({placeholders})', chunk)
+    note_bulk_write('payroll_records', moved_count)
+    note_bulk_write('payroll_adjustments', adjustment_count)
+    db.execute('''
+        INSERT OR REPLACE INTO payroll_archive_files
+            (archive_year, file_name, record_count, adjustment_count, checksum, file_size)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (archive_year, os.path.basename(path), moved_count, adjustment_count, checksum, os.path.getsize(path)))
+
+    if progress:
+        progress(total_chunks + 1, total_chunks + 1, '校验通过，已从主库移除')
+
+    return {
+        'success': True,
+        'message': f'已迁移{moved_count}条工资单、{adjustment_count}条调整记录到 {os.path.basename(path)}',
+        'moved_count': moved_count,
+        'adjustment_count': adjustment_count,
+        'checksum': checksum,
+        'archive_file': path
+    }
+
+
+def verify_archive_file(archive_year):
+    """
+    重新计算归档库校验值并与迁移时记录的值对比
+
+    Returns:
+        dict: {'success': bool, 'message': str, 'checksum': str}
+    """
+    record = query_db('SELECT * FROM payroll_archive_files WHERE archive_year = ?', [archive_year], one=True)
+    if not record:
+        return {'success': False, 'message': f'{archive_year}年没有归档库'}
+
+    with attached_archive(archive_year) as db:
+        if db is None:
+            return {'success': False, 'message': f'归档库文件缺失：{record["file_name"]}'}
+        payroll_ids = [row[0] for row in db.execute(
+            f'SELECT id FROM {ARCHIVE_SCHEMA}.payroll_records ORDER BY id'
+        ).fetchall()]
+        columns = {table: [c for c in _columns(db, table, ARCHIVE_SCHEMA) if c not in _CHECKSUM_EXCLUDED]
+                   for table, _ in ARCHIVE_TABLES}
+        digest = hashlib.sha256()
+        adjustment_count = 0
+        for i in range(0, len(payroll_ids), ARCHIVE_CHUNK_SIZE):
+            chunk = payroll_ids[i:i + ARCHIVE_CHUNK_SIZE]
+            chunk_digest = hashlib.sha256()
+            for table, key in ARCHIVE_TABLES:
+                count = _update_checksum(db, chunk_digest, ARCHIVE_SCHEMA, table, key, columns[table], chunk)
+                if table == 'payroll_adjustments':
+                    adjustment_count += count
+            digest.update(chunk_digest.digest())
+
+    checksum = digest.hexdigest()
+    if (checksum != record['checksum'] or len(payroll_ids) != record['record_count']
+            or adjustment_count != record['adjustment_count']):
+        return {'success': False, 'message': f'{archive_year}年归档库校验不一致', 'checksum': checksum}
+
+    db = get_db()
+    db.execute('UPDATE payroll_archive_files SET verified_at = CURRENT_TIMESTAMP WHERE archive_year = ?',
+               (archive_year,))
+    db.commit()
+    return {'success': True, 'message': f'{archive_year}年归档库校验通过（{len(payroll_ids)}条）', 'checksum': checksum}
+
+
+def get_archive_storage(archive_year):
+    """
+    归档库信息
+
+    Returns:
+        dict or None: payroll_archive_files 记录，附加 file_exists
+    """
+    record = query_db('SELECT * FROM payroll_archive_files WHERE archive_year = ?', [archive_year], one=True)
+    if not record:
+        return None
+    storage = dict(record)
+    storage['file_exists'] = os.path.isfile(archive_path(archive_year))
+    return storage
+
+
+def get_archived_monthly_summary(archive_year):
+    """
+    从归档库按月汇总
+
+    Returns:
+        list or None: [{'year_month', 'total_employees', 'total_records', 'total_amount'}]；归档库不存在时为 None
+    """
+    with attached_archive(archive_year) as db:
+        if db is None:
+            return None
+        rows = db.execute(f'''
+            SELECT year_month, COUNT(DISTINCT employee_id) as total_employees,
+                   COUNT(*) as total_records, SUM(total_salary) as total_amount
+            FROM {ARCHIVE_SCHEMA}.payroll_records
+            GROUP BY year_month ORDER BY year_month
+        ''').fetchall()
+        return [dict(row) for row in rows]
+
+
+def get_archived_payrolls(archive_year, year_month=None, keyword=None, limit=ARCHIVE_PAGE_LIMIT):
+    """
+    查询归档库中的工资单
+
+    Args:
+        archive_year: 归档年份
+        year_month: 月份筛选（YYYY-MM）
+        keyword: 工号/姓名筛选
+        limit: 最多返回条数
+
+    Returns:
+        list: 工资单记录（dict）；归档库不存在时为空列表
+    """
+    conditions, params = [], []
+    if year_month:
+        conditions.append('year_month = ?')
+        params.append(year_month)
+    if keyword:
+        conditions.append('(employee_no LIKE ? OR employee_name LIKE ?)')
+        params.extend([f'%{keyword}%', f'%{keyword}%'])
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+    with attached_archive(archive_year) as db:
+        if db is None:
+            return []
+        rows = db.execute(f'''
+            SELECT id, employee_no, employee_name, team, year_month, subtotal,
+                   deductions, allowances, total_salary, status, payment_date, payment_reference
+            FROM {ARCHIVE_SCHEMA}.payroll_records
+            {where}
+            ORDER BY year_month, employee_no
+            LIMIT ?
+        ''', params + [limit]).fetchall()
+        return [dict(row) for row in rows]
@@ -6,15 +6,20 @@
 """
 
 from datetime import datetime, date
+import base64
 import json
+import math
 from core.database import query_db, get_db
 from core.audit import log_payroll_generate, log_payroll_adjustment, log_payroll_payment
-from core.notifications import create_notification
+from core.notifications import create_notification, NotificationType
+from core.cache import invalidate_tags, payroll_tag
+from core.db_maintenance import note_bulk_write
+from core.payment_batch import PENDING_BATCH_ITEM_SQL, in_pending_batch
 
 
 # ==================== 工资单生成 ====================
 
-def generate_payroll_for_month(year_month, overwrite=False, operator_id=None, operator_name=None):
+def generate_payroll_for_month(year_month, overwrite=False, operator_id=None, operator_name=None, progress=None):
     """
     生成指定月份的工资单
     
@@ -23,6 +28,7 @@ def generate_payroll_for_month(year_month, overwrite=False, operator_id=None, op
         overwrite: 是否覆盖已有工资单
         operator_id: 操作人ID
         operator_name: 操作人姓名
+        progress: 进度回调 progress(done, total, message)（后台任务使用）
     
     Returns:
         dict: {
@@ -63,6 +69,7 @@ def generate_payroll_for_month(year_month, overwrite=False, operator_id=None, op
                     AND is_archived = 0
                 )
             ''', [year_month])
+            invalidate_tags(payroll_tag(year_month))
             db.commit()
     
     # 从salary表获取数据
@@ -72,7 +79,7 @@ def generate_payroll_for_month(year_month, overwrite=False, operator_id=None, op
             e.employee_no,
             e.name as employee_name,
             e.team,
-            e.status
+            e.status as employee_status
         FROM salary s
         JOIN employees e ON s.employee_id = e.id
         WHERE s.year_month = ?
@@ -112,7 +119,7 @@ def generate_payroll_for_month(year_month, overwrite=False, operator_id=None, op
             salary['employee_no'],
             salary['employee_name'],
             salary['team'],
-            salary['status'],
+            salary['employee_status'],  # salary 表也有 status 列（快照状态），须取员工状态
             year_month,
             salary['base_salary'],
             salary['attendance_bonus'],
@@ -124,7 +131,12 @@ def generate_payroll_for_month(year_month, overwrite=False, operator_id=None, op
         
         generated_count += 1
         total_amount += subtotal
+        
+        if progress and generated_count % 100 == 0:
+            progress(generated_count, len(salary_records), '生成工资单')
     
+    note_bulk_write('payroll_records', generated_count)
+    invalidate_tags(payroll_tag(year_month))
     db.commit()
     
     # 记录日志
@@ -181,6 +193,9 @@ def adjust_payroll(payroll_id, adjustment_type, amount, reason, operator_id, ope
     if payroll['status'] == 'paid':
         return {'success': False, 'message': '已发放的工资单不能调整'}
     
+    if in_pending_batch(payroll_id):
+        return {'success': False, 'message': '工资单在未回盘的代发批次中，不能调整'}
+    
     if adjustment_type not in ['deduction', 'allowance']:
         return {'success': False, 'message': f'无效的调整类型：{adjustment_type}'}
     
@@ -233,6 +248,7 @@ def adjust_payroll(payroll_id, adjustment_type, amount, reason, operator_id, ope
     ''', (payroll_id, adjustment_type, amount, reason,
           operator_id, operator_name, operator_role))
     
+    invalidate_tags(payroll_tag(payroll['year_month']))
     db.commit()
     
     # 记录日志
@@ -259,6 +275,329 @@ def get_payroll_adjustments(payroll_id):
     return adjustments
 
 
+# ==================== 批量调整 ====================
+
+# 批量调整文件的列名（CSV 表头或 Excel 第一行，中英文均可）
+ADJUSTMENT_FILE_COLUMNS = {
+    'employee_no': ('employee_no', '工号'),
+    'payroll_id': ('payroll_id', '工资单ID'),
+    'adjustment_type': ('type', 'adjustment_type', '类型'),
+    'amount': ('amount', '金额'),
+    'reason': ('reason', '原因')
+}
+
+ADJUSTMENT_TYPE_ALIASES = {
+    'deduction': 'deduction', '扣款': 'deduction',
+    'allowance': 'allowance', '补贴': 'allowance'
+}
+
+
+def _read_adjustment_rows(content, filename):
+    """读取 CSV/XLSX 为 [{表头: 值}]"""
+    if filename.lower().endswith(('.xlsx', '.xlsm')):
+        import io
+        import openpyxl  # 按需导入，避免拖慢启动
+
+        try:
+            workbook = openpyxl.load_workbook(io.BytesIO(content), read_only=True, data_only=True)
+        except Exception as e:
+            raise ValueError(f'Excel文件解析失败: {e}')
+        rows = workbook.active.iter_rows(values_only=True)
+        headers = [str(h).strip() if h is not None else '' for h in next(rows, ())]
+        return [dict(zip(headers, row)) for row in rows]
+
+    import csv
+    import io
+
+    if isinstance(content, bytes):
+        content = content.decode('utf-8-sig')
+    return list(csv.DictReader(io.StringIO(content)))
+
+
+def parse_payroll_adjustment_file(content, filename):
+    """
+    解析批量调整文件
+
+    CSV/XLSX 列：employee_no（工号）或 payroll_id（工资单ID）, type（类型：deduction/allowance 或 扣款/补贴）,
+    amount（金额）, reason（原因）。只做格式解析，业务校验见 bulk_adjust_payroll。
+
+    Args:
+        content: 文件内容（bytes 或 str）
+        filename: 文件名（用于判断格式）
+
+    Returns:
+        list: [{'row_number', 'employee_no', 'payroll_id', 'adjustment_type', 'amount', 'reason'}]
+
+    Raises:
+        ValueError: 文件格式错误
+    """
+    raw_rows = _read_adjustment_rows(content, filename)
+    if not raw_rows:
+        return []
+
+    headers = set(raw_rows[0])
+    columns = {}
+    for field, aliases in ADJUSTMENT_FILE_COLUMNS.items():
+        columns[field] = next((a for a in aliases if a in headers), None)
+    if not columns['employee_no'] and not columns['payroll_id']:
+        raise ValueError('缺少工号（employee_no）或工资单ID（payroll_id）列')
+    for field in ('adjustment_type', 'amount', 'reason'):
+        if not columns[field]:
+            raise ValueError(f'缺少列：{ADJUSTMENT_FILE_COLUMNS[field][0]}')
+
+    def cell(row, field):
+        value = row.get(columns[field]) if columns[field] else None
+        if value is None:
+            return ''
+        return str(value).strip()
+
+    rows = []
+    for row_number, row in enumerate(raw_rows, start=2):
+        if not any(v not in (None, '') for v in row.values()):
+            continue  # 跳过空行
+        payroll_id = cell(row, 'payroll_id')
+        # Excel 数字单元格读出为 12.0
+        if payroll_id.endswith('.0'):
+            payroll_id = payroll_id[:-2]
+        rows.append({
+            'row_number': row_number,
+            'employee_no': cell(row, 'employee_no') or None,
+            'payroll_id': payroll_id or None,
+            'adjustment_type': cell(row, 'adjustment_type'),
+            'amount': cell(row, 'amount'),
+            'reason': cell(row, 'reason')
+        })
+    return rows
+
+
+def bulk_adjust_payroll(rows, year_month, operator_id, operator_name, operator_role,
+                        allow_partial=False, dry_run=False):
+    """
+    批量调整工资（单事务）
+
+    整批校验用集合查询完成：按工资单ID/工号一次性读取工资单，经理只读取一次所属团队；
+    通过校验的调整用 executemany 写入明细与增量，再用一条 UPDATE 重算实发工资，
+    整批写一条审计日志。
+
+    Args:
+        rows: parse_payroll_adjustment_file 的结果
+        year_month: 按工号定位工资单时使用的月份（YYYY-MM）
+        operator_id: 操作人ID
+        operator_name: 操作人姓名
+        operator_role: 操作人角色（经理只能调整本团队）
+        allow_partial: 存在无效行时是否仍执行有效行（默认整批不执行）
+        dry_run: 只校验不写入
+
+    Returns:
+        dict: {
+            'success', 'message', 'applied', 'failed', 'dry_run',
+            'total_deductions', 'total_allowances',
+            'rows': [{'row_number', 'payroll_id', 'employee_no', 'employee_name',
+                      'adjustment_type', 'amount', 'status': 'ok'|'error'|'skipped', 'message', 'new_total'}]
+        }
+    """
+    from core.audit import log_payroll_bulk_adjustment
+    from core.performance_recalculator import SQL_CHUNK_SIZE
+
+    if not rows:
+        return {'success': False, 'message': '文件中没有调整记录'}
+
+    db = get_db()
+
+    # 逐行格式校验
+    results = []
+    for row in rows:
+        result = {
+            'row_number': row['row_number'],
+            'payroll_id': None,
+            'employee_no': row.get('employee_no'),
+            'employee_name': None,
+            'adjustment_type': ADJUSTMENT_TYPE_ALIASES.get((row.get('adjustment_type') or '').lower()),
+            'amount': None,
+            'status': 'ok',
+            'message': '',
+            'new_total': None
+        }
+        results.append(result)
+
+        errors = []
+        if row.get('payroll_id'):
+            try:
+                result['payroll_id'] = int(row['payroll_id'])
+            except (TypeError, ValueError):
+                errors.append(f"工资单ID格式错误：{row['payroll_id']}")
+        elif not row.get('employee_no'):
+            errors.append('缺少工号或工资单ID')
+        elif not year_month:
+            errors.append('按工号调整时必须指定月份')
+
+        if not result['adjustment_type']:
+            errors.append(f"无效的调整类型：{row.get('adjustment_type')}")
+        try:
+            amount = float(row.get('amount'))
+            if not math.isfinite(amount):
+                raise ValueError(amount)
+            result['amount'] = round(amount, 2)
+            if result['amount'] <= 0:
+                errors.append('金额必须大于0')
+        except (TypeError, ValueError):
+            errors.append(f"金额格式不正确：{row.get('amount')}")
+        if not (row.get('reason') or '').strip():
+            errors.append('必须填写调整原因')
+        result['reason'] = (row.get('reason') or '').strip()
+
+        if errors:
+            result.update(status='error', message='；'.join(errors))
+
+    # 集合查询：一次性读取涉及的工资单
+    payroll_ids = sorted({r['payroll_id'] for r in results if r['status'] == 'ok' and r['payroll_id']})
+    employee_nos = sorted({r['employee_no'] for r in results
+                           if r['status'] == 'ok' and not r['payroll_id'] and r['employee_no']})
+    by_id, by_employee_no = {}, {}
+    columns = ('id, employee_id, employee_no, employee_name, team, year_month, status, subtotal, deductions, allowances, '
+               f"EXISTS ({PENDING_BATCH_ITEM_SQL.format('payroll_records.id')}) AS in_batch")
+    for i in range(0, len(payroll_ids), SQL_CHUNK_SIZE):
+        chunk = payroll_ids[i:i + SQL_CHUNK_SIZE]
+        for p in db.execute(f'''
+            SELECT {columns} FROM payroll_records
+            WHERE id IN ({','.join('?' * len(chunk))})
+        ''', chunk).fetchall():
+            by_id[p['id']] = p
+    for i in range(0, len(employee_nos), SQL_CHUNK_SIZE):
+        chunk = employee_nos[i:i + SQL_CHUNK_SIZE]
+        for p in db.execute(f'''
+            SELECT {columns} FROM payroll_records
+            WHERE year_month = ? AND employee_no IN ({','.join('?' * len(chunk))})
+        ''', [year_month] + chunk).fetchall():
+            by_employee_no[p['employee_no']] = p
+
+    operator_team = None
+    if operator_role == 'manager':
+        operator_emp = query_db(
+            'SELECT team FROM employees WHERE id IN (SELECT employee_id FROM users WHERE id = ?)',
+            [operator_id],
+            one=True
+        )
+        operator_team = operator_emp['team'] if operator_emp else None
+
+    # 权限与状态校验，按工资单累计增量
+    deltas = {}
+    for result in results:
+        if result['status'] != 'ok':
+            continue
+        if result['payroll_id']:
+            payroll = by_id.get(result['payroll_id'])
+            missing = f"工资单 {result['payroll_id']} 不存在"
+        else:
+            payroll = by_employee_no.get(result['employee_no'])
+            missing = f"工号 {result['employee_no']} 没有{year_month}月工资单"
+        if not payroll:
+            result.update(status='error', message=missing)
+            continue
+
+        result.update(payroll_id=payroll['id'], employee_no=payroll['employee_no'],
+                      employee_name=payroll['employee_name'])
+        if operator_team and operator_team != payroll['team']:
+            result.update(status='error', message='无权限调整其他团队员工工资')
+            continue
+        if payroll['status'] == 'paid':
+            result.update(status='error', message='已发放的工资单不能调整')
+            continue
+        if payroll['in_batch']:
+            result.update(status='error', message='工资单在未回盘的代发批次中，不能调整')
+            continue
+
+        delta = deltas.setdefault(payroll['id'], {'payroll': payroll, 'deduction': 0.0, 'allowance': 0.0})
+        delta[result['adjustment_type']] += result['amount']
+
+    for delta in deltas.values():
+        payroll = delta['payroll']
+        delta['new_total'] = round(
+            payroll['subtotal'] + payroll['allowances'] + delta['allowance']
+            - payroll['deductions'] - delta['deduction'], 2
+        )
+    valid = [r for r in results if r['status'] == 'ok']
+    for result in valid:
+        result['new_total'] = deltas[result['payroll_id']]['new_total']
+
+    failed = len(results) - len(valid)
+    total_deductions = round(sum(r['amount'] for r in valid if r['adjustment_type'] == 'deduction'), 2)
+    total_allowances = round(sum(r['amount'] for r in valid if r['adjustment_type'] == 'allowance'), 2)
+    report = {
+        'dry_run': dry_run,
+        'failed': failed,
+        'total_deductions': total_deductions,
+        'total_allowances': total_allowances,
+        'rows': results
+    }
+
+    if failed and not allow_partial:
+        for result in valid:
+            result.update(status='skipped', message='存在无效行，整批未执行')
+        return dict(report, success=False, applied=0,
+                    message=f'{failed}行校验失败，整批未执行')
+    if not valid:
+        return dict(report, success=False, applied=0, message='没有可执行的调整')
+    if dry_run:
+        return dict(report, success=True, applied=0,
+                    message=f'校验通过{len(valid)}行（预览，未写入）')
+
+    payroll_ids = sorted(deltas)
+    try:
+        db.executemany('''
+            INSERT INTO payroll_adjustments (
+                payroll_id, adjustment_type, amount, reason,
+                adjusted_by, adjusted_by_name, adjusted_by_role
+            ) VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', [
+            (r['payroll_id'], r['adjustment_type'], r['amount'], r['reason'],
+             operator_id, operator_name, operator_role)
+            for r in valid
+        ])
+
+        db.executemany('''
+            UPDATE payroll_records
+            SET deductions = deductions + ?,
+                allowances = allowances + ?,
+                adjusted_by = ?,
+                adjusted_by_name = ?,
+                adjusted_at = CURRENT_TIMESTAMP,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND status != 'paid'
+        ''', [
+            (deltas[pid]['deduction'], deltas[pid]['allowance'], operator_id, operator_name, pid)
+            for pid in payroll_ids
+        ])
+
+        for i in range(0, len(payroll_ids), SQL_CHUNK_SIZE):
+            chunk = payroll_ids[i:i + SQL_CHUNK_SIZE]
+            db.execute(f'''
+                UPDATE payroll_records
+                SET total_salary = subtotal + allowances - deductions
+                WHERE id IN ({','.join('?' * len(chunk))})
+            ''', chunk)
+
+        log_payroll_bulk_adjustment(
+            valid, total_deductions, total_allowances,
+            operator_id=operator_id, operator_name=operator_name, operator_role=operator_role,
+            commit=False
+        )
+        note_bulk_write('payroll_adjustments', len(valid))
+        invalidate_tags(*{payroll_tag(deltas[pid]['payroll']['year_month']) for pid in payroll_ids})
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        return dict(report, success=False, applied=0, message=f'批量调整失败: {str(e)}')
+
+    return dict(
+        report,
+        success=True,
+        applied=len(valid),
+        message=f'批量调整完成：成功{len(valid)}行（{len(payroll_ids)}张工资单），失败{failed}行，'
+                f'扣款¥{total_deductions:,.2f}，补贴¥{total_allowances:,.2f}'
+    )
+
+
 # ==================== 工资发放 ====================
 
 def confirm_payroll_for_payment(payroll_id, finance_id, finance_name):
@@ -298,6 +637,7 @@ def confirm_payroll_for_payment(payroll_id, finance_id, finance_name):
         WHERE id = ?
     ''', (finance_id, finance_name, payroll_id))
     
+    invalidate_tags(payroll_tag(payroll['year_month']))
     db.commit()
     
     return {'success': True, 'message': '工资单已确认，可以发放'}
@@ -329,6 +669,10 @@ def mark_payroll_payment(payroll_id, payment_method, payment_date, payment_refer
     if not payroll:
         return {'success': False, 'message': '工资单不存在'}
     
+    # 代发批次中的工资单以回盘结果为准
+    if in_pending_batch(payroll_id):
+        return {'success': False, 'message': '工资单在未回盘的代发批次中，请导入回盘文件'}
+    
     # 如果选择银行转账，需要验证银行信息
     if payment_method == 'bank_transfer':
         employee = query_db(
@@ -357,6 +701,7 @@ def mark_payroll_payment(payroll_id, payment_method, payment_date, payment_refer
         WHERE id = ?
     ''', (payment_method, payment_date, payment_reference, notes, payroll_id))
     
+    invalidate_tags(payroll_tag(payroll['year_month']))
     db.commit()
     
     # 记录日志
@@ -385,6 +730,9 @@ def mark_payroll_payment_failed(payroll_id, failure_reason, finance_id=None, fin
     if not payroll:
         return {'success': False, 'message': '工资单不存在'}
     
+    if in_pending_batch(payroll_id):
+        return {'success': False, 'message': '工资单在未回盘的代发批次中，请导入回盘文件'}
+    
     db = get_db()
     cursor = db.cursor()
     
@@ -396,6 +744,7 @@ def mark_payroll_payment_failed(payroll_id, failure_reason, finance_id=None, fin
         WHERE id = ?
     ''', (failure_reason, payroll_id))
     
+    invalidate_tags(payroll_tag(payroll['year_month']))
     db.commit()
     
     # 记录日志
@@ -437,6 +786,7 @@ def retry_payroll_payment(payroll_id):
         WHERE id = ?
     ''', [payroll_id])
     
+    invalidate_tags(payroll_tag(payroll['year_month']))
     db.commit()
     
     return {'success': True, 'message': '已设置为待重试状态'}
@@ -453,7 +803,7 @@ def notify_payroll_failed(payroll, reason):
             user_id=admin['id'],
             title='工资发放失败',
             content=f'员工{payroll["employee_name"]}的工资发放失败：{reason}',
-            notification_type='payroll_paid'
+            notification_type=NotificationType.SALARY
         )
 
 
@@ -482,6 +832,7 @@ def batch_confirm_payrolls(year_month, finance_id, finance_name):
     ''', (finance_id, finance_name, year_month))
     
     confirmed_count = cursor.rowcount
+    invalidate_tags(payroll_tag(year_month))
     db.commit()
     
     return {
@@ -493,26 +844,36 @@ def batch_confirm_payrolls(year_month, finance_id, finance_name):
 
 # ==================== 年度归档 ====================
 
-def archive_payroll_year(archive_year, operator_id, operator_name):
+def archive_payroll_year(archive_year, operator_id, operator_name, progress=None):
     """
     归档指定年份的工资记录
     
+    工资单与调整记录迁出到该年的归档库（见 core/payroll_archive.py），校验一致后从主库删除；
+    旧版本仅标记 is_archived 的年份再次执行时补做迁移。
+    
     Args:
         archive_year: 归档年份（如：2024）
         operator_id: 操作人ID
         operator_name: 操作人姓名
+        progress: 进度回调 progress(done, total, message)（后台任务使用）
     
     Returns:
         dict: {'success': bool, 'archived_count': int, 'message': str}
     """
+    from core.payroll_archive import move_payroll_year, get_archive_storage
+    
+    start, end = f'{archive_year}-01', f'{archive_year}-12'
+    existing = query_db('SELECT id FROM payroll_archives WHERE archive_year = ?', [archive_year], one=True)
+    if existing and get_archive_storage(archive_year):
+        return {'success': False, 'message': f'{archive_year}年已归档'}
+    
     # 检查是否有未发放的工资单
     unpaid = query_db('''
         SELECT COUNT(*) as count
         FROM payroll_records
-        WHERE year_month LIKE ?
+        WHERE year_month BETWEEN ? AND ?
         AND status NOT IN ('paid', 'cancelled')
-        AND is_archived = 0
-    ''', [f'{archive_year}-%'], one=True)
+    ''', [start, end], one=True)
     
     if unpaid and unpaid['count'] > 0:
         return {
@@ -528,55 +889,193 @@ def archive_payroll_year(archive_year, operator_id, operator_name):
             SUM(total_salary) as total_amount,
             year_month
         FROM payroll_records
-        WHERE year_month LIKE ?
-        AND is_archived = 0
+        WHERE year_month BETWEEN ? AND ?
         GROUP BY year_month
-    ''', [f'{archive_year}-%'])
+        ORDER BY year_month
+    ''', [start, end])
     
     if not summary:
         return {'success': False, 'message': f'{archive_year}年没有工资记录'}
     
-    # 构建汇总JSON
-    summary_json = json.dumps([dict(row) for row in summary], ensure_ascii=False)
-    
-    total_employees = len(set(row['total_employees'] for row in summary))
+    total_employees = query_db('''
+        SELECT COUNT(DISTINCT employee_id) as count
+        FROM payroll_records
+        WHERE year_month BETWEEN ? AND ?
+    ''', [start, end], one=True)['count']
     total_records = sum(row['total_records'] for row in summary)
-    total_amount = sum(row['total_amount'] for row in summary)
+    total_amount = sum(row['total_amount'] or 0 for row in summary)
+    
+    # 复制到归档库并校验，删除主库记录（未提交）
+    moved = move_payroll_year(archive_year, progress=progress)
+    if not moved['success']:
+        return moved
     
     db = get_db()
-    cursor = db.cursor()
+    if not existing:
+        db.execute('''
+            INSERT INTO payroll_archives (
+                archive_year, total_employees, total_records, total_amount,
+                summary_json, archived_by, archived_by_name
+            ) VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (archive_year, total_employees, total_records, total_amount,
+              json.dumps([dict(row) for row in summary], ensure_ascii=False), operator_id, operator_name))
+    
+    invalidate_tags(*(payroll_tag(f'{archive_year}-{month:02d}') for month in range(1, 13)))
+    db.commit()
     
-    # 创建归档记录
-    cursor.execute('''
-        INSERT INTO payroll_archives (
-            archive_year, total_employees, total_records, total_amount,
-            summary_json, archived_by, archived_by_name
-        ) VALUES (?, ?, ?, ?, ?, ?, ?)
-    ''', (archive_year, total_employees, total_records, total_amount,
-          summary_json, operator_id, operator_name))
+    return {
+        'success': True,
+        'archived_count': moved['moved_count'],
+        'total_amount': total_amount,
+        'checksum': moved['checksum'],
+        'message': f'成功归档{archive_year}年工资记录：{moved["moved_count"]}条，总计¥{total_amount:,.2f}（已迁出到归档库）'
+    }
+
+
+def get_payroll_status_stats(year_month):
+    """
+    各状态工资单数量与金额（未归档）
     
-    # 标记工资单为已归档
-    cursor.execute('''
-        UPDATE payroll_records
-        SET is_archived = 1,
-            archive_year = ?
-        WHERE year_month LIKE ?
-        AND is_archived = 0
-    ''', (archive_year, f'{archive_year}-%'))
+    读取 payroll_status_counters（由 schema.sql 中的触发器在工资单写入的同一事务中维护）
+    
+    Args:
+        year_month: 年月 YYYY-MM
+    
+    Returns:
+        list: [{'status', 'count', 'amount'}]
+    """
+    stats = query_db('''
+        SELECT 
+            status,
+            record_count as count,
+            ROUND(total_amount, 2) as amount
+        FROM payroll_status_counters
+        WHERE year_month = ?
+        AND record_count > 0
+        ORDER BY status
+    ''', [year_month])
+    return [dict(s) for s in stats]
+
+
+def rebuild_payroll_status_counters(year_month=None):
+    """
+    按工资单重新计算状态计数（计数表与工资单不一致时修复）
+    
+    Args:
+        year_month: 只重算指定月份；为空时重算全部
     
-    archived_count = cursor.rowcount
+    Returns:
+        dict: {'success': bool, 'message': str, 'rows': int}
+    """
+    db = get_db()
+    condition, params = ('AND year_month = ?', [year_month]) if year_month else ('', [])
+    db.execute(f'''
+        DELETE FROM payroll_status_counters WHERE 1 = 1 {condition}
+    ''', params)
+    cursor = db.execute(f'''
+        INSERT INTO payroll_status_counters (year_month, status, record_count, total_amount)
+        SELECT year_month, status, COUNT(*), IFNULL(SUM(total_salary), 0)
+        FROM payroll_records
+        WHERE is_archived = 0 {condition}
+        GROUP BY year_month, status
+    ''', params)
     db.commit()
+    return {'success': True, 'message': f'已重算{cursor.rowcount}组工资单状态计数', 'rows': cursor.rowcount}
+
+
+# ==================== 工资单工作列表 ====================
+
+# 工作列表每页条数
+WORKLIST_PAGE_SIZE = 50
+WORKLIST_MAX_PAGE_SIZE = 500
+
+# 工作列表排序键（团队为空按空串，与 idx_payroll_worklist 的表达式一致）
+_WORKLIST_KEY = "IFNULL(team, '')"
+
+
+def encode_worklist_cursor(record):
+    """由一页的最后一条工资单生成下一页游标"""
+    raw = json.dumps([record['team'] or '', record['employee_no'], record['id']], ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_worklist_cursor(cursor):
+    """
+    解析游标
+    
+    Returns:
+        list or None: [team, employee_no, id]；游标无效时返回 None（从第一页开始）
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        team, employee_no, payroll_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+        return [str(team), str(employee_no), int(payroll_id)]
+    except (ValueError, TypeError):
+        return None
+
+
+def get_payroll_worklist(year_month, statuses=None, team=None, keyword=None, cursor=None, limit=WORKLIST_PAGE_SIZE):
+    """
+    工资单工作列表（游标分页，按 团队、工号、id 排序）
+    
+    Args:
+        year_month: 年月 YYYY-MM
+        statuses: 状态列表；为空时不限状态
+        team: 团队筛选
+        keyword: 工号/姓名筛选
+        cursor: 上一页返回的 next_cursor
+        limit: 每页条数
     
+    Returns:
+        dict: {'items': list, 'next_cursor': str or None, 'has_more': bool}
+    """
+    limit = max(1, min(int(limit or WORKLIST_PAGE_SIZE), WORKLIST_MAX_PAGE_SIZE))
+    conditions = ['year_month = ?', 'is_archived = 0']
+    params = [year_month]
+    if statuses:
+        conditions.append(f"status IN ({','.join('?' * len(statuses))})")
+        params.extend(statuses)
+    if team:
+        conditions.append(f'{_WORKLIST_KEY} = ?')
+        params.append(team)
+    if keyword:
+        conditions.append('(employee_no LIKE ? OR employee_name LIKE ?)')
+        params.extend([f'%{keyword}%', f'%{keyword}%'])
+    after = decode_worklist_cursor(cursor)
+    if after:
+        # 首列单独给出下界，SQLite 才会在表达式索引上定位到游标所在团队（行值比较本身不参与索引定位）
+        conditions.append(f'{_WORKLIST_KEY} >= ? AND ({_WORKLIST_KEY}, employee_no, id) > (?, ?, ?)')
+        params.extend([after[0]] + after)
+    
+    rows = query_db(f'''
+        SELECT * FROM payroll_records
+        WHERE {' AND '.join(conditions)}
+        ORDER BY {_WORKLIST_KEY}, employee_no, id
+        LIMIT ?
+    ''', params + [limit + 1])
+    
+    has_more = len(rows) > limit
+    items = rows[:limit]
     return {
-        'success': True,
-        'archived_count': archived_count,
-        'total_amount': total_amount,
-        'message': f'成功归档{archive_year}年工资记录：{archived_count}条，总计¥{total_amount:,.2f}'
+        'items': items,
+        'next_cursor': encode_worklist_cursor(items[-1]) if has_more else None,
+        'has_more': has_more
     }
 
 
 def get_archive_summary(archive_year):
-    """获取归档汇总信息"""
+    """
+    获取归档汇总信息
+    
+    已迁出到归档库的年份，月度明细从归档库（ATTACH）按月汇总；旧版本仅标记的年份使用归档时保存的汇总
+    
+    Returns:
+        dict or None: {'archive', 'monthly_summary', 'storage'}
+    """
+    from core.payroll_archive import get_archive_storage, get_archived_monthly_summary
+    
     archive = query_db('''
         SELECT * FROM payroll_archives
         WHERE archive_year = ?
@@ -585,12 +1084,16 @@ def get_archive_summary(archive_year):
     if not archive:
         return None
     
-    # 解析summary_json
-    summary = json.loads(archive['summary_json']) if archive['summary_json'] else []
+    storage = get_archive_storage(archive_year)
+    summary = get_archived_monthly_summary(archive_year) if storage else None
+    if summary is None:
+        # 解析summary_json
+        summary = json.loads(archive['summary_json']) if archive['summary_json'] else []
     
     return {
         'archive': dict(archive),
-        'monthly_summary': summary
+        'monthly_summary': summary,
+        'storage': storage
     }
 
 
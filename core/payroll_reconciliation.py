@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+工资单核对模块
+工资单生成后业绩被修正或工作日调整时，工资单中的薪资明细不会自动更新。
+本模块按月从 performance 整批重算应发各项（向量化执行与 salary_engine 相同的规则），
+与 payroll_records 及 salary 快照逐项比对，按薪资项与团队汇总差异，
+可选地为未发放（且不在未回盘代发批次中）的工资单生成校正调整（补贴/扣款）。财务确认发放前运行。
+"""
+
+import time
+import numpy as np
+from core.database import get_db
+from core.payment_batch import PENDING_BATCH_ITEM_SQL
+from core.salary_engine import SALARY_RULES
+from core.salary_ledger import RECENT_DAYS_KEPT, month_date_range
+
+# 比对的薪资项
+SALARY_COMPONENTS = ('base_salary', 'attendance_bonus', 'performance_bonus', 'commission')
+
+# 工资单 status_at_time 的有效取值
+EMPLOYEE_STATUSES = ('trainee', 'C', 'B', 'A', 'eliminated')
+
+# 金额比较精度
+RECONCILE_TOLERANCE = 0.005
+
+# 校正调整的原因前缀（再次核对时扣除已生成的校正，避免重复调整）
+CORRECTION_REASON_PREFIX = '工资核对校正'
+
+# 报告中返回的差异明细条数
+SAMPLE_SIZE = 50
+
+
+def calculate_salary_components_array(status, work_days, valid_work_days, total_orders,
+                                      recent_orders, total_commission, rules=None):
+    """
+    向量化计算薪资各项（与 salary_engine.calculate_salary_from_ledger 规则一致）
+
+    Args:
+        status: 员工状态数组（'trainee' / 'C' / 'B' / 'A'）
+        work_days, valid_work_days, total_orders, recent_orders: 当月台账口径的整数数组
+        total_commission: 当月提成合计数组
+        rules: 薪资规则（默认 SALARY_RULES）
+
+    Returns:
+        dict: {'base_salary', 'attendance_bonus', 'performance_bonus', 'commission'} → 数组
+    """
+    rules = rules or SALARY_RULES
+    c_rule, b_rule, a_rule = rules['C'], rules['B'], rules['A']
+    is_c, is_b, is_a = status == 'C', status == 'B', status == 'A'
+
+    qualified_days = np.where(work_days >= c_rule['min_days'], c_rule['min_days'], 0)
+    c_base = np.minimum(qualified_days * c_rule['daily_rate'], c_rule['max_total'])
+    b_base = np.minimum(work_days, b_rule['max_days']) * b_rule['daily_rate']
+    base_salary = np.select([is_c, is_b, is_a], [c_base, b_base, a_rule['base_salary']], 0).astype(np.float64)
+
+    attendance = np.where(
+        is_a
+        & (valid_work_days >= a_rule['attendance_min_valid_days'])
+        & (recent_orders >= a_rule['attendance_min_recent_orders']),
+        a_rule['attendance_bonus'], 0
+    ).astype(np.float64)
+
+    performance = np.zeros(len(status))
+    for min_orders, bonus in sorted(a_rule['performance_bonus_tiers']):
+        performance = np.where(total_orders >= min_orders, bonus, performance)
+    performance = np.where(is_a, performance, 0).astype(np.float64)
+
+    return {
+        'base_salary': base_salary,
+        'attendance_bonus': attendance,
+        'performance_bonus': performance,
+        'commission': np.asarray(total_commission, dtype=np.float64)
+    }
+
+
+def _load_month_facts(db, year_month):
+    """按员工汇总当月业绩（一条查询，最近6条按窗口函数取）"""
+    start, end = month_date_range(year_month)
+    rows = db.execute(f'''
+        SELECT
+            p.employee_id,
+            e.employee_no,
+            e.name,
+            e.team,
+            COUNT(*) as work_days,
+            SUM(CASE WHEN p.is_valid_workday THEN 1 ELSE 0 END) as valid_work_days,
+            SUM(IFNULL(p.orders_count, 0)) as total_orders,
+            SUM(IFNULL(p.commission, 0)) as total_commission,
+            SUM(CASE WHEN p.recent_rank <= {RECENT_DAYS_KEPT} THEN IFNULL(p.orders_count, 0) ELSE 0 END) as recent_orders
+        FROM (
+            SELECT employee_id, orders_count, commission, is_valid_workday,
+                   ROW_NUMBER() OVER (PARTITION BY employee_id ORDER BY work_date DESC) as recent_rank
+            FROM performance
+            WHERE work_date >= ? AND work_date < ?
+        ) p
+        JOIN employees e ON e.id = p.employee_id
+        GROUP BY p.employee_id
+    ''', (start, end)).fetchall()
+    return {row['employee_id']: row for row in rows}
+
+
+def _load_prior_corrections(db, year_month):
+    """已生成的核对校正（补贴为正、扣款为负），按工资单汇总"""
+    rows = db.execute('''
+        SELECT a.payroll_id,
+               SUM(CASE WHEN a.adjustment_type = 'allowance' THEN a.amount ELSE -a.amount END) as amount
+        FROM payroll_adjustments a
+        JOIN payroll_records p ON p.id = a.payroll_id
+        WHERE p.year_month = ? AND p.is_archived = 0
+        AND a.reason LIKE ?
+        GROUP BY a.payroll_id
+    ''', (year_month, CORRECTION_REASON_PREFIX + '%')).fetchall()
+    return {row['payroll_id']: row['amount'] for row in rows}
+
+
+def reconcile_payroll_month(year_month, team=None, apply_corrections=False,
+                            operator_id=None, operator_name=None, operator_role=None):
+    """
+    核对某月工资单与按当前业绩重算的应发各项
+
+    Args:
+        year_month: 年月 YYYY-MM
+        team: 只核对指定团队
+        apply_corrections: 是否为未发放的差异工资单生成校正调整（按应发差额写入补贴/扣款）
+        operator_id / operator_name / operator_role: 校正调整的操作人
+
+    Returns:
+        dict: {
+            'success', 'message', 'year_month', 'checked', 'mismatched', 'elapsed_ms',
+            'expected_subtotal', 'actual_subtotal', 'subtotal_delta',
+            'by_component': [{'component', 'count', 'delta'}],
+            'by_team': [{'team', 'checked', 'mismatched', 'delta'}],
+            'salary_mismatched': int, 'salary_missing': int,
+            'missing_payrolls': [{'employee_id', 'employee_no', 'name', 'team'}],
+            'pending_corrections': int, 'correction_amount': float, 'locked': int,
+            'samples': [...], 'corrections': bulk_adjust_payroll 的结果或 None
+        }
+    """
+    started = time.perf_counter()
+    db = get_db()
+
+    conditions, params = ['p.year_month = ?', 'p.is_archived = 0'], [year_month]
+    if team:
+        conditions.append('p.team = ?')
+        params.append(team)
+    payrolls = db.execute(f'''
+        SELECT p.id, p.employee_id, p.employee_no, p.employee_name, p.team, p.status_at_time, p.status,
+               e.status as employee_status,
+               p.base_salary, p.attendance_bonus, p.performance_bonus, p.commission,
+               p.subtotal, p.deductions, p.allowances, p.total_salary,
+               s.id as salary_id, s.base_salary as s_base_salary, s.attendance_bonus as s_attendance_bonus,
+               s.performance_bonus as s_performance_bonus, s.commission as s_commission,
+               EXISTS ({PENDING_BATCH_ITEM_SQL.format('p.id')}) as in_batch
+        FROM payroll_records p
+        LEFT JOIN employees e ON e.id = p.employee_id
+        LEFT JOIN salary s ON s.employee_id = p.employee_id AND s.year_month = p.year_month
+        WHERE {' AND '.join(conditions)}
+        ORDER BY p.team, p.employee_no
+    ''', params).fetchall()
+
+    if not payrolls:
+        return {'success': False, 'message': f'{year_month}月没有工资单'}
+
+    facts = _load_month_facts(db, year_month)
+    prior = _load_prior_corrections(db, year_month)
+    n = len(payrolls)
+
+    def column(key, source=None, dtype=np.float64):
+        source = source or payrolls
+        return np.fromiter(((r[key] or 0) for r in source), dtype=dtype, count=n)
+
+    employee_facts = [facts.get(p['employee_id']) for p in payrolls]
+    zero = {'work_days': 0, 'valid_work_days': 0, 'total_orders': 0, 'recent_orders': 0, 'total_commission': 0}
+    fact_rows = [f if f is not None else zero for f in employee_facts]
+
+    # 1. 向量化重算应发各项（按生成工资单时的员工状态；早期工资单记录的是薪资快照状态，改用员工当前状态）
+    expected = calculate_salary_components_array(
+        np.array([
+            p['status_at_time'] if p['status_at_time'] in EMPLOYEE_STATUSES else (p['employee_status'] or '')
+            for p in payrolls
+        ]),
+        column('work_days', fact_rows, np.int64),
+        column('valid_work_days', fact_rows, np.int64),
+        column('total_orders', fact_rows, np.int64),
+        column('recent_orders', fact_rows, np.int64),
+        column('total_commission', fact_rows)
+    )
+    actual = {c: column(c) for c in SALARY_COMPONENTS}
+    deltas = {c: expected[c] - actual[c] for c in SALARY_COMPONENTS}
+    mismatch = {c: np.abs(deltas[c]) > RECONCILE_TOLERANCE for c in SALARY_COMPONENTS}
+
+    expected_subtotal = sum(expected[c] for c in SALARY_COMPONENTS)
+    actual_subtotal = column('subtotal')
+    subtotal_delta = expected_subtotal - actual_subtotal
+    any_mismatch = np.logical_or.reduce([mismatch[c] for c in SALARY_COMPONENTS]) \
+        | (np.abs(subtotal_delta) > RECONCILE_TOLERANCE)
+
+    # salary 快照与重算结果的差异（快照缺失单独计数）
+    has_salary = np.fromiter((p['salary_id'] is not None for p in payrolls), dtype=bool, count=n)
+    salary_mismatch = np.zeros(n, dtype=bool)
+    for c in SALARY_COMPONENTS:
+        salary_mismatch |= np.abs(expected[c] - column('s_' + c)) > RECONCILE_TOLERANCE
+    salary_mismatch &= has_salary
+
+    # 2. 待校正金额：应发差额扣除已生成的校正
+    corrected = np.fromiter((prior.get(p['id'], 0) for p in payrolls), dtype=np.float64, count=n)
+    outstanding = np.round(subtotal_delta - corrected, 2)
+    # 已发放、已取消或在未回盘代发批次中的工资单不能校正
+    editable = np.fromiter((p['status'] not in ('paid', 'cancelled') and not p['in_batch'] for p in payrolls),
+                           dtype=bool, count=n)
+    needs_correction = np.abs(outstanding) > RECONCILE_TOLERANCE
+    correctable = needs_correction & editable
+
+    # 3. 按薪资项、团队汇总
+    by_component = [
+        {
+            'component': c,
+            'count': int(mismatch[c].sum()),
+            'delta': round(float(deltas[c][mismatch[c]].sum()), 2)
+        }
+        for c in SALARY_COMPONENTS
+    ]
+    teams = np.array([p['team'] or '' for p in payrolls])
+    by_team = []
+    for team_name in sorted(set(teams.tolist())):
+        in_team = teams == team_name
+        by_team.append({
+            'team': team_name or '-',
+            'checked': int(in_team.sum()),
+            'mismatched': int((in_team & any_mismatch).sum()),
+            'delta': round(float(subtotal_delta[in_team & any_mismatch].sum()), 2)
+        })
+
+    samples = []
+    for index in np.flatnonzero(any_mismatch)[:SAMPLE_SIZE].tolist():
+        p = payrolls[index]
+        samples.append({
+            'payroll_id': p['id'],
+            'employee_no': p['employee_no'],
+            'employee_name': p['employee_name'],
+            'team': p['team'],
+            'status_at_time': p['status_at_time'],
+            'payroll_status': p['status'],
+            'components': {
+                c: {'expected': round(float(expected[c][index]), 2), 'actual': round(float(actual[c][index]), 2)}
+                for c in SALARY_COMPONENTS if mismatch[c][index]
+            },
+            'subtotal_delta': round(float(subtotal_delta[index]), 2),
+            'outstanding': round(float(outstanding[index]), 2)
+        })
+
+    # 当月有业绩但没有工资单的员工（只核对单个团队时按团队过滤）
+    payroll_employees = {p['employee_id'] for p in payrolls}
+    missing_payrolls = [
+        {'employee_id': emp_id, 'employee_no': f['employee_no'], 'name': f['name'], 'team': f['team']}
+        for emp_id, f in sorted(facts.items())
+        if emp_id not in payroll_employees and (not team or f['team'] == team)
+    ]
+
+    # 4. 可选：为未发放的差异工资单生成校正调整（一批写入）
+    corrections = None
+    if apply_corrections and correctable.any():
+        from core.payroll_engine import bulk_adjust_payroll
+        rows = []
+        for row_number, index in enumerate(np.flatnonzero(correctable).tolist(), start=1):
+            p = payrolls[index]
+            amount = float(outstanding[index])
+            changed = '、'.join(c for c in SALARY_COMPONENTS if mismatch[c][index]) or 'subtotal'
+            rows.append({
+                'row_number': row_number,
+                'payroll_id': p['id'],
+                'adjustment_type': 'allowance' if amount > 0 else 'deduction',
+                'amount': abs(amount),
+                'reason': f'{CORRECTION_REASON_PREFIX}：{changed}（应发 {float(expected_subtotal[index]):.2f}，'
+                          f'工资单 {float(actual_subtotal[index]):.2f}）'
+            })
+        corrections = bulk_adjust_payroll(rows, year_month, operator_id, operator_name, operator_role)
+
+    mismatched = int(any_mismatch.sum())
+    message = f'核对{year_month}月{n}张工资单：{mismatched}张与当前业绩不一致'
+    if mismatched:
+        message += f'，应发合计差额{float(subtotal_delta[any_mismatch].sum()):+,.2f}元'
+    if missing_payrolls:
+        message += f'；{len(missing_payrolls)}名员工有业绩但没有工资单'
+    if corrections is not None:
+        message += f'；{corrections["message"]}'
+
+    return {
+        'success': True,
+        'message': message,
+        'year_month': year_month,
+        'team': team,
+        'checked': n,
+        'mismatched': mismatched,
+        'expected_subtotal': round(float(expected_subtotal.sum()), 2),
+        'actual_subtotal': round(float(actual_subtotal.sum()), 2),
+        'subtotal_delta': round(float(subtotal_delta.sum()), 2),
+        'by_component': by_component,
+        'by_team': by_team,
+        'salary_mismatched': int(salary_mismatch.sum()),
+        'salary_missing': int((~has_salary).sum()),
+        'missing_payrolls': missing_payrolls,
+        'pending_corrections': int(correctable.sum()),
+        'correction_amount': round(float(outstanding[correctable].sum()), 2),
+        'locked': int((needs_correction & ~editable).sum()),
+        'samples': samples,
+        'corrections': corrections,
+        'elapsed_ms': int((time.perf_counter() - started) * 1000)
+    }
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+业绩矩阵模块
+一次性把一段日期内的业绩加载为 员工×日期 的 NumPy 矩阵，
+并预先计算前缀和，使任意窗口的出单数、有效工作日数都可 O(1) 取得。
+供规则回放等需要逐日扫描大量员工的场景使用，避免每天重复查询数据库。
+"""
+
+from datetime import timedelta
+import numpy as np
+from core.database import query_db
+from core.workday import get_calendar_index, count_workdays_between, resolve_as_of
+
+# 回放起点之前额外加载的天数，需覆盖最长的规则窗口（含长假）
+LOOKBACK_DAYS = 60
+
+
+def _prefix_sum(values):
+    """按最后一维求前缀和，首列补0：prefix[..., k] = sum(values[..., :k])"""
+    pad = [(0, 0)] * (values.ndim - 1) + [(1, 0)]
+    return np.pad(np.cumsum(values, axis=-1, dtype=np.int64), pad)
+
+
+class PerformanceMatrix:
+    """
+    员工×日期 业绩矩阵
+
+    所有查询方法以日期下标 day（相对 origin 的天数，见 day_index）为参数，
+    返回按员工顺序（self.employee_ids）排列的数组。
+
+    口径与规则引擎的数据库查询一致：
+        recent_orders          最近N个自然日出单数（不区分有效工作日）
+        recent_workday_orders  最近N个工作日的有效出单数
+        month_valid_workdays   当月截至当日的有效工作日数
+        valid_orders_between   区间内有效出单数
+    """
+
+    def __init__(self, start_date, end_date, employee_ids=None, lookback_days=LOOKBACK_DAYS):
+        """
+        Args:
+            start_date: 起始日期
+            end_date: 结束日期（含）
+            employee_ids: 员工ID列表，None 表示加载区间内有业绩的全部员工
+            lookback_days: 起始日期之前额外加载的天数
+        """
+        start_date = resolve_as_of(start_date)
+        self.end = resolve_as_of(end_date)
+        self.origin = start_date - timedelta(days=lookback_days)
+        self.num_days = (self.end - self.origin).days + 1
+        self.dates = [self.origin + timedelta(days=i) for i in range(self.num_days)]
+
+        # 工作日日历（未配置的日期默认为工作日）
+        calendar = get_calendar_index()
+        workday_mask = np.array(
+            [calendar.get(d.strftime('%Y-%m-%d'), True) for d in self.dates], dtype=bool
+        )
+        self.workday_mask = workday_mask
+        self._cum_workdays = _prefix_sum(workday_mask.astype(np.int64))
+        self._workday_positions = np.flatnonzero(workday_mask)
+        self._workday_count_cache = {}
+
+        rows = query_db('''
+            SELECT employee_id, work_date, orders_count, is_valid_workday
+            FROM performance
+            WHERE work_date >= ? AND work_date <= ?
+        ''', [self.origin.strftime('%Y-%m-%d'), self.end.strftime('%Y-%m-%d')])
+
+        if employee_ids is None:
+            employee_ids = sorted({r['employee_id'] for r in rows})
+        self.employee_ids = list(employee_ids)
+        self.row_of = {emp_id: i for i, emp_id in enumerate(self.employee_ids)}
+
+        orders = np.zeros((len(self.employee_ids), self.num_days), dtype=np.int64)
+        valid = np.zeros((len(self.employee_ids), self.num_days), dtype=bool)
+        present = np.zeros((len(self.employee_ids), self.num_days), dtype=bool)
+
+        emp_rows, day_cols, counts, flags = [], [], [], []
+        for r in rows:
+            i = self.row_of.get(r['employee_id'])
+            if i is None:
+                continue
+            emp_rows.append(i)
+            day_cols.append(self.day_index(r['work_date']))
+            counts.append(r['orders_count'] or 0)
+            flags.append(r['is_valid_workday'] == 1)
+        if emp_rows:
+            orders[emp_rows, day_cols] = counts
+            valid[emp_rows, day_cols] = flags
+            present[emp_rows, day_cols] = True
+
+        # 原始矩阵：出单数、是否有效工作日、是否有业绩记录
+        self.orders = orders
+        self.valid = valid
+        self.present = present
+
+        valid_orders = np.where(valid, orders, 0)
+        self._cum_orders = _prefix_sum(orders)
+        self._cum_valid_orders = _prefix_sum(valid_orders)
+        self._cum_valid_workday_orders = _prefix_sum(valid_orders * workday_mask)
+        self._cum_valid_days = _prefix_sum(valid.astype(np.int64))
+
+    def day_index(self, value):
+        """日期 → 矩阵列下标"""
+        if isinstance(value, str):
+            value = resolve_as_of(value)
+        return (value - self.origin).days
+
+    def recent_orders(self, day, days):
+        """截至 day（含）最近N个自然日的出单数"""
+        start = max(day - days + 1, 0)
+        return self._cum_orders[:, day + 1] - self._cum_orders[:, start]
+
+    def recent_workday_orders(self, day, count):
+        """
+        截至 day（含）最近N个工作日的有效出单数
+
+        Returns:
+            ndarray；加载范围内可追溯的工作日不足N天时返回 None
+        """
+        available = self._cum_workdays[day + 1]
+        if available < count:
+            return None
+        start = self._workday_positions[available - count]
+        return self._cum_valid_workday_orders[:, day + 1] - self._cum_valid_workday_orders[:, start]
+
+    def month_valid_workdays(self, day):
+        """day 所在月截至当日的有效工作日数"""
+        month_start = max(self.day_index(self.dates[day].replace(day=1)), 0)
+        return self._cum_valid_days[:, day + 1] - self._cum_valid_days[:, month_start]
+
+    def valid_orders_between(self, start_day, end_day):
+        """区间 [start_day, end_day] 内的有效出单数"""
+        start_day = max(start_day, 0)
+        return self._cum_valid_orders[:, end_day + 1] - self._cum_valid_orders[:, start_day]
+
+    def workdays_between(self, start_day, day):
+        """
+        按日期下标统计 [start_day, day] 之间的工作日数（向量化版本，start_day 为数组）
+        早于加载范围的部分不计入，由调用方补足
+        """
+        start_day = np.maximum(start_day, 0)
+        return self._cum_workdays[day + 1] - self._cum_workdays[start_day]
+
+    def count_workdays(self, start_date, day):
+        """
+        统计 start_date 到 day（均含）之间的工作日数
+        （与 count_workdays_between 口径一致，早于加载范围的部分回退到日历查询）
+        """
+        start = self.day_index(start_date)
+        if start > day:
+            return 0
+        if start >= 0:
+            return int(self._cum_workdays[day + 1] - self._cum_workdays[start])
+
+        before = self._workday_count_cache.get(start_date)
+        if before is None:
+            before = count_workdays_between(start_date, self.origin, include_start=True, include_end=False)
+            self._workday_count_cache[start_date] = before
+        return before + int(self._cum_workdays[day + 1])
@@ -2,26 +2,189 @@
 # -*- coding: utf-8 -*-
 """
 业绩重算核心模块
-用于工作日配置变更后重新计算员工业绩
+工作日配置变更后，按变更日期同步 performance.is_valid_workday，
+并刷新受影响的薪资台账、作废未确认的薪资快照
 """
 
-from datetime import datetime, timedelta
+import calendar
+from collections import defaultdict
+from datetime import date, datetime
 from core.database import query_db, get_db
 from core.workday import count_workdays_in_month
+from core.salary_ledger import adjust_valid_workdays, month_date_range
+from core.cache import invalidate_tags, performance_tag
+
+# 单条SQL中 IN (...) 的最大参数个数（低于SQLite默认上限999）
+SQL_CHUNK_SIZE = 500
+
+# 工作日口径：work_calendar 未配置的日期默认为工作日
+CALENDAR_FLAG_SQL = '''
+    COALESCE((SELECT c.is_workday FROM work_calendar c
+              WHERE c.calendar_date = performance.work_date), 1)
+'''
+
+
+def _normalize_dates(dates):
+    """日期去重并统一为 YYYY-MM-DD 字符串（升序）"""
+    result = set()
+    for d in dates:
+        if isinstance(d, datetime):
+            d = d.date()
+        result.add(str(d)[:10])
+    return sorted(result)
+
+
+def _chunks(items, size=SQL_CHUNK_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def propagate_calendar_changes(dates, db=None, progress=None):
+    """
+    将工作日配置变更同步到业绩数据
+
+    只处理传入日期上 is_valid_workday 与日历不一致的业绩行：
+    先查出将要翻转的行，再用一条集合式 UPDATE 写回，
+    随后按（员工, 月份）增量调整薪资台账的有效工作日数，
+    并作废对应月份未确认（pending）的薪资快照，使其回落到实时计算。
+
+    Args:
+        dates: 变更的日期列表（date 或 'YYYY-MM-DD'）
+        db: 数据库连接（传入时不提交，由调用方提交）
+        progress: 进度回调 progress(done, total, message)（后台任务使用）
+
+    Returns:
+        dict: 影响报告
+    """
+    own_transaction = db is None
+    if db is None:
+        db = get_db()
+
+    dates = _normalize_dates(dates)
+
+    # 1. 找出需要翻转的业绩行
+    flipped = []
+    for chunk in _chunks(dates):
+        placeholders = ','.join('?' * len(chunk))
+        flipped.extend(db.execute(f'''
+            SELECT id, employee_id, work_date, is_valid_workday,
+                   {CALENDAR_FLAG_SQL} AS target_flag
+            FROM performance
+            WHERE work_date IN ({placeholders})
+            AND is_valid_workday != {CALENDAR_FLAG_SQL}
+        ''', chunk).fetchall())
+
+    if progress:
+        progress(1, 3, f'{len(flipped)}条业绩需要更新')
+
+    # 2. 集合式更新
+    updated_rows = 0
+    if flipped:
+        for chunk in _chunks(dates):
+            placeholders = ','.join('?' * len(chunk))
+            cursor = db.execute(f'''
+                UPDATE performance
+                SET is_valid_workday = {CALENDAR_FLAG_SQL}
+                WHERE work_date IN ({placeholders})
+                AND is_valid_workday != {CALENDAR_FLAG_SQL}
+            ''', chunk)
+            updated_rows += cursor.rowcount
+
+    # 3. 按（员工, 月份）汇总有效工作日变化量，增量刷新台账
+    deltas = defaultdict(int)
+    changed_dates = set()
+    for row in flipped:
+        work_date = str(row['work_date'])[:10]
+        changed_dates.add(work_date)
+        deltas[(row['employee_id'], work_date[:7])] += row['target_flag'] - row['is_valid_workday']
+
+    ledger_deltas = [(emp_id, ym, delta) for (emp_id, ym), delta in deltas.items() if delta]
+    if ledger_deltas:
+        adjust_valid_workdays(db, ledger_deltas)
+    invalidate_tags(*{performance_tag(work_date) for work_date in changed_dates})
+
+    if progress:
+        progress(2, 3, '业绩与台账已更新')
+
+    # 4. 作废未确认的薪资快照，已确认/有异议的仅报告
+    affected_pairs = sorted(deltas.keys())
+    invalidated_salaries, locked_salaries, stale_payrolls = invalidate_salary_snapshots(db, affected_pairs)
+
+    if own_transaction:
+        db.commit()
+
+    if progress:
+        progress(3, 3, '完成')
+
+    affected_employees = {emp_id for emp_id, _ in affected_pairs}
+    affected_months = sorted({ym for _, ym in affected_pairs})
+
+    return {
+        'success': True,
+        'checked_dates': len(dates),
+        'changed_dates': sorted(changed_dates),
+        'updated_rows': updated_rows,
+        'affected_employees': len(affected_employees),
+        'affected_months': affected_months,
+        'ledger_rows_refreshed': len(ledger_deltas),
+        'invalidated_salaries': invalidated_salaries,
+        'locked_salaries': locked_salaries,
+        'stale_payrolls': stale_payrolls,
+        'message': f'{len(changed_dates)}个日期的{updated_rows}条业绩记录已同步工作日配置'
+    }
+
+
+def invalidate_salary_snapshots(db, pairs):
+    """
+    业绩变更后作废受影响（员工, 月份）未确认的薪资快照，使其回落到实时计算
+
+    已确认/有异议的薪资快照与未归档的工资单不做修改，只返回供调用方报告。
+    不提交，由调用方提交。
+
+    Args:
+        db: 数据库连接
+        pairs: [(employee_id, year_month), ...]
+
+    Returns:
+        tuple: (作废的快照数, 已锁定的薪资快照列表, 需复核的工资单列表)
+    """
+    invalidated_salaries = 0
+    locked_salaries = []
+    stale_payrolls = []
+    for chunk in _chunks(list(pairs), SQL_CHUNK_SIZE // 2):
+        condition = ' OR '.join(['(employee_id = ? AND year_month = ?)'] * len(chunk))
+        params = [value for pair in chunk for value in pair]
+
+        locked_salaries.extend(dict(r) for r in db.execute(f'''
+            SELECT employee_id, year_month, status FROM salary
+            WHERE ({condition}) AND status != 'pending'
+        ''', params).fetchall())
+
+        invalidated_salaries += db.execute(f'''
+            DELETE FROM salary WHERE ({condition}) AND status = 'pending'
+        ''', params).rowcount
+
+        stale_payrolls.extend(dict(r) for r in db.execute(f'''
+            SELECT id, employee_id, year_month, status FROM payroll_records
+            WHERE ({condition}) AND is_archived = 0
+            AND status IN ('pending', 'confirmed')
+        ''', params).fetchall())
+
+    return invalidated_salaries, locked_salaries, stale_payrolls
 
 
 def get_affected_employees(year_month):
     """
     获取指定月份的所有活跃员工
-    
+
     Args:
         year_month: str, 格式 'YYYY-MM'
-    
+
     Returns:
         list: 员工ID列表
     """
-    year, month = map(int, year_month.split('-'))
-    
+    start, end = month_date_range(year_month)
+
     # 获取该月份有业绩记录的所有员工
     employees = query_db('''
         SELECT DISTINCT e.id, e.employee_no, e.name, e.status
@@ -30,57 +193,37 @@ def get_affected_employees(year_month):
         AND EXISTS (
             SELECT 1 FROM performance p
             WHERE p.employee_id = e.id
-            AND strftime('%Y-%m', p.work_date) = ?
+            AND p.work_date >= ? AND p.work_date < ?
         )
         ORDER BY e.employee_no
-    ''', [year_month])
-    
+    ''', [start, end])
+
     return employees if employees else []
 
 
 def recalculate_employee_month_attendance(employee_id, year_month):
     """
-    重新计算员工的月度出勤统计
-    基于最新的工作日配置
-    
+    统计员工的月度出勤情况
+
     Args:
         employee_id: int, 员工ID
         year_month: str, 格式 'YYYY-MM'
-    
+
     Returns:
-        dict: 更新后的出勤统计
+        dict: 出勤统计
     """
-    # 获取该月的所有业绩记录
-    performances = query_db('''
-        SELECT work_date, attendance, orders_count
+    start, end = month_date_range(year_month)
+
+    stats = query_db('''
+        SELECT COUNT(CASE WHEN is_valid_workday = 1 THEN 1 END) as valid_days
         FROM performance
-        WHERE employee_id = ? AND strftime('%Y-%m', work_date) = ?
-        ORDER BY work_date
-    ''', [employee_id, year_month])
-    
-    if not performances:
-        return {
-            'valid_work_days': 0,
-            'total_work_days': 0,
-            'attendance_rate': 0
-        }
-    
-    # 计算有效出勤天数（出勤且是工作日）
-    from core.workday import is_workday
-    
-    valid_days = 0
+        WHERE employee_id = ? AND work_date >= ? AND work_date < ?
+    ''', [employee_id, start, end], one=True)
+
+    valid_days = stats['valid_days'] or 0
     total_workdays = count_workdays_in_month(year_month)
-    
-    for perf in performances:
-        work_date = perf['work_date']
-        attendance = perf['attendance']
-        
-        # 只有出勤且确实是工作日才计入
-        if attendance == 1 and is_workday(work_date):
-            valid_days += 1
-    
     attendance_rate = (valid_days / total_workdays * 100) if total_workdays > 0 else 0
-    
+
     return {
         'valid_work_days': valid_days,
         'total_work_days': total_workdays,
@@ -88,97 +231,62 @@ def recalculate_employee_month_attendance(employee_id, year_month):
     }
 
 
-def recalculate_month_performance(year_month):
+def recalculate_month_performance(year_month, progress=None):
     """
-    重新计算指定月份所有员工的业绩统计
-    
+    按最新工作日配置重新同步指定月份的业绩
+
+    等价于对该月每一天调用 propagate_calendar_changes，
+    只有与日历不一致的业绩行会被更新。
+
     Args:
         year_month: str, 格式 'YYYY-MM'
-    
+        progress: 进度回调（后台任务使用）
+
     Returns:
-        dict: 结果统计
+        dict: 影响报告
     """
-    employees = get_affected_employees(year_month)
-    
-    if not employees:
-        return {
-            'success': True,
-            'recalculated_count': 0,
-            'message': '该月份没有员工业绩数据'
-        }
-    
-    db = get_db()
-    cursor = db.cursor()
-    
-    recalculated_count = 0
-    errors = []
-    
-    for emp in employees:
-        try:
-            employee_id = emp['id']
-            
-            # 重新计算出勤统计
-            attendance_stats = recalculate_employee_month_attendance(employee_id, year_month)
-            
-            # 获取该月的总单数和总金额
-            summary = query_db('''
-                SELECT 
-                    COALESCE(SUM(orders_count), 0) as total_orders,
-                    COALESCE(SUM(revenue), 0) as total_revenue
-                FROM performance
-                WHERE employee_id = ? AND strftime('%Y-%m', work_date) = ?
-            ''', [employee_id, year_month], one=True)
-            
-            # 注意：这里不更新薪资计算，因为薪资是在查询时动态计算的
-            # 我们只需要确保业绩数据的工作日统计是准确的
-            
-            # 记录日志（可选）
-            # log_performance_recalculation(employee_id, year_month, attendance_stats)
-            
-            recalculated_count += 1
-            
-        except Exception as e:
-            errors.append(f"员工 {emp['employee_no']} 重算失败: {str(e)}")
-    
-    db.commit()
-    
-    return {
-        'success': len(errors) == 0,
-        'recalculated_count': recalculated_count,
-        'total_employees': len(employees),
-        'errors': errors if errors else None,
-        'message': f'成功重新计算 {recalculated_count}/{len(employees)} 名员工的业绩'
-    }
+    year, month = map(int, year_month.split('-'))
+    days = calendar.monthrange(year, month)[1]
+    dates = [date(year, month, d) for d in range(1, days + 1)]
+
+    result = propagate_calendar_changes(dates, progress=progress)
+    result['recalculated_count'] = result['affected_employees']
+
+    return result
 
 
 def validate_workday_impact(year_month):
     """
     验证工作日配置变更对业绩的影响
-    
+
     Args:
         year_month: str, 格式 'YYYY-MM'
-    
+
     Returns:
         dict: 影响分析
     """
+    start, end = month_date_range(year_month)
+
     # 统计该月工作日数量
     total_workdays = count_workdays_in_month(year_month)
-    
+
     # 统计有多少员工受影响
     affected_employees = get_affected_employees(year_month)
-    
-    # 统计该月的总业绩记录数
-    perf_count = query_db('''
-        SELECT COUNT(*) as count
+
+    # 统计该月的总业绩记录数，以及与当前日历不一致的记录数
+    perf_count = query_db(f'''
+        SELECT COUNT(*) as count,
+               COUNT(CASE WHEN is_valid_workday != {CALENDAR_FLAG_SQL} THEN 1 END) as out_of_sync
         FROM performance
-        WHERE strftime('%Y-%m', work_date) = ?
-    ''', [year_month], one=True)
-    
+        WHERE work_date >= ? AND work_date < ?
+    ''', [start, end], one=True)
+
     return {
         'year_month': year_month,
         'total_workdays': total_workdays,
         'affected_employees': len(affected_employees),
         'performance_records': perf_count['count'] if perf_count else 0,
+        'out_of_sync_records': perf_count['out_of_sync'] if perf_count else 0,
         'employees': [
             {
                 'id': emp['id'],
@@ -189,4 +297,3 @@ def validate_workday_impact(year_month):
             for emp in affected_employees[:10]  # 只返回前10个作为示例
         ]
     }
-
@@ -5,9 +5,11 @@
 处理员工晋级的触发、审批、确认流程
 """
 
-from datetime import datetime, date, timedelta
+from datetime import datetime, timedelta
 from core.database import query_db, get_db
-from core.workday import count_workdays_between, get_recent_workdays, get_next_workday
+from core.workday import count_workdays_between, get_next_workday, resolve_as_of
+from core.cache import invalidate_employee_tags
+from core.status_engine import get_recent_workday_orders
 from core.audit import log_promotion_trigger, log_promotion_approval, log_promotion_override
 from core.notifications import create_notification
 
@@ -42,262 +44,218 @@ PROMOTION_RULES = {
 }
 
 
-# ==================== 晋级检测函数 ====================
+# ==================== 晋级规则判断（纯函数） ====================
 
-def check_trainee_to_c_eligible(employee_id):
+def evaluate_trainee_to_c(workdays, assessment_passed, rules=None):
     """
-    检查培训期→C级晋级资格
-    
+    培训期→C级规则判断
+
+    Args:
+        workdays: 培训期已满工作日数
+        assessment_passed: 是否已通过培训考核
+        rules: 规则配置（默认 PROMOTION_RULES）
+
     Returns:
-        dict: {
-            'eligible': bool,
-            'workdays': int,
-            'has_assessment': bool,
-            'assessment_passed': bool,
-            'reason': str
-        }
+        dict: {'eligible', 'workdays', 'has_assessment', 'assessment_passed', 'reason'}
     """
-    # 获取员工信息
-    employee = query_db(
-        'SELECT * FROM employees WHERE id = ? AND status = ?',
-        [employee_id, 'trainee'],
-        one=True
-    )
-    
-    if not employee:
-        return {'eligible': False, 'reason': '员工不存在或状态不是培训期'}
-    
-    # 获取状态变更历史（计算在培训期的天数）
-    last_change = query_db(
-        'SELECT * FROM status_history WHERE employee_id = ? ORDER BY change_date DESC LIMIT 1',
-        [employee_id],
-        one=True
-    )
-    
-    # 计算工作日数
-    if last_change:
-        status_start_date = last_change['change_date']
-        if isinstance(status_start_date, str):
-            status_start_date = datetime.strptime(status_start_date, '%Y-%m-%d').date()
-    else:
-        # 没有变更历史，使用入职日期
-        join_date = employee['join_date']
-        if isinstance(join_date, str):
-            join_date = datetime.strptime(join_date, '%Y-%m-%d').date()
-        status_start_date = join_date
-    
-    today = date.today()
-    workdays = count_workdays_between(status_start_date, today, include_start=True, include_end=True)
-    
-    # 检查工作日要求
-    rule = PROMOTION_RULES['trainee_to_C']
+    rule = (rules or PROMOTION_RULES)['trainee_to_C']
     workdays_met = workdays >= rule['workdays_required']
-    
-    # 检查培训考核
-    assessment = query_db('''
-        SELECT * FROM training_assessments
-        WHERE employee_id = ?
-        AND both_passed = 1
-        ORDER BY assessment_date DESC
-        LIMIT 1
-    ''', [employee_id], one=True)
-    
-    has_assessment = assessment is not None
-    assessment_passed = has_assessment
-    
+
     # 综合判断
     eligible = workdays_met and assessment_passed
-    
-    reason = ''
+
     if not workdays_met:
         reason = f'工作日不足（当前{workdays}天，需要{rule["workdays_required"]}天）'
     elif not assessment_passed:
         reason = '未通过培训考核'
     else:
         reason = f'已满足晋级条件（工作{workdays}天，已通过考核）'
-    
+
     return {
         'eligible': eligible,
         'workdays': workdays,
-        'has_assessment': has_assessment,
+        'has_assessment': assessment_passed,
         'assessment_passed': assessment_passed,
         'reason': reason
     }
 
 
-def check_c_to_b_eligible(employee_id):
+def evaluate_cycle_promotion(rule_key, workdays_in_status, recent_orders, rules=None):
     """
-    检查C级→B级晋级资格
-    
+    C级→B级 / B级→A级规则判断
+
+    Args:
+        rule_key: 'C_to_B' 或 'B_to_A'
+        workdays_in_status: 在当前级别的工作日数
+        recent_orders: 最近N个工作日有效出单数，可追溯工作日不足时为 None
+        rules: 规则配置（默认 PROMOTION_RULES）
+
     Returns:
-        dict: {
-            'eligible': bool,
-            'workdays_in_c': int,
-            'recent_orders': int,
-            'reason': str
-        }
+        dict: {'eligible', 'workdays_in_c'/'workdays_in_b', 'recent_orders', 'reason'}
     """
-    employee = query_db(
-        'SELECT * FROM employees WHERE id = ? AND status = ?',
-        [employee_id, 'C'],
-        one=True
-    )
-    
-    if not employee:
-        return {'eligible': False, 'reason': '员工不存在或状态不是C级'}
-    
-    # 获取C级开始日期
-    last_change = query_db(
-        'SELECT * FROM status_history WHERE employee_id = ? AND to_status = ? ORDER BY change_date DESC LIMIT 1',
-        [employee_id, 'C'],
-        one=True
-    )
-    
-    if last_change:
-        c_start_date = last_change['change_date']
-        if isinstance(c_start_date, str):
-            c_start_date = datetime.strptime(c_start_date, '%Y-%m-%d').date()
-    else:
-        # 没有变更到C级的记录，可能是直接创建的，使用入职日期
-        join_date = employee['join_date']
-        if isinstance(join_date, str):
-            join_date = datetime.strptime(join_date, '%Y-%m-%d').date()
-        c_start_date = join_date
-    
-    today = date.today()
-    workdays_in_c = count_workdays_between(c_start_date, today, include_start=True, include_end=True)
-    
-    # 检查周期要求
-    rule = PROMOTION_RULES['C_to_B']
-    workdays_met = workdays_in_c <= rule['max_workdays']
-    
-    # 获取最近N个工作日的出单数
-    recent_workdays = get_recent_workdays(today, rule['recent_days'], include_end=True)
-    if len(recent_workdays) < rule['recent_days']:
+    rule = (rules or PROMOTION_RULES)[rule_key]
+    level = rule['from_status']
+    workdays_key = f'workdays_in_{level.lower()}'
+
+    if recent_orders is None:
         return {
             'eligible': False,
-            'workdays_in_c': workdays_in_c,
+            workdays_key: workdays_in_status,
             'recent_orders': 0,
             'reason': f'工作日数不足{rule["recent_days"]}天'
         }
-    
-    # 计算出单数
-    date_placeholders = ','.join('?' * len(recent_workdays))
-    date_strs = [d.strftime('%Y-%m-%d') for d in recent_workdays]
-    
-    result = query_db(f'''
-        SELECT SUM(orders_count) as total_orders
-        FROM performance
-        WHERE employee_id = ?
-        AND work_date IN ({date_placeholders})
-        AND is_valid_workday = 1
-    ''', [employee_id] + date_strs, one=True)
-    
-    recent_orders = result['total_orders'] if result and result['total_orders'] else 0
+
+    # 检查周期要求与出单要求
+    workdays_met = workdays_in_status <= rule['max_workdays']
     orders_met = recent_orders >= rule['min_orders']
-    
+
     # 综合判断
     eligible = workdays_met and orders_met
-    
-    reason = ''
+
     if not workdays_met:
-        reason = f'C级周期过长（当前{workdays_in_c}天，要求≤{rule["max_workdays"]}天）'
+        reason = f'{level}级周期过长（当前{workdays_in_status}天，要求≤{rule["max_workdays"]}天）'
     elif not orders_met:
         reason = f'最近{rule["recent_days"]}个工作日出单不足（当前{recent_orders}单，要求≥{rule["min_orders"]}单）'
     else:
-        reason = f'已满足晋级条件（C级{workdays_in_c}天，最近{rule["recent_days"]}日出单{recent_orders}单）'
-    
+        reason = f'已满足晋级条件（{level}级{workdays_in_status}天，最近{rule["recent_days"]}日出单{recent_orders}单）'
+
     return {
         'eligible': eligible,
-        'workdays_in_c': workdays_in_c,
+        workdays_key: workdays_in_status,
         'recent_orders': recent_orders,
         'reason': reason
     }
 
 
-def check_b_to_a_eligible(employee_id):
+# ==================== 晋级检测函数 ====================
+
+def _status_start_date(employee, to_status, as_of):
     """
-    检查B级→A级晋级资格
+    获取员工进入当前级别的日期（as_of 之前最后一次变更，没有记录时使用入职日期）
+
+    Args:
+        to_status: 变更到的状态，None 表示任意状态
+    """
+    sql = 'SELECT change_date FROM status_history WHERE employee_id = ? AND change_date <= ?'
+    params = [employee['id'], as_of.strftime('%Y-%m-%d')]
+    if to_status:
+        sql += ' AND to_status = ?'
+        params.append(to_status)
+    last_change = query_db(sql + ' ORDER BY change_date DESC LIMIT 1', params, one=True)
+
+    start_date = last_change['change_date'] if last_change else employee['join_date']
+    if isinstance(start_date, str):
+        start_date = datetime.strptime(start_date[:10], '%Y-%m-%d').date()
+    return start_date
+
+
+def check_trainee_to_c_eligible(employee_id, as_of=None):
+    """
+    检查培训期→C级晋级资格
+    
+    Args:
+        employee_id: 员工ID
+        as_of: 基准日期（默认今天）
+    
+    Returns:
+        dict: {
+            'eligible': bool,
+            'workdays': int,
+            'has_assessment': bool,
+            'assessment_passed': bool,
+            'reason': str
+        }
     """
+    # 获取员工信息
     employee = query_db(
         'SELECT * FROM employees WHERE id = ? AND status = ?',
-        [employee_id, 'B'],
+        [employee_id, 'trainee'],
         one=True
     )
     
     if not employee:
-        return {'eligible': False, 'reason': '员工不存在或状态不是B级'}
+        return {'eligible': False, 'reason': '员工不存在或状态不是培训期'}
     
-    # 获取B级开始日期
-    last_change = query_db(
-        'SELECT * FROM status_history WHERE employee_id = ? AND to_status = ? ORDER BY change_date DESC LIMIT 1',
-        [employee_id, 'B'],
-        one=True
-    )
+    as_of = resolve_as_of(as_of)
     
-    if last_change:
-        b_start_date = last_change['change_date']
-        if isinstance(b_start_date, str):
-            b_start_date = datetime.strptime(b_start_date, '%Y-%m-%d').date()
-    else:
-        join_date = employee['join_date']
-        if isinstance(join_date, str):
-            join_date = datetime.strptime(join_date, '%Y-%m-%d').date()
-        b_start_date = join_date
+    # 计算在培训期的工作日数
+    status_start_date = _status_start_date(employee, None, as_of)
+    workdays = count_workdays_between(status_start_date, as_of, include_start=True, include_end=True)
     
-    today = date.today()
-    workdays_in_b = count_workdays_between(b_start_date, today, include_start=True, include_end=True)
+    # 检查培训考核
+    assessment = query_db('''
+        SELECT * FROM training_assessments
+        WHERE employee_id = ?
+        AND both_passed = 1
+        AND assessment_date <= ?
+        ORDER BY assessment_date DESC
+        LIMIT 1
+    ''', [employee_id, as_of.strftime('%Y-%m-%d')], one=True)
     
-    # 检查周期要求
-    rule = PROMOTION_RULES['B_to_A']
-    workdays_met = workdays_in_b <= rule['max_workdays']
+    return evaluate_trainee_to_c(workdays, assessment is not None)
+
+
+def check_c_to_b_eligible(employee_id, as_of=None):
+    """
+    检查C级→B级晋级资格
     
-    # 获取最近N个工作日的出单数
-    recent_workdays = get_recent_workdays(today, rule['recent_days'], include_end=True)
-    if len(recent_workdays) < rule['recent_days']:
-        return {
-            'eligible': False,
-            'workdays_in_b': workdays_in_b,
-            'recent_orders': 0,
-            'reason': f'工作日数不足{rule["recent_days"]}天'
+    Args:
+        employee_id: 员工ID
+        as_of: 基准日期（默认今天）
+    
+    Returns:
+        dict: {
+            'eligible': bool,
+            'workdays_in_c': int,
+            'recent_orders': int,
+            'reason': str
         }
+    """
+    return _check_cycle_eligible(employee_id, 'C_to_B', as_of)
+
+
+def check_b_to_a_eligible(employee_id, as_of=None):
+    """
+    检查B级→A级晋级资格
+    """
+    return _check_cycle_eligible(employee_id, 'B_to_A', as_of)
+
+
+def _check_cycle_eligible(employee_id, rule_key, as_of=None):
+    """按周期+出单规则检查晋级资格（C→B、B→A 共用）"""
+    rule = PROMOTION_RULES[rule_key]
+    level = rule['from_status']
     
-    date_placeholders = ','.join('?' * len(recent_workdays))
-    date_strs = [d.strftime('%Y-%m-%d') for d in recent_workdays]
+    employee = query_db(
+        'SELECT * FROM employees WHERE id = ? AND status = ?',
+        [employee_id, level],
+        one=True
+    )
     
-    result = query_db(f'''
-        SELECT SUM(orders_count) as total_orders
-        FROM performance
-        WHERE employee_id = ?
-        AND work_date IN ({date_placeholders})
-        AND is_valid_workday = 1
-    ''', [employee_id] + date_strs, one=True)
+    if not employee:
+        return {'eligible': False, 'reason': f'员工不存在或状态不是{level}级'}
     
-    recent_orders = result['total_orders'] if result and result['total_orders'] else 0
-    orders_met = recent_orders >= rule['min_orders']
+    as_of = resolve_as_of(as_of)
     
-    eligible = workdays_met and orders_met
+    # 获取当前级别开始日期（没有变更记录的可能是直接创建的，使用入职日期）
+    start_date = _status_start_date(employee, level, as_of)
+    workdays_in_status = count_workdays_between(start_date, as_of, include_start=True, include_end=True)
     
-    reason = ''
-    if not workdays_met:
-        reason = f'B级周期过长（当前{workdays_in_b}天，要求≤{rule["max_workdays"]}天）'
-    elif not orders_met:
-        reason = f'最近{rule["recent_days"]}个工作日出单不足（当前{recent_orders}单，要求≥{rule["min_orders"]}单）'
-    else:
-        reason = f'已满足晋级条件（B级{workdays_in_b}天，最近{rule["recent_days"]}日出单{recent_orders}单）'
+    # 获取最近N个工作日的出单数
+    recent_orders = get_recent_workday_orders(employee_id, rule['recent_days'], as_of)
     
-    return {
-        'eligible': eligible,
-        'workdays_in_b': workdays_in_b,
-        'recent_orders': recent_orders,
-        'reason': reason
-    }
+    return evaluate_cycle_promotion(rule_key, workdays_in_status, recent_orders)
 
 
-def trigger_promotion_confirmation(employee_id):
+def trigger_promotion_confirmation(employee_id, as_of=None):
+
     """
     触发晋级确认流程
     
+    Args:
+        employee_id: 员工ID
+        as_of: 基准日期（默认今天），同时作为触发日期
+    
     Returns:
         dict: {
             'success': bool,
@@ -332,13 +290,13 @@ def trigger_promotion_confirmation(employee_id):
     to_status = None
     
     if current_status == 'trainee':
-        check_result = check_trainee_to_c_eligible(employee_id)
+        check_result = check_trainee_to_c_eligible(employee_id, as_of)
         to_status = 'C'
     elif current_status == 'C':
-        check_result = check_c_to_b_eligible(employee_id)
+        check_result = check_c_to_b_eligible(employee_id, as_of)
         to_status = 'B'
     elif current_status == 'B':
-        check_result = check_b_to_a_eligible(employee_id)
+        check_result = check_b_to_a_eligible(employee_id, as_of)
         to_status = 'A'
     else:
         return {'success': False, 'message': f'状态{current_status}无晋级路径'}
@@ -350,7 +308,7 @@ def trigger_promotion_confirmation(employee_id):
     db = get_db()
     cursor = db.cursor()
     
-    trigger_date = date.today()
+    trigger_date = resolve_as_of(as_of)
     
     cursor.execute('''
         INSERT INTO promotion_confirmations (
@@ -409,10 +367,13 @@ def notify_manager_promotion_pending(team, promotion_id, employee):
         )
 
 
-def approve_promotion(promotion_id, approver_id, approver_name, approver_role):
+def approve_promotion(promotion_id, approver_id, approver_name, approver_role, as_of=None):
     """
     批准晋级
     
+    Args:
+        as_of: 审批日期（默认今天），下一个工作日生效
+    
     Returns:
         dict: {'success': bool, 'message': str}
     """
@@ -429,7 +390,7 @@ def approve_promotion(promotion_id, approver_id, approver_name, approver_role):
         return {'success': False, 'message': f'当前状态为{promotion["status"]}，不可批准'}
     
     # 计算生效日期（下一个工作日）
-    effective_date = get_next_workday(date.today(), offset=1)
+    effective_date = get_next_workday(resolve_as_of(as_of), offset=1)
     
     db = get_db()
     cursor = db.cursor()
@@ -466,6 +427,7 @@ def approve_promotion(promotion_id, approver_id, approver_name, approver_role):
         effective_date,
         f'晋级确认通过（{approver_name}批准）'
     ))
+    invalidate_employee_tags(employee_ids=[promotion['employee_id']])
     
     db.commit()
     
@@ -589,6 +551,7 @@ def override_promotion(promotion_id, admin_id, admin_name, reason):
             SET status = ?
             WHERE id = ?
         ''', (promotion['from_status'], promotion['employee_id']))
+        invalidate_employee_tags(employee_ids=[promotion['employee_id']])
     
     db.commit()
     
@@ -601,26 +564,35 @@ def override_promotion(promotion_id, admin_id, admin_name, reason):
     return {'success': True, 'message': '晋级已被管理员否决'}
 
 
-def check_all_employees_for_promotion():
+def check_all_employees_for_promotion(progress=None, as_of=None):
     """
     批量检查所有员工的晋级资格（定时任务）
     
+    Args:
+        progress: 进度回调 progress(done, total, message)（后台任务使用）
+        as_of: 基准日期（默认今天），只检查该日期前已入职的员工
+    
     Returns:
         dict: {'triggered_count': int, 'details': list}
     """
+    as_of = resolve_as_of(as_of)
+    
     # 获取所有在职员工
     employees = query_db('''
         SELECT id, employee_no, name, status
         FROM employees
         WHERE is_active = 1
         AND status IN ('trainee', 'C', 'B')
-    ''')
+        AND join_date <= ?
+    ''', [as_of.strftime('%Y-%m-%d')])
     
     triggered_count = 0
     details = []
     
-    for emp in employees:
-        result = trigger_promotion_confirmation(emp['id'])
+    for index, emp in enumerate(employees, start=1):
+        if progress:
+            progress(index, len(employees), emp['employee_no'])
+        result = trigger_promotion_confirmation(emp['id'], as_of)
         if result['success']:
             triggered_count += 1
             details.append({
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+规则回放模块
+在一个进程内按日期逐日回放状态流转、晋级、保级规则，不写数据库。
+日历与业绩一次性加载为矩阵（见 core.performance_matrix），每天只做数组取值，
+可在上线前用历史数据验证规则调整的影响。
+
+回放口径：
+    - 状态流转规则（status_engine）驱动员工状态，当天判定当天生效；
+    - 晋级资格（promotion_engine）与降级预警（challenge_engine）只记录触发事件，
+      不模拟审批：同一级别内晋级只触发一次，降级预警每月不超过 monthly_limit 次；
+    - 三类规则都基于当天开始时的状态判断。
+"""
+
+import copy
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from core.database import query_db
+from core.workday import resolve_as_of
+from core.performance_matrix import PerformanceMatrix
+from core.status_engine import STATUS_RULES, evaluate_status_transition
+from core.promotion_engine import PROMOTION_RULES, evaluate_trainee_to_c, evaluate_cycle_promotion
+from core.challenge_engine import CHALLENGE_RULES, evaluate_demotion_alert
+from core.salary_engine import SALARY_RULES
+
+REPLAY_ENGINES = ('status', 'promotion', 'challenge')
+
+# 可晋级的状态 → 晋级规则
+_PROMOTION_PATHS = {'trainee': 'trainee_to_C', 'C': 'C_to_B', 'B': 'B_to_A'}
+
+
+def _to_date(value):
+    if isinstance(value, str):
+        return datetime.strptime(value[:10], '%Y-%m-%d').date()
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+def merge_rules(overrides=None):
+    """
+    在默认规则上叠加覆盖项
+
+    Args:
+        overrides: {'status': {...}, 'promotion': {...}, 'challenge': {...}, 'salary': {...}}，
+                   可只给出需要调整的字段，如 {'status': {'C': {'min_orders': 4}}}
+
+    Returns:
+        dict: 完整规则 {'status', 'promotion', 'challenge', 'salary'}
+    """
+    rules = {
+        'status': copy.deepcopy(STATUS_RULES),
+        'promotion': copy.deepcopy(PROMOTION_RULES),
+        'challenge': copy.deepcopy(CHALLENGE_RULES),
+        'salary': copy.deepcopy(SALARY_RULES)
+    }
+
+    def merge(target, source):
+        for key, value in source.items():
+            if isinstance(value, dict) and isinstance(target.get(key), dict):
+                merge(target[key], value)
+            else:
+                target[key] = value
+
+    merge(rules, overrides or {})
+    return rules
+
+
+def load_replay_employees(start_date, end_date, employee_ids=None):
+    """
+    加载回放员工及其在起始日的初始状态
+
+    包括期间内离职的员工（离职/淘汰的员工正是回放需要对比的对象），leave_date 之后不再参与回放
+    """
+    sql = '''
+        SELECT id, employee_no, name, team, status, join_date, leave_date
+        FROM employees
+        WHERE join_date <= ? AND (leave_date IS NULL OR leave_date >= ?)
+    '''
+    params = [end_date.strftime('%Y-%m-%d'), start_date.strftime('%Y-%m-%d')]
+    if employee_ids:
+        sql += f" AND id IN ({','.join('?' * len(employee_ids))})"
+        params.extend(employee_ids)
+    employees = [dict(e) for e in query_db(sql + ' ORDER BY id', params)]
+
+    history = {}
+    for row in query_db('''
+        SELECT employee_id, from_status, to_status, change_date
+        FROM status_history
+        ORDER BY employee_id, change_date, id
+    '''):
+        history.setdefault(row['employee_id'], []).append(row)
+
+    assessments = {
+        r['employee_id']: _to_date(r['passed_date'])
+        for r in query_db('''
+            SELECT employee_id, MIN(assessment_date) AS passed_date
+            FROM training_assessments
+            WHERE both_passed = 1
+            GROUP BY employee_id
+        ''')
+    }
+
+    for emp in employees:
+        emp['join_date'] = _to_date(emp['join_date'])
+        emp['leave_date'] = _to_date(emp['leave_date']) if emp['leave_date'] else None
+        rows = history.get(emp['id'], [])
+        before = [r for r in rows if _to_date(r['change_date']) < start_date]
+
+        # 起始日状态：起始日前最后一次变更；否则为第一次变更前的状态；都没有则取当前状态
+        if before:
+            emp['status'] = before[-1]['to_status']
+            emp['status_start'] = _to_date(before[-1]['change_date'])
+        else:
+            if rows and rows[0]['from_status']:
+                emp['status'] = rows[0]['from_status']
+            emp['status_start'] = emp['join_date']
+
+        emp['assessment_date'] = assessments.get(emp['id'])
+
+    return employees
+
+
+def load_baseline_transitions(start_date, end_date, employee_ids):
+    """区间内实际发生的状态变更（用于与回放结果对比）"""
+    rows = query_db('''
+        SELECT employee_id, from_status, to_status
+        FROM status_history
+        WHERE change_date >= ? AND change_date <= ?
+    ''', [start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')])
+    return Counter(
+        f"{r['from_status']}→{r['to_status']}" for r in rows if r['employee_id'] in employee_ids
+    )
+
+
+def replay_rules(start_date, end_date, employee_ids=None, rules=None,
+                 engines=REPLAY_ENGINES, max_events=None, progress=None):
+    """
+    按日期回放规则
+
+    Args:
+        start_date: 起始日期
+        end_date: 结束日期（含）
+        employee_ids: 只回放指定员工（默认全部在职员工）
+        rules: 规则覆盖项（见 merge_rules）
+        engines: 参与回放的规则引擎，取自 REPLAY_ENGINES
+        max_events: 返回的事件明细上限（汇总不受影响），None 表示不限
+        progress: 进度回调 progress(done, total, message)（后台任务使用）
+
+    Returns:
+        dict: {
+            'success', 'start_date', 'end_date', 'days', 'employees',
+            'events': 事件明细 [{date, engine, employee_id, employee_no, name, team,
+                                from_status, to_status, reason}],
+            'summary': {'by_engine', 'transitions', 'baseline_transitions', 'final_status'},
+            'elapsed_ms'
+        }
+    """
+    started = time.perf_counter()
+    start_date = resolve_as_of(start_date)
+    end_date = resolve_as_of(end_date)
+    if start_date > end_date:
+        return {'success': False, 'message': '开始日期不能晚于结束日期'}
+
+    unknown = set(engines) - set(REPLAY_ENGINES)
+    if unknown:
+        return {'success': False, 'message': f'未知的规则引擎：{"、".join(sorted(unknown))}'}
+
+    rules = merge_rules(rules)
+    employees = load_replay_employees(start_date, end_date, employee_ids)
+    matrix = PerformanceMatrix(start_date, end_date, [e['id'] for e in employees])
+
+    status_rules = rules['status']
+    promotion_rules = rules['promotion']
+    challenge_rules = rules['challenge']
+    alert_rule = challenge_rules['trigger_threshold']
+
+    events = []
+    by_engine = Counter()
+    transitions = Counter()
+    promoted_in_stint = set()      # 当前级别内已触发晋级的员工
+    alerts_in_month = Counter()    # (员工, 月份) → 降级预警次数
+
+    def record(engine, emp, day_date, to_status, reason):
+        by_engine[engine] += 1
+        if engine == 'status':
+            transitions[f"{emp['status']}→{to_status}"] += 1
+        if max_events is None or len(events) < max_events:
+            events.append({
+                'date': day_date.strftime('%Y-%m-%d'),
+                'engine': engine,
+                'employee_id': emp['id'],
+                'employee_no': emp['employee_no'],
+                'name': emp['name'],
+                'team': emp['team'],
+                'from_status': emp['status'],
+                'to_status': to_status,
+                'reason': reason
+            })
+
+    total_days = (end_date - start_date).days + 1
+    for offset in range(total_days):
+        day_date = start_date + timedelta(days=offset)
+        day = matrix.day_index(day_date)
+        year_month = day_date.strftime('%Y-%m')
+
+        # 当天各窗口的全员数组，按需计算后转为列表
+        columns = {}
+
+        def column(key, compute):
+            if key not in columns:
+                values = compute()
+                columns[key] = values.tolist() if values is not None else None
+            return columns[key]
+
+        changes = []
+        for i, emp in enumerate(employees):
+            status = emp['status']
+            if emp['join_date'] > day_date or status == 'eliminated':
+                continue
+            if emp['leave_date'] and emp['leave_date'] < day_date:
+                continue
+
+            # 状态流转
+            if 'status' in engines:
+                result = evaluate_status_transition(
+                    status,
+                    (day_date - emp['status_start']).days,
+                    day_date,
+                    recent_orders=lambda days: column(('recent', days), lambda: matrix.recent_orders(day, days))[i],
+                    month_valid_workdays=lambda: column(('month',), lambda: matrix.month_valid_workdays(day))[i],
+                    rules=status_rules
+                )
+                if result['should_change']:
+                    changes.append((emp, result))
+
+            # 晋级资格
+            rule_key = _PROMOTION_PATHS.get(status)
+            if 'promotion' in engines and rule_key and emp['id'] not in promoted_in_stint:
+                workdays = matrix.count_workdays(emp['status_start'], day)
+                if rule_key == 'trainee_to_C':
+                    passed = emp['assessment_date'] is not None and emp['assessment_date'] <= day_date
+                    check = evaluate_trainee_to_c(workdays, passed, promotion_rules)
+                else:
+                    recent_days = promotion_rules[rule_key]['recent_days']
+                    orders = column(('workday', recent_days), lambda: matrix.recent_workday_orders(day, recent_days))
+                    check = evaluate_cycle_promotion(
+                        rule_key, workdays, orders[i] if orders else None, promotion_rules
+                    )
+                if check['eligible']:
+                    promoted_in_stint.add(emp['id'])
+                    record('promotion', emp, day_date, promotion_rules[rule_key]['to_status'], check['reason'])
+
+            # 降级预警
+            if ('challenge' in engines and status == 'A'
+                    and alerts_in_month[(emp['id'], year_month)] < challenge_rules['monthly_limit']):
+                recent_days = alert_rule['recent_days']
+                orders = column(('workday', recent_days), lambda: matrix.recent_workday_orders(day, recent_days))
+                check = evaluate_demotion_alert(orders[i] if orders else None, challenge_rules)
+                if check['should_alert']:
+                    alerts_in_month[(emp['id'], year_month)] += 1
+                    record('challenge', emp, day_date, 'C', check['reason'])
+
+        # 当天的状态变更统一在判断完成后生效
+        for emp, result in changes:
+            record('status', emp, day_date, result['new_status'], result['reason'])
+            emp['status'] = result['new_status']
+            emp['status_start'] = day_date
+            promoted_in_stint.discard(emp['id'])
+
+        if progress:
+            progress(offset + 1, total_days, day_date.strftime('%Y-%m-%d'))
+
+    employee_id_set = {e['id'] for e in employees}
+    return {
+        'success': True,
+        'start_date': start_date.strftime('%Y-%m-%d'),
+        'end_date': end_date.strftime('%Y-%m-%d'),
+        'days': total_days,
+        'employees': len(employees),
+        'events': events,
+        'summary': {
+            'by_engine': dict(by_engine),
+            'transitions': dict(transitions),
+            'baseline_transitions': dict(load_baseline_transitions(start_date, end_date, employee_id_set)),
+            'final_status': dict(Counter(
+                e['status'] for e in employees if not e['leave_date'] or e['leave_date'] >= end_date
+            ))
+        },
+        'elapsed_ms': int((time.perf_counter() - started) * 1000)
+    }
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+报表只读快照
+月底报表（团队对比、趋势、排行、收入成本）与批量导出是长时间的聚合扫描，
+开启 REPORT_SNAPSHOT_ENABLED 后改为读取定期生成的只读副本，不再与业绩录入、工资单写入争用主库。
+
+快照由数据库维护线程（core/db_maintenance.py 的 report_snapshot 任务）按 REPORT_SNAPSHOT_INTERVAL 重建：
+    1. sqlite3 backup API 一次复制全部页（WAL 模式下是一致的读快照，不阻塞写入）
+    2. 副本改为 DELETE 日志模式，加报表专用覆盖索引与按 团队+日期 汇总的 report_team_daily，执行 ANALYZE
+    3. 写入 report_snapshot_meta（生成时间）后原子替换旧快照
+快照不存在或超过 REPORT_SNAPSHOT_MAX_AGE 时报表回退读取主库。
+
+用法：
+    python3 -m core.report_snapshot              # 立即重建快照
+    python3 -m core.report_snapshot --info       # 查看快照生成时间
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from functools import wraps
+from pathlib import Path
+from flask import g, make_response
+from config import Config
+from core.auth import get_current_user, get_user_team
+from core.sql_monitor import MonitoredConnection
+
+# 报表专用索引（只建在快照中：主库每次写入业绩都要多维护这些索引）
+REPORT_INDEXES = [
+    # 团队对比/排行/趋势：按员工 + 日期范围汇总，覆盖索引免回表
+    'CREATE INDEX IF NOT EXISTS rpt_performance_employee_cover '
+    'ON performance(employee_id, work_date, orders_count, commission, is_valid_workday)',
+    # 热力图/导出：按日期范围扫描
+    'CREATE INDEX IF NOT EXISTS rpt_performance_date_cover '
+    'ON performance(work_date, employee_id, orders_count, commission)',
+    'CREATE INDEX IF NOT EXISTS rpt_employees_active_team ON employees(is_active, team, status)'
+]
+
+# 报表汇总表（收入成本按日/月/年读取，不再逐行扫描业绩）
+REPORT_ROLLUPS = [
+    '''
+    CREATE TABLE report_team_daily AS
+    SELECT p.work_date AS work_date, e.team AS team,
+           SUM(p.orders_count) AS orders_count, SUM(p.commission) AS commission
+    FROM performance p
+    JOIN employees e ON p.employee_id = e.id
+    GROUP BY p.work_date, e.team
+    ''',
+    'CREATE INDEX rpt_team_daily ON report_team_daily(work_date, team, orders_count, commission)'
+]
+
+_local = threading.local()
+
+
+def snapshot_path(db_path=None):
+    """快照文件路径（默认数据库使用 REPORT_SNAPSHOT_PATH，其他数据库放在同目录）"""
+    if not db_path or db_path == Config.DATABASE:
+        return Config.REPORT_SNAPSHOT_PATH
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), 'report_snapshot.db')
+
+
+def build_report_snapshot(db_path=None, dest_path=None):
+    """
+    重建报表快照
+
+    Args:
+        db_path: 源数据库（默认 Config.DATABASE）
+        dest_path: 快照路径（默认 snapshot_path(db_path)）
+
+    Returns:
+        dict: {'success', 'message', 'path', 'built_at', 'duration_ms', 'file_size'}
+    """
+    dest_path = dest_path or snapshot_path(db_path)
+    tmp_path = dest_path + '.tmp'
+    os.makedirs(os.path.dirname(os.path.abspath(dest_path)), exist_ok=True)
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    started = time.perf_counter()
+    built_ts = time.time()
+    source = sqlite3.connect(db_path or Config.DATABASE)
+    target = sqlite3.connect(tmp_path, isolation_level=None)
+    try:
+        # 一步复制：整个复制在同一个读事务中完成（分步复制遇到并发写入会从头重来）
+        source.backup(target)
+        target.execute('PRAGMA journal_mode = DELETE')
+        target.execute('BEGIN')
+        for sql in REPORT_INDEXES + REPORT_ROLLUPS:
+            target.execute(sql)
+        target.execute('CREATE TABLE report_snapshot_meta (built_at TEXT, built_ts REAL, duration_ms INTEGER)')
+        target.execute('INSERT INTO report_snapshot_meta VALUES (?, ?, ?)', (
+            datetime.fromtimestamp(built_ts).strftime('%Y-%m-%d %H:%M:%S'), built_ts,
+            int((time.perf_counter() - started) * 1000)
+        ))
+        target.execute('COMMIT')
+        target.execute('ANALYZE')
+    except Exception:
+        target.close()
+        os.remove(tmp_path)
+        raise
+    finally:
+        source.close()
+    target.close()
+
+    # 原子替换：已打开旧快照的连接继续读旧文件，新连接读新文件
+    os.replace(tmp_path, dest_path)
+    duration_ms = int((time.perf_counter() - started) * 1000)
+    return {
+        'success': True,
+        'message': f'报表快照已生成（{duration_ms}ms）',
+        'path': dest_path,
+        'built_at': datetime.fromtimestamp(built_ts).strftime('%Y-%m-%d %H:%M:%S'),
+        'duration_ms': duration_ms,
+        'file_size': os.path.getsize(dest_path)
+    }
+
+
+def _read_meta(conn):
+    row = conn.execute('SELECT built_at, built_ts, duration_ms FROM report_snapshot_meta').fetchone()
+    return {'built_at': row[0], 'built_ts': row[1], 'duration_ms': row[2]}
+
+
+def get_snapshot_info(path=None):
+    """
+    快照状态
+
+    Returns:
+        dict | None: {'path', 'built_at', 'age_seconds', 'duration_ms', 'file_size', 'stale'}，快照不存在时为 None
+    """
+    path = path or snapshot_path()
+    if not os.path.exists(path):
+        return None
+    conn = sqlite3.connect(Path(os.path.abspath(path)).as_uri() + '?mode=ro', uri=True)
+    try:
+        meta = _read_meta(conn)
+    except sqlite3.DatabaseError:
+        return None
+    finally:
+        conn.close()
+    age = int(time.time() - meta['built_ts'])
+    return {
+        'path': path,
+        'built_at': meta['built_at'],
+        'age_seconds': age,
+        'duration_ms': meta['duration_ms'],
+        'file_size': os.path.getsize(path),
+        'stale': age > Config.REPORT_SNAPSHOT_MAX_AGE
+    }
+
+
+def _snapshot_connection():
+    """
+    本线程的快照只读连接（快照被替换后重新连接）
+
+    Returns:
+        tuple: (连接, 快照元数据)；未开启、快照不存在或已过期时为 (None, None)
+    """
+    path = Config.REPORT_SNAPSHOT_PATH
+    try:
+        inode = os.stat(path).st_ino
+    except FileNotFoundError:
+        return None, None
+
+    conn = getattr(_local, 'conn', None)
+    if conn is None or _local.key != (path, inode):
+        if conn is not None:
+            conn.close()
+        conn = sqlite3.connect(
+            Path(os.path.abspath(path)).as_uri() + '?mode=ro', uri=True,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            factory=MonitoredConnection if Config.SQL_MONITOR_ENABLED else sqlite3.Connection,
+            cached_statements=Config.DB_STATEMENT_CACHE_SIZE
+        )
+        conn.row_factory = sqlite3.Row
+        try:
+            meta = _read_meta(conn)
+        except sqlite3.DatabaseError:
+            conn.close()
+            return None, None
+        _local.conn, _local.key, _local.meta = conn, (path, inode), meta
+
+    if time.time() - _local.meta['built_ts'] > Config.REPORT_SNAPSHOT_MAX_AGE:
+        return None, None
+    return _local.conn, _local.meta
+
+
+def discard_snapshot_connections():
+    """丢弃当前线程的快照连接（fork 后的子进程不可复用父进程的连接）"""
+    _local.conn = None
+    _local.key = None
+    _local.meta = None
+
+
+def in_report_snapshot():
+    """当前请求是否在读取报表快照"""
+    return g.get('report_snapshot') is not None
+
+
+def reads_report_snapshot(view):
+    """
+    报表/导出视图装饰器：开启快照时视图内的 get_db()/query_db() 读取只读快照
+
+    当前用户与经理团队在切换前按主库解析（同一请求内缓存），不受快照延迟影响；
+    页面通过 g.report_snapshot 显示数据截止时间，响应头 X-Report-Snapshot-At 标明快照时间；
+    快照不可用时照常读取主库
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        conn, meta = _snapshot_connection() if Config.REPORT_SNAPSHOT_ENABLED else (None, None)
+        if conn is None:
+            return view(*args, **kwargs)
+
+        # 权限范围（当前用户、经理所属团队）按主库解析，只有报表聚合读取快照
+        user = get_current_user()
+        if user:
+            get_user_team(user)
+
+        live = g.pop('db', None)
+        g.db = conn
+        g.report_snapshot = dict(meta, age_minutes=int((time.time() - meta['built_ts']) // 60))
+        try:
+            response = make_response(view(*args, **kwargs))
+        finally:
+            g.pop('db')
+            if live is not None:
+                g.db = live
+        response.headers['X-Report-Snapshot-At'] = meta['built_at']
+        return response
+    return wrapper
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='报表只读快照')
+    parser.add_argument('--db', help='源数据库路径（默认 Config.DATABASE）')
+    parser.add_argument('--info', action='store_true', help='只查看快照状态')
+    args = parser.parse_args()
+
+    if not args.info:
+        print(build_report_snapshot(args.db)['message'])
+    info = get_snapshot_info(snapshot_path(args.db))
+    if info is None:
+        print('快照不存在')
+    else:
+        print(f"{info['path']}：生成于 {info['built_at']}（{info['age_seconds']} 秒前），"
+              f"{info['file_size'] / 1048576:.1f}MB{'，已过期' if info['stale'] else ''}")
+
+
+if __name__ == '__main__':
+    main()
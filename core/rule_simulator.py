@@ -0,0 +1,474 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+规则仿真模块
+把一个期间的业绩一次性加载为矩阵后，对多套规则方案（流转/晋级/保级规则、
+提成阶梯、薪资参数）做向量化推演：每天对全体员工做一次数组运算，
+按团队汇总晋级、淘汰、降级预警人数与工资总额，并给出相对基准方案的差异。
+
+推演口径与规则回放（core.replay）一致，区别在于：
+    - 回放逐人调用规则判断函数，输出逐条事件；仿真整列计算，只输出汇总，
+      单个方案通常只需几十毫秒，适合参数扫描；
+    - driver='status'：状态流转规则驱动员工状态（与回放相同）；
+      driver='promotion'：晋级改由晋级规则触发并视为当天审批通过，
+      降级与淘汰仍按状态流转规则；
+    - 工资按月末（或期末）状态、以期间内业绩计算，公式同 salary_engine。
+"""
+
+import copy
+import time
+from datetime import timedelta
+import numpy as np
+from core.workday import resolve_as_of
+from core.performance_matrix import PerformanceMatrix
+from core.commission import calculate_commission_array
+from core.salary_ledger import RECENT_DAYS_KEPT
+from core.replay import merge_rules, load_replay_employees, load_baseline_transitions
+
+STATUS_NAMES = ('trainee', 'C', 'B', 'A', 'eliminated')
+TRAINEE, C, B, A, ELIMINATED = range(len(STATUS_NAMES))
+STATUS_CODES = {name: code for code, name in enumerate(STATUS_NAMES)}
+
+SIMULATION_DRIVERS = ('status', 'promotion')
+
+# 单次请求最多推演的方案数
+MAX_SCENARIOS = 50
+
+_PROMOTIONS = ((TRAINEE, C), (C, B), (B, A))
+_DEMOTIONS = ((B, C), (A, C))
+
+# 未考核通过时的占位下标（永远不满足 <= day）
+_NEVER = np.iinfo(np.int64).max
+
+
+class SimulationDataset:
+    """
+    一个期间的仿真输入（员工初始状态 + 业绩矩阵），加载一次后可推演任意多个方案
+    """
+
+    def __init__(self, start_date, end_date, employee_ids=None):
+        self.start_date = resolve_as_of(start_date)
+        self.end_date = resolve_as_of(end_date)
+
+        employees = load_replay_employees(self.start_date, self.end_date, employee_ids)
+        self.employees = employees
+        self.matrix = matrix = PerformanceMatrix(
+            self.start_date, self.end_date, [e['id'] for e in employees]
+        )
+        self.start_day = matrix.day_index(self.start_date)
+        self.end_day = matrix.day_index(self.end_date)
+
+        self.teams = sorted({e['team'] for e in employees})
+        team_index = {team: i for i, team in enumerate(self.teams)}
+        self.team_codes = np.array([team_index[e['team']] for e in employees], dtype=np.int64)
+
+        self.join_day = np.array([matrix.day_index(e['join_date']) for e in employees], dtype=np.int64)
+        self.leave_day = np.array(
+            [matrix.day_index(e['leave_date']) if e['leave_date'] else _NEVER for e in employees],
+            dtype=np.int64
+        )
+        self.initial_status = np.array([STATUS_CODES[e['status']] for e in employees], dtype=np.int64)
+        self.initial_start = np.array(
+            [matrix.day_index(e['status_start']) for e in employees], dtype=np.int64
+        )
+        # 状态开始日早于加载范围时，范围之前的工作日数
+        self.initial_pre_workdays = np.array(
+            [matrix.count_workdays(e['status_start'], -1) for e in employees], dtype=np.int64
+        )
+        self.assessment_day = np.array(
+            [matrix.day_index(e['assessment_date']) if e['assessment_date'] else _NEVER
+             for e in employees],
+            dtype=np.int64
+        )
+
+        # 期间内各月的日期下标范围 [(year_month, first_day, last_day)]
+        self.months = []
+        day = self.start_day
+        while day <= self.end_day:
+            current = matrix.dates[day]
+            next_month = (current.replace(day=28) + timedelta(days=4)).replace(day=1)
+            last = min(matrix.day_index(next_month) - 1, self.end_day)
+            self.months.append((current.strftime('%Y-%m'), day, last))
+            day = last + 1
+
+        self.baseline_transitions = dict(load_baseline_transitions(
+            self.start_date, self.end_date, {e['id'] for e in employees}
+        ))
+
+    @property
+    def days(self):
+        return self.end_day - self.start_day + 1
+
+
+def _simulate_statuses(dataset, rules, driver):
+    """
+    逐日推演员工状态
+
+    Returns:
+        tuple: (transitions[team, from, to], promotion_triggers[team],
+                challenge_triggers[team], {year_month: 月末状态数组})
+    """
+    matrix = dataset.matrix
+    status_rules = rules['status']
+    promotion_rules = rules['promotion']
+    challenge_rules = rules['challenge']
+    teams = dataset.team_codes
+    num_teams = len(dataset.teams)
+
+    status = dataset.initial_status.copy()
+    start = dataset.initial_start.copy()
+    pre_workdays = dataset.initial_pre_workdays.copy()
+    promoted = np.zeros(len(status), dtype=bool)
+    alerts = np.zeros(len(status), dtype=np.int64)
+
+    transitions = np.zeros((num_teams, len(STATUS_NAMES), len(STATUS_NAMES)), dtype=np.int64)
+    promotion_triggers = np.zeros(num_teams, dtype=np.int64)
+    challenge_triggers = np.zeros(num_teams, dtype=np.int64)
+    month_end_status = {}
+    month_ends = {last: ym for ym, _, last in dataset.months}
+    month_starts = {first for _, first, _ in dataset.months}
+
+    for day in range(dataset.start_day, dataset.end_day + 1):
+        if day in month_starts:
+            alerts[:] = 0
+
+        active = (dataset.join_day <= day) & (dataset.leave_day >= day) & (status != ELIMINATED)
+        days_in = day - start
+        windows = {}
+
+        def recent(days):
+            if ('recent', days) not in windows:
+                windows[('recent', days)] = matrix.recent_orders(day, days)
+            return windows[('recent', days)]
+
+        def recent_workdays(count):
+            if ('workday', count) not in windows:
+                windows[('workday', count)] = matrix.recent_workday_orders(day, count)
+            return windows[('workday', count)]
+
+        new_status = status.copy()
+        is_trainee = active & (status == TRAINEE)
+        is_c = active & (status == C)
+        is_b = active & (status == B)
+        is_a = active & (status == A)
+
+        # 状态流转规则
+        rule = status_rules['C']
+        c_ready = is_c & (days_in >= rule['min_days'])
+        c_orders = recent(rule['recent_days'])
+        c_up = c_ready & (days_in <= rule['max_days']) & (c_orders >= rule['min_orders'])
+        c_down = c_ready & (days_in > rule['max_days']) & (c_orders < rule['min_orders'])
+
+        rule = status_rules['B']
+        b_ready = is_b & (days_in >= rule['min_days'])
+        b_orders = recent(rule['recent_days'])
+        b_up = b_ready & (days_in <= rule['max_days']) & (b_orders >= rule['min_orders'])
+        b_down = b_ready & (days_in > rule['max_days']) & (b_orders < rule['min_orders'])
+
+        rule = status_rules['A']
+        a_down = is_a & (recent(rule['recent_days']) <= rule['max_orders'])
+        if matrix.dates[day].day > rule['month_check_day']:
+            a_down |= is_a & (matrix.month_valid_workdays(day) < rule['min_month_workdays'])
+
+        new_status[c_down] = ELIMINATED
+        new_status[b_down] = C
+        new_status[a_down] = C
+
+        # 晋级资格
+        workdays = matrix.workdays_between(start, day) + pre_workdays
+        rule = promotion_rules['trainee_to_C']
+        trainee_ok = is_trainee & (workdays >= rule['workdays_required']) & (dataset.assessment_day <= day)
+        eligible = {TRAINEE: trainee_ok}
+        for level, rule_key in ((C, 'C_to_B'), (B, 'B_to_A')):
+            rule = promotion_rules[rule_key]
+            orders = recent_workdays(rule['recent_days'])
+            if orders is None:
+                eligible[level] = np.zeros(len(status), dtype=bool)
+            else:
+                eligible[level] = (active & (status == level)
+                                   & (workdays <= rule['max_workdays'])
+                                   & (orders >= rule['min_orders']))
+
+        triggered = (eligible[TRAINEE] | eligible[C] | eligible[B]) & ~promoted
+        promotion_triggers += np.bincount(teams[triggered], minlength=num_teams)
+        promoted |= triggered
+
+        if driver == 'status':
+            new_status[is_trainee & (days_in >= status_rules['trainee']['min_days'])] = C
+            new_status[c_up] = B
+            new_status[b_up] = A
+        else:
+            # 晋级视为当天审批通过；同一天被降级/淘汰的以降级为准
+            unchanged = new_status == status
+            for level, to_status in _PROMOTIONS:
+                new_status[triggered & (status == level) & unchanged] = to_status
+
+        # 降级预警
+        rule = challenge_rules['trigger_threshold']
+        orders = recent_workdays(rule['recent_days'])
+        if orders is not None:
+            alerted = is_a & (alerts < challenge_rules['monthly_limit']) & (orders <= rule['min_orders'])
+            challenge_triggers += np.bincount(teams[alerted], minlength=num_teams)
+            alerts[alerted] += 1
+
+        changed = new_status != status
+        if changed.any():
+            np.add.at(transitions, (teams[changed], status[changed], new_status[changed]), 1)
+            start[changed] = day
+            pre_workdays[changed] = 0
+            promoted[changed] = False
+            status = new_status
+
+        if day in month_ends:
+            month_end_status[month_ends[day]] = status.copy()
+
+    return transitions, promotion_triggers, challenge_triggers, month_end_status
+
+
+def _simulate_payroll(dataset, month_end_status, salary_rules, commission_tiers):
+    """
+    按月末状态向量化计算工资
+
+    Returns:
+        dict: {year_month: 每人工资数组}（未入职或已离职的员工为0）
+    """
+    matrix = dataset.matrix
+    commission = calculate_commission_array(matrix.orders, commission_tiers)
+    c_rule, b_rule, a_rule = salary_rules['C'], salary_rules['B'], salary_rules['A']
+
+    payroll = {}
+    for year_month, first, last in dataset.months:
+        status = month_end_status[year_month]
+        present = matrix.present[:, first:last + 1]
+        orders = matrix.orders[:, first:last + 1]
+
+        work_days = present.sum(axis=1)
+        valid_work_days = matrix.valid[:, first:last + 1].sum(axis=1)
+        total_orders = orders.sum(axis=1)
+        total_commission = commission[:, first:last + 1].sum(axis=1)
+
+        # 最近6条业绩记录的出单数（与薪资台账 recent_6_orders 口径一致）
+        seen = np.cumsum(present, axis=1)
+        latest = present & (seen > seen[:, -1:] - RECENT_DAYS_KEPT)
+        recent_orders = np.where(latest, orders, 0).sum(axis=1)
+
+        qualified_days = np.where(work_days >= c_rule['min_days'], c_rule['min_days'], 0)
+        c_salary = np.minimum(qualified_days * c_rule['daily_rate'], c_rule['max_total'])
+        b_salary = np.minimum(work_days, b_rule['max_days']) * b_rule['daily_rate']
+
+        attendance = np.where(
+            (valid_work_days >= a_rule['attendance_min_valid_days'])
+            & (recent_orders >= a_rule['attendance_min_recent_orders']),
+            a_rule['attendance_bonus'], 0
+        )
+        performance = np.zeros(len(status))
+        for min_orders, bonus in sorted(a_rule['performance_bonus_tiers']):
+            performance = np.where(total_orders >= min_orders, bonus, performance)
+        a_salary = a_rule['base_salary'] + attendance + performance
+
+        base = np.select([status == C, status == B, status == A], [c_salary, b_salary, a_salary], 0)
+        salary = base + total_commission
+        payroll[year_month] = np.where((dataset.join_day <= last) & (dataset.leave_day >= first), salary, 0)
+
+    return payroll
+
+
+def run_scenario(dataset, scenario=None):
+    """
+    推演单个规则方案
+
+    Args:
+        dataset: SimulationDataset
+        scenario: {
+            'name': 方案名称,
+            'rules': 规则覆盖项（见 core.replay.merge_rules，含 status/promotion/challenge/salary）,
+            'commission_tiers': 提成阶梯 [[上限, 单价], ..., [null, 单价]],
+            'driver': 'status' | 'promotion'
+        }
+
+    Returns:
+        dict: 方案报告 {'name', 'driver', 'totals', 'teams', 'transitions', 'payroll_by_month'}
+
+    Raises:
+        ValueError: 方案配置不合法
+    """
+    scenario = scenario or {}
+    driver = scenario.get('driver', 'status')
+    if driver not in SIMULATION_DRIVERS:
+        raise ValueError(f'未知的推演方式：{driver}')
+
+    try:
+        rules = merge_rules(scenario.get('rules'))
+        transitions, promotion_triggers, challenge_triggers, month_end_status = \
+            _simulate_statuses(dataset, rules, driver)
+        payroll = _simulate_payroll(
+            dataset, month_end_status, rules['salary'], scenario.get('commission_tiers')
+        )
+    except KeyError as e:
+        raise ValueError(f'方案配置缺少字段：{e}')
+    except TypeError:
+        raise ValueError('方案配置不合法：规则参数必须为数字')
+
+    teams = dataset.team_codes
+    num_teams = len(dataset.teams)
+    final_status = month_end_status[dataset.months[-1][0]]
+    # 期末在职（期间内离职的员工不计入期末人数）
+    joined = (dataset.join_day <= dataset.end_day) & (dataset.leave_day >= dataset.end_day)
+
+    promotions = sum(transitions[:, f, t] for f, t in _PROMOTIONS)
+    demotions = sum(transitions[:, f, t] for f, t in _DEMOTIONS)
+    eliminations = transitions[:, :, ELIMINATED].sum(axis=1)
+    team_payroll = sum(np.bincount(teams, weights=values, minlength=num_teams) for values in payroll.values())
+
+    team_reports = []
+    for i, team in enumerate(dataset.teams):
+        in_team = joined & (teams == i)
+        team_reports.append({
+            'team': team,
+            'promotions': int(promotions[i]),
+            'demotions': int(demotions[i]),
+            'eliminations': int(eliminations[i]),
+            'promotion_triggers': int(promotion_triggers[i]),
+            'challenge_triggers': int(challenge_triggers[i]),
+            'payroll': round(float(team_payroll[i]), 2),
+            'headcount': {
+                name: int(np.count_nonzero(in_team & (final_status == code)))
+                for code, name in enumerate(STATUS_NAMES)
+            }
+        })
+
+    totals = {
+        'promotions': int(promotions.sum()),
+        'demotions': int(demotions.sum()),
+        'eliminations': int(eliminations.sum()),
+        'promotion_triggers': int(promotion_triggers.sum()),
+        'challenge_triggers': int(challenge_triggers.sum()),
+        'payroll': round(float(team_payroll.sum()), 2),
+        'headcount': {
+            name: int(np.count_nonzero(joined & (final_status == code)))
+            for code, name in enumerate(STATUS_NAMES)
+        }
+    }
+
+    total_transitions = transitions.sum(axis=0)
+    return {
+        'name': scenario.get('name') or '方案',
+        'driver': driver,
+        'totals': totals,
+        'teams': team_reports,
+        'transitions': {
+            f'{STATUS_NAMES[f]}→{STATUS_NAMES[t]}': int(total_transitions[f, t])
+            for f, t in zip(*np.nonzero(total_transitions))
+        },
+        'payroll_by_month': {
+            ym: round(float(values.sum()), 2) for ym, values in payroll.items()
+        }
+    }
+
+
+_DELTA_FIELDS = ('promotions', 'demotions', 'eliminations', 'promotion_triggers', 'challenge_triggers', 'payroll')
+
+
+def _diff(report, baseline):
+    """计算方案相对基准的差异（总计与各团队）"""
+    def delta(current, base):
+        result = {field: round(current[field] - base[field], 2) for field in _DELTA_FIELDS}
+        result['headcount'] = {
+            name: current['headcount'][name] - base['headcount'][name] for name in STATUS_NAMES
+        }
+        return result
+
+    report['delta'] = delta(report['totals'], baseline['totals'])
+    base_teams = {t['team']: t for t in baseline['teams']}
+    for team in report['teams']:
+        team['delta'] = delta(team, base_teams[team['team']])
+    return report
+
+
+def expand_sweep(sweep):
+    """
+    将参数扫描展开为方案列表
+
+    Args:
+        sweep: {
+            'parameter': 规则路径，如 'promotion.B_to_A.min_orders',
+            'values': 取值列表,
+            'base': 基础方案（可选）
+        }
+
+    Returns:
+        list: 方案列表
+    """
+    path = sweep['parameter'].split('.')
+    base = sweep.get('base') or {}
+
+    scenarios = []
+    for value in sweep['values']:
+        scenario = copy.deepcopy(base)
+        node = scenario.setdefault('rules', {})
+        for key in path[:-1]:
+            node = node.setdefault(key, {})
+        node[path[-1]] = value
+        scenario['name'] = f"{sweep['parameter']}={value}"
+        scenarios.append(scenario)
+    return scenarios
+
+
+def simulate_rules(start_date, end_date, scenarios=None, sweep=None, baseline=None, employee_ids=None):
+    """
+    对历史业绩推演多个规则方案，并与基准方案对比
+
+    Args:
+        start_date: 起始日期
+        end_date: 结束日期（含）
+        scenarios: 方案列表（见 run_scenario）
+        sweep: 参数扫描（见 expand_sweep），展开后追加到 scenarios
+        baseline: 基准方案，默认为现行规则
+        employee_ids: 只推演指定员工（默认全部在职员工）
+
+    Returns:
+        dict: {
+            'success', 'start_date', 'end_date', 'days', 'employees', 'teams',
+            'baseline': 基准报告（含 actual_transitions 实际发生的状态变更）,
+            'scenarios': [方案报告（含 delta 差异）],
+            'load_ms', 'simulate_ms'
+        }
+    """
+    started = time.perf_counter()
+    start_date = resolve_as_of(start_date)
+    end_date = resolve_as_of(end_date)
+    if start_date > end_date:
+        return {'success': False, 'message': '开始日期不能晚于结束日期'}
+
+    try:
+        scenarios = list(scenarios or []) + (expand_sweep(sweep) if sweep else [])
+    except (KeyError, TypeError, AttributeError) as e:
+        return {'success': False, 'message': f'参数扫描配置不合法：{e}'}
+    if len(scenarios) > MAX_SCENARIOS:
+        return {'success': False, 'message': f'单次最多推演{MAX_SCENARIOS}个方案'}
+
+    dataset = SimulationDataset(start_date, end_date, employee_ids)
+    if not dataset.employees:
+        return {'success': False, 'message': '期间内没有可推演的员工'}
+    loaded = time.perf_counter()
+
+    try:
+        base_report = run_scenario(dataset, dict(baseline or {}, name=(baseline or {}).get('name') or '现行规则'))
+        base_report['actual_transitions'] = dataset.baseline_transitions
+        reports = [_diff(run_scenario(dataset, scenario), base_report) for scenario in scenarios]
+    except ValueError as e:
+        return {'success': False, 'message': str(e)}
+
+    finished = time.perf_counter()
+    return {
+        'success': True,
+        'start_date': start_date.strftime('%Y-%m-%d'),
+        'end_date': end_date.strftime('%Y-%m-%d'),
+        'days': dataset.days,
+        'employees': len(dataset.employees),
+        'teams': dataset.teams,
+        'baseline': base_report,
+        'scenarios': reports,
+        'load_ms': int((loaded - started) * 1000),
+        'simulate_ms': int((finished - loaded) * 1000)
+    }
@@ -2,6 +2,28 @@
 薪资计算引擎
 """
 from core.database import query_db
+from core.salary_ledger import get_salary_ledger
+
+# 薪资规则配置
+SALARY_RULES = {
+    'C': {
+        'min_days': 3,          # 工作满3天达标
+        'daily_rate': 30,
+        'max_total': 90
+    },
+    'B': {
+        'max_days': 6,          # 晋级后前6天
+        'daily_rate': 88
+    },
+    'A': {
+        'base_salary': 2200,
+        'attendance_bonus': 400,
+        'attendance_min_valid_days': 25,
+        'attendance_min_recent_orders': 12,
+        # 绩效奖：(总单下限, 奖金)，从高到低匹配
+        'performance_bonus_tiers': [(125, 1000), (100, 600), (75, 300)]
+    }
+}
 
 
 def get_or_calculate_salary(employee_id, year_month):
@@ -50,101 +72,77 @@ def calculate_salary_realtime(employee_id, year_month):
     if not employee:
         return _empty_salary(employee_id, year_month)
     
+    # 当月累计数据来自薪资台账（业绩写入时增量维护）
+    ledger = get_salary_ledger(employee_id, year_month)
+    
+    return calculate_salary_from_ledger(employee, ledger, year_month)
+
+
+def calculate_salary_from_ledger(employee, ledger, year_month):
+    """
+    根据薪资台账计算薪资（纯函数，不访问数据库）
+    
+    结果只携带结构化的计算依据 calculation_facts（输入、规则分支、各项金额），
+    文字版明细按需调用 render_calculation_detail 生成。
+    
+    参数:
+        employee: 员工信息（需包含 id, employee_no, name, status）
+        ledger: 薪资台账，见 core.salary_ledger.get_salary_ledger
+        year_month: 年月，格式：YYYY-MM
+        
+    返回:
+        dict: 薪资数据字典
+    """
+    employee_id = employee['id']
     status = employee['status']
     
-    # 查询该月业绩数据
-    perf_data = query_db('''
-        SELECT 
-            COUNT(*) as work_days,
-            COUNT(CASE WHEN is_valid_workday = 1 THEN 1 END) as valid_work_days,
-            SUM(orders_count) as total_orders,
-            SUM(commission) as total_commission
-        FROM performance
-        WHERE employee_id = ? AND strftime('%Y-%m', work_date) = ?
-    ''', (employee_id, year_month), one=True)
-    
-    work_days = perf_data['work_days'] or 0
-    valid_work_days = perf_data['valid_work_days'] or 0
-    total_orders = perf_data['total_orders'] or 0
-    total_commission = perf_data['total_commission'] or 0
+    work_days = ledger['work_days']
+    valid_work_days = ledger['valid_work_days']
+    total_orders = ledger['total_orders']
+    total_commission = ledger['total_commission']
     
     # 根据状态计算薪资
     base_salary = 0
     attendance_bonus = 0
     performance_bonus = 0
-    calculation_detail = []
+    components = {}
     
-    calculation_detail.append(f"员工: {employee['name']} ({employee['employee_no']})")
-    calculation_detail.append(f"状态: {status}")
-    calculation_detail.append(f"月份: {year_month}")
-    calculation_detail.append(f"工作日数: {work_days}, 有效工作日: {valid_work_days}")
-    calculation_detail.append(f"总订单数: {total_orders}, 总提成: ¥{total_commission:.2f}")
-    calculation_detail.append("")
-    
-    if status == 'trainee':
-        # 培训期：仅提成
-        calculation_detail.append("【培训期薪资】")
-        calculation_detail.append("- 固定薪资: ¥0")
-        calculation_detail.append(f"- 提成: ¥{total_commission:.2f}")
-        
-    elif status == 'C':
+    if status == 'C':
         # C级：固定薪资= min(达标日数×30, 90)
-        qualified_days = 3 if work_days >= 3 else 0
-        base_salary = min(qualified_days * 30, 90)
-        calculation_detail.append("【C级薪资】")
-        calculation_detail.append(f"- 工作日数: {work_days} ({'达标' if work_days >= 3 else '未达标'})")
-        calculation_detail.append(f"- 固定薪资: min({qualified_days}×30, 90) = ¥{base_salary:.2f}")
-        calculation_detail.append(f"- 提成: ¥{total_commission:.2f}")
+        rule = SALARY_RULES['C']
+        qualified_days = rule['min_days'] if work_days >= rule['min_days'] else 0
+        base_salary = min(qualified_days * rule['daily_rate'], rule['max_total'])
+        components['qualified_days'] = qualified_days
         
     elif status == 'B':
         # B级：固定薪资= 晋级后前6天在本月发生的实际出勤天数×88
         # 简化处理：取前6个有效工作日，但最多不超过实际工作日数
-        b_days = min(work_days, 6)
-        base_salary = b_days * 88
-        calculation_detail.append("【B级薪资】")
-        calculation_detail.append(f"- 前6天出勤: {b_days}天")
-        calculation_detail.append(f"- 固定薪资: {b_days}×88 = ¥{base_salary:.2f}")
-        calculation_detail.append(f"- 提成: ¥{total_commission:.2f}")
+        rule = SALARY_RULES['B']
+        b_days = min(work_days, rule['max_days'])
+        base_salary = b_days * rule['daily_rate']
+        components['b_days'] = b_days
         
     elif status == 'A':
         # A级：底薪2200 + 全勤奖 + 绩效奖 + 提成
-        base_salary = 2200
+        rule = SALARY_RULES['A']
+        base_salary = rule['base_salary']
         
         # 全勤奖：有效出勤≥25 且 最近6个工作日出单≥12
-        recent_6_orders = query_db('''
-            SELECT COALESCE(SUM(orders_count), 0) as orders 
-            FROM (
-                SELECT orders_count FROM performance
-                WHERE employee_id = ? AND strftime('%Y-%m', work_date) = ?
-                ORDER BY work_date DESC LIMIT 6
-            )
-        ''', (employee_id, year_month), one=True)['orders']
+        recent_6_orders = ledger['recent_6_orders']
+        components['recent_6_orders'] = recent_6_orders
         
-        if valid_work_days >= 25 and recent_6_orders >= 12:
-            attendance_bonus = 400
-            calculation_detail.append(f"- 全勤奖: 有效出勤{valid_work_days}≥25 且 最近6日出单{recent_6_orders}≥12，奖励¥400")
-        else:
-            calculation_detail.append(f"- 全勤奖: 未达标 (有效出勤{valid_work_days}, 最近6日出单{recent_6_orders}) ¥0")
+        if (valid_work_days >= rule['attendance_min_valid_days']
+                and recent_6_orders >= rule['attendance_min_recent_orders']):
+            attendance_bonus = rule['attendance_bonus']
         
         # 绩效奖：总单<75:0；75-99:300；100-124:600；≥125:1000
-        if total_orders < 75:
-            performance_bonus = 0
-        elif total_orders < 100:
-            performance_bonus = 300
-        elif total_orders < 125:
-            performance_bonus = 600
-        else:
-            performance_bonus = 1000
-        
-        calculation_detail.append(f"- 绩效奖: 总单{total_orders} → ¥{performance_bonus}")
-        calculation_detail.append(f"- 底薪: ¥{base_salary}")
-        calculation_detail.append(f"- 提成: ¥{total_commission:.2f}")
+        for min_orders, bonus in rule['performance_bonus_tiers']:
+            if total_orders >= min_orders:
+                performance_bonus = bonus
+                break
     
     total_salary = base_salary + attendance_bonus + performance_bonus + total_commission
     
-    calculation_detail.append("")
-    calculation_detail.append(f"【总计】 ¥{total_salary:.2f}")
-    
     return {
         'employee_id': employee_id,
         'year_month': year_month,
@@ -153,10 +151,117 @@ def calculate_salary_realtime(employee_id, year_month):
         'performance_bonus': performance_bonus,
         'commission': total_commission,
         'total_salary': total_salary,
-        'calculation_detail': '\n'.join(calculation_detail)
+        'calculation_facts': {
+            'employee_no': employee['employee_no'],
+            'name': employee['name'],
+            'status': status,
+            'year_month': year_month,
+            'inputs': {
+                'work_days': work_days,
+                'valid_work_days': valid_work_days,
+                'total_orders': total_orders,
+                'total_commission': total_commission
+            },
+            'components': components,
+            'amounts': {
+                'base_salary': base_salary,
+                'attendance_bonus': attendance_bonus,
+                'performance_bonus': performance_bonus,
+                'commission': total_commission,
+                'total_salary': total_salary
+            }
+        }
     }
 
 
+def render_calculation_detail(facts):
+    """
+    将结构化计算依据渲染为文字版计算明细
+    
+    参数:
+        facts: calculate_salary_from_ledger 返回的 calculation_facts
+        
+    返回:
+        str: 多行文本明细
+    """
+    status = facts['status']
+    inputs = facts['inputs']
+    components = facts['components']
+    amounts = facts['amounts']
+    
+    work_days = inputs['work_days']
+    valid_work_days = inputs['valid_work_days']
+    total_orders = inputs['total_orders']
+    total_commission = inputs['total_commission']
+    base_salary = amounts['base_salary']
+    
+    lines = [
+        f"员工: {facts['name']} ({facts['employee_no']})",
+        f"状态: {status}",
+        f"月份: {facts['year_month']}",
+        f"工作日数: {work_days}, 有效工作日: {valid_work_days}",
+        f"总订单数: {total_orders}, 总提成: ¥{total_commission:.2f}",
+        ""
+    ]
+    
+    if status == 'trainee':
+        lines.append("【培训期薪资】")
+        lines.append("- 固定薪资: ¥0")
+        lines.append(f"- 提成: ¥{total_commission:.2f}")
+        
+    elif status == 'C':
+        qualified_days = components['qualified_days']
+        lines.append("【C级薪资】")
+        lines.append(f"- 工作日数: {work_days} ({'达标' if work_days >= 3 else '未达标'})")
+        lines.append(f"- 固定薪资: min({qualified_days}×30, 90) = ¥{base_salary:.2f}")
+        lines.append(f"- 提成: ¥{total_commission:.2f}")
+        
+    elif status == 'B':
+        b_days = components['b_days']
+        lines.append("【B级薪资】")
+        lines.append(f"- 前6天出勤: {b_days}天")
+        lines.append(f"- 固定薪资: {b_days}×88 = ¥{base_salary:.2f}")
+        lines.append(f"- 提成: ¥{total_commission:.2f}")
+        
+    elif status == 'A':
+        recent_6_orders = components['recent_6_orders']
+        if amounts['attendance_bonus']:
+            lines.append(f"- 全勤奖: 有效出勤{valid_work_days}≥25 且 最近6日出单{recent_6_orders}≥12，奖励¥400")
+        else:
+            lines.append(f"- 全勤奖: 未达标 (有效出勤{valid_work_days}, 最近6日出单{recent_6_orders}) ¥0")
+        lines.append(f"- 绩效奖: 总单{total_orders} → ¥{amounts['performance_bonus']}")
+        lines.append(f"- 底薪: ¥{base_salary}")
+        lines.append(f"- 提成: ¥{total_commission:.2f}")
+    
+    lines.append("")
+    lines.append(f"【总计】 ¥{amounts['total_salary']:.2f}")
+    
+    return '\n'.join(lines)
+
+
+def get_calculation_detail(salary_data):
+    """
+    获取薪资的文字版计算明细
+    
+    已确认的薪资（salary表）直接返回保存的明细；
+    实时计算的薪资根据 calculation_facts 现场渲染。
+    
+    参数:
+        salary_data: get_or_calculate_salary 的返回值
+        
+    返回:
+        str: 文字版计算明细
+    """
+    if salary_data.get('calculation_detail'):
+        return salary_data['calculation_detail']
+    
+    facts = salary_data.get('calculation_facts')
+    if facts:
+        return render_calculation_detail(facts)
+    
+    return ''
+
+
 def _empty_salary(employee_id, year_month):
     """返回空薪资数据"""
     return {
@@ -167,6 +272,7 @@ def _empty_salary(employee_id, year_month):
         'performance_bonus': 0,
         'commission': 0,
         'total_salary': 0,
+        'calculation_facts': None,
         'calculation_detail': '未找到员工信息'
     }
 
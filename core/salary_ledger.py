@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+月度薪资台账模块
+按（员工, 年月）维护业绩累计值，业绩每次写入时增量更新台账，
+实时薪资计算直接读取台账，不再从 performance 表全量汇总
+"""
+
+import json
+from datetime import date
+from core.database import query_db, get_db
+from core.cache import invalidate_tags, performance_tag
+
+# A级全勤奖需要"最近6个工作日出单"，台账保留当月最近6条业绩
+RECENT_DAYS_KEPT = 6
+
+
+def _date_str(value):
+    """统一日期为 YYYY-MM-DD 字符串（兼容 date 对象）"""
+    return str(value)[:10]
+
+
+def month_date_range(year_month):
+    """
+    返回月份的日期区间 [起始日, 次月1日)，用于走 work_date 索引的范围查询
+
+    Args:
+        year_month: str, 格式 'YYYY-MM'
+
+    Returns:
+        tuple: ('YYYY-MM-01', 次月'YYYY-MM-01')
+    """
+    year, month = map(int, year_month.split('-'))
+    start = date(year, month, 1)
+    end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')
+
+
+def save_performance(db, employee_id, work_date, orders_count, commission, is_valid_workday=1):
+    """
+    写入一条业绩（新增或覆盖），并在同一事务内增量更新薪资台账
+
+    业绩录入、批量录入、Excel导入统一走此入口。不提交事务，由调用方提交。
+
+    Args:
+        db: 数据库连接
+        employee_id: 员工ID
+        work_date: 业绩日期
+        orders_count: 出单数
+        commission: 日提成
+        is_valid_workday: 是否有效工作日
+
+    Returns:
+        bool: True=更新已有记录, False=新增记录
+    """
+    work_date = _date_str(work_date)
+
+    old = db.execute(
+        '''SELECT orders_count, commission, is_valid_workday
+           FROM performance WHERE employee_id = ? AND work_date = ?''',
+        (employee_id, work_date)
+    ).fetchone()
+
+    db.execute('''
+        INSERT INTO performance (employee_id, work_date, orders_count, commission, is_valid_workday)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(employee_id, work_date) DO UPDATE SET
+            orders_count = excluded.orders_count,
+            commission = excluded.commission,
+            is_valid_workday = excluded.is_valid_workday
+    ''', (employee_id, work_date, orders_count, commission, is_valid_workday))
+
+    apply_performance_change(
+        db, employee_id, work_date,
+        orders_count, commission, is_valid_workday,
+        old=old
+    )
+
+    return old is not None
+
+
+def apply_performance_change(db, employee_id, work_date, orders_count, commission,
+                             is_valid_workday, old=None):
+    """
+    将一条业绩变更增量同步到台账（O(1)）
+
+    须在业绩写入之后、同一事务内调用。台账行不存在时（历史数据、首次写入）
+    改为从 performance 重建该员工当月台账。
+
+    Args:
+        db: 数据库连接
+        employee_id: 员工ID
+        work_date: 业绩日期
+        orders_count / commission / is_valid_workday: 写入后的值
+        old: 写入前的业绩记录（None 表示新增）
+    """
+    work_date = _date_str(work_date)
+    year_month = work_date[:7]
+    invalidate_tags(performance_tag(year_month))
+
+    ledger = db.execute(
+        'SELECT * FROM salary_ledger WHERE employee_id = ? AND year_month = ?',
+        (employee_id, year_month)
+    ).fetchone()
+
+    if ledger is None:
+        rebuild_salary_ledger(employee_months=[(employee_id, year_month)], db=db)
+        return
+
+    new_valid = 1 if is_valid_workday else 0
+    if old is None:
+        work_days_delta = 1
+        valid_delta = new_valid
+        orders_delta = orders_count
+        commission_delta = commission
+    else:
+        work_days_delta = 0
+        valid_delta = new_valid - (1 if old['is_valid_workday'] else 0)
+        orders_delta = orders_count - old['orders_count']
+        commission_delta = commission - old['commission']
+
+    recent = _merge_recent(_load_recent(ledger['recent_days']), work_date, orders_count)
+
+    db.execute('''
+        UPDATE salary_ledger
+        SET work_days = work_days + ?,
+            valid_work_days = valid_work_days + ?,
+            total_orders = total_orders + ?,
+            total_commission = total_commission + ?,
+            recent_days = ?,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE employee_id = ? AND year_month = ?
+    ''', (work_days_delta, valid_delta, orders_delta, commission_delta,
+          json.dumps(recent), employee_id, year_month))
+
+
+def adjust_valid_workdays(db, deltas):
+    """
+    批量调整台账的有效工作日数（工作日配置变更后使用）
+
+    Args:
+        db: 数据库连接
+        deltas: [(employee_id, year_month, delta), ...]
+    """
+    db.executemany('''
+        UPDATE salary_ledger
+        SET valid_work_days = valid_work_days + ?,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE employee_id = ? AND year_month = ?
+    ''', [(delta, employee_id, year_month) for employee_id, year_month, delta in deltas])
+
+
+def adjust_commission(db, deltas):
+    """
+    批量调整台账的累计提成（提成重算后使用）
+
+    Args:
+        db: 数据库连接
+        deltas: [(employee_id, year_month, delta), ...]
+    """
+    db.executemany('''
+        UPDATE salary_ledger
+        SET total_commission = total_commission + ?,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE employee_id = ? AND year_month = ?
+    ''', [(delta, employee_id, year_month) for employee_id, year_month, delta in deltas])
+
+
+def _load_recent(recent_json):
+    """解析台账中的最近业绩列表 [[work_date, orders_count], ...]（按日期倒序）"""
+    if not recent_json:
+        return []
+    try:
+        return json.loads(recent_json)
+    except (TypeError, ValueError):
+        return []
+
+
+def _merge_recent(recent, work_date, orders_count):
+    """
+    将一条业绩合并进最近N条列表
+
+    列表始终是当月按日期倒序的前 RECENT_DAYS_KEPT 条；
+    比列表中最早一条还早的业绩（且列表已满）不影响结果。
+    """
+    for item in recent:
+        if item[0] == work_date:
+            item[1] = orders_count
+            return recent
+
+    if len(recent) < RECENT_DAYS_KEPT or work_date > recent[-1][0]:
+        recent.append([work_date, orders_count])
+        recent.sort(key=lambda item: item[0], reverse=True)
+        del recent[RECENT_DAYS_KEPT:]
+
+    return recent
+
+
+def rebuild_salary_ledger(year_month=None, employee_months=None, db=None):
+    """
+    从 performance 表重建台账（数据修复、工作日重算、历史数据首次接入时使用）
+
+    Args:
+        year_month: 重建整月（当月有业绩的员工）
+        employee_months: 只重建指定的 [(employee_id, year_month), ...]
+        db: 数据库连接（传入时不提交，由调用方提交）
+
+    Returns:
+        int: 重建的台账行数
+    """
+    own_transaction = db is None
+    if db is None:
+        db = get_db()
+
+    if employee_months is None:
+        if not year_month:
+            return 0
+        start, end = month_date_range(year_month)
+        rows = db.execute('''
+            SELECT employee_id, work_date, orders_count, commission, is_valid_workday
+            FROM performance
+            WHERE work_date >= ? AND work_date < ?
+            ORDER BY employee_id, work_date DESC
+        ''', (start, end)).fetchall()
+        targets = {(row['employee_id'], year_month) for row in rows}
+        db.execute('DELETE FROM salary_ledger WHERE year_month = ?', (year_month,))
+    else:
+        targets = {(employee_id, ym) for employee_id, ym in employee_months}
+        rows = []
+        for employee_id, ym in sorted(targets):
+            start, end = month_date_range(ym)
+            rows.extend(db.execute('''
+                SELECT employee_id, work_date, orders_count, commission, is_valid_workday
+                FROM performance
+                WHERE employee_id = ? AND work_date >= ? AND work_date < ?
+                ORDER BY work_date DESC
+            ''', (employee_id, start, end)).fetchall())
+        db.executemany(
+            'DELETE FROM salary_ledger WHERE employee_id = ? AND year_month = ?',
+            list(targets)
+        )
+
+    # 汇总（行已按日期倒序，前6条即最近6条）
+    ledgers = {key: _empty_ledger() for key in targets}
+    for row in rows:
+        work_date = _date_str(row['work_date'])
+        ledger = ledgers[(row['employee_id'], work_date[:7])]
+        ledger['work_days'] += 1
+        ledger['valid_work_days'] += 1 if row['is_valid_workday'] else 0
+        ledger['total_orders'] += row['orders_count'] or 0
+        ledger['total_commission'] += row['commission'] or 0
+        if len(ledger['recent_days']) < RECENT_DAYS_KEPT:
+            ledger['recent_days'].append([work_date, row['orders_count'] or 0])
+
+    db.executemany('''
+        INSERT INTO salary_ledger (
+            employee_id, year_month, work_days, valid_work_days,
+            total_orders, total_commission, recent_days
+        ) VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', [
+        (employee_id, ym, l['work_days'], l['valid_work_days'],
+         l['total_orders'], l['total_commission'], json.dumps(l['recent_days']))
+        for (employee_id, ym), l in ledgers.items()
+    ])
+
+    if own_transaction:
+        db.commit()
+
+    return len(ledgers)
+
+
+def _empty_ledger():
+    return {
+        'work_days': 0,
+        'valid_work_days': 0,
+        'total_orders': 0,
+        'total_commission': 0,
+        'recent_days': []
+    }
+
+
+def get_salary_ledger(employee_id, year_month):
+    """
+    读取员工某月的薪资台账（不存在时从 performance 重建一次）
+
+    Returns:
+        dict: {
+            'work_days', 'valid_work_days', 'total_orders', 'total_commission',
+            'recent_days': [[work_date, orders_count], ...],
+            'recent_6_orders': int
+        }
+    """
+    row = query_db(
+        'SELECT * FROM salary_ledger WHERE employee_id = ? AND year_month = ?',
+        (employee_id, year_month),
+        one=True
+    )
+
+    if row is None:
+        rebuild_salary_ledger(employee_months=[(employee_id, year_month)])
+        row = query_db(
+            'SELECT * FROM salary_ledger WHERE employee_id = ? AND year_month = ?',
+            (employee_id, year_month),
+            one=True
+        )
+
+    recent = _load_recent(row['recent_days'])
+
+    return {
+        'work_days': row['work_days'] or 0,
+        'valid_work_days': row['valid_work_days'] or 0,
+        'total_orders': row['total_orders'] or 0,
+        'total_commission': row['total_commission'] or 0,
+        'recent_days': recent,
+        'recent_6_orders': sum(item[1] for item in recent[:RECENT_DAYS_KEPT])
+    }
@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SQL监控模块
+统计每个请求、每个后台任务执行的SQL语句数与耗时，按语句指纹归并：
+    - 同一指纹在一次请求/任务内重复超过阈值时标记为 N+1 查询
+    - 单条语句超过慢查询阈值时连同 EXPLAIN QUERY PLAN 写入日志
+    - 按路由/任务类型汇总，供管理员接口查看；调试模式下附加到响应头
+"""
+
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter, defaultdict
+from flask import g, has_app_context, request
+from config import Config
+from core.index_advisor import record_query_shape
+
+# SQL 指纹：字面量替换为 ?，合并空白
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_SPACES = re.compile(r'\s+')
+
+# 不计入统计的事务控制语句
+_CONTROL_PREFIXES = ('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE')
+
+# 汇总中每个路由保留的高频指纹数
+TOP_FINGERPRINTS = 5
+
+# 路由/任务汇总：{key: {...}}
+_stats = {}
+_stats_lock = threading.Lock()
+
+_logger = None
+_logger_lock = threading.Lock()
+
+
+def fingerprint(sql):
+    """SQL语句指纹（字面量替换为 ?）"""
+    return _SPACES.sub(' ', _LITERALS.sub('?', sql)).strip()
+
+
+def _get_logger():
+    """慢查询 / N+1 日志（写入 Config.SQL_MONITOR_LOG）"""
+    global _logger
+    with _logger_lock:
+        if _logger is None:
+            logger = logging.getLogger('sql_monitor')
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+            os.makedirs(os.path.dirname(Config.SQL_MONITOR_LOG), exist_ok=True)
+            handler = logging.FileHandler(Config.SQL_MONITOR_LOG, encoding='utf-8')
+            handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+            logger.addHandler(handler)
+            _logger = logger
+    return _logger
+
+
+class SqlCollector:
+    """一次请求或后台任务内的SQL统计"""
+
+    def __init__(self, key):
+        self.key = key
+        self.count = 0
+        self.total_ms = 0.0
+        self.by_sql = Counter()       # 原始语句 → 次数（参数绑定的语句文本相同）
+        self.ms_by_sql = defaultdict(float)
+        self.slow = []
+
+    def record(self, entry):
+        self.count += 1
+        self.total_ms += entry.elapsed_ms
+        self.by_sql[entry.sql] += 1
+        self.ms_by_sql[entry.sql] += entry.elapsed_ms
+
+    def add_time(self, entry, elapsed_ms):
+        self.total_ms += elapsed_ms
+        self.ms_by_sql[entry.sql] += elapsed_ms
+
+    def summary(self):
+        """
+        Returns:
+            dict: {'key', 'queries', 'sql_ms', 'fingerprints': [{fingerprint, count, ms}],
+                   'n_plus_one': [{fingerprint, count, ms}], 'slow_queries'}
+        """
+        counts = Counter()
+        ms = defaultdict(float)
+        for sql, count in self.by_sql.items():
+            fp = fingerprint(sql)
+            counts[fp] += count
+            ms[fp] += self.ms_by_sql[sql]
+
+        fingerprints = [
+            {'fingerprint': fp, 'count': count, 'ms': round(ms[fp], 2)}
+            for fp, count in counts.most_common()
+        ]
+        return {
+            'key': self.key,
+            'queries': self.count,
+            'sql_ms': round(self.total_ms, 2),
+            'fingerprints': fingerprints,
+            'n_plus_one': [f for f in fingerprints if f['count'] >= Config.SQL_N_PLUS_ONE_THRESHOLD],
+            'slow_queries': len(self.slow)
+        }
+
+
+class _Entry:
+    """一条已执行语句（fetch 耗时累加到该语句上）"""
+
+    __slots__ = ('sql', 'params', 'elapsed_ms', 'many', 'logged')
+
+    def __init__(self, sql, params, elapsed_ms, many):
+        self.sql = sql
+        self.params = params
+        self.elapsed_ms = elapsed_ms
+        self.many = many
+        self.logged = False
+
+
+def _current_collector():
+    if has_app_context():
+        return g.get('sql_collector')
+    return None
+
+
+def _log_slow(connection, entry, collector):
+    """记录慢查询及其执行计划"""
+    entry.logged = True
+    plan = ''
+    if not entry.many:
+        try:
+            # 用普通游标执行，避免计入统计
+            rows = sqlite3.Cursor(connection).execute(
+                'EXPLAIN QUERY PLAN ' + entry.sql, entry.params
+            ).fetchall()
+            plan = ' | '.join(str(row[-1]) for row in rows)
+        except sqlite3.Error as e:
+            plan = f'无法获取执行计划：{e}'
+
+    collector.slow.append(entry.sql)
+    _get_logger().warning(
+        '[慢查询] %s %.1fms %s\n    SQL: %s\n    PLAN: %s',
+        collector.key, entry.elapsed_ms, '(executemany)' if entry.many else '',
+        fingerprint(entry.sql)[:1000], plan
+    )
+
+
+class MonitoredCursor(sqlite3.Cursor):
+    """记录耗时的游标（fetch 耗时计入最近一条语句）"""
+
+    _entry = None
+
+    def _run(self, method, sql, params, many=False):
+        started = time.perf_counter()
+        result = method(sql, params)
+        if not many:
+            record_query_shape(sql, params)
+        collector = _current_collector()
+        if collector is not None and not sql.lstrip().upper().startswith(_CONTROL_PREFIXES):
+            entry = _Entry(sql, params, (time.perf_counter() - started) * 1000, many)
+            collector.record(entry)
+            self._entry = entry
+            if entry.elapsed_ms >= Config.SQL_SLOW_QUERY_MS:
+                _log_slow(self.connection, entry, collector)
+        else:
+            self._entry = None
+        return result
+
+    def _timed_fetch(self, method, *args):
+        started = time.perf_counter()
+        rows = method(*args)
+        entry = self._entry
+        collector = _current_collector()
+        if entry is not None and collector is not None:
+            elapsed = (time.perf_counter() - started) * 1000
+            entry.elapsed_ms += elapsed
+            collector.add_time(entry, elapsed)
+            if not entry.logged and entry.elapsed_ms >= Config.SQL_SLOW_QUERY_MS:
+                _log_slow(self.connection, entry, collector)
+        return rows
+
+    def execute(self, sql, parameters=()):
+        return self._run(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._run(super().executemany, sql, seq_of_parameters, many=True)
+
+    def executescript(self, sql_script):
+        run_script = lambda sql, _: super(MonitoredCursor, self).executescript(sql)
+        return self._run(run_script, sql_script, None, many=True)
+
+    def fetchone(self):
+        return self._timed_fetch(super().fetchone)
+
+    def fetchmany(self, size=None):
+        if size is None:
+            return self._timed_fetch(super().fetchmany)
+        return self._timed_fetch(super().fetchmany, size)
+
+    def fetchall(self):
+        return self._timed_fetch(super().fetchall)
+
+
+class MonitoredConnection(sqlite3.Connection):
+    """get_db 使用的连接类，所有语句经由 MonitoredCursor 执行"""
+
+    def cursor(self, factory=MonitoredCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+
+def begin_collection(key):
+    """开始统计（请求开始、后台任务开始时调用）"""
+    g.sql_collector = SqlCollector(key)
+
+
+def finish_collection():
+    """
+    结束统计并计入汇总
+
+    Returns:
+        dict or None: 本次统计摘要（见 SqlCollector.summary）
+    """
+    collector = g.pop('sql_collector', None)
+    if collector is None:
+        return None
+
+    summary = collector.summary()
+    for item in summary['n_plus_one']:
+        _get_logger().warning(
+            '[N+1] %s 同一语句执行%d次（%.1fms）：%s',
+            collector.key, item['count'], item['ms'], item['fingerprint'][:1000]
+        )
+
+    with _stats_lock:
+        stats = _stats.get(collector.key)
+        if stats is None:
+            stats = _stats[collector.key] = {
+                'count': 0,
+                'queries_total': 0,
+                'queries_max': 0,
+                'sql_ms_total': 0.0,
+                'sql_ms_max': 0.0,
+                'n_plus_one_count': 0,
+                'slow_queries': 0,
+                'fingerprints': Counter(),
+                'n_plus_one': {}
+            }
+        stats['count'] += 1
+        stats['queries_total'] += summary['queries']
+        stats['queries_max'] = max(stats['queries_max'], summary['queries'])
+        stats['sql_ms_total'] += summary['sql_ms']
+        stats['sql_ms_max'] = max(stats['sql_ms_max'], summary['sql_ms'])
+        stats['slow_queries'] += summary['slow_queries']
+        if summary['n_plus_one']:
+            stats['n_plus_one_count'] += 1
+        for item in summary['fingerprints']:
+            stats['fingerprints'][item['fingerprint']] += item['count']
+        for item in summary['n_plus_one']:
+            stats['n_plus_one'][item['fingerprint']] = max(
+                stats['n_plus_one'].get(item['fingerprint'], 0), item['count']
+            )
+
+    return summary
+
+
+def get_sql_stats(sort='sql_ms_total', limit=50):
+    """
+    路由/任务SQL汇总
+
+    Args:
+        sort: 排序字段（queries_avg, queries_max, sql_ms_avg, sql_ms_total, n_plus_one_count, count）
+        limit: 返回条数
+
+    Returns:
+        list: [{'key', 'count', 'queries_avg', 'queries_max', 'sql_ms_avg', 'sql_ms_total', 'sql_ms_max',
+                'n_plus_one_count', 'slow_queries', 'top_fingerprints', 'n_plus_one'}]
+    """
+    with _stats_lock:
+        rows = []
+        for key, stats in _stats.items():
+            rows.append({
+                'key': key,
+                'count': stats['count'],
+                'queries_avg': round(stats['queries_total'] / stats['count'], 1),
+                'queries_max': stats['queries_max'],
+                'sql_ms_avg': round(stats['sql_ms_total'] / stats['count'], 2),
+                'sql_ms_total': round(stats['sql_ms_total'], 2),
+                'sql_ms_max': round(stats['sql_ms_max'], 2),
+                'n_plus_one_count': stats['n_plus_one_count'],
+                'slow_queries': stats['slow_queries'],
+                'top_fingerprints': [
+                    {'fingerprint': fp, 'count': count}
+                    for fp, count in stats['fingerprints'].most_common(TOP_FINGERPRINTS)
+                ],
+                'n_plus_one': [
+                    {'fingerprint': fp, 'max_count': count}
+                    for fp, count in sorted(stats['n_plus_one'].items(), key=lambda x: -x[1])
+                ]
+            })
+
+    if rows and sort not in rows[0]:
+        sort = 'sql_ms_total'
+    rows.sort(key=lambda r: r[sort], reverse=True)
+    return rows[:limit]
+
+
+def reset_sql_stats():
+    """清空汇总"""
+    with _stats_lock:
+        _stats.clear()
+
+
+def init_app(app):
+    """注册请求钩子：每个请求单独统计，调试模式下附加响应头"""
+    if not Config.SQL_MONITOR_ENABLED:
+        return
+
+    @app.before_request
+    def _begin_request_collection():
+        if request.endpoint and request.endpoint != 'static':
+            begin_collection(f'{request.method} {request.endpoint}')
+
+    @app.after_request
+    def _finish_request_collection(response):
+        summary = finish_collection()
+        if summary and (app.debug or Config.SQL_MONITOR_HEADERS):
+            response.headers['X-SQL-Queries'] = str(summary['queries'])
+            response.headers['X-SQL-Time-Ms'] = f"{summary['sql_ms']:.1f}"
+            response.headers['X-SQL-N-Plus-One'] = str(len(summary['n_plus_one']))
+        return response
+
+    @app.teardown_request
+    def _discard_request_collection(exc=None):
+        # 视图抛出异常时 after_request 不执行，仍计入汇总
+        finish_collection()
@@ -1,16 +1,191 @@
 """
 人员状态流转引擎
+
+规则判断（evaluate_*）为纯函数，只依赖传入的天数与出单数；
+check_* 函数负责从数据库取数后调用规则判断。
+所有检查均以 as_of 为基准日期（默认今天），便于历史回放。
 """
 from datetime import datetime, timedelta
 from core.database import query_db
+from core.workday import resolve_as_of, get_recent_workdays
+from core.cache import invalidate_employee_tags
+
+
+# ==================== 流转规则配置 ====================
+
+STATUS_RULES = {
+    'trainee': {
+        'min_days': 3            # 在岗满3天转C
+    },
+    'C': {
+        'min_days': 3,           # 未满3天不判断
+        'max_days': 6,           # 6天内达标晋升B，超期未达标淘汰
+        'recent_days': 3,
+        'min_orders': 3
+    },
+    'B': {
+        'min_days': 6,
+        'max_days': 9,
+        'recent_days': 6,
+        'min_orders': 12
+    },
+    'A': {
+        'recent_days': 6,
+        'max_orders': 12,        # 最近6天出单≤12单降级
+        'month_check_day': 25,   # 25号之后检查当月有效工作日
+        'min_month_workdays': 20
+    }
+}
+
+
+# ==================== 规则判断（纯函数） ====================
+
+def _result(should_change, new_status, reason, days_in_status):
+    return {
+        'should_change': should_change,
+        'new_status': new_status,
+        'reason': reason,
+        'days_in_status': days_in_status
+    }
+
+
+def evaluate_trainee_transition(days_in_status, rules=None):
+    """trainee → C：在岗满3天自动转C"""
+    rule = (rules or STATUS_RULES)['trainee']
+    if days_in_status >= rule['min_days']:
+        return _result(True, 'C', f'培训期满{rule["min_days"]}天', days_in_status)
+
+    return _result(False, 'trainee', f'培训期未满{rule["min_days"]}天（当前{days_in_status}天）', days_in_status)
+
+
+def evaluate_c_transition(days_in_status, recent_orders, rules=None):
+    """
+    C → B：C在岗天数≤6 且 最近3天累计出单≥3
+    C → eliminated：C在岗天数>6 且 最近3天累计出单<3
+
+    Args:
+        days_in_status: 在岗天数
+        recent_orders: 出单数查询函数 recent_orders(days) -> int（按需调用）
+        rules: 规则配置（默认 STATUS_RULES）
+    """
+    rule = (rules or STATUS_RULES)['C']
+    if days_in_status < rule['min_days']:
+        return _result(False, 'C', f'C状态未满{rule["min_days"]}天（当前{days_in_status}天）', days_in_status)
+
+    orders = recent_orders(rule['recent_days'])
+    recent_days, min_orders, max_days = rule['recent_days'], rule['min_orders'], rule['max_days']
+
+    # C在岗≤6天 且 最近3天出单≥3 → 晋升B
+    if days_in_status <= max_days and orders >= min_orders:
+        return _result(True, 'B', f'{max_days}天内最近{recent_days}天出单≥{min_orders}单（实际{orders}单）', days_in_status)
+
+    # C在岗>6天 且 最近3天出单<3 → 淘汰
+    if days_in_status > max_days and orders < min_orders:
+        return _result(True, 'eliminated', f'超{max_days}天最近{recent_days}天出单<{min_orders}单（实际{orders}单）', days_in_status)
+
+    return _result(False, 'C', f'暂不符合流转条件（在岗{days_in_status}天，最近{recent_days}天{orders}单）', days_in_status)
+
+
+def evaluate_b_transition(days_in_status, recent_orders, rules=None):
+    """
+    B → A：B在岗天数≤9 且 最近6天累计出单≥12
+    B → C：B在岗天数>9 且 最近6天累计出单<12
+    """
+    rule = (rules or STATUS_RULES)['B']
+    if days_in_status < rule['min_days']:
+        return _result(False, 'B', f'B状态未满{rule["min_days"]}天（当前{days_in_status}天）', days_in_status)
+
+    orders = recent_orders(rule['recent_days'])
+    recent_days, min_orders, max_days = rule['recent_days'], rule['min_orders'], rule['max_days']
 
+    # B在岗≤9天 且 最近6天出单≥12 → 晋升A
+    if days_in_status <= max_days and orders >= min_orders:
+        return _result(True, 'A', f'{max_days}天内最近{recent_days}天出单≥{min_orders}单（实际{orders}单）', days_in_status)
+
+    # B在岗>9天 且 最近6天出单<12 → 降级C
+    if days_in_status > max_days and orders < min_orders:
+        return _result(True, 'C', f'超{max_days}天最近{recent_days}天出单<{min_orders}单（实际{orders}单）', days_in_status)
 
-def check_status_transition(employee_id):
+    return _result(False, 'B', f'暂不符合流转条件（在岗{days_in_status}天，最近{recent_days}天{orders}单）', days_in_status)
+
+
+def evaluate_a_transition(days_in_status, recent_orders, month_valid_workdays, as_of, rules=None):
+    """
+    A → C：最近6天累计出单≤12；或当月>25号时发现有效工作日<20
+
+    Args:
+        recent_orders: 出单数查询函数 recent_orders(days) -> int
+        month_valid_workdays: 当月有效工作日查询函数 month_valid_workdays() -> int（仅25号后调用）
+        as_of: 基准日期
+    """
+    rule = (rules or STATUS_RULES)['A']
+    orders = recent_orders(rule['recent_days'])
+
+    # 检查最近6天出单
+    if orders <= rule['max_orders']:
+        return _result(True, 'C', f'最近{rule["recent_days"]}天出单≤{rule["max_orders"]}单（实际{orders}单）', days_in_status)
+
+    # 检查当月有效工作日（仅在25号之后）
+    if as_of.day > rule['month_check_day']:
+        valid_workdays = month_valid_workdays()
+        if valid_workdays < rule['min_month_workdays']:
+            return _result(True, 'C', f'月末有效工作日<{rule["min_month_workdays"]}天（实际{valid_workdays}天）', days_in_status)
+
+    return _result(False, 'A', f'维持A级（最近{rule["recent_days"]}天{orders}单）', days_in_status)
+
+
+def evaluate_status_transition(status, days_in_status, as_of, recent_orders, month_valid_workdays, rules=None):
+    """
+    按当前状态分派到对应的规则判断
+
+    Args:
+        status: 当前状态
+        days_in_status: 在当前状态的天数
+        as_of: 基准日期
+        recent_orders: recent_orders(days) -> int，截至 as_of 最近N天出单数
+        month_valid_workdays: month_valid_workdays() -> int，as_of 所在月截至当日的有效工作日数
+        rules: 规则配置（默认 STATUS_RULES）
+
+    Returns:
+        dict: {'should_change', 'new_status', 'reason', 'days_in_status'}
+    """
+    if status == 'trainee':
+        return evaluate_trainee_transition(days_in_status, rules)
+
+    elif status == 'C':
+        return evaluate_c_transition(days_in_status, recent_orders, rules)
+
+    elif status == 'B':
+        return evaluate_b_transition(days_in_status, recent_orders, rules)
+
+    elif status == 'A':
+        return evaluate_a_transition(days_in_status, recent_orders, month_valid_workdays, as_of, rules)
+
+    elif status == 'eliminated':
+        # 已淘汰，无需流转
+        return _result(False, 'eliminated', '已淘汰', days_in_status)
+
+    # 默认不变更
+    return _result(False, status, '无需变更', days_in_status)
+
+
+# ==================== 数据库检查 ====================
+
+def _to_date(value):
+    if isinstance(value, str):
+        return datetime.strptime(value[:10], '%Y-%m-%d').date()
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+def check_status_transition(employee_id, as_of=None):
     """
     检查员工是否需要状态流转
     
     Args:
         employee_id: 员工ID
+        as_of: 基准日期（默认今天）
         
     Returns:
         dict: {
@@ -35,219 +210,79 @@ def check_status_transition(employee_id):
             'days_in_status': 0
         }
     
-    status = employee['status']
-    
-    # 处理 join_date（可能是字符串或 date 对象）
-    join_date = employee['join_date']
-    if isinstance(join_date, str):
-        join_date = datetime.strptime(join_date, '%Y-%m-%d').date()
+    as_of = resolve_as_of(as_of)
     
-    today = datetime.now().date()
-    
-    # 获取最后一次状态变更记录
+    # 获取基准日期之前最后一次状态变更记录
     last_change = query_db(
         '''SELECT change_date, to_status 
            FROM status_history 
-           WHERE employee_id = ? 
+           WHERE employee_id = ? AND change_date <= ?
            ORDER BY change_date DESC, id DESC 
            LIMIT 1''',
-        (employee_id,),
+        (employee_id, as_of.strftime('%Y-%m-%d')),
         one=True
     )
     
-    # 计算在当前状态的天数
+    # 计算在当前状态的天数（没有状态变更记录时使用入职日期）
     if last_change:
-        # 处理 change_date（可能是字符串或 date 对象）
-        status_start_date = last_change['change_date']
-        if isinstance(status_start_date, str):
-            status_start_date = datetime.strptime(status_start_date, '%Y-%m-%d').date()
-        days_in_status = (today - status_start_date).days
+        status_start_date = _to_date(last_change['change_date'])
     else:
-        # 没有状态变更记录，使用入职日期
-        days_in_status = (today - join_date).days
-    
-    # 根据不同状态判断是否需要流转
-    if status == 'trainee':
-        return check_trainee_transition(employee_id, days_in_status)
+        status_start_date = _to_date(employee['join_date'])
+    days_in_status = (as_of - status_start_date).days
     
-    elif status == 'C':
-        return check_c_transition(employee_id, days_in_status)
-    
-    elif status == 'B':
-        return check_b_transition(employee_id, days_in_status)
-    
-    elif status == 'A':
-        return check_a_transition(employee_id, days_in_status)
-    
-    elif status == 'eliminated':
-        # 已淘汰，无需流转
-        return {
-            'should_change': False,
-            'new_status': 'eliminated',
-            'reason': '已淘汰',
-            'days_in_status': days_in_status
-        }
-    
-    # 默认不变更
-    return {
-        'should_change': False,
-        'new_status': status,
-        'reason': '无需变更',
-        'days_in_status': days_in_status
-    }
+    return evaluate_status_transition(
+        employee['status'], days_in_status, as_of,
+        recent_orders=lambda days: get_recent_days_orders(employee_id, days, as_of),
+        month_valid_workdays=lambda: get_month_valid_workdays(employee_id, as_of.year, as_of.month, as_of)
+    )
 
 
 def check_trainee_transition(employee_id, days_in_status):
     """trainee → C：在岗满3天自动转C"""
-    if days_in_status >= 3:
-        return {
-            'should_change': True,
-            'new_status': 'C',
-            'reason': '培训期满3天',
-            'days_in_status': days_in_status
-        }
-    
-    return {
-        'should_change': False,
-        'new_status': 'trainee',
-        'reason': f'培训期未满3天（当前{days_in_status}天）',
-        'days_in_status': days_in_status
-    }
+    return evaluate_trainee_transition(days_in_status)
 
 
-def check_c_transition(employee_id, days_in_status):
-    """
-    C → B：C在岗天数≤6 且 最近3天累计出单≥3
-    C → eliminated：C在岗天数>6 且 最近3天累计出单<3
-    """
-    if days_in_status < 3:
-        return {
-            'should_change': False,
-            'new_status': 'C',
-            'reason': f'C状态未满3天（当前{days_in_status}天）',
-            'days_in_status': days_in_status
-        }
-    
-    # 计算最近3天的出单数
-    recent_3_days_orders = get_recent_days_orders(employee_id, 3)
-    
-    # C在岗≤6天 且 最近3天出单≥3 → 晋升B
-    if days_in_status <= 6 and recent_3_days_orders >= 3:
-        return {
-            'should_change': True,
-            'new_status': 'B',
-            'reason': f'6天内最近3天出单≥3单（实际{recent_3_days_orders}单）',
-            'days_in_status': days_in_status
-        }
-    
-    # C在岗>6天 且 最近3天出单<3 → 淘汰
-    if days_in_status > 6 and recent_3_days_orders < 3:
-        return {
-            'should_change': True,
-            'new_status': 'eliminated',
-            'reason': f'超6天最近3天出单<3单（实际{recent_3_days_orders}单）',
-            'days_in_status': days_in_status
-        }
-    
-    return {
-        'should_change': False,
-        'new_status': 'C',
-        'reason': f'暂不符合流转条件（在岗{days_in_status}天，最近3天{recent_3_days_orders}单）',
-        'days_in_status': days_in_status
-    }
+def check_c_transition(employee_id, days_in_status, as_of=None):
+    """C级流转检查（规则见 evaluate_c_transition）"""
+    return evaluate_c_transition(
+        days_in_status,
+        lambda days: get_recent_days_orders(employee_id, days, as_of)
+    )
 
 
-def check_b_transition(employee_id, days_in_status):
-    """
-    B → A：B在岗天数≤9 且 最近6天累计出单≥12
-    B → C：B在岗天数>9 且 最近6天累计出单<12
-    """
-    if days_in_status < 6:
-        return {
-            'should_change': False,
-            'new_status': 'B',
-            'reason': f'B状态未满6天（当前{days_in_status}天）',
-            'days_in_status': days_in_status
-        }
-    
-    # 计算最近6天的出单数
-    recent_6_days_orders = get_recent_days_orders(employee_id, 6)
-    
-    # B在岗≤9天 且 最近6天出单≥12 → 晋升A
-    if days_in_status <= 9 and recent_6_days_orders >= 12:
-        return {
-            'should_change': True,
-            'new_status': 'A',
-            'reason': f'9天内最近6天出单≥12单（实际{recent_6_days_orders}单）',
-            'days_in_status': days_in_status
-        }
-    
-    # B在岗>9天 且 最近6天出单<12 → 降级C
-    if days_in_status > 9 and recent_6_days_orders < 12:
-        return {
-            'should_change': True,
-            'new_status': 'C',
-            'reason': f'超9天最近6天出单<12单（实际{recent_6_days_orders}单）',
-            'days_in_status': days_in_status
-        }
-    
-    return {
-        'should_change': False,
-        'new_status': 'B',
-        'reason': f'暂不符合流转条件（在岗{days_in_status}天，最近6天{recent_6_days_orders}单）',
-        'days_in_status': days_in_status
-    }
+def check_b_transition(employee_id, days_in_status, as_of=None):
+    """B级流转检查（规则见 evaluate_b_transition）"""
+    return evaluate_b_transition(
+        days_in_status,
+        lambda days: get_recent_days_orders(employee_id, days, as_of)
+    )
 
 
-def check_a_transition(employee_id, days_in_status):
-    """
-    A → C：最近6天累计出单≤12；或当月>25号时发现有效工作日<20
-    """
-    # 计算最近6天的出单数
-    recent_6_days_orders = get_recent_days_orders(employee_id, 6)
-    
-    # 检查最近6天出单
-    if recent_6_days_orders <= 12:
-        return {
-            'should_change': True,
-            'new_status': 'C',
-            'reason': f'最近6天出单≤12单（实际{recent_6_days_orders}单）',
-            'days_in_status': days_in_status
-        }
-    
-    # 检查当月有效工作日（仅在25号之后）
-    today = datetime.now().date()
-    if today.day > 25:
-        valid_workdays = get_month_valid_workdays(employee_id, today.year, today.month)
-        if valid_workdays < 20:
-            return {
-                'should_change': True,
-                'new_status': 'C',
-                'reason': f'月末有效工作日<20天（实际{valid_workdays}天）',
-                'days_in_status': days_in_status
-            }
-    
-    return {
-        'should_change': False,
-        'new_status': 'A',
-        'reason': f'维持A级（最近6天{recent_6_days_orders}单）',
-        'days_in_status': days_in_status
-    }
+def check_a_transition(employee_id, days_in_status, as_of=None):
+    """A级流转检查（规则见 evaluate_a_transition）"""
+    as_of = resolve_as_of(as_of)
+    return evaluate_a_transition(
+        days_in_status,
+        lambda days: get_recent_days_orders(employee_id, days, as_of),
+        lambda: get_month_valid_workdays(employee_id, as_of.year, as_of.month, as_of),
+        as_of
+    )
 
 
-def get_recent_days_orders(employee_id, days):
+def get_recent_days_orders(employee_id, days, as_of=None):
     """
     获取最近N天的总出单数
     
     Args:
         employee_id: 员工ID
         days: 天数
+        as_of: 截止日期（含当天，默认今天）
         
     Returns:
         int: 总出单数
     """
-    today = datetime.now().date()
-    start_date = today - timedelta(days=days-1)  # 包含今天
+    end_date = resolve_as_of(as_of)
+    start_date = end_date - timedelta(days=days-1)  # 包含当天
     
     result = query_db(
         '''SELECT COALESCE(SUM(orders_count), 0) as total 
@@ -255,14 +290,44 @@ def get_recent_days_orders(employee_id, days):
            WHERE employee_id = ? 
            AND work_date >= ? 
            AND work_date <= ?''',
-        (employee_id, start_date.strftime('%Y-%m-%d'), today.strftime('%Y-%m-%d')),
+        (employee_id, start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')),
         one=True
     )
     
     return result['total'] if result else 0
 
 
-def get_month_valid_workdays(employee_id, year, month):
+def get_recent_workday_orders(employee_id, count, as_of=None):
+    """
+    获取截至 as_of 最近N个工作日的有效出单数（晋级、保级规则口径）
+    
+    Args:
+        employee_id: 员工ID
+        count: 工作日数
+        as_of: 截止日期（含当天，默认今天）
+        
+    Returns:
+        int: 总出单数；可追溯的工作日不足N天时返回 None
+    """
+    recent_workdays = get_recent_workdays(resolve_as_of(as_of), count, include_end=True)
+    if len(recent_workdays) < count:
+        return None
+    
+    date_placeholders = ','.join('?' * len(recent_workdays))
+    date_strs = [d.strftime('%Y-%m-%d') for d in recent_workdays]
+    
+    result = query_db(f'''
+        SELECT SUM(orders_count) as total_orders
+        FROM performance
+        WHERE employee_id = ?
+        AND work_date IN ({date_placeholders})
+        AND is_valid_workday = 1
+    ''', [employee_id] + date_strs, one=True)
+    
+    return result['total_orders'] if result and result['total_orders'] else 0
+
+
+def get_month_valid_workdays(employee_id, year, month, as_of=None):
     """
     获取指定月份的有效工作日数
     
@@ -270,26 +335,30 @@ def get_month_valid_workdays(employee_id, year, month):
         employee_id: 员工ID
         year: 年份
         month: 月份
+        as_of: 只统计该日期（含）之前的业绩，默认不限
         
     Returns:
         int: 有效工作日数
     """
-    year_month = f"{year:04d}-{month:02d}"
+    start = f"{year:04d}-{month:02d}-01"
+    end = f"{year + month // 12:04d}-{month % 12 + 1:02d}-01"
+    if as_of is not None:
+        end = min(end, (resolve_as_of(as_of) + timedelta(days=1)).strftime('%Y-%m-%d'))
     
     result = query_db(
         '''SELECT COUNT(*) as count 
            FROM performance 
            WHERE employee_id = ? 
-           AND strftime('%Y-%m', work_date) = ?
+           AND work_date >= ? AND work_date < ?
            AND is_valid_workday = 1''',
-        (employee_id, year_month),
+        (employee_id, start, end),
         one=True
     )
     
     return result['count'] if result else 0
 
 
-def apply_status_change(employee_id, new_status, reason, days_in_status):
+def apply_status_change(employee_id, new_status, reason, days_in_status, as_of=None):
     """
     应用状态变更
     
@@ -298,6 +367,7 @@ def apply_status_change(employee_id, new_status, reason, days_in_status):
         new_status: 新状态
         reason: 变更原因
         days_in_status: 在旧状态的天数
+        as_of: 变更日期（默认今天）
         
     Returns:
         bool: 是否成功
@@ -305,7 +375,7 @@ def apply_status_change(employee_id, new_status, reason, days_in_status):
     from core.database import get_db
     
     db = get_db()
-    today = datetime.now().date().strftime('%Y-%m-%d')
+    change_date = resolve_as_of(as_of).strftime('%Y-%m-%d')
     
     try:
         # 获取当前状态
@@ -331,8 +401,9 @@ def apply_status_change(employee_id, new_status, reason, days_in_status):
             '''INSERT INTO status_history 
                (employee_id, from_status, to_status, change_date, reason, days_in_status)
                VALUES (?, ?, ?, ?, ?, ?)''',
-            (employee_id, old_status, new_status, today, reason, days_in_status)
+            (employee_id, old_status, new_status, change_date, reason, days_in_status)
         )
+        invalidate_employee_tags(employee_ids=[employee_id])
         
         db.commit()
         return True
@@ -343,20 +414,31 @@ def apply_status_change(employee_id, new_status, reason, days_in_status):
         return False
 
 
-def batch_check_all_employees():
+def batch_check_all_employees(progress=None, as_of=None, team=None):
     """
     批量检查所有在职员工的状态流转
     
+    Args:
+        progress: 进度回调 progress(done, total, message)（后台任务使用）
+        as_of: 基准日期（默认今天），只检查该日期前已入职的员工
+        team: 只检查该团队（默认全部）
+    
     Returns:
         list: 需要变更的员工列表
     """
-    employees = query_db(
-        'SELECT id, employee_no, name, status, team FROM employees WHERE is_active = 1'
-    )
+    as_of = resolve_as_of(as_of)
+    query = 'SELECT id, employee_no, name, status, team FROM employees WHERE is_active = 1 AND join_date <= ?'
+    params = [as_of.strftime('%Y-%m-%d')]
+    if team:
+        query += ' AND team = ?'
+        params.append(team)
+    employees = query_db(query, params)
     
     changes = []
-    for emp in employees:
-        result = check_status_transition(emp['id'])
+    for index, emp in enumerate(employees, start=1):
+        if progress:
+            progress(index, len(employees), emp['employee_no'])
+        result = check_status_transition(emp['id'], as_of)
         if result['should_change']:
             changes.append({
                 'employee_id': emp['id'],
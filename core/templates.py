@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+模板模块
+    - 编译结果写入文件字节码缓存（Config.TEMPLATE_CACHE_DIR），进程重启或新增 worker 时直接加载，不再重新编译
+    - precompile_templates 编译全部模板（build_assets.py 构建时、生产模式启动预热时调用）
+    - check_templates 只做语法检查，并列出路由引用但不存在的模板（CI：python build_assets.py --check-templates）
+"""
+
+import os
+import re
+from jinja2 import FileSystemBytecodeCache, TemplateSyntaxError
+from config import Config
+
+# 路由中 render_template('xxx.html' 的模板名
+_RENDER_TEMPLATE = re.compile(r"render_template\(\s*['\"]([^'\"]+)['\"]")
+
+
+def _template_names(app):
+    return [name for name in app.jinja_env.list_templates() if name.endswith('.html')]
+
+
+def precompile_templates(app):
+    """
+    编译全部模板（写入字节码缓存与进程内模板缓存）
+
+    Returns:
+        dict: {'compiled': int, 'errors': [{'template', 'error'}]}
+    """
+    compiled, errors = 0, []
+    for name in _template_names(app):
+        try:
+            app.jinja_env.get_template(name)
+            compiled += 1
+        except Exception as e:
+            errors.append({'template': name, 'error': str(e)})
+    return {'compiled': compiled, 'errors': errors}
+
+
+def check_templates(app, source_dirs=('routes',)):
+    """
+    模板语法检查（不写缓存）
+
+    Args:
+        app: Flask 应用
+        source_dirs: 扫描 render_template 引用的代码目录（相对应用根目录）
+
+    Returns:
+        dict: {'checked': int, 'errors': [{'template', 'line', 'error'}], 'missing': [{'template', 'file'}]}
+    """
+    env = app.jinja_env
+    checked, errors = 0, []
+    for name in _template_names(app):
+        source, filename, _ = env.loader.get_source(env, name)
+        try:
+            env.compile(source, name, filename)
+            checked += 1
+        except TemplateSyntaxError as e:
+            errors.append({'template': name, 'line': e.lineno, 'error': e.message})
+
+    existing = set(env.list_templates())
+    missing = []
+    for directory in source_dirs:
+        root = os.path.join(app.root_path, directory)
+        for filename in sorted(os.listdir(root)):
+            if not filename.endswith('.py'):
+                continue
+            with open(os.path.join(root, filename), encoding='utf-8') as f:
+                for name in _RENDER_TEMPLATE.findall(f.read()):
+                    if name not in existing:
+                        missing.append({'template': name, 'file': f'{directory}/{filename}'})
+    return {'checked': checked, 'errors': errors, 'missing': missing}
+
+
+def init_app(app):
+    """启用文件字节码缓存"""
+    if Config.TEMPLATE_BYTECODE_CACHE:
+        os.makedirs(Config.TEMPLATE_CACHE_DIR, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(Config.TEMPLATE_CACHE_DIR)
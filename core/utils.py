@@ -3,12 +3,7 @@
 """
 from datetime import datetime
 import io
-try:
-    from openpyxl import Workbook
-    from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-    HAS_OPENPYXL = True
-except ImportError:
-    HAS_OPENPYXL = False
+from core.cache import cached, TAG_EMPLOYEES, TAG_TEAMS
 
 
 def export_to_excel(data, headers, filename='export.xlsx'):
@@ -23,7 +18,10 @@ def export_to_excel(data, headers, filename='export.xlsx'):
     Returns:
         BytesIO: Excel 文件的字节流
     """
-    if not HAS_OPENPYXL:
+    try:
+        from openpyxl import Workbook
+        from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+    except ImportError:
         raise ImportError("openpyxl 未安装，无法导出 Excel")
     
     wb = Workbook()
@@ -92,6 +90,14 @@ def format_date(date_str, format='%Y-%m-%d'):
         return date_str
 
 
+def validate_year_month(year_month):
+    """验证年月格式（YYYY-MM，月份 01-12）"""
+    try:
+        return datetime.strptime(year_month, '%Y-%m').strftime('%Y-%m') == year_month
+    except (TypeError, ValueError):
+        return False
+
+
 def validate_phone(phone):
     """验证手机号格式"""
     if not phone:
@@ -108,3 +114,27 @@ def format_currency(amount):
 
 
 
+
+
+@cached(tags=[TAG_EMPLOYEES])
+def get_employee_teams():
+    """
+    员工所属的全部团队（用于筛选，员工变动时失效）
+    
+    Returns:
+        list: [{'team': 团队名}]
+    """
+    from core.database import query_db
+    return [{'team': row['team']} for row in query_db('SELECT DISTINCT team FROM employees ORDER BY team')]
+
+
+@cached(tags=[TAG_TEAMS])
+def get_active_teams():
+    """
+    启用的团队（用于表单选择，团队增删时失效）
+    
+    Returns:
+        list: [{'team_name': 团队名}]
+    """
+    from core.database import query_db
+    return [{'team_name': row['team_name']} for row in query_db('SELECT team_name FROM teams WHERE is_active = 1')]
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+生产模式启动与健康检查
+gunicorn 预加载应用（preload_app）时，主进程在 fork 之前执行 warmup_app：
+    - 数据库切换到 WAL，多个 worker 并发读不阻塞写
+    - 载入工作日索引、编译全部模板（同时写入字节码缓存）、计算静态资源指纹，fork 后各 worker 共享（写时复制）
+    - 执行进程已退出的排队中/执行中后台任务标记为失败（平滑重载时旧 worker 仍在执行的任务按心跳保留）
+每个 worker fork 后执行 init_worker：丢弃从主进程继承的连接、缓存与线程池，建立本进程的连接并预热。
+/healthz（存活）与 /readyz（就绪）供负载均衡与容器健康检查使用。
+"""
+
+import logging
+import os
+import time
+from flask import current_app
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# worker 启动时预热的常用表（加载页缓存与语句缓存）
+WARMUP_QUERIES = (
+    'SELECT COUNT(*) FROM users',
+    'SELECT COUNT(*) FROM employees',
+    'SELECT COUNT(*) FROM teams',
+    'SELECT COUNT(*) FROM performance',
+    'SELECT COUNT(*) FROM salary_ledger',
+    'SELECT COUNT(*) FROM payroll_records',
+    'SELECT param_key, param_value FROM system_params'
+)
+
+# 预热状态：status 为 None（未执行预热，如开发模式）、'warming'、'ready'、'failed'
+_state = {
+    'status': None,
+    'warmup_ms': None,
+    'templates': 0,
+    'static_files': 0,
+    'template_errors': [],
+    'error': None,
+    'worker_pid': None,
+    'worker_started_at': None
+}
+
+
+def warmup_app(app):
+    """
+    主进程预热（fork 之前调用一次）
+
+    Returns:
+        dict: 预热状态（见 get_warmup_state）
+    """
+    from core.database import get_db
+    from core.workday import get_calendar_index
+    from core.assets import warm_fingerprints
+    from core.templates import precompile_templates
+    from core.jobs import recover_stale_jobs
+
+    _state['status'] = 'warming'
+    started = time.perf_counter()
+    try:
+        with app.app_context():
+            db = get_db()
+            db.execute('PRAGMA journal_mode = WAL')
+            get_calendar_index()
+            # 执行进程已退出的任务不会再执行；其他进程（平滑重载中的旧 worker、其他实例）仍在执行的任务不受影响
+            stale_jobs = recover_stale_jobs()
+            if stale_jobs:
+                logger.warning('%s 个执行进程已退出的后台任务已标记为失败', stale_jobs)
+        compiled = precompile_templates(app)
+        _state['templates'], _state['template_errors'] = compiled['compiled'], compiled['errors']
+        for error in compiled['errors']:
+            logger.warning('模板编译失败：%s %s', error['template'], error['error'])
+        _state['static_files'] = warm_fingerprints()
+        _state['status'] = 'ready'
+    except Exception as e:
+        _state['status'] = 'failed'
+        _state['error'] = str(e)
+        logger.exception('预热失败')
+    finally:
+        # 主进程不保留连接，避免被 fork 到各 worker
+        discard_process_state()
+        _state['warmup_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    return get_warmup_state()
+
+
+def discard_process_state():
+    """丢弃当前进程的数据库/快照连接、缓存实例、任务线程池与维护线程（fork 后的子进程不可复用）"""
+    from core.database import discard_thread_connections
+    from core.cache import discard_cache
+    from core.jobs import discard_executor
+    from core.db_maintenance import discard_scheduler
+    from core.report_snapshot import discard_snapshot_connections
+
+    discard_thread_connections()
+    discard_snapshot_connections()
+    discard_cache()
+    discard_executor()
+    discard_scheduler()
+
+
+def init_worker(app):
+    """
+    worker 进程初始化（fork 之后调用）
+
+    建立本进程的数据库连接并预热常用表，启动数据库维护线程
+    """
+    from core.database import get_db
+    from core.db_maintenance import start_maintenance_scheduler
+
+    discard_process_state()
+    _state['worker_pid'] = os.getpid()
+    _state['worker_started_at'] = time.strftime('%Y-%m-%d %H:%M:%S')
+    try:
+        with app.app_context():
+            db = get_db()
+            for sql in WARMUP_QUERIES:
+                db.execute(sql).fetchall()
+    except Exception as e:
+        # 预热失败不阻止 worker 启动，由 /readyz 反映数据库状态
+        logger.warning('worker %s 预热失败：%s', os.getpid(), e)
+    start_maintenance_scheduler()
+
+
+def get_warmup_state():
+    """
+    Returns:
+        dict: {'status', 'warmup_ms', 'templates', 'static_files', 'template_errors', 'error', 'worker_pid', 'worker_started_at'}
+    """
+    return dict(_state, template_errors=list(_state['template_errors']))
+
+
+def readiness():
+    """
+    就绪检查：数据库可查询且预热已完成（未执行预热的开发模式只检查数据库）
+
+    Returns:
+        dict: {'success': bool, 'message': str, 'checks': {...}}
+    """
+    from core.database import get_db
+
+    checks = {'warmup': _state['status'] or 'skipped', 'pid': os.getpid()}
+    try:
+        started = time.perf_counter()
+        get_db().execute('SELECT 1').fetchone()
+        checks['database_ms'] = round((time.perf_counter() - started) * 1000, 2)
+    except Exception as e:
+        checks['database'] = str(e)
+        return {'success': False, 'message': '数据库不可用', 'checks': checks}
+
+    if _state['status'] not in (None, 'ready'):
+        return {'success': False, 'message': f"预热未完成（{_state['status']}）", 'checks': checks}
+
+    checks['persistent_connections'] = Config.DB_PERSISTENT_CONNECTIONS
+    checks['cache_backend'] = Config.CACHE_BACKEND if Config.CACHE_ENABLED else 'disabled'
+    checks['debug'] = current_app.debug
+    return {'success': True, 'message': 'ready', 'checks': checks}
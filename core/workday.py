@@ -5,8 +5,96 @@
 提供工作日判断、计算、获取等功能
 """
 
+import csv
+import io
+import json
+import threading
 from datetime import datetime, timedelta, date
-from core.database import query_db
+from flask import g, has_app_context
+from core.database import query_db, get_db
+from core.cache import cached, invalidate_tags, TAG_CALENDAR
+
+DAY_TYPES = ('workday', 'holiday', 'weekend', 'custom')
+
+# 单个日期区间/单次批量配置最多包含的天数
+MAX_CALENDAR_BATCH_DAYS = 366
+
+# 进程内工作日索引：{'YYYY-MM-DD': is_workday}
+# 通过版本标记（配置行数 + 最后配置时间 + calendar_version 参数）判断是否需要重载，
+# 每个请求最多检查一次版本。索引只整体替换、不原地修改：重建期间其他线程继续读取旧索引
+_calendar_index = {'version': None, 'days': {}}
+_calendar_lock = threading.Lock()
+
+
+def _calendar_version():
+    """读取工作日配置的版本标记"""
+    row = query_db('''
+        SELECT COUNT(*) AS cnt, MAX(configured_at) AS last_at,
+               (SELECT param_value FROM system_params
+                WHERE param_key = 'calendar_version') AS version
+        FROM work_calendar
+    ''', one=True)
+    return (row['cnt'], str(row['last_at']), row['version'])
+
+
+def get_calendar_index():
+    """
+    获取进程内工作日索引（按需重载）
+
+    Returns:
+        dict: {'YYYY-MM-DD': True/False}，未配置的日期不在索引中（默认工作日）
+    """
+    global _calendar_index
+    if has_app_context() and g.get('_calendar_index_checked'):
+        return _calendar_index['days']
+
+    version = _calendar_version()
+    if version != _calendar_index['version']:
+        with _calendar_lock:
+            if version != _calendar_index['version']:
+                rows = query_db('SELECT calendar_date, is_workday FROM work_calendar')
+                days = {str(r['calendar_date'])[:10]: r['is_workday'] == 1 for r in rows}
+                reloaded = _calendar_index['version'] is not None
+                _calendar_index = {'version': version, 'days': days}
+                if reloaded:
+                    # 其他进程修改了日历：按日历缓存的工作日计数同时失效
+                    invalidate_tags(TAG_CALENDAR)
+
+    if has_app_context():
+        g._calendar_index_checked = True
+    return _calendar_index['days']
+
+
+def invalidate_calendar_index():
+    """使工作日索引失效（直接写 work_calendar 后调用；下次读取时重建，重建完成前仍返回旧索引）"""
+    global _calendar_index
+    with _calendar_lock:
+        _calendar_index = {'version': None, 'days': _calendar_index['days']}
+    if has_app_context():
+        g.pop('_calendar_index_checked', None)
+    invalidate_tags(TAG_CALENDAR)
+
+
+def resolve_as_of(as_of=None):
+    """
+    解析规则引擎的"当前日期"
+
+    各规则引擎默认以今天为基准；传入 as_of 时按指定日期判断，
+    用于历史回放与补跑。
+
+    Args:
+        as_of: date/datetime/'YYYY-MM-DD'，None 表示今天
+
+    Returns:
+        date: 基准日期
+    """
+    if as_of is None:
+        return date.today()
+    if isinstance(as_of, datetime):
+        return as_of.date()
+    if isinstance(as_of, str):
+        return datetime.strptime(as_of[:10], '%Y-%m-%d').date()
+    return as_of
 
 
 def is_workday(check_date):
@@ -26,18 +114,8 @@ def is_workday(check_date):
     elif isinstance(check_date, datetime):
         check_date = check_date.date()
     
-    # 查询配置
-    config = query_db(
-        'SELECT is_workday FROM work_calendar WHERE calendar_date = ?',
-        [check_date.strftime('%Y-%m-%d')],
-        one=True
-    )
-    
-    if config:
-        return config['is_workday'] == 1
-    else:
-        # 未配置默认为工作日
-        return True
+    # 查询配置（未配置默认为工作日）
+    return get_calendar_index().get(check_date.strftime('%Y-%m-%d'), True)
 
 
 def count_workdays_in_month(year_month):
@@ -96,11 +174,19 @@ def count_workdays_between(start_date, end_date, include_start=True, include_end
     if start_date > end_date:
         return 0
     
-    # 计数
+    # 先校验日历版本（其他进程修改日历时使计数缓存失效）
+    get_calendar_index()
+    return _count_workdays(start_date, end_date)
+
+
+@cached(ttl=0, tags=[TAG_CALENDAR], local=True, key=lambda start_date, end_date: f'workdays:{start_date}:{end_date}')
+def _count_workdays(start_date, end_date):
+    """闭区间内的工作日数量（按日历标签失效）"""
+    days = get_calendar_index()
     count = 0
     current = start_date
     while current <= end_date:
-        if is_workday(current):
+        if days.get(current.strftime('%Y-%m-%d'), True):
             count += 1
         current += timedelta(days=1)
     
@@ -253,12 +339,13 @@ def get_workdays_in_range(start_date, end_date):
     return workdays
 
 
-def calculate_workdays_since_join(employee_id):
+def calculate_workdays_since_join(employee_id, as_of=None):
     """
     计算员工入职以来的工作日数量
     
     Args:
         employee_id: 员工ID
+        as_of: 截止日期（默认今天）
     
     Returns:
         int: 工作日数量
@@ -278,10 +365,10 @@ def calculate_workdays_since_join(employee_id):
     if isinstance(join_date, str):
         join_date = datetime.strptime(join_date, '%Y-%m-%d').date()
     
-    today = date.today()
+    as_of = resolve_as_of(as_of)
     
     # 入职当天不算，从次日开始
-    return count_workdays_between(join_date, today, include_start=False, include_end=True)
+    return count_workdays_between(join_date, as_of, include_start=False, include_end=True)
 
 
 def format_workday_range(start_date, end_date):
@@ -310,6 +397,285 @@ def format_workday_range(start_date, end_date):
     return f"{start_str}至{end_str}（{count}个工作日）"
 
 
+# ==================== 批量配置 ====================
+
+def expand_date_range(start_date, end_date):
+    """
+    展开日期区间（含首尾）
+
+    Args:
+        start_date: 开始日期
+        end_date: 结束日期
+
+    Returns:
+        list: 'YYYY-MM-DD' 字符串列表
+
+    Raises:
+        ValueError: 日期格式错误或区间超过 MAX_CALENDAR_BATCH_DAYS 天
+    """
+    try:
+        if isinstance(start_date, str):
+            start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
+        if isinstance(end_date, str):
+            end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError(f'日期格式错误 {start_date} ~ {end_date}，应为 YYYY-MM-DD')
+    if (end_date - start_date).days >= MAX_CALENDAR_BATCH_DAYS:
+        raise ValueError(f'日期区间超过 {MAX_CALENDAR_BATCH_DAYS} 天：{start_date} ~ {end_date}')
+
+    return [
+        (start_date + timedelta(days=i)).strftime('%Y-%m-%d')
+        for i in range((end_date - start_date).days + 1)
+    ]
+
+
+def build_calendar_entries(dates=None, ranges=None, is_workday=True, day_type='custom', notes=None):
+    """
+    将日期列表/日期区间组装为批量配置条目
+
+    Args:
+        dates: ['YYYY-MM-DD', ...]
+        ranges: [('YYYY-MM-DD', 'YYYY-MM-DD'), ...]
+        is_workday: 是否工作日
+        day_type: 日期类型
+        notes: 备注（None 表示保留原备注）
+
+    Returns:
+        list: 配置条目
+
+    Raises:
+        ValueError: 参数格式错误，或合计超过 MAX_CALENDAR_BATCH_DAYS 天
+    """
+    dates = dates or []
+    ranges = ranges or []
+    if not isinstance(dates, list) or not all(isinstance(d, str) for d in dates):
+        raise ValueError('dates 应为日期字符串列表')
+    if not isinstance(ranges, list):
+        raise ValueError('ranges 应为日期区间列表')
+
+    all_dates = list(dates)
+    for item in ranges:
+        if not (isinstance(item, (list, tuple)) and len(item) == 2
+                and all(isinstance(d, (str, date)) for d in item)):
+            raise ValueError(f'日期区间格式错误：{item!r}，应为 [开始日期, 结束日期]')
+        all_dates.extend(expand_date_range(*item))
+        if len(all_dates) > MAX_CALENDAR_BATCH_DAYS:
+            break
+    if len(all_dates) > MAX_CALENDAR_BATCH_DAYS:
+        raise ValueError(f'一次最多配置 {MAX_CALENDAR_BATCH_DAYS} 天，请分批配置或导入节假日文件')
+
+    return [
+        {'calendar_date': d, 'is_workday': 1 if is_workday else 0, 'day_type': day_type, 'notes': notes}
+        for d in all_dates
+    ]
+
+
+def parse_holiday_file(content, filename):
+    """
+    解析节假日文件（整年配置）
+
+    CSV: 表头 date,is_workday[,day_type][,notes]，日期支持区间写法 2026-10-01~2026-10-07
+    JSON: [{"date": "2026-10-01~2026-10-07", "is_workday": 0, "day_type": "holiday", "notes": "国庆"}, ...]
+
+    Args:
+        content: 文件内容（str 或 bytes）
+        filename: 文件名（用于判断格式）
+
+    Returns:
+        list: 配置条目
+
+    Raises:
+        ValueError: 文件格式错误
+    """
+    if isinstance(content, bytes):
+        content = content.decode('utf-8-sig')
+
+    if filename.lower().endswith('.json'):
+        try:
+            rows = json.loads(content)
+        except ValueError as e:
+            raise ValueError(f'JSON解析失败: {e}')
+        if not isinstance(rows, list):
+            raise ValueError('JSON文件应为数组')
+    else:
+        rows = list(csv.DictReader(io.StringIO(content)))
+
+    entries = []
+    for line_no, row in enumerate(rows, start=2):
+        if not isinstance(row, dict):
+            raise ValueError(f'第{line_no}行: 应为对象，如 {{"date": "2026-10-01", "is_workday": 0}}')
+        date_value = str(row.get('date') or row.get('calendar_date') or '').strip()
+        if not date_value:
+            raise ValueError(f'第{line_no}行: 缺少日期')
+
+        flag = str(row.get('is_workday', '0')).strip().lower()
+        is_workday_flag = 1 if flag in ('1', 'true', 'yes', '工作日') else 0
+        day_type = (row.get('day_type') or ('workday' if is_workday_flag else 'holiday')).strip()
+        notes = (row.get('notes') or '').strip() or None
+
+        if '~' in date_value:
+            start, end = [part.strip() for part in date_value.split('~', 1)]
+            try:
+                dates = expand_date_range(start, end)
+            except ValueError as e:
+                raise ValueError(f'第{line_no}行: {e}')
+        else:
+            try:
+                dates = [datetime.strptime(date_value, '%Y-%m-%d').strftime('%Y-%m-%d')]
+            except ValueError:
+                raise ValueError(f'第{line_no}行: 日期格式错误 {date_value}，应为 YYYY-MM-DD')
+
+        entries.extend(
+            {'calendar_date': d, 'is_workday': is_workday_flag, 'day_type': day_type, 'notes': notes}
+            for d in dates
+        )
+
+    return entries
+
+
+def bulk_configure_calendar(entries, reason=None, propagate=True, operator_id=None, operator_name=None):
+    """
+    批量配置工作日（单事务）
+
+    与现有配置比对后，只对实际变化的日期执行
+    INSERT ... ON CONFLICT(calendar_date) DO UPDATE，
+    整批写一条审计日志，并同步工作日标记发生翻转的业绩记录。
+
+    Args:
+        entries: [{'calendar_date', 'is_workday', 'day_type', 'notes'}, ...]
+        reason: 原因（写入审计日志）
+        propagate: 是否同步业绩的有效工作日标记
+        operator_id: 操作人ID（默认从session获取）
+        operator_name: 操作人姓名（默认从session获取）
+
+    Returns:
+        dict: {
+            'success', 'message',
+            'requested': 请求的日期数,
+            'changed': [{'calendar_date', 'before', 'after'}, ...],
+            'unchanged_count': 未变化的日期数,
+            'flipped_dates': 工作日/假期发生翻转的日期,
+            'propagation': 业绩同步报告
+        }
+    """
+    from core.audit import log_calendar_batch_change
+    from core.performance_recalculator import propagate_calendar_changes, SQL_CHUNK_SIZE
+
+    # 校验并去重（同一日期以最后一条为准）
+    normalized = {}
+    for entry in entries:
+        date_str = str(entry['calendar_date'])[:10]
+        try:
+            datetime.strptime(date_str, '%Y-%m-%d')
+        except ValueError:
+            return {'success': False, 'message': f'日期格式错误: {date_str}'}
+        day_type = entry.get('day_type') or 'custom'
+        if day_type not in DAY_TYPES:
+            return {'success': False, 'message': f'日期类型错误: {day_type}'}
+        normalized[date_str] = {
+            'is_workday': 1 if int(entry['is_workday']) else 0,
+            'day_type': day_type,
+            'notes': entry.get('notes')
+        }
+
+    if not normalized:
+        return {'success': False, 'message': '没有选择任何日期'}
+
+    db = get_db()
+    dates = sorted(normalized)
+
+    # 读取现有配置
+    existing = {}
+    for i in range(0, len(dates), SQL_CHUNK_SIZE):
+        chunk = dates[i:i + SQL_CHUNK_SIZE]
+        placeholders = ','.join('?' * len(chunk))
+        for row in db.execute(f'''
+            SELECT calendar_date, is_workday, day_type, notes FROM work_calendar
+            WHERE calendar_date IN ({placeholders})
+        ''', chunk).fetchall():
+            existing[str(row['calendar_date'])[:10]] = {
+                'is_workday': row['is_workday'],
+                'day_type': row['day_type'],
+                'notes': row['notes']
+            }
+
+    # 计算差异（只写实际变化的日期）
+    changed = []
+    flipped_dates = []
+    for date_str in dates:
+        after = dict(normalized[date_str])
+        before = existing.get(date_str)
+        if after['notes'] is None and before:
+            after['notes'] = before['notes']
+        if before == after:
+            continue
+        changed.append({'calendar_date': date_str, 'before': before, 'after': after})
+        # 未配置的日期默认为工作日
+        if (before['is_workday'] if before else 1) != after['is_workday']:
+            flipped_dates.append(date_str)
+
+    propagation = None
+    try:
+        if changed:
+            if operator_id is None:
+                from core.audit import _current_operator
+                operator = _current_operator()
+                operator_id = operator.get('user_id')
+                operator_name = operator.get('username')
+
+            db.executemany('''
+                INSERT INTO work_calendar (
+                    calendar_date, is_workday, day_type, notes,
+                    configured_by, configured_name
+                ) VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(calendar_date) DO UPDATE SET
+                    is_workday = excluded.is_workday,
+                    day_type = excluded.day_type,
+                    notes = excluded.notes,
+                    configured_by = excluded.configured_by,
+                    configured_name = excluded.configured_name,
+                    configured_at = CURRENT_TIMESTAMP
+            ''', [
+                (c['calendar_date'], c['after']['is_workday'], c['after']['day_type'],
+                 c['after']['notes'], operator_id, operator_name)
+                for c in changed
+            ])
+
+            # 递增配置版本，其他进程据此重载索引
+            db.execute('''
+                INSERT INTO system_params (param_key, param_value, param_desc)
+                VALUES ('calendar_version', '1', '工作日配置版本（自动维护）')
+                ON CONFLICT(param_key) DO UPDATE SET
+                    param_value = CAST(system_params.param_value AS INTEGER) + 1,
+                    updated_at = CURRENT_TIMESTAMP
+            ''')
+
+            log_calendar_batch_change(changed, reason=reason, commit=False)
+
+            if propagate and flipped_dates:
+                propagation = propagate_calendar_changes(flipped_dates, db=db)
+
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        return {'success': False, 'message': f'配置失败: {str(e)}'}
+
+    # 预热进程内索引
+    if changed:
+        invalidate_calendar_index()
+        get_calendar_index()
+
+    return {
+        'success': True,
+        'message': f'共{len(dates)}天，实际变更{len(changed)}天',
+        'requested': len(dates),
+        'changed': changed,
+        'unchanged_count': len(dates) - len(changed),
+        'flipped_dates': flipped_dates,
+        'propagation': propagation
+    }
+
+
 # 测试函数
 if __name__ == '__main__':
     # 测试工作日判断
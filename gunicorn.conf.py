@@ -0,0 +1,56 @@
+"""
+gunicorn 配置（生产模式：bash run.sh prod）
+
+worker 数默认按 CPU 核数计算（2 × 核数 + 1），可通过环境变量覆盖：
+    PORT              监听端口（默认 8080）
+    WEB_CONCURRENCY   worker 进程数
+    WEB_THREADS       每个 worker 的线程数（默认 4）
+    WEB_TIMEOUT       请求超时秒数（默认 120，导出/工资单生成较慢）
+    MAX_REQUESTS      worker 处理多少请求后自动重启（默认 0 不重启：重启会中断该进程内的后台任务）
+    GUNICORN_PIDFILE  主进程 pid 文件（run.sh reload/stop 使用）
+
+平滑重载：kill -HUP <主进程> 只重启 worker（预加载模式下不重新导入代码）；
+代码更新使用 bash run.sh reload（USR2 启动新主进程后 QUIT 旧主进程）。
+"""
+import multiprocessing
+import os
+
+_BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8080')}"
+workers = int(os.environ.get('WEB_CONCURRENCY') or multiprocessing.cpu_count() * 2 + 1)
+worker_class = 'gthread'
+threads = int(os.environ.get('WEB_THREADS', '4'))
+
+# 主进程导入应用并预热（wsgi.py），worker 通过 fork 共享已加载的模块、模板与工作日索引
+preload_app = True
+
+timeout = int(os.environ.get('WEB_TIMEOUT', '120'))
+graceful_timeout = int(os.environ.get('WEB_GRACEFUL_TIMEOUT', '60'))
+keepalive = 5
+
+max_requests = int(os.environ.get('MAX_REQUESTS', '0'))
+max_requests_jitter = max_requests // 10
+
+pidfile = os.environ.get('GUNICORN_PIDFILE', os.path.join(_BASE_DIR, 'logs', 'gunicorn.pid'))
+accesslog = '-'
+errorlog = '-'
+loglevel = os.environ.get('LOG_LEVEL', 'info')
+
+
+def post_fork(server, worker):
+    """worker 启动：丢弃继承自主进程的连接与线程池，建立本进程的数据库连接"""
+    from app import app
+    from core.warmup import init_worker
+    init_worker(app)
+    server.log.info('worker %s 已初始化', worker.pid)
+
+
+def when_ready(server):
+    from core.warmup import get_warmup_state
+    state = get_warmup_state()
+    server.log.info(
+        '预热%s：%sms，模板 %s 个（失败 %s），静态文件 %s 个',
+        state['status'], state['warmup_ms'], state['templates'],
+        len(state['template_errors']), state['static_files']
+    )
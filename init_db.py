@@ -7,6 +7,7 @@ from datetime import datetime, timedelta
 import random
 from core.auth import hash_password, encrypt_phone
 from config import Config
+from core.migrations import apply_migrations
 
 
 def init_database():
@@ -23,6 +24,11 @@ def init_database():
     with open('schema.sql', 'r', encoding='utf-8') as f:
         cursor.executescript(f.read())
     
+    # 执行迁移（补充扩展字段并登记迁移版本，之后 migrate_database.py 只执行新增迁移）
+    result = apply_migrations(Config.DATABASE, pause=0)
+    if not result['success']:
+        raise RuntimeError(result['message'])
+    
     print("正在插入初始数据...")
     
     # 1. 创建团队
@@ -1,176 +1,120 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """
-数据库迁移脚本 - 应用 schema_extensions.sql
-版本：2.0
-日期：2025-10-15
+数据库迁移脚本
+执行 core/migrations.py 中登记的待执行迁移：先用 SQLite 在线备份 API 备份，
+回填与重建表按批执行并让出写锁，应用无需停机；中断后重新执行从中断处继续。
+
+用法：
+    python3 migrate_database.py
+    python3 migrate_database.py --status
+    python3 migrate_database.py --no-backup --chunk-size 1000 --pause 0.1
+版本：3.0
 """
 
-import sqlite3
 import os
+import argparse
 from config import Config
+from core.migrations import (apply_migrations, backup_database, connect, default_backup_path,
+                             get_migration_status, MIGRATION_CHUNK_SIZE, MIGRATION_PAUSE_SECONDS)
+
+
+def print_status(db_path):
+    """打印迁移状态"""
+    conn = connect(db_path)
+    try:
+        status = get_migration_status(conn)
+    finally:
+        conn.close()
+
+    labels = {'applied': '✓ 已执行', 'running': '… 进行中', 'pending': '  待执行'}
+    for item in status:
+        line = f"{labels[item['status']]}  {item['version']}  {item['name']}"
+        if item['status'] == 'running':
+            line += f"（步骤 {item['step_index'] + 1}/{item['steps']}，已处理 {item['rows_done']} 行）"
+        print(line)
+        if item['error']:
+            print(f"           上次失败：{item['error']}")
 
-def migrate_database():
+
+def migrate_database(db_path=None, backup=True, backup_path=None, target=None,
+                     chunk_size=MIGRATION_CHUNK_SIZE, pause=MIGRATION_PAUSE_SECONDS):
     """执行数据库迁移"""
     print("="*60)
-    print("数据库迁移工具 v2.0")
+    print("数据库迁移工具 v3.0")
     print("="*60)
-    
-    db_path = Config.DATABASE
-    
+
+    db_path = db_path or Config.DATABASE
+
     # 检查数据库是否存在
     if not os.path.exists(db_path):
         print(f"错误：数据库文件不存在：{db_path}")
-        print("请先运行 init_test_data_advanced.py 初始化数据库")
+        print("请先运行 init_db.py 初始化数据库")
         return False
-    
-    # 备份数据库
-    print("\n[1/5] 备份数据库...")
-    backup_path = db_path + '.backup'
-    try:
-        import shutil
-        shutil.copy2(db_path, backup_path)
-        print(f"✓ 数据库已备份到: {backup_path}")
-    except Exception as e:
-        print(f"✗ 备份失败: {e}")
-        return False
-    
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
+
+    conn = connect(db_path)
     try:
-        # 步骤2：更新users表的CHECK约束（添加finance角色）
-        print("\n[2/5] 更新users表（添加finance角色）...")
-        
-        # SQLite不支持直接修改CHECK约束，需要重建表
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users_new (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT NOT NULL UNIQUE,
-                password TEXT NOT NULL,
-                role TEXT NOT NULL CHECK(role IN ('employee', 'manager', 'admin', 'finance')),
-                employee_id INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (employee_id) REFERENCES employees(id)
-            )
-        """)
-        
-        # 复制数据
-        cursor.execute("""
-            INSERT INTO users_new SELECT * FROM users
-        """)
-        
-        # 删除旧表，重命名新表
-        cursor.execute("DROP TABLE users")
-        cursor.execute("ALTER TABLE users_new RENAME TO users")
-        
-        # 重建索引
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_username ON users(username)")
-        
-        print("✓ users表已更新")
-        
-        # 步骤3：更新notifications表的CHECK约束
-        print("\n[3/5] 更新notifications表（添加新通知类型）...")
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS notifications_new (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                title TEXT NOT NULL,
-                content TEXT NOT NULL,
-                type TEXT DEFAULT 'system' CHECK(type IN (
-                    'system', 'status_change', 'salary', 'performance', 'dispute', 'announcement',
-                    'promotion_pending', 'promotion_approved', 'promotion_rejected',
-                    'challenge_triggered', 'challenge_success', 'challenge_failed',
-                    'calendar_changed', 'payroll_ready', 'payroll_paid'
-                )),
-                link TEXT,
-                is_read INTEGER DEFAULT 0 CHECK(is_read IN (0, 1)),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id)
-            )
-        """)
-        
-        cursor.execute("INSERT INTO notifications_new SELECT * FROM notifications")
-        cursor.execute("DROP TABLE notifications")
-        cursor.execute("ALTER TABLE notifications_new RENAME TO notifications")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_notifications_user ON notifications(user_id, is_read, created_at)")
-        
-        print("✓ notifications表已更新")
-        
-        # 步骤4：应用schema_extensions.sql
-        print("\n[4/5] 应用schema扩展...")
-        
-        with open('schema_extensions.sql', 'r', encoding='utf-8') as f:
-            sql_content = f.read()
-            # 移除已经处理的部分
-            # 执行剩余的SQL语句
-            cursor.executescript(sql_content)
-        
-        print("✓ schema扩展已应用")
-        
-        # 步骤5：验证新表
-        print("\n[5/5] 验证新表...")
-        
-        expected_tables = [
-            'promotion_confirmations',
-            'demotion_challenges',
-            'training_assessments',
-            'work_calendar',
-            'audit_logs',
-            'payroll_records',
-            'payroll_adjustments',
-            'payroll_archives'
-        ]
-        
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-        existing_tables = [row[0] for row in cursor.fetchall()]
-        
-        all_exists = True
-        for table in expected_tables:
-            if table in existing_tables:
-                print(f"  ✓ {table}")
-            else:
-                print(f"  ✗ {table} (未找到)")
-                all_exists = False
-        
-        if all_exists:
-            conn.commit()
-            print("\n" + "="*60)
-            print("✅ 数据库迁移成功完成！")
-            print("="*60)
-            print(f"\n新增表：{len(expected_tables)}个")
-            print(f"备份文件：{backup_path}")
-            print("\n可以安全删除备份文件（如果测试通过）")
-            return True
-        else:
-            print("\n⚠️  部分表创建失败")
-            conn.rollback()
-            return False
-            
-    except Exception as e:
-        print(f"\n✗ 迁移失败: {e}")
-        print("正在回滚...")
-        conn.rollback()
-        
-        # 恢复备份
-        try:
-            conn.close()
-            import shutil
-            shutil.copy2(backup_path, db_path)
-            print("✓ 数据库已从备份恢复")
-        except Exception as e2:
-            print(f"✗ 恢复失败: {e2}")
-        
-        return False
-    
+        pending = [item for item in get_migration_status(conn)
+                   if item['status'] != 'applied' and not (target and item['version'] > target)]
     finally:
         conn.close()
+    if not pending:
+        print("\n✅ 没有待执行的迁移")
+        return True
 
+    # 在线备份（应用运行中也可执行）
+    if backup:
+        backup_path = backup_path or default_backup_path(db_path)
+        print(f"\n备份数据库 → {backup_path}")
 
-if __name__ == '__main__':
-    success = migrate_database()
-    exit(0 if success else 1)
+        def on_backup(done, total):
+            print(f"\r  {done}/{total} 页", end='', flush=True)
+
+        try:
+            backup_database(backup_path, db_path, progress=on_backup)
+        except Exception as e:
+            print(f"\n✗ 备份失败: {e}")
+            return False
+        print("\n✓ 备份完成")
 
+    print("\n执行迁移...")
+    last = {}
 
+    def on_progress(version, label, done, total):
+        if total == 0:
+            print(f"  [{version}] {label}（无需变更）")
+        elif total > 1:
+            print(f"\r  [{version}] {label}: {done}/{total}", end='', flush=True)
+        elif last.get('label') != (version, label):
+            print(f"  [{version}] {label}")
+        if total > 1 and done >= total:
+            print()
+        last['label'] = (version, label)
 
+    result = apply_migrations(db_path, target=target, chunk_size=chunk_size, pause=pause,
+                              progress=on_progress)
+    print()
+    print(("✅ " if result['success'] else "✗ ") + result['message'])
+    if backup:
+        print(f"备份文件：{backup_path}（确认无误后可删除）")
+    return result['success']
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='数据库迁移')
+    parser.add_argument('--db', help='数据库路径（默认 Config.DATABASE）')
+    parser.add_argument('--status', action='store_true', help='只查看迁移状态')
+    parser.add_argument('--target', help='执行到该版本为止')
+    parser.add_argument('--no-backup', action='store_true', help='不备份')
+    parser.add_argument('--backup-path', help='备份文件路径')
+    parser.add_argument('--chunk-size', type=int, default=MIGRATION_CHUNK_SIZE, help='每批处理行数')
+    parser.add_argument('--pause', type=float, default=MIGRATION_PAUSE_SECONDS, help='批间暂停秒数')
+    args = parser.parse_args()
+
+    if args.status:
+        print_status(args.db or Config.DATABASE)
+        exit(0)
+
+    success = migrate_database(args.db, backup=not args.no_backup, backup_path=args.backup_path,
+                               target=args.target, chunk_size=args.chunk_size, pause=args.pause)
+    exit(0 if success else 1)
@@ -5,17 +5,25 @@
 包括：工作日配置、工资管理、年度归档
 """
 
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify, Response
 from core.auth import login_required, role_required
 from core.database import query_db, get_db
-from core.workday import is_workday, count_workdays_between
+from core.workday import (
+    is_workday,
+    count_workdays_between,
+    build_calendar_entries,
+    bulk_configure_calendar,
+    parse_holiday_file
+)
 from core.payroll_engine import (
     generate_payroll_for_month,
     adjust_payroll,
+    bulk_adjust_payroll,
+    parse_payroll_adjustment_file,
     archive_payroll_year,
     get_archive_summary
 )
-from core.audit import log_calendar_change
+from core.jobs import enqueue_job
 from datetime import datetime, date, timedelta
 
 bp = Blueprint('admin_ext', __name__, url_prefix='/admin')
@@ -163,51 +171,17 @@ def configure_workday():
         flash('请填写完整信息', 'error')
         return redirect(url_for('admin_ext.work_calendar'))
     
-    db = get_db()
-    cursor = db.cursor()
+    result = bulk_configure_calendar([{
+        'calendar_date': calendar_date,
+        'is_workday': int(is_workday_flag),
+        'day_type': day_type,
+        'notes': notes
+    }], reason=notes or None)
     
-    # 检查是否已存在配置
-    existing = query_db(
-        'SELECT * FROM work_calendar WHERE calendar_date = ?',
-        [calendar_date],
-        one=True
-    )
-    
-    if existing:
-        # 更新
-        cursor.execute('''
-            UPDATE work_calendar
-            SET is_workday = ?,
-                day_type = ?,
-                notes = ?,
-                configured_by = ?,
-                configured_name = ?,
-                configured_at = CURRENT_TIMESTAMP
-            WHERE calendar_date = ?
-        ''', (is_workday_flag, day_type, notes,
-              session.get('user_id'), session.get('username'),
-              calendar_date))
+    if result['success']:
+        flash(f'{calendar_date} 已配置为{"工作日" if is_workday_flag == "1" else "假期"}', 'success')
     else:
-        # 插入
-        cursor.execute('''
-            INSERT INTO work_calendar (
-                calendar_date, is_workday, day_type, notes,
-                configured_by, configured_name
-            ) VALUES (?, ?, ?, ?, ?, ?)
-        ''', (calendar_date, is_workday_flag, day_type, notes,
-              session.get('user_id'), session.get('username')))
-    
-    db.commit()
-    
-    # 记录日志
-    log_calendar_change(
-        calendar_date,
-        int(is_workday_flag) == 1,
-        day_type,
-        notes
-    )
-    
-    flash(f'{calendar_date} 已配置为{"工作日" if is_workday_flag == "1" else "假期"}', 'success')
+        flash(result['message'], 'error')
     
     # 返回到当前月份
     year_month = calendar_date[:7]
@@ -218,93 +192,82 @@ def configure_workday():
 @login_required
 @role_required('admin')
 def batch_save_workdays():
-    """批量保存工作日配置（新版API，支持JSON）"""
-    from core.performance_recalculator import recalculate_month_performance, get_affected_employees
-    
-    data = request.get_json()
+    """
+    批量保存工作日配置（JSON）
+    
+    请求体：
+        dates: ['2025-10-01', ...]
+        ranges: [['2025-10-01', '2025-10-07'], ...]（可选）
+        is_workday: true/false
+        day_type: 日期类型（默认custom）
+        recalculate_performance: 是否同步业绩有效工作日标记
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'success': False, 'message': '请求体应为 JSON 对象'}), 400
     dates = data.get('dates', [])  # ['2025-10-01', '2025-10-02', ...]
+    ranges = data.get('ranges', [])
     is_workday = data.get('is_workday', True)  # True or False
     recalculate = data.get('recalculate_performance', False)
-    year_month = data.get('year_month')
     
-    if not dates:
+    if not dates and not ranges:
         return jsonify({
             'success': False,
             'message': '没有选择任何日期'
         }), 400
     
-    db = get_db()
-    cursor = db.cursor()
-    
-    configured_count = 0
-    
-    # 批量保存配置
-    for date_str in dates:
-        try:
-            # 检查是否已存在
-            existing = query_db(
-                'SELECT * FROM work_calendar WHERE calendar_date = ?',
-                [date_str],
-                one=True
-            )
-            
-            is_workday_flag = 1 if is_workday else 0
-            
-            if existing:
-                cursor.execute('''
-                    UPDATE work_calendar
-                    SET is_workday = ?,
-                        day_type = ?,
-                        notes = ?,
-                        configured_by = ?,
-                        configured_name = ?,
-                        configured_at = CURRENT_TIMESTAMP
-                    WHERE calendar_date = ?
-                ''', (is_workday_flag, 'custom', '批量配置',
-                      session.get('user_id'), session.get('username'),
-                      date_str))
-            else:
-                cursor.execute('''
-                    INSERT INTO work_calendar (
-                        calendar_date, is_workday, day_type, notes,
-                        configured_by, configured_name
-                    ) VALUES (?, ?, ?, ?, ?, ?)
-                ''', (date_str, is_workday_flag, 'custom', '批量配置',
-                      session.get('user_id'), session.get('username')))
-            
-            configured_count += 1
-            
-            # 记录日志
-            from core.audit import log_calendar_change
-            log_calendar_change(date_str, is_workday, 'custom', '批量配置')
-            
-        except Exception as e:
-            db.rollback()
-            return jsonify({
-                'success': False,
-                'message': f'配置失败: {str(e)}'
-            }), 500
-    
-    db.commit()
-    
-    # 如果需要重新计算业绩
-    affected_employees = 0
-    if recalculate and year_month:
-        try:
-            result = recalculate_month_performance(year_month)
-            affected_employees = result.get('recalculated_count', 0)
-        except Exception as e:
-            # 业绩重算失败不影响配置保存
-            pass
+    try:
+        entries = build_calendar_entries(
+            dates=dates,
+            ranges=ranges,
+            is_workday=is_workday,
+            day_type=data.get('day_type', 'custom'),
+            notes='批量配置'
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    result = bulk_configure_calendar(entries, reason='批量配置', propagate=recalculate)
+    if not result['success']:
+        return jsonify(result), 400
+    
+    propagation = result['propagation']
     
     return jsonify({
         'success': True,
-        'affected_dates': configured_count,
-        'affected_employees': affected_employees,
-        'message': f'成功配置 {configured_count} 天'
+        'affected_dates': len(result['changed']),
+        'unchanged_dates': result['unchanged_count'],
+        'changed': result['changed'],
+        'flipped_dates': result['flipped_dates'],
+        'affected_employees': propagation['affected_employees'] if propagation else 0,
+        'propagation': propagation,
+        'message': f"成功配置 {result['requested']} 天（实际变更 {len(result['changed'])} 天）"
     })
 
 
+@bp.route('/work_calendar/import', methods=['POST'])
+@login_required
+@role_required('admin')
+def import_holiday_calendar():
+    """导入整年节假日文件（CSV/JSON）"""
+    file = request.files.get('file')
+    if not file or not file.filename:
+        return jsonify({'success': False, 'message': '请选择节假日文件'}), 400
+    
+    try:
+        entries = parse_holiday_file(file.read(), file.filename)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    result = bulk_configure_calendar(
+        entries,
+        reason=f'导入节假日文件 {file.filename}',
+        propagate=request.form.get('recalculate_performance', '1') == '1'
+    )
+    
+    return jsonify(result), (200 if result['success'] else 400)
+
+
 @bp.route('/work_calendar/recalculate_performance', methods=['POST'])
 @login_required
 @role_required('admin')
@@ -321,6 +284,9 @@ def recalculate_performance():
             'message': '请指定年月'
         }), 400
     
+    if data.get('run_async'):
+        return jsonify(enqueue_job('recalculate_performance', {'year_month': year_month})), 202
+    
     try:
         result = recalculate_month_performance(year_month)
         return jsonify(result)
@@ -352,49 +318,22 @@ def batch_configure_workdays():
         flash('开始日期不能晚于结束日期', 'error')
         return redirect(url_for('admin_ext.work_calendar'))
     
-    db = get_db()
-    cursor = db.cursor()
-    
-    current = start
-    configured_count = 0
-    
-    while current <= end:
-        date_str = current.strftime('%Y-%m-%d')
-        
-        # 检查是否已存在
-        existing = query_db(
-            'SELECT * FROM work_calendar WHERE calendar_date = ?',
-            [date_str],
-            one=True
+    try:
+        entries = build_calendar_entries(
+            ranges=[(start, end)],
+            is_workday=is_workday_flag == '1',
+            day_type=day_type
         )
-        
-        if existing:
-            cursor.execute('''
-                UPDATE work_calendar
-                SET is_workday = ?,
-                    day_type = ?,
-                    configured_by = ?,
-                    configured_name = ?,
-                    configured_at = CURRENT_TIMESTAMP
-                WHERE calendar_date = ?
-            ''', (is_workday_flag, day_type,
-                  session.get('user_id'), session.get('username'),
-                  date_str))
-        else:
-            cursor.execute('''
-                INSERT INTO work_calendar (
-                    calendar_date, is_workday, day_type,
-                    configured_by, configured_name
-                ) VALUES (?, ?, ?, ?, ?)
-            ''', (date_str, is_workday_flag, day_type,
-                  session.get('user_id'), session.get('username')))
-        
-        configured_count += 1
-        current += timedelta(days=1)
+    except ValueError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('admin_ext.work_calendar'))
     
-    db.commit()
+    result = bulk_configure_calendar(entries)
     
-    flash(f'批量配置成功：{configured_count}天', 'success')
+    if result['success']:
+        flash(f"批量配置成功：{result['requested']}天（实际变更{len(result['changed'])}天）", 'success')
+    else:
+        flash(result['message'], 'error')
     return redirect(url_for('admin_ext.work_calendar'))
 
 
@@ -451,12 +390,20 @@ def generate_payroll():
         flash('请选择月份', 'error')
         return redirect(url_for('admin_ext.payroll_management'))
     
-    result = generate_payroll_for_month(
-        year_month,
-        overwrite,
-        session.get('user_id'),
-        session.get('username')
-    )
+    # 后台执行：不阻塞请求线程，结果在任务中心查询
+    if request.form.get('run_async') == '1':
+        result = enqueue_job(
+            'generate_payroll',
+            {'year_month': year_month, 'overwrite': overwrite},
+            idempotency_key=request.form.get('idempotency_key') or None
+        )
+    else:
+        result = generate_payroll_for_month(
+            year_month,
+            overwrite,
+            session.get('user_id'),
+            session.get('username')
+        )
     
     if result['success']:
         flash(result['message'], 'success')
@@ -503,6 +450,46 @@ def adjust_payroll_action(payroll_id):
     return redirect(request.referrer or url_for('admin_ext.payroll_management'))
 
 
+@bp.route('/payroll_management/adjust/import', methods=['POST'])
+@login_required
+@role_required('admin', 'manager')
+def import_payroll_adjustments():
+    """批量调整工资（CSV/XLSX：工号或工资单ID、类型、金额、原因）"""
+    file = request.files.get('file')
+    if not file or not file.filename:
+        return jsonify({'success': False, 'message': '请选择调整文件'}), 400
+    
+    try:
+        rows = parse_payroll_adjustment_file(file.read(), file.filename)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    result = bulk_adjust_payroll(
+        rows,
+        request.form.get('year_month'),
+        session.get('user_id'),
+        session.get('username'),
+        session.get('role'),
+        allow_partial=request.form.get('allow_partial') == '1',
+        dry_run=request.form.get('dry_run') == '1'
+    )
+    
+    return jsonify(result), (200 if result['success'] else 400)
+
+
+@bp.route('/payroll_management/adjust/template')
+@login_required
+@role_required('admin', 'manager')
+def payroll_adjustment_template():
+    """下载批量调整模板（CSV）"""
+    content = '\ufeffemployee_no,payroll_id,type,amount,reason\nA001,,deduction,50,迟到扣款\n,123,allowance,200,高温补贴\n'
+    return Response(
+        content,
+        mimetype='text/csv',
+        headers={'Content-Disposition': 'attachment; filename=payroll_adjustments_template.csv'}
+    )
+
+
 # ==================== 年度归档 ====================
 
 @bp.route('/payroll_archive')
@@ -536,11 +523,18 @@ def create_archive():
         flash('年份格式不正确', 'error')
         return redirect(url_for('admin_ext.payroll_archive'))
     
-    result = archive_payroll_year(
-        archive_year,
-        session.get('user_id'),
-        session.get('username')
-    )
+    if request.form.get('run_async') == '1':
+        result = enqueue_job(
+            'archive_payroll',
+            {'archive_year': archive_year},
+            idempotency_key=f'archive_payroll:{archive_year}'
+        )
+    else:
+        result = archive_payroll_year(
+            archive_year,
+            session.get('user_id'),
+            session.get('username')
+        )
     
     if result['success']:
         flash(result['message'], 'success')
@@ -554,16 +548,38 @@ def create_archive():
 @login_required
 @role_required('admin')
 def view_archive(year):
-    """查看归档详情"""
+    """查看归档详情（月度汇总与工资单从归档库读取）"""
+    from core.payroll_archive import get_archived_payrolls
+    
     archive_data = get_archive_summary(year)
     
     if not archive_data:
         flash(f'{year}年归档不存在', 'error')
         return redirect(url_for('admin_ext.payroll_archive'))
     
+    year_month = request.args.get('year_month', '').strip()
+    keyword = request.args.get('keyword', '').strip()
+    records = get_archived_payrolls(year, year_month or None, keyword or None) if archive_data['storage'] else []
+    
     return render_template('admin/payroll_archive_detail.html',
                          archive=archive_data['archive'],
-                         monthly_summary=archive_data['monthly_summary'])
+                         monthly_summary=archive_data['monthly_summary'],
+                         storage=archive_data['storage'],
+                         records=records,
+                         year_month=year_month,
+                         keyword=keyword)
+
+
+@bp.route('/payroll_archive/<int:year>/verify', methods=['POST'])
+@login_required
+@role_required('admin')
+def verify_archive(year):
+    """重新校验归档库"""
+    from core.payroll_archive import verify_archive_file
+    
+    result = verify_archive_file(year)
+    flash(result['message'], 'success' if result['success'] else 'error')
+    return redirect(url_for('admin_ext.view_archive', year=year))
 
 
 # ==================== 银行信息审核 ====================
@@ -594,36 +610,18 @@ def bank_verification():
 @role_required('admin', 'finance')
 def verify_bank_info(employee_id):
     """审核银行信息"""
-    action = request.form.get('action')  # 'approve' or 'reject'
-    notes = request.form.get('notes', '')
+    from core.bank_verification import audit_bank_info
     
-    if action not in ['approve', 'reject']:
-        flash('无效的操作', 'error')
-        return redirect(url_for('admin_ext.bank_verification'))
-    
-    db = get_db()
-    cursor = db.cursor()
-    
-    new_status = 'verified' if action == 'approve' else 'rejected'
-    
-    cursor.execute('''
-        UPDATE employees
-        SET bank_info_status = ?,
-            bank_info_notes = ?,
-            bank_verified_by = ?,
-            bank_verified_at = CURRENT_TIMESTAMP
-        WHERE id = ?
-    ''', (new_status, notes, session.get('user_id'), employee_id))
-    
-    db.commit()
-    
-    # 记录日志
-    from core.audit import log_bank_verification
-    employee = query_db('SELECT employee_no, name FROM employees WHERE id = ?', [employee_id], one=True)
-    if employee:
-        log_bank_verification(employee_id, employee['name'], new_status, notes)
+    result = audit_bank_info(
+        [employee_id],
+        request.form.get('action'),  # 'approve' or 'reject'
+        request.form.get('notes', ''),
+        session.get('user_id'),
+        session.get('username'),
+        session.get('role')
+    )
     
-    flash(f'银行信息已{"审核通过" if action == "approve" else "审核拒绝"}', 'success')
+    flash(result['message'], 'success' if result['success'] else 'error')
     return redirect(url_for('admin_ext.bank_verification'))
 
 
@@ -667,3 +665,188 @@ def api_count_workdays():
 
 
 
+
+
+@bp.route('/api/rule_simulation', methods=['POST'])
+@login_required
+@role_required('admin')
+def api_rule_simulation():
+    """
+    规则仿真（API）
+    
+    请求体：{start_date, end_date, scenarios: [...], sweep: {...}, baseline: {...}}，
+    方案格式见 core.rule_simulator.run_scenario
+    """
+    from core.rule_simulator import simulate_rules
+    
+    data = request.get_json(silent=True) or {}
+    
+    if not data.get('start_date') or not data.get('end_date'):
+        return jsonify({'success': False, 'message': '缺少参数'}), 400
+    
+    try:
+        start_date = datetime.strptime(str(data['start_date']), '%Y-%m-%d').date()
+        end_date = datetime.strptime(str(data['end_date']), '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({'success': False, 'message': '日期格式错误（应为 YYYY-MM-DD）'}), 400
+    
+    try:
+        result = simulate_rules(
+            start_date,
+            end_date,
+            scenarios=data.get('scenarios'),
+            sweep=data.get('sweep'),
+            baseline=data.get('baseline'),
+            employee_ids=data.get('employee_ids')
+        )
+    except ValueError as e:
+        # 方案配置错误（见 core.rule_simulator.run_scenario）
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    return jsonify(result), (200 if result['success'] else 400)
+
+
+@bp.route('/api/commission/recompute', methods=['POST'])
+@login_required
+@role_required('admin')
+def api_recompute_commission():
+    """
+    重算业绩提成（API）
+    
+    请求体：{start_date, end_date, employee_ids, tiers, dry_run, run_async}，
+    均可省略；tiers 省略时按当前提成阶梯重算，自定义 tiers 只能与 dry_run 一起使用
+    """
+    from core.commission_recompute import recompute_commission, check_recompute_tiers
+    
+    data = request.get_json(silent=True) or {}
+    params = {
+        'start_date': data.get('start_date'),
+        'end_date': data.get('end_date'),
+        'employee_ids': data.get('employee_ids'),
+        'tiers': data.get('tiers'),
+        'dry_run': bool(data.get('dry_run'))
+    }
+    
+    error = check_recompute_tiers(params['tiers'], params['dry_run'])
+    if error:
+        return jsonify({'success': False, 'message': error}), 400
+    
+    if data.get('run_async'):
+        return jsonify(enqueue_job('recompute_commission', params)), 202
+    
+    try:
+        result = recompute_commission(**params)
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'重算失败: {str(e)}'
+        }), 500
+    
+    return jsonify(result), (200 if result['success'] else 400)
+
+
+@bp.route('/api/sql_stats')
+@login_required
+@role_required('admin')
+def api_sql_stats():
+    """
+    SQL监控汇总（API）
+    
+    按路由/后台任务统计的语句数、SQL耗时、N+1 与慢查询次数（本进程启动或上次清空以来）
+    参数：sort（排序字段，默认 sql_ms_total）、limit（默认50）
+    """
+    from core.sql_monitor import get_sql_stats
+    
+    sort = request.args.get('sort', 'sql_ms_total')
+    limit = request.args.get('limit', 50, type=int)
+    return jsonify({'success': True, 'routes': get_sql_stats(sort=sort, limit=limit)})
+
+
+@bp.route('/api/sql_stats/reset', methods=['POST'])
+@login_required
+@role_required('admin')
+def api_sql_stats_reset():
+    """清空SQL监控汇总"""
+    from core.sql_monitor import reset_sql_stats
+    
+    reset_sql_stats()
+    return jsonify({'success': True, 'message': 'SQL监控汇总已清空'})
+
+
+@bp.route('/api/index_advice')
+@login_required
+@role_required('admin')
+def api_index_advice():
+    """
+    索引顾问（API）
+
+    按本进程记录的语句形态（INDEX_ADVISOR_ENABLED=1）分析索引使用情况，返回冗余/未使用索引与迁移 SQL
+    参数：table（只分析该表，可选）、keep_unused=1（迁移中不删除未使用的索引）
+    """
+    from core.database import get_db
+    from core.index_advisor import advise_indexes, build_index_migration, get_query_shapes
+
+    shapes = get_query_shapes()
+    if not shapes:
+        return jsonify({'success': False, 'message': '尚未记录语句形态，请设置 INDEX_ADVISOR_ENABLED=1 后运行一段时间'}), 400
+
+    report = advise_indexes(get_db(), shapes, table=request.args.get('table') or None)
+    report.pop('plans')
+    report['migration'] = build_index_migration(report, drop_unused=request.args.get('keep_unused') != '1')
+    return jsonify({'success': True, **report})
+
+
+@bp.route('/api/db_health')
+@login_required
+@role_required('admin')
+def api_db_health():
+    """数据库维护健康报告（API）：文件/WAL 大小、空闲页、统计信息、各维护任务上次执行"""
+    from core.db_maintenance import get_health_report
+
+    return jsonify(get_health_report())
+
+
+@bp.route('/api/db_maintenance/run', methods=['POST'])
+@login_required
+@role_required('admin')
+def api_db_maintenance_run():
+    """
+    立即执行数据库维护（API）
+
+    参数：tasks（任务名列表，默认全部）、force=1（忽略到期判断，默认 1）
+    """
+    from core.db_maintenance import run_maintenance
+
+    data = request.get_json(silent=True)
+    if data is None:
+        data = request.form
+    elif not isinstance(data, dict):
+        return jsonify({'success': False, 'message': '请求体应为 JSON 对象'}), 400
+    tasks = data.get('tasks')
+    if isinstance(tasks, str):
+        tasks = [t for t in tasks.split(',') if t]
+    elif tasks is not None and not (isinstance(tasks, list) and all(isinstance(t, str) for t in tasks)):
+        return jsonify({'success': False, 'message': 'tasks 应为任务名列表'}), 400
+    result = run_maintenance(tasks or None, force=str(data.get('force', '1')).lower() in ('1', 'true'))
+    return jsonify(result), (200 if result['success'] else 400)
+
+
+@bp.route('/api/cache_stats')
+@login_required
+@role_required('admin')
+def api_cache_stats():
+    """缓存命中统计（API，本进程）"""
+    from core.cache import cache_stats
+    
+    return jsonify({'success': True, 'cache': cache_stats()})
+
+
+@bp.route('/api/cache/clear', methods=['POST'])
+@login_required
+@role_required('admin')
+def api_cache_clear():
+    """清空缓存（直接修改数据库后使用）"""
+    from core.cache import clear_cache
+    
+    clear_cache()
+    return jsonify({'success': True, 'message': '缓存已清空'})
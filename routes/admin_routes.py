@@ -6,9 +6,13 @@ from datetime import datetime, timedelta
 from core.auth import login_required, role_required, get_current_user, get_user_team, check_employee_access, hash_password, encrypt_phone
 from core.database import query_db, execute_db, get_db
 from core.status_engine import batch_check_all_employees, apply_status_change, check_status_transition
-from core.salary_engine import get_or_calculate_salary, calculate_monthly_salary
+from core.salary_engine import get_or_calculate_salary, calculate_monthly_salary, get_calculation_detail
 from core.commission import calculate_daily_commission
+from core.salary_ledger import save_performance
 from core.import_helper import ExcelImporter, generate_import_template
+from core.utils import get_employee_teams, get_active_teams, validate_year_month
+from core.cache import invalidate_tags, invalidate_employee_tags, TAG_TEAMS
+from core.report_snapshot import reads_report_snapshot, in_report_snapshot
 from config import Config
 import io
 import os
@@ -186,7 +190,7 @@ def employees():
     employees_list = query_db(query, params + [per_page, offset])
     
     # 获取所有团队（用于筛选）
-    teams = query_db('SELECT DISTINCT team FROM employees ORDER BY team')
+    teams = get_employee_teams()
     
     # 生成分页信息
     pagination = {
@@ -252,6 +256,7 @@ def employee_add():
                    VALUES (?, ?, ?, ?, ?, 'trainee', ?, 1)''',
                 (employee_no, name, phone, phone_encrypted, emp_team, join_date)
             )
+            invalidate_employee_tags(emp_team)
             
             flash(f'员工 {name} 添加成功', 'success')
             return redirect(url_for('admin.employees'))
@@ -259,7 +264,7 @@ def employee_add():
             flash(f'添加失败: {str(e)}', 'danger')
     
     # GET: 显示表单
-    teams = query_db('SELECT team_name FROM teams WHERE is_active = 1')
+    teams = get_active_teams()
     
     return render_template('admin/employee_form.html',
                          user=user,
@@ -304,6 +309,7 @@ def employee_edit(emp_id):
                    WHERE id = ?''',
                 (name, phone, phone_encrypted, emp_team, status, emp_id)
             )
+            invalidate_employee_tags(employee['team'], emp_team)
             
             flash(f'员工 {name} 信息已更新', 'success')
             return redirect(url_for('admin.employees'))
@@ -311,7 +317,7 @@ def employee_edit(emp_id):
             flash(f'更新失败: {str(e)}', 'danger')
     
     # GET: 显示表单
-    teams = query_db('SELECT team_name FROM teams WHERE is_active = 1')
+    teams = get_active_teams()
     
     return render_template('admin/employee_form.html',
                          user=user,
@@ -337,6 +343,8 @@ def employee_delete(emp_id):
             'UPDATE employees SET is_active = 0, leave_date = ? WHERE id = ?',
             (today, emp_id)
         )
+        employee = query_db('SELECT team FROM employees WHERE id = ?', (emp_id,), one=True)
+        invalidate_employee_tags(employee['team'] if employee else None)
         return jsonify({'success': True, 'message': '员工已离职'})
     except Exception as e:
         return jsonify({'success': False, 'message': f'操作失败: {str(e)}'})
@@ -471,31 +479,14 @@ def performance_add():
             # 计算提成
             commission = calculate_daily_commission(orders_count)
             
-            # 检查是否已存在
-            existing = query_db(
-                'SELECT id FROM performance WHERE employee_id = ? AND work_date = ?',
-                (employee_id, work_date),
-                one=True
+            # 写入业绩并同步薪资台账
+            db = get_db()
+            updated = save_performance(
+                db, int(employee_id), work_date,
+                orders_count, commission, is_valid_workday
             )
-            
-            if existing:
-                # 更新
-                execute_db(
-                    '''UPDATE performance 
-                       SET orders_count = ?, commission = ?, is_valid_workday = ?
-                       WHERE id = ?''',
-                    (orders_count, commission, is_valid_workday, existing['id'])
-                )
-                message = '业绩记录已更新'
-            else:
-                # 插入
-                execute_db(
-                    '''INSERT INTO performance 
-                       (employee_id, work_date, orders_count, commission, is_valid_workday)
-                       VALUES (?, ?, ?, ?, ?)''',
-                    (employee_id, work_date, orders_count, commission, is_valid_workday)
-                )
-                message = '业绩记录已添加'
+            db.commit()
+            message = '业绩记录已更新' if updated else '业绩记录已添加'
             
             return jsonify({'success': True, 'message': message})
         except Exception as e:
@@ -525,8 +516,9 @@ def performance_batch():
     team = get_user_team(user)
     
     if request.method == 'POST':
-        work_date = request.form.get('work_date')
-        batch_data = request.get_json()
+        # 页面以JSON提交明细，日期放在查询参数中
+        work_date = request.form.get('work_date') or request.args.get('work_date')
+        batch_data = request.get_json(silent=True)
         
         if not work_date or not batch_data:
             return jsonify({'success': False, 'message': '数据不完整'})
@@ -546,12 +538,10 @@ def performance_batch():
                 
                 commission = calculate_daily_commission(orders_count)
                 
-                # 使用 REPLACE 处理冲突
-                db.execute(
-                    '''INSERT OR REPLACE INTO performance 
-                       (employee_id, work_date, orders_count, commission, is_valid_workday)
-                       VALUES (?, ?, ?, ?, ?)''',
-                    (employee_id, work_date, orders_count, commission, is_valid)
+                # 写入业绩并同步薪资台账（同一事务）
+                save_performance(
+                    db, int(employee_id), work_date,
+                    orders_count, commission, is_valid
                 )
                 success_count += 1
             
@@ -727,7 +717,9 @@ def salary():
     team = get_user_team(user)
     
     # 获取筛选参数
-    year_month = request.args.get('year_month', datetime.now().date().strftime('%Y-%m'))
+    year_month = request.args.get('year_month', '')
+    if not validate_year_month(year_month):
+        year_month = datetime.now().strftime('%Y-%m')
     filter_employee = request.args.get('employee', '')
     filter_team = request.args.get('team', '')
     filter_status = request.args.get('status', '')
@@ -772,8 +764,7 @@ def salary():
             'attendance_bonus': salary_data['attendance_bonus'],
             'performance_bonus': salary_data['performance_bonus'],
             'commission': salary_data['commission'],
-            'total_salary': salary_data['total_salary'],
-            'calculation_detail': salary_data.get('calculation_detail', '')
+            'total_salary': salary_data['total_salary']
         })
     
     # 统计
@@ -810,11 +801,36 @@ def salary():
                          user=user)
 
 
+@bp.route('/api/salary_detail/<int:employee_id>')
+@login_required
+@role_required('manager', 'admin')
+def api_salary_detail(employee_id):
+    """获取员工某月薪资计算明细（API，列表页展开时按需加载）"""
+    user = get_current_user()
+    year_month = request.args.get('year_month', datetime.now().strftime('%Y-%m'))
+    
+    if not validate_year_month(year_month):
+        return jsonify({'error': f'年月格式错误：{year_month}（应为 YYYY-MM）'}), 400
+    
+    if not check_employee_access(user, employee_id):
+        return jsonify({'error': '无权查看此员工'}), 403
+    
+    salary_data = get_or_calculate_salary(employee_id, year_month)
+    
+    return jsonify({
+        'employee_id': employee_id,
+        'year_month': year_month,
+        'calculation_detail': get_calculation_detail(salary_data),
+        'calculation_facts': salary_data.get('calculation_facts')
+    })
+
+
 # ==================== 收入成本分析 ====================
 
 @bp.route('/revenue_cost')
 @login_required
 @role_required('manager', 'admin')
+@reads_report_snapshot
 def revenue_cost():
     """收入成本分析"""
     user = get_current_user()
@@ -860,31 +876,45 @@ def revenue_cost():
                          user=user)
 
 
-def calculate_daily_revenue_cost(date, team=None):
-    """计算单日收入成本"""
-    date_str = date.strftime('%Y-%m-%d')
-    
-    query = '''
-        SELECT SUM(p.orders_count) as orders, SUM(p.commission) as commission
-        FROM performance p
-        JOIN employees e ON p.employee_id = e.id
-        WHERE p.work_date = ?
-    '''
-    params = [date_str]
-    
+def _sum_orders_commission(start_date, end_date, team=None):
+    """
+    [start_date, end_date) 的订单数与提成合计
+
+    读取报表快照时从按 团队+日期 汇总的 report_team_daily 读取，否则扫描业绩（按 work_date 范围走索引）
+    """
+    if in_report_snapshot():
+        query = '''
+            SELECT SUM(orders_count) as orders, SUM(commission) as commission
+            FROM report_team_daily
+            WHERE work_date >= ? AND work_date < ?
+        '''
+        team_filter = ' AND team = ?'
+    else:
+        query = '''
+            SELECT SUM(p.orders_count) as orders, SUM(p.commission) as commission
+            FROM performance p
+            JOIN employees e ON p.employee_id = e.id
+            WHERE p.work_date >= ? AND p.work_date < ?
+        '''
+        team_filter = ' AND e.team = ?'
+    params = [start_date, end_date]
+
     if team:
-        query += ' AND e.team = ?'
+        query += team_filter
         params.append(team)
-    
-    result = query_db(query, params, one=True)
-    
+
+    return query_db(query, params, one=True)
+
+
+def _revenue_cost_row(period, result):
+    """收入成本行（简化：仅计提成作为成本）"""
     orders = result['orders'] or 0
     revenue = orders * Config.REVENUE_PER_ORDER
-    cost = result['commission'] or 0  # 简化：仅计提成作为成本
+    cost = result['commission'] or 0
     profit = revenue - cost
-    
+
     return {
-        'period': date.strftime('%Y-%m-%d'),
+        'period': period,
         'orders': orders,
         'revenue': revenue,
         'cost': cost,
@@ -893,66 +923,23 @@ def calculate_daily_revenue_cost(date, team=None):
     }
 
 
+def calculate_daily_revenue_cost(date, team=None):
+    """计算单日收入成本"""
+    date_str = date.strftime('%Y-%m-%d')
+    next_day = (date + timedelta(days=1)).strftime('%Y-%m-%d')
+    return _revenue_cost_row(date_str, _sum_orders_commission(date_str, next_day, team))
+
+
 def calculate_monthly_revenue_cost(year_month, team=None):
     """计算月度收入成本"""
-    query = '''
-        SELECT SUM(p.orders_count) as orders, SUM(p.commission) as commission
-        FROM performance p
-        JOIN employees e ON p.employee_id = e.id
-        WHERE strftime('%Y-%m', p.work_date) = ?
-    '''
-    params = [year_month]
-    
-    if team:
-        query += ' AND e.team = ?'
-        params.append(team)
-    
-    result = query_db(query, params, one=True)
-    
-    orders = result['orders'] or 0
-    revenue = orders * Config.REVENUE_PER_ORDER
-    cost = result['commission'] or 0
-    profit = revenue - cost
-    
-    return {
-        'period': year_month,
-        'orders': orders,
-        'revenue': revenue,
-        'cost': cost,
-        'profit': profit,
-        'margin': (profit / revenue * 100) if revenue > 0 else 0
-    }
+    start = datetime.strptime(year_month, '%Y-%m').date()
+    next_month = (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return _revenue_cost_row(year_month, _sum_orders_commission(start.isoformat(), next_month.isoformat(), team))
 
 
 def calculate_yearly_revenue_cost(year, team=None):
     """计算年度收入成本"""
-    query = '''
-        SELECT SUM(p.orders_count) as orders, SUM(p.commission) as commission
-        FROM performance p
-        JOIN employees e ON p.employee_id = e.id
-        WHERE strftime('%Y', p.work_date) = ?
-    '''
-    params = [str(year)]
-    
-    if team:
-        query += ' AND e.team = ?'
-        params.append(team)
-    
-    result = query_db(query, params, one=True)
-    
-    orders = result['orders'] or 0
-    revenue = orders * Config.REVENUE_PER_ORDER
-    cost = result['commission'] or 0
-    profit = revenue - cost
-    
-    return {
-        'period': str(year),
-        'orders': orders,
-        'revenue': revenue,
-        'cost': cost,
-        'profit': profit,
-        'margin': (profit / revenue * 100) if revenue > 0 else 0
-    }
+    return _revenue_cost_row(str(year), _sum_orders_commission(f'{year}-01-01', f'{int(year) + 1}-01-01', team))
 
 
 # ==================== 定制中心 ====================
@@ -1031,6 +1018,7 @@ def team_add():
             'INSERT INTO teams (team_name, team_leader, description) VALUES (?, ?, ?)',
             (team_name, team_leader, description)
         )
+        invalidate_tags(TAG_TEAMS)
         return jsonify({'success': True, 'message': '团队已添加'})
     except Exception as e:
         return jsonify({'success': False, 'message': f'添加失败: {str(e)}'})
@@ -1057,6 +1045,7 @@ def team_delete(team_id):
     
     try:
         execute_db('DELETE FROM teams WHERE id = ?', (team_id,))
+        invalidate_tags(TAG_TEAMS)
         return jsonify({'success': True, 'message': '团队已删除'})
     except Exception as e:
         return jsonify({'success': False, 'message': f'删除失败: {str(e)}'})
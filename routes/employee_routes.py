@@ -6,7 +6,8 @@ from datetime import datetime, timedelta
 from core.auth import login_required, role_required, get_current_user, decrypt_phone
 from core.database import query_db, execute_db, get_db
 from core.commission import calculate_total_commission
-from core.salary_engine import get_or_calculate_salary
+from core.salary_engine import get_or_calculate_salary, get_calculation_detail
+from core.utils import validate_year_month
 
 bp = Blueprint('employee', __name__, url_prefix='/employee')
 
@@ -125,6 +126,7 @@ def salary():
     today = datetime.now().date()
     current_month = today.strftime('%Y-%m')
     current_salary = get_or_calculate_salary(employee_id, current_month)
+    current_salary['calculation_detail'] = get_calculation_detail(current_salary)
     
     # 历史6个月薪资（实时计算或获取已确认的）
     history_salaries = []
@@ -155,6 +157,28 @@ def salary():
                          disputes=disputes)
 
 
+@bp.route('/api/salary_detail/<string:year_month>')
+@login_required
+@role_required('employee')
+def api_salary_detail(year_month):
+    """获取本人某月薪资计算明细（API）"""
+    user = get_current_user()
+    employee_id = user['employee_id']
+    
+    if not employee_id:
+        return jsonify({'error': '员工信息未关联'}), 400
+    
+    if not validate_year_month(year_month):
+        return jsonify({'error': f'年月格式错误：{year_month}（应为 YYYY-MM）'}), 400
+    
+    salary_data = get_or_calculate_salary(employee_id, year_month)
+    
+    return jsonify({
+        'year_month': year_month,
+        'calculation_detail': get_calculation_detail(salary_data)
+    })
+
+
 @bp.route('/submit_dispute', methods=['POST'])
 @login_required
 @role_required('employee')
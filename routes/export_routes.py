@@ -12,6 +12,8 @@ from core.export import (
     generate_salary_pdf
 )
 from core.salary_engine import get_or_calculate_salary
+from core.utils import validate_year_month
+from core.report_snapshot import reads_report_snapshot
 
 bp = Blueprint('export', __name__, url_prefix='/export')
 
@@ -19,6 +21,7 @@ bp = Blueprint('export', __name__, url_prefix='/export')
 @bp.route('/employees/excel')
 @login_required
 @role_required('manager', 'admin')
+@reads_report_snapshot
 def export_employees_excel():
     """导出员工数据为 Excel"""
     user = get_current_user()
@@ -52,6 +55,7 @@ def export_employees_excel():
 @bp.route('/performance/excel')
 @login_required
 @role_required('manager', 'admin')
+@reads_report_snapshot
 def export_performance_excel():
     """导出业绩数据为 Excel"""
     user = get_current_user()
@@ -98,7 +102,9 @@ def export_salary_excel():
     user = get_current_user()
     team = get_user_team(user)
     
-    year_month = request.args.get('year_month', datetime.now().strftime('%Y-%m'))
+    year_month = request.args.get('year_month', '')
+    if not validate_year_month(year_month):
+        year_month = datetime.now().strftime('%Y-%m')
     
     # 获取员工列表
     query = 'SELECT id, employee_no, name, status, team FROM employees WHERE is_active = 1'
@@ -150,7 +156,9 @@ def export_salary_pdf(employee_id):
     if user['role'] == 'employee' and user['employee_id'] != employee_id:
         return '无权访问', 403
     
-    year_month = request.args.get('year_month', datetime.now().strftime('%Y-%m'))
+    year_month = request.args.get('year_month', '')
+    if not validate_year_month(year_month):
+        year_month = datetime.now().strftime('%Y-%m')
     
     # P2-10: 获取密码保护参数（可选）
     password = request.args.get('password', None)  # 可以从查询参数获取
@@ -5,15 +5,28 @@
 包括：工资发放管理、银行信息审核、状态标记、批量操作
 """
 
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify, Response, stream_with_context
 from core.auth import login_required, role_required
-from core.database import query_db, get_db
+from core.database import query_db
 from core.payroll_engine import (
     confirm_payroll_for_payment,
     mark_payroll_payment,
     mark_payroll_payment_failed,
     retry_payroll_payment,
-    batch_confirm_payrolls
+    batch_confirm_payrolls,
+    get_payroll_status_stats,
+    get_payroll_worklist
+)
+from core.utils import get_employee_teams
+from core.bank_verification import BANK_AUDIT_ACTIONS, audit_bank_info
+from core.payment_batch import (
+    PAYMENT_FILE_FORMATS,
+    create_payment_batch,
+    get_payment_batch,
+    list_payment_batches,
+    stream_payment_file,
+    parse_bank_return_file,
+    reconcile_payment_batch
 )
 from datetime import datetime, date
 
@@ -26,61 +39,41 @@ bp = Blueprint('finance', __name__, url_prefix='/finance')
 @login_required
 @role_required('finance')
 def dashboard():
-    """财务工作台主页"""
+    """财务工作台主页（待确认/待发放/失败列表按游标分页）"""
     # 获取月份参数
     year_month = request.args.get('year_month')
     if not year_month:
         year_month = date.today().strftime('%Y-%m')
+    team = request.args.get('team', '').strip()
+    keyword = request.args.get('keyword', '').strip()
     
-    # 统计各状态的工资单数量
-    stats = query_db('''
-        SELECT 
-            status,
-            COUNT(*) as count,
-            SUM(total_salary) as amount
-        FROM payroll_records
-        WHERE year_month = ?
-        AND is_archived = 0
-        GROUP BY status
-    ''', [year_month])
-    
-    status_stats = {s['status']: {'count': s['count'], 'amount': s['amount']} for s in stats} if stats else {}
-    
-    # 获取待确认的工资单
-    pending_payrolls = query_db('''
-        SELECT * FROM payroll_records
-        WHERE year_month = ?
-        AND status = 'pending'
-        AND is_archived = 0
-        ORDER BY team, employee_no
-        LIMIT 100
-    ''', [year_month])
-    
-    # 获取已确认待发放的工资单
-    confirmed_payrolls = query_db('''
-        SELECT * FROM payroll_records
-        WHERE year_month = ?
-        AND status = 'confirmed'
-        AND is_archived = 0
-        ORDER BY team, employee_no
-        LIMIT 100
-    ''', [year_month])
-    
-    # 获取发放失败的工资单
-    failed_payrolls = query_db('''
-        SELECT * FROM payroll_records
-        WHERE year_month = ?
-        AND status IN ('failed', 'retry')
-        AND is_archived = 0
-        ORDER BY updated_at DESC
-    ''', [year_month])
+    # 统计各状态的工资单数量（计数表，O(1)）
+    stats = get_payroll_status_stats(year_month)
+    
+    status_stats = {s['status']: {'count': s['count'], 'amount': s['amount']} for s in stats}
+    
+    def worklist(statuses, cursor_arg):
+        return get_payroll_worklist(year_month, statuses, team=team or None, keyword=keyword or None,
+                                    cursor=request.args.get(cursor_arg))
+    
+    # 待确认、已确认待发放、发放失败的工资单
+    pending = worklist(['pending'], 'pending_after')
+    confirmed = worklist(['confirmed'], 'confirmed_after')
+    failed = worklist(['failed', 'retry'], 'failed_after')
     
     return render_template('finance/dashboard.html',
                          year_month=year_month,
+                         team=team,
+                         keyword=keyword,
+                         teams=get_employee_teams(),
                          status_stats=status_stats,
-                         pending_payrolls=pending_payrolls,
-                         confirmed_payrolls=confirmed_payrolls,
-                         failed_payrolls=failed_payrolls)
+                         pending_payrolls=pending['items'],
+                         pending_next=pending['next_cursor'],
+                         confirmed_payrolls=confirmed['items'],
+                         confirmed_next=confirmed['next_cursor'],
+                         failed_payrolls=failed['items'],
+                         failed_next=failed['next_cursor'],
+                         payment_batches=list_payment_batches(year_month))
 
 
 # ==================== 工资确认 ====================
@@ -237,13 +230,96 @@ def retry_payment(payroll_id):
     return redirect(request.referrer or url_for('finance.dashboard'))
 
 
+# ==================== 银行代发批次 ====================
+
+@bp.route('/payment_batch/create', methods=['POST'])
+@login_required
+@role_required('finance')
+def create_batch():
+    """生成银行代发批次（已确认及待重试的工资单）"""
+    year_month = request.form.get('year_month')
+    if not year_month:
+        flash('请选择月份', 'error')
+        return redirect(url_for('finance.dashboard'))
+    
+    result = create_payment_batch(year_month, session.get('user_id'), session.get('username'))
+    flash(result['message'], 'success' if result['success'] else 'error')
+    for item in result.get('skipped', [])[:10]:
+        flash(f"{item['employee_no']} {item['employee_name']}：{item['reason']}", 'warning')
+    
+    return redirect(url_for('finance.dashboard', year_month=year_month))
+
+
+@bp.route('/payment_batch/<int:batch_id>/file')
+@login_required
+@role_required('finance')
+def download_batch_file(batch_id):
+    """下载代发文件（format=csv|fixed，流式输出）"""
+    batch = get_payment_batch(batch_id)
+    if not batch:
+        flash('代发批次不存在', 'error')
+        return redirect(url_for('finance.dashboard'))
+    
+    file_format = request.args.get('format', 'csv')
+    if file_format not in PAYMENT_FILE_FORMATS:
+        file_format = 'csv'
+    extension = 'csv' if file_format == 'csv' else 'txt'
+    
+    return Response(
+        stream_with_context(stream_payment_file(batch_id, file_format)),
+        mimetype='text/csv' if file_format == 'csv' else 'text/plain',
+        headers={'Content-Disposition': f"attachment; filename={batch['batch_no']}.{extension}"}
+    )
+
+
+@bp.route('/payment_batch/<int:batch_id>/reconcile', methods=['POST'])
+@login_required
+@role_required('finance')
+def reconcile_batch(batch_id):
+    """导入银行回盘文件，整批标记已发放/失败/待重试"""
+    batch = get_payment_batch(batch_id)
+    if not batch:
+        flash('代发批次不存在', 'error')
+        return redirect(url_for('finance.dashboard'))
+    
+    redirect_to = redirect(url_for('finance.dashboard', year_month=batch['year_month']))
+    file = request.files.get('file')
+    if not file or not file.filename:
+        flash('请选择回盘文件', 'error')
+        return redirect_to
+    
+    payment_date = None
+    if request.form.get('payment_date'):
+        try:
+            payment_date = datetime.strptime(request.form['payment_date'], '%Y-%m-%d').date()
+        except ValueError:
+            flash('日期格式不正确', 'error')
+            return redirect_to
+    
+    try:
+        rows = parse_bank_return_file(file.read(), file.filename)
+    except ValueError as e:
+        flash(str(e), 'error')
+        return redirect_to
+    
+    result = reconcile_payment_batch(
+        batch_id, rows, payment_date,
+        session.get('user_id'), session.get('username')
+    )
+    flash(result['message'], 'success' if result['success'] else 'error')
+    for item in result.get('rejected', [])[:10]:
+        flash(f"第{item['line_no']}行（工资单{item['payroll_id']}）：{item['reason']}", 'warning')
+    
+    return redirect_to
+
+
 # ==================== 发放记录查询 ====================
 
 @bp.route('/payment_history')
 @login_required
 @role_required('finance')
 def payment_history():
-    """发放历史记录"""
+    """发放历史记录（按 团队、工号 游标分页）"""
     # 获取月份参数
     year_month = request.args.get('year_month')
     if not year_month:
@@ -251,37 +327,73 @@ def payment_history():
     
     # 获取状态参数
     status_filter = request.args.get('status', '')
+    keyword = request.args.get('keyword', '').strip()
     
-    # 构建查询
-    if status_filter:
-        records = query_db('''
-            SELECT * FROM payroll_records
-            WHERE year_month = ?
-            AND status = ?
-            AND is_archived = 0
-            ORDER BY payment_date DESC, employee_no
-        ''', [year_month, status_filter])
-    else:
-        records = query_db('''
-            SELECT * FROM payroll_records
-            WHERE year_month = ?
-            AND is_archived = 0
-            ORDER BY 
-                CASE status
-                    WHEN 'pending' THEN 1
-                    WHEN 'confirmed' THEN 2
-                    WHEN 'paid' THEN 3
-                    WHEN 'failed' THEN 4
-                    WHEN 'retry' THEN 5
-                    ELSE 6
-                END,
-                employee_no
-        ''', [year_month])
+    page = get_payroll_worklist(
+        year_month,
+        [status_filter] if status_filter else None,
+        keyword=keyword or None,
+        cursor=request.args.get('after')
+    )
     
     return render_template('finance/payment_history.html',
-                         records=records,
+                         records=page['items'],
+                         next_cursor=page['next_cursor'],
+                         status_stats={s['status']: s for s in get_payroll_status_stats(year_month)},
+                         year_month=year_month,
+                         status_filter=status_filter,
+                         keyword=keyword)
+
+
+# ==================== 工资单核对 ====================
+
+@bp.route('/reconcile')
+@login_required
+@role_required('finance')
+def reconcile():
+    """工资单核对：按当前业绩重算应发各项并与工资单比对"""
+    from core.payroll_reconciliation import reconcile_payroll_month
+    
+    year_month = request.args.get('year_month') or date.today().strftime('%Y-%m')
+    team = request.args.get('team', '').strip()
+    
+    report = reconcile_payroll_month(year_month, team=team or None)
+    
+    return render_template('finance/payroll_reconciliation.html',
                          year_month=year_month,
-                         status_filter=status_filter)
+                         team=team,
+                         teams=get_employee_teams(),
+                         report=report)
+
+
+@bp.route('/reconcile/apply', methods=['POST'])
+@login_required
+@role_required('finance')
+def apply_reconcile():
+    """为未发放的差异工资单生成校正调整"""
+    from core.payroll_reconciliation import reconcile_payroll_month
+    
+    year_month = request.form.get('year_month')
+    team = request.form.get('team', '').strip()
+    if not year_month:
+        flash('请选择月份', 'error')
+        return redirect(url_for('finance.reconcile'))
+    
+    report = reconcile_payroll_month(
+        year_month,
+        team=team or None,
+        apply_corrections=True,
+        operator_id=session.get('user_id'),
+        operator_name=session.get('username'),
+        operator_role=session.get('role')
+    )
+    
+    corrections = report.get('corrections')
+    if corrections is None:
+        flash(report['message'] if not report['success'] else '没有需要校正的工资单', 'info')
+    else:
+        flash(corrections['message'], 'success' if corrections['success'] else 'error')
+    return redirect(url_for('finance.reconcile', year_month=year_month, team=team))
 
 
 # ==================== 银行信息审核 ====================
@@ -327,36 +439,16 @@ def bank_audit():
 @role_required('finance')
 def verify_bank(employee_id):
     """审核银行信息"""
-    action = request.form.get('action')  # 'approve' or 'reject'
-    notes = request.form.get('notes', '')
-    
-    if action not in ['approve', 'reject']:
-        flash('无效的操作', 'error')
-        return redirect(url_for('finance.bank_audit'))
-    
-    db = get_db()
-    cursor = db.cursor()
-    
-    new_status = 'verified' if action == 'approve' else 'rejected'
-    
-    cursor.execute('''
-        UPDATE employees
-        SET bank_info_status = ?,
-            bank_info_notes = ?,
-            bank_verified_by = ?,
-            bank_verified_at = CURRENT_TIMESTAMP
-        WHERE id = ?
-    ''', (new_status, notes, session.get('user_id'), employee_id))
-    
-    db.commit()
-    
-    # 记录日志
-    from core.audit import log_bank_verification
-    employee = query_db('SELECT employee_no, name FROM employees WHERE id = ?', [employee_id], one=True)
-    if employee:
-        log_bank_verification(employee_id, employee['name'], new_status, notes)
+    result = audit_bank_info(
+        [employee_id],
+        request.form.get('action'),  # 'approve' or 'reject'
+        request.form.get('notes', ''),
+        session.get('user_id'),
+        session.get('username'),
+        session.get('role')
+    )
     
-    flash(f'银行信息已{"审核通过" if action == "approve" else "审核拒绝"}', 'success')
+    flash(result['message'], 'success' if result['success'] else 'error')
     return redirect(url_for('finance.bank_audit'))
 
 
@@ -365,71 +457,43 @@ def verify_bank(employee_id):
 @role_required('finance')
 def batch_audit_bank():
     """P2-12: 批量审核银行信息"""
-    data = request.get_json()
+    data = request.get_json(silent=True)
     
     if not data:
         return jsonify({'success': False, 'message': '无效的请求数据'}), 400
     
     employee_ids = data.get('employee_ids', [])
     action = data.get('action')  # 'approve' or 'reject'
-    notes = data.get('notes', '')
     
     if not employee_ids:
         return jsonify({'success': False, 'message': '未选择任何员工'}), 400
     
-    if action not in ['approve', 'reject']:
+    if action not in BANK_AUDIT_ACTIONS:
         return jsonify({'success': False, 'message': '无效的操作类型'}), 400
     
     try:
-        db = get_db()
-        cursor = db.cursor()
-        
-        new_status = 'verified' if action == 'approve' else 'rejected'
-        approved_count = 0
-        rejected_count = 0
-        
-        for employee_id in employee_ids:
-            # 验证员工存在且有待审核的银行信息
-            employee = query_db(
-                'SELECT id, employee_no, name, bank_info_status FROM employees WHERE id = ? AND bank_info_status = ?',
-                (employee_id, 'pending'),
-                one=True
-            )
-            
-            if not employee:
-                continue
-            
-            # 更新银行信息状态
-            cursor.execute('''
-                UPDATE employees
-                SET bank_info_status = ?,
-                    bank_info_notes = ?,
-                    bank_verified_by = ?,
-                    bank_verified_at = CURRENT_TIMESTAMP
-                WHERE id = ?
-            ''', (new_status, notes, session.get('user_id'), employee_id))
-            
-            # 记录日志
-            from core.audit import log_bank_verification
-            log_bank_verification(employee_id, employee['name'], new_status, notes)
-            
-            if action == 'approve':
-                approved_count += 1
-            else:
-                rejected_count += 1
-        
-        db.commit()
-        
-        return jsonify({
-            'success': True,
-            'message': f'批量审核完成',
-            'approved_count': approved_count,
-            'rejected_count': rejected_count
-        })
-    
+        result = audit_bank_info(
+            employee_ids,
+            action,
+            data.get('notes', ''),
+            session.get('user_id'),
+            session.get('username'),
+            session.get('role')
+        )
     except Exception as e:
-        db.rollback()
         return jsonify({'success': False, 'message': f'批量审核失败: {str(e)}'}), 500
+    
+    if 'updated' not in result:
+        return jsonify(result), 400
+    
+    count = len(result['updated'])
+    return jsonify({
+        'success': result['success'],
+        'message': result['message'],
+        'approved_count': count if action == 'approve' else 0,
+        'rejected_count': count if action == 'reject' else 0,
+        'skipped': result['skipped']
+    })
 
 
 # ==================== API 接口 ====================
@@ -458,37 +522,70 @@ def api_get_payroll(payroll_id):
     })
 
 
+@bp.route('/api/payrolls/<string:year_month>')
+@login_required
+@role_required('finance')
+def api_payroll_worklist(year_month):
+    """工资单工作列表（API，游标分页）"""
+    statuses = [s for s in request.args.get('status', '').split(',') if s]
+    page = get_payroll_worklist(
+        year_month,
+        statuses or None,
+        team=request.args.get('team') or None,
+        keyword=request.args.get('keyword') or None,
+        cursor=request.args.get('cursor'),
+        limit=request.args.get('limit', type=int)
+    )
+    
+    return jsonify({
+        'year_month': year_month,
+        'items': [
+            {
+                'id': p['id'],
+                'employee_no': p['employee_no'],
+                'employee_name': p['employee_name'],
+                'team': p['team'],
+                'status': p['status'],
+                'total_salary': p['total_salary']
+            }
+            for p in page['items']
+        ],
+        'next_cursor': page['next_cursor'],
+        'has_more': page['has_more']
+    })
+
+
+@bp.route('/api/reconcile/<string:year_month>')
+@login_required
+@role_required('finance')
+def api_reconcile(year_month):
+    """工资单核对报告（API）"""
+    from core.payroll_reconciliation import reconcile_payroll_month
+    
+    report = reconcile_payroll_month(year_month, team=request.args.get('team') or None)
+    return jsonify(report), (200 if report['success'] else 404)
+
+
 @bp.route('/api/stats/<string:year_month>')
 @login_required
 @role_required('finance')
 def api_get_stats(year_month):
     """获取月度统计（API）"""
-    stats = query_db('''
-        SELECT 
-            COUNT(*) as total_count,
-            SUM(total_salary) as total_amount,
-            status,
-            COUNT(*) as status_count
-        FROM payroll_records
-        WHERE year_month = ?
-        AND is_archived = 0
-        GROUP BY status
-    ''', [year_month])
-    
-    total = query_db('''
-        SELECT 
-            COUNT(*) as count,
-            SUM(total_salary) as amount
-        FROM payroll_records
-        WHERE year_month = ?
-        AND is_archived = 0
-    ''', [year_month], one=True)
+    stats = get_payroll_status_stats(year_month)
     
     return jsonify({
         'year_month': year_month,
-        'total_count': total['count'] if total else 0,
-        'total_amount': total['amount'] if total else 0,
-        'status_breakdown': [dict(s) for s in stats] if stats else []
+        'total_count': sum(s['count'] for s in stats),
+        'total_amount': sum(s['amount'] or 0 for s in stats) if stats else None,
+        'status_breakdown': [
+            {
+                'status': s['status'],
+                'status_count': s['count'],
+                'total_count': s['count'],
+                'total_amount': s['amount']
+            }
+            for s in stats
+        ]
     })
 
 
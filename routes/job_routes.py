@@ -0,0 +1,70 @@
+"""
+后台任务路由
+"""
+from flask import Blueprint, request, jsonify
+from core.auth import login_required, role_required, get_current_user, get_user_team
+from core.jobs import JOB_REGISTRY, enqueue_job, get_job, list_jobs
+
+bp = Blueprint('jobs', __name__, url_prefix='/jobs')
+
+
+@bp.route('/api/submit/<string:job_type>', methods=['POST'])
+@login_required
+@role_required('admin', 'manager')
+def submit_job(job_type):
+    """
+    提交后台任务（API）
+
+    请求体为任务参数（JSON）；幂等键可通过 Idempotency-Key 请求头
+    或参数 idempotency_key 传入
+    """
+    user = get_current_user()
+
+    entry = JOB_REGISTRY.get(job_type)
+    if not entry:
+        return jsonify({'success': False, 'message': f'未知的任务类型：{job_type}'}), 404
+    if user['role'] not in entry['roles']:
+        return jsonify({'success': False, 'message': '无权提交此任务'}), 403
+
+    params = request.get_json(silent=True)
+    if not isinstance(params, dict):
+        params = {}
+    idempotency_key = request.headers.get('Idempotency-Key') or params.pop('idempotency_key', None)
+    if user['role'] != 'admin':
+        # 经理提交的任务只处理本团队（不信任请求体中的 team）
+        params['team'] = get_user_team(user)
+
+    result = enqueue_job(job_type, params, idempotency_key=idempotency_key)
+    return jsonify(result), (202 if result['success'] else 400)
+
+
+@bp.route('/api/<int:job_id>')
+@login_required
+@role_required('admin', 'manager')
+def job_status(job_id):
+    """查询任务状态与结果（API）"""
+    user = get_current_user()
+
+    job = get_job(job_id)
+    if not job:
+        return jsonify({'error': '任务不存在'}), 404
+    if user['role'] != 'admin' and job['created_by'] != user['id']:
+        return jsonify({'error': '无权查看此任务'}), 403
+
+    return jsonify(job)
+
+
+@bp.route('/api/list')
+@login_required
+@role_required('admin', 'manager')
+def job_list():
+    """最近的任务列表（API）"""
+    user = get_current_user()
+
+    jobs = list_jobs(
+        limit=request.args.get('limit', 50, type=int),
+        job_type=request.args.get('job_type'),
+        created_by=None if user['role'] == 'admin' else user['id']
+    )
+
+    return jsonify({'jobs': jobs})
@@ -5,91 +5,139 @@ from flask import Blueprint, render_template, request, jsonify
 from datetime import datetime, timedelta
 from core.auth import login_required, role_required, get_current_user, get_user_team
 from core.database import query_db
+from core.cache import cached, performance_tag, team_tag, TAG_EMPLOYEES
+from core.report_snapshot import reads_report_snapshot
+from core.utils import validate_year_month
 from config import Config
 import json
 
 bp = Blueprint('reports', __name__, url_prefix='/reports')
 
 
-@bp.route('/team_comparison')
-@login_required
-@role_required('admin')
-def team_comparison():
-    """团队对比报表"""
-    year_month = request.args.get('year_month', datetime.now().strftime('%Y-%m'))
-    
-    # 获取所有团队
-    teams = query_db('SELECT DISTINCT team FROM employees WHERE is_active = 1 ORDER BY team')
+# 报表数据缓存时间（秒）；业绩、员工状态写入时按标签失效
+REPORT_CACHE_TTL = 600
+
+
+def _month_range(year_month):
+    """月份的 [起始日, 次月1日) 日期范围（可走 work_date 索引）"""
+    start = datetime.strptime(year_month, '%Y-%m').date()
+    next_month = (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start.isoformat(), next_month.isoformat()
+
+
+def _year_month_arg():
+    """查询参数 year_month（缺省或格式错误时取当月）"""
+    year_month = request.args.get('year_month', '')
+    return year_month if validate_year_month(year_month) else datetime.now().strftime('%Y-%m')
+
+
+def _scope_tags(team):
+    """按团队或全体员工的失效标签"""
+    return [team_tag(team)] if team else [TAG_EMPLOYEES]
+
+
+@cached(ttl=REPORT_CACHE_TTL, tags=lambda year_month: [performance_tag(year_month), TAG_EMPLOYEES])
+def get_team_comparison_data(year_month):
+    """
+    团队对比数据
+    
+    Args:
+        year_month: 年月 YYYY-MM
+    
+    Returns:
+        list: 每个团队一项 dict
+    """
+    staff_stats = query_db('''
+        SELECT team, status, COUNT(*) as count
+        FROM employees
+        WHERE is_active = 1
+        GROUP BY team, status
+    ''')
+    stats_by_team = {}
+    for s in staff_stats:
+        stats_by_team.setdefault(s['team'], {})[s['status']] = s['count']
+    
+    # 本月业绩（一次按团队汇总）
+    month_perf = query_db('''
+        SELECT 
+            e.team,
+            COUNT(DISTINCT e.id) as active_employees,
+            SUM(p.orders_count) as total_orders,
+            SUM(p.commission) as total_commission,
+            AVG(p.orders_count) as avg_orders
+        FROM employees e
+        LEFT JOIN performance p ON e.id = p.employee_id 
+            AND p.work_date >= ? AND p.work_date < ?
+        WHERE e.is_active = 1
+        GROUP BY e.team
+        ORDER BY e.team
+    ''', _month_range(year_month))
     
-    # 计算每个团队的数据
     team_data = []
-    for team_row in teams:
-        team_name = team_row['team']
-        
-        # 人员统计
-        staff_stats = query_db('''
-            SELECT status, COUNT(*) as count
-            FROM employees
-            WHERE team = ? AND is_active = 1
-            GROUP BY status
-        ''', (team_name,))
-        
-        stats_dict = {s['status']: s['count'] for s in staff_stats}
-        total_staff = sum(stats_dict.values())
-        
-        # 本月业绩
-        month_perf = query_db('''
-            SELECT 
-                COUNT(DISTINCT e.id) as active_employees,
-                SUM(p.orders_count) as total_orders,
-                SUM(p.commission) as total_commission,
-                AVG(p.orders_count) as avg_orders
-            FROM employees e
-            LEFT JOIN performance p ON e.id = p.employee_id 
-                AND strftime('%Y-%m', p.work_date) = ?
-            WHERE e.team = ? AND e.is_active = 1
-        ''', (year_month, team_name), one=True)
+    for perf in month_perf:
+        team_name = perf['team']
+        stats_dict = stats_by_team.get(team_name, {})
         
         # 收入成本
-        revenue = (month_perf['total_orders'] or 0) * Config.REVENUE_PER_ORDER
-        cost = month_perf['total_commission'] or 0
+        revenue = (perf['total_orders'] or 0) * Config.REVENUE_PER_ORDER
+        cost = perf['total_commission'] or 0
         profit = revenue - cost
         
         team_data.append({
             'team': team_name,
-            'total_staff': total_staff,
+            'total_staff': sum(stats_dict.values()),
             'a_count': stats_dict.get('A', 0),
             'b_count': stats_dict.get('B', 0),
             'c_count': stats_dict.get('C', 0),
             'trainee_count': stats_dict.get('trainee', 0),
-            'active_employees': month_perf['active_employees'] or 0,
-            'total_orders': month_perf['total_orders'] or 0,
-            'avg_orders': round(month_perf['avg_orders'] or 0, 1),
-            'total_commission': month_perf['total_commission'] or 0,
+            'active_employees': perf['active_employees'] or 0,
+            'total_orders': perf['total_orders'] or 0,
+            'avg_orders': round(perf['avg_orders'] or 0, 1),
+            'total_commission': perf['total_commission'] or 0,
             'revenue': revenue,
             'cost': cost,
             'profit': profit,
             'profit_margin': round(profit / revenue * 100, 1) if revenue > 0 else 0
         })
+    return team_data
+
+
+@bp.route('/team_comparison')
+@login_required
+@role_required('admin')
+@reads_report_snapshot
+def team_comparison():
+    """团队对比报表"""
+    year_month = _year_month_arg()
     
     return render_template('reports/team_comparison.html',
-                         team_data=team_data,
+                         team_data=get_team_comparison_data(year_month),
                          year_month=year_month,
                          user=get_current_user())
 
 
-@bp.route('/employee_ranking')
-@login_required
-@role_required('manager', 'admin')
-def employee_ranking():
-    """员工业绩排行榜"""
-    user = get_current_user()
-    team = get_user_team(user)
-    
-    year_month = request.args.get('year_month', datetime.now().strftime('%Y-%m'))
-    rank_type = request.args.get('type', 'orders')  # orders, commission, valid_days
-    
-    # 构建查询
+# 排行榜排序方式
+RANK_ORDER_BY = {
+    'orders': 'total_orders DESC',
+    'commission': 'total_commission DESC',
+    'valid_days': 'valid_days DESC'
+}
+
+
+@cached(ttl=REPORT_CACHE_TTL,
+        tags=lambda year_month, rank_type, team=None: [performance_tag(year_month)] + _scope_tags(team))
+def get_employee_ranking_data(year_month, rank_type, team=None):
+    """
+    员工业绩排行（前50名）
+    
+    Args:
+        year_month: 年月 YYYY-MM
+        rank_type: orders | commission | valid_days
+        team: 团队（None 为全部）
+    
+    Returns:
+        list: 排名 dict（含 rank）
+    """
     query = '''
         SELECT 
             e.id,
@@ -104,10 +152,10 @@ def employee_ranking():
             ROUND(AVG(p.orders_count), 1) as avg_orders
         FROM employees e
         LEFT JOIN performance p ON e.id = p.employee_id 
-            AND strftime('%Y-%m', p.work_date) = ?
+            AND p.work_date >= ? AND p.work_date < ?
         WHERE e.is_active = 1
     '''
-    params = [year_month]
+    params = list(_month_range(year_month))
     
     if team:
         query += ' AND e.team = ?'
@@ -115,49 +163,53 @@ def employee_ranking():
     
     query += ' GROUP BY e.id'
     
-    # 排序
-    if rank_type == 'orders':
-        query += ' ORDER BY total_orders DESC'
-    elif rank_type == 'commission':
-        query += ' ORDER BY total_commission DESC'
-    elif rank_type == 'valid_days':
-        query += ' ORDER BY valid_days DESC'
+    if rank_type in RANK_ORDER_BY:
+        query += ' ORDER BY ' + RANK_ORDER_BY[rank_type]
     
     query += ' LIMIT 50'
     
-    rankings = query_db(query, params)
+    rankings = [dict(row) for row in query_db(query, params)]
     
     # 添加排名
     for idx, rank in enumerate(rankings, 1):
         rank['rank'] = idx
-    
-    return render_template('reports/employee_ranking.html',
-                         rankings=rankings,
-                         year_month=year_month,
-                         rank_type=rank_type,
-                         user=user)
+    return rankings
 
 
-@bp.route('/trend_analysis')
+@bp.route('/employee_ranking')
 @login_required
 @role_required('manager', 'admin')
-def trend_analysis():
-    """趋势分析报表"""
+@reads_report_snapshot
+def employee_ranking():
+    """员工业绩排行榜"""
     user = get_current_user()
     team = get_user_team(user)
     
-    # 获取最近12个月的数据
-    months = []
-    data_points = []
-    
-    today = datetime.now().date()
+    year_month = _year_month_arg()
+    rank_type = request.args.get('type', 'orders')  # orders, commission, valid_days
     
-    for i in range(11, -1, -1):
-        month_date = today - timedelta(days=30*i)
-        year_month = month_date.strftime('%Y-%m')
-        months.append(year_month)
-        
-        # 查询该月数据
+    return render_template('reports/employee_ranking.html',
+                         rankings=get_employee_ranking_data(year_month, rank_type, team),
+                         year_month=year_month,
+                         rank_type=rank_type,
+                         user=user)
+
+
+@cached(ttl=REPORT_CACHE_TTL,
+        tags=lambda months, team=None: [performance_tag(m) for m in months] + _scope_tags(team))
+def get_trend_data(months, team=None):
+    """
+    按月趋势数据
+    
+    Args:
+        months: 年月元组（YYYY-MM，升序）
+        team: 团队（None 为全部）
+    
+    Returns:
+        list: 每月一项 dict
+    """
+    data_points = []
+    for year_month in months:
         query = '''
             SELECT 
                 COUNT(DISTINCT e.id) as active_count,
@@ -165,10 +217,10 @@ def trend_analysis():
                 SUM(p.commission) as total_commission
             FROM employees e
             LEFT JOIN performance p ON e.id = p.employee_id 
-                AND strftime('%Y-%m', p.work_date) = ?
+                AND p.work_date >= ? AND p.work_date < ?
             WHERE e.is_active = 1
         '''
-        params = [year_month]
+        params = list(_month_range(year_month))
         
         if team:
             query += ' AND e.team = ?'
@@ -188,26 +240,43 @@ def trend_analysis():
             'revenue': revenue,
             'profit': revenue - commission
         })
-    
-    return render_template('reports/trend_analysis.html',
-                         data_points=data_points,
-                         user=user)
+    return data_points
 
 
-@bp.route('/status_flow')
+@bp.route('/trend_analysis')
 @login_required
 @role_required('manager', 'admin')
-def status_flow():
-    """状态流转分析"""
+@reads_report_snapshot
+def trend_analysis():
+    """趋势分析报表"""
     user = get_current_user()
     team = get_user_team(user)
     
-    # 获取时间范围
-    days = int(request.args.get('days', 30))
-    end_date = datetime.now().date()
-    start_date = end_date - timedelta(days=days)
+    # 最近12个月
+    today = datetime.now().date()
+    months = tuple(
+        (today - timedelta(days=30*i)).strftime('%Y-%m')
+        for i in range(11, -1, -1)
+    )
     
-    # 状态流转统计
+    return render_template('reports/trend_analysis.html',
+                         data_points=get_trend_data(months, team),
+                         user=user)
+
+
+@cached(ttl=REPORT_CACHE_TTL, tags=lambda start_date, end_date, team=None: _scope_tags(team))
+def get_status_flow_data(start_date, end_date, team=None):
+    """
+    状态流转统计与当前状态分布
+    
+    Args:
+        start_date: 开始日期 YYYY-MM-DD
+        end_date: 结束日期 YYYY-MM-DD
+        team: 团队（None 为全部）
+    
+    Returns:
+        dict: {'flow_data': list, 'current_status': list}
+    """
     query = '''
         SELECT 
             sh.from_status,
@@ -218,7 +287,7 @@ def status_flow():
         JOIN employees e ON sh.employee_id = e.id
         WHERE sh.change_date >= ? AND sh.change_date <= ?
     '''
-    params = [start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')]
+    params = [start_date, end_date]
     
     if team:
         query += ' AND e.team = ?'
@@ -226,7 +295,7 @@ def status_flow():
     
     query += ' GROUP BY sh.from_status, sh.to_status ORDER BY count DESC'
     
-    flow_data = query_db(query, params)
+    flow_data = [dict(row) for row in query_db(query, params)]
     
     # 当前状态分布
     status_query = '''
@@ -242,26 +311,46 @@ def status_flow():
     
     status_query += ' GROUP BY status'
     
-    current_status = query_db(status_query, status_params)
-    
-    return render_template('reports/status_flow.html',
-                         flow_data=flow_data,
-                         current_status=current_status,
-                         days=days,
-                         user=user)
+    current_status = [dict(row) for row in query_db(status_query, status_params)]
+    return {'flow_data': flow_data, 'current_status': current_status}
 
 
-@bp.route('/performance_heatmap')
+@bp.route('/status_flow')
 @login_required
 @role_required('manager', 'admin')
-def performance_heatmap():
-    """业绩热力图"""
+@reads_report_snapshot
+def status_flow():
+    """状态流转分析"""
     user = get_current_user()
     team = get_user_team(user)
     
-    year_month = request.args.get('year_month', datetime.now().strftime('%Y-%m'))
+    # 获取时间范围
+    days = request.args.get('days', 30, type=int)
+    end_date = datetime.now().date()
+    start_date = end_date - timedelta(days=days)
+    
+    data = get_status_flow_data(start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'), team)
     
-    # 获取该月所有日期的业绩数据
+    return render_template('reports/status_flow.html',
+                         flow_data=data['flow_data'],
+                         current_status=data['current_status'],
+                         days=days,
+                         user=user)
+
+
+@cached(ttl=REPORT_CACHE_TTL,
+        tags=lambda year_month, team=None: [performance_tag(year_month)] + _scope_tags(team))
+def get_heatmap_data(year_month, team=None):
+    """
+    业绩热力图数据
+    
+    Args:
+        year_month: 年月 YYYY-MM
+        team: 团队（None 为全部）
+    
+    Returns:
+        dict: {'daily_data': list, 'weekday_data': list}
+    """
     query = '''
         SELECT 
             p.work_date,
@@ -270,9 +359,9 @@ def performance_heatmap():
             AVG(p.orders_count) as avg_orders
         FROM performance p
         JOIN employees e ON p.employee_id = e.id
-        WHERE strftime('%Y-%m', p.work_date) = ?
+        WHERE p.work_date >= ? AND p.work_date < ?
     '''
-    params = [year_month]
+    params = list(_month_range(year_month))
     
     if team:
         query += ' AND e.team = ?'
@@ -280,14 +369,17 @@ def performance_heatmap():
     
     query += ' GROUP BY p.work_date ORDER BY p.work_date'
     
-    daily_data = query_db(query, params)
+    daily_data = []
+    for row in query_db(query, params):
+        record = dict(row)
+        record['work_date'] = str(record['work_date'])[:10]
+        daily_data.append(record)
     
     # 按星期几统计
     weekday_stats = {i: {'count': 0, 'orders': 0} for i in range(7)}
     
     for record in daily_data:
-        date_obj = datetime.strptime(record['work_date'], '%Y-%m-%d')
-        weekday = date_obj.weekday()
+        weekday = datetime.strptime(record['work_date'], '%Y-%m-%d').weekday()
         weekday_stats[weekday]['count'] += 1
         weekday_stats[weekday]['orders'] += record['total_orders'] or 0
     
@@ -299,10 +391,24 @@ def performance_heatmap():
         }
         for i in range(7)
     ]
+    return {'daily_data': daily_data, 'weekday_data': weekday_data}
+
+
+@bp.route('/performance_heatmap')
+@login_required
+@role_required('manager', 'admin')
+@reads_report_snapshot
+def performance_heatmap():
+    """业绩热力图"""
+    user = get_current_user()
+    team = get_user_team(user)
+    
+    year_month = _year_month_arg()
+    data = get_heatmap_data(year_month, team)
     
     return render_template('reports/performance_heatmap.html',
-                         daily_data=daily_data,
-                         weekday_data=weekday_data,
+                         daily_data=data['daily_data'],
+                         weekday_data=data['weekday_data'],
                          year_month=year_month,
                          user=user)
 
@@ -1,6 +1,54 @@
 #!/bin/bash
 
 # 呼叫中心职场管理系统启动脚本
+#
+# 用法: bash run.sh [dev|prod|reload|stop]（默认取环境变量 SERVE_MODE，未设置时为 dev）
+#   dev     开发服务器（python3 app.py，调试模式）
+#   prod    gunicorn 多 worker（gunicorn.conf.py，预加载 + 预热）
+#   reload  平滑重载生产服务（新主进程就绪后退出旧主进程）
+#   stop    停止生产服务
+
+MODE="${1:-${SERVE_MODE:-dev}}"
+PIDFILE="${GUNICORN_PIDFILE:-logs/gunicorn.pid}"
+
+case "$MODE" in
+    reload)
+        if [ ! -f "$PIDFILE" ]; then
+            echo "错误: 未找到 $PIDFILE，生产服务未运行"
+            exit 1
+        fi
+        OLD_PID=$(cat "$PIDFILE")
+        echo "平滑重载 (主进程 $OLD_PID)..."
+        # 预加载模式下 HUP 不会重新导入代码：USR2 启动新主进程，就绪后 QUIT 旧主进程
+        kill -USR2 "$OLD_PID"
+        for i in $(seq 1 60); do
+            # 新主进程写入 $PIDFILE，旧主进程的 pid 文件改名为 $PIDFILE.oldbin
+            if [ -f "$PIDFILE" ] && [ "$(cat "$PIDFILE")" != "$OLD_PID" ]; then
+                break
+            fi
+            sleep 1
+        done
+        sleep 2
+        kill -QUIT "$OLD_PID"
+        echo "已重载"
+        exit 0
+        ;;
+    stop)
+        if [ -f "$PIDFILE" ]; then
+            kill -TERM "$(cat "$PIDFILE")"
+            echo "已停止"
+        else
+            echo "生产服务未运行"
+        fi
+        exit 0
+        ;;
+    dev|prod)
+        ;;
+    *)
+        echo "用法: bash run.sh [dev|prod|reload|stop]"
+        exit 1
+        ;;
+esac
 
 echo "========================================"
 echo "  呼叫中心职场管理系统"
@@ -26,13 +74,20 @@ if [ ! -f "data/callcenter.db" ]; then
     python3 init_db.py
 else
     echo "数据库已存在"
+    # 执行待执行的迁移（有待执行迁移时先在线备份；分批执行，可在服务运行中重复执行）
+    python3 migrate_database.py || exit 1
 fi
 
 # 启动应用
 echo "========================================"
-echo "启动应用..."
+echo "启动应用 ($MODE)..."
 echo "========================================"
-python3 app.py
+if [ "$MODE" = "prod" ]; then
+    mkdir -p logs
+    exec gunicorn -c gunicorn.conf.py wsgi:app
+else
+    python3 app.py
+fi
 
 
 
@@ -69,6 +69,20 @@ CREATE TABLE IF NOT EXISTS salary (
     UNIQUE(employee_id, year_month)
 );
 
+-- 月度薪资台账（业绩写入时增量更新，实时薪资计算读取此表）
+CREATE TABLE IF NOT EXISTS salary_ledger (
+    employee_id INTEGER NOT NULL,
+    year_month TEXT NOT NULL,  -- YYYY-MM 格式
+    work_days INTEGER NOT NULL DEFAULT 0,  -- 工作日数（有业绩记录的天数）
+    valid_work_days INTEGER NOT NULL DEFAULT 0,  -- 有效工作日数
+    total_orders INTEGER NOT NULL DEFAULT 0,  -- 总出单数
+    total_commission REAL NOT NULL DEFAULT 0,  -- 提成合计
+    recent_days TEXT,  -- 当月最近6条业绩 JSON: [["YYYY-MM-DD", 出单数], ...]
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (employee_id, year_month),
+    FOREIGN KEY (employee_id) REFERENCES employees(id)
+);
+
 -- 薪资异议表
 CREATE TABLE IF NOT EXISTS salary_disputes (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -136,7 +150,12 @@ CREATE TABLE IF NOT EXISTS notifications (
     user_id INTEGER NOT NULL,
     title TEXT NOT NULL,
     content TEXT NOT NULL,
-    type TEXT DEFAULT 'system' CHECK(type IN ('system', 'status_change', 'salary', 'performance', 'dispute', 'announcement')),
+    type TEXT DEFAULT 'system' CHECK(type IN (
+        'system', 'status_change', 'salary', 'performance', 'dispute', 'announcement',
+        'promotion_pending', 'promotion_approved', 'promotion_rejected',
+        'challenge_triggered', 'challenge_success', 'challenge_failed',
+        'calendar_changed', 'payroll_ready', 'payroll_paid'
+    )),
     link TEXT,  -- 相关链接
     is_read INTEGER DEFAULT 0 CHECK(is_read IN (0, 1)),
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
@@ -304,12 +323,15 @@ CREATE TABLE IF NOT EXISTS audit_logs (
     FOREIGN KEY (target_employee_id) REFERENCES employees(id)
 );
 
--- 审计日志索引（优化查询性能）
-CREATE INDEX IF NOT EXISTS idx_audit_logs_operation_type ON audit_logs(operation_type);
-CREATE INDEX IF NOT EXISTS idx_audit_logs_operator_id ON audit_logs(operator_id);
+-- 审计日志索引：按操作人/员工/类型筛选并按时间倒序（idx_audit_operator 等见扩展表部分），全量按时间倒序
 CREATE INDEX IF NOT EXISTS idx_audit_logs_created_at ON audit_logs(created_at DESC);
-CREATE INDEX IF NOT EXISTS idx_audit_logs_target_employee_id ON audit_logs(target_employee_id);
-CREATE INDEX IF NOT EXISTS idx_audit_logs_operator_created ON audit_logs(operator_id, created_at DESC);
+
+-- 已合并的审计日志索引（被上述索引前缀覆盖或从未被查询使用，每次写日志都要多维护）
+DROP INDEX IF EXISTS idx_audit_logs_operation_type;
+DROP INDEX IF EXISTS idx_audit_logs_operator_id;
+DROP INDEX IF EXISTS idx_audit_logs_target_employee_id;
+DROP INDEX IF EXISTS idx_audit_logs_operator_created;
+DROP INDEX IF EXISTS idx_audit_module;
 
 -- ==================== 扩展表：工资管理系统 ====================
 
@@ -405,6 +427,101 @@ CREATE TABLE IF NOT EXISTS payroll_archives (
     FOREIGN KEY (archived_by) REFERENCES users(id)
 );
 
+-- 归档库文件表（已归档年份的工资单迁出到 data/archive/payroll_<年>.db）
+CREATE TABLE IF NOT EXISTS payroll_archive_files (
+    archive_year INTEGER PRIMARY KEY,
+    file_name TEXT NOT NULL,
+    record_count INTEGER NOT NULL,
+    adjustment_count INTEGER NOT NULL DEFAULT 0,
+    checksum TEXT NOT NULL,                 -- 迁移时计算的 sha256（按 id 分批）
+    file_size INTEGER,
+    moved_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    verified_at TIMESTAMP                   -- 最近一次重新校验通过的时间
+);
+
+-- 银行代发批次表
+CREATE TABLE IF NOT EXISTS payment_batches (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    batch_no TEXT NOT NULL UNIQUE,  -- 批次号（写入代发文件，回盘文件按此匹配）
+    year_month TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'exported' CHECK(status IN ('exported', 'partial', 'reconciled')),
+    record_count INTEGER DEFAULT 0,
+    total_amount REAL DEFAULT 0,
+    paid_count INTEGER DEFAULT 0,
+    failed_count INTEGER DEFAULT 0,
+    retry_count INTEGER DEFAULT 0,
+    
+    created_by INTEGER,
+    created_by_name TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    reconciled_by INTEGER,
+    reconciled_by_name TEXT,
+    reconciled_at TIMESTAMP,
+    
+    FOREIGN KEY (created_by) REFERENCES users(id)
+);
+
+-- 代发批次明细表（生成批次时的收款快照）
+CREATE TABLE IF NOT EXISTS payment_batch_items (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    batch_id INTEGER NOT NULL,
+    payroll_id INTEGER NOT NULL,
+    employee_no TEXT NOT NULL,
+    account_holder_name TEXT NOT NULL,
+    bank_account_number TEXT NOT NULL,
+    bank_name TEXT,
+    amount REAL NOT NULL,
+    result TEXT NOT NULL DEFAULT 'pending' CHECK(result IN ('pending', 'paid', 'failed', 'retry')),
+    bank_reference TEXT,
+    failure_reason TEXT,
+    updated_at TIMESTAMP,
+    
+    UNIQUE (batch_id, payroll_id),
+    FOREIGN KEY (batch_id) REFERENCES payment_batches(id),
+    FOREIGN KEY (payroll_id) REFERENCES payroll_records(id)
+);
+
+-- 后台任务表
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_type TEXT NOT NULL,  -- 任务类型（见 core/jobs.py 注册表）
+    params_json TEXT,  -- 任务参数
+    status TEXT NOT NULL DEFAULT 'queued' CHECK(status IN ('queued', 'running', 'succeeded', 'failed')),
+    progress REAL DEFAULT 0,  -- 进度百分比
+    result_json TEXT,  -- 执行结果
+    error TEXT,  -- 失败原因
+    idempotency_key TEXT UNIQUE,  -- 幂等键（相同键只执行一次）
+    duration_ms INTEGER,
+    owner TEXT,  -- 执行进程（主机名:pid）
+    heartbeat_at REAL,  -- 执行进程最近一次心跳（unix 时间戳），超时视为进程已退出
+    
+    created_by INTEGER,
+    created_by_name TEXT,
+    created_by_role TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP,
+    
+    FOREIGN KEY (created_by) REFERENCES users(id)
+);
+
+-- 数据库维护任务状态（core/db_maintenance.py；lease_until 为执行中任务的租约，多 worker 只有一个执行）
+CREATE TABLE IF NOT EXISTS db_maintenance_tasks (
+    task TEXT PRIMARY KEY,
+    last_run_ts REAL,  -- 上次执行完成时间（unix 时间戳）
+    last_status TEXT,  -- ok / partial / skipped / failed
+    last_duration_ms INTEGER,
+    last_detail TEXT,  -- 执行详情（JSON）
+    lease_until REAL
+);
+
+-- 大批量写入登记（导入、生成工资单、归档等在同一事务中累加，ANALYZE 后清零）
+CREATE TABLE IF NOT EXISTS db_maintenance_writes (
+    table_name TEXT PRIMARY KEY,
+    pending_rows INTEGER NOT NULL DEFAULT 0,
+    last_write_at TIMESTAMP
+);
+
 -- 创建索引
 CREATE INDEX IF NOT EXISTS idx_employees_team ON employees(team);
 CREATE INDEX IF NOT EXISTS idx_employees_status ON employees(status);
@@ -415,6 +532,9 @@ CREATE INDEX IF NOT EXISTS idx_salary_employee_month ON salary(employee_id, year
 CREATE INDEX IF NOT EXISTS idx_status_history_employee ON status_history(employee_id, change_date);
 CREATE INDEX IF NOT EXISTS idx_users_username ON users(username);
 CREATE INDEX IF NOT EXISTS idx_notifications_user ON notifications(user_id, is_read, created_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_type_status ON jobs(job_type, status, created_at);
+CREATE INDEX IF NOT EXISTS idx_payment_batches_month ON payment_batches(year_month, created_at);
+CREATE INDEX IF NOT EXISTS idx_payment_batch_items_payroll ON payment_batch_items(payroll_id, result);
 
 -- 扩展表索引
 CREATE INDEX IF NOT EXISTS idx_promotion_status ON promotion_confirmations(status, employee_id);
@@ -434,7 +554,6 @@ CREATE INDEX IF NOT EXISTS idx_work_calendar_workday ON work_calendar(is_workday
 CREATE INDEX IF NOT EXISTS idx_audit_operator ON audit_logs(operator_id, created_at);
 CREATE INDEX IF NOT EXISTS idx_audit_employee ON audit_logs(target_employee_id, created_at);
 CREATE INDEX IF NOT EXISTS idx_audit_type ON audit_logs(operation_type, created_at);
-CREATE INDEX IF NOT EXISTS idx_audit_module ON audit_logs(operation_module, created_at);
 
 CREATE UNIQUE INDEX IF NOT EXISTS idx_payroll_unique ON payroll_records(employee_id, year_month) 
     WHERE is_archived = 0;
@@ -444,6 +563,66 @@ CREATE INDEX IF NOT EXISTS idx_payroll_status ON payroll_records(status);
 CREATE INDEX IF NOT EXISTS idx_payroll_archive ON payroll_records(is_archived, archive_year);
 CREATE INDEX IF NOT EXISTS idx_payroll_employee ON payroll_records(employee_id);
 
+-- 工资单工作列表（按 团队、工号、id 游标分页；团队为空按空串排序）
+CREATE INDEX IF NOT EXISTS idx_payroll_worklist ON payroll_records(year_month, status, IFNULL(team, ''), employee_no, id);
+CREATE INDEX IF NOT EXISTS idx_payroll_month_order ON payroll_records(year_month, IFNULL(team, ''), employee_no, id);
+
+-- 工资单状态计数（未归档，按 年月 + 状态），由下方触发器在工资单写入的同一事务中维护
+CREATE TABLE IF NOT EXISTS payroll_status_counters (
+    year_month TEXT NOT NULL,
+    status TEXT NOT NULL,
+    record_count INTEGER NOT NULL DEFAULT 0,
+    total_amount REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (year_month, status)
+) WITHOUT ROWID;
+
+-- 首次建表时按现有工资单补齐（计数行不删除，已存在的分组不会重复累加）
+INSERT OR IGNORE INTO payroll_status_counters (year_month, status, record_count, total_amount)
+SELECT year_month, status, COUNT(*), IFNULL(SUM(total_salary), 0)
+FROM payroll_records
+WHERE is_archived = 0
+GROUP BY year_month, status;
+
+CREATE TRIGGER IF NOT EXISTS trg_payroll_counter_insert
+AFTER INSERT ON payroll_records
+WHEN NEW.is_archived = 0
+BEGIN
+    INSERT INTO payroll_status_counters (year_month, status, record_count, total_amount)
+    VALUES (NEW.year_month, NEW.status, 1, IFNULL(NEW.total_salary, 0))
+    ON CONFLICT(year_month, status) DO UPDATE SET
+        record_count = record_count + 1,
+        total_amount = total_amount + excluded.total_amount;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_payroll_counter_update
+AFTER UPDATE OF status, total_salary, year_month, is_archived ON payroll_records
+WHEN OLD.status IS NOT NEW.status
+    OR OLD.total_salary IS NOT NEW.total_salary
+    OR OLD.year_month IS NOT NEW.year_month
+    OR OLD.is_archived IS NOT NEW.is_archived
+BEGIN
+    UPDATE payroll_status_counters
+    SET record_count = record_count - 1,
+        total_amount = total_amount - IFNULL(OLD.total_salary, 0)
+    WHERE year_month = OLD.year_month AND status = OLD.status AND OLD.is_archived = 0;
+    INSERT INTO payroll_status_counters (year_month, status, record_count, total_amount)
+    SELECT NEW.year_month, NEW.status, 1, IFNULL(NEW.total_salary, 0)
+    WHERE NEW.is_archived = 0
+    ON CONFLICT(year_month, status) DO UPDATE SET
+        record_count = record_count + 1,
+        total_amount = total_amount + excluded.total_amount;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_payroll_counter_delete
+AFTER DELETE ON payroll_records
+WHEN OLD.is_archived = 0
+BEGIN
+    UPDATE payroll_status_counters
+    SET record_count = record_count - 1,
+        total_amount = total_amount - IFNULL(OLD.total_salary, 0)
+    WHERE year_month = OLD.year_month AND status = OLD.status;
+END;
+
 CREATE INDEX IF NOT EXISTS idx_adjustment_payroll ON payroll_adjustments(payroll_id);
 CREATE INDEX IF NOT EXISTS idx_adjustment_date ON payroll_adjustments(adjusted_at);
 
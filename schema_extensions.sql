@@ -180,7 +180,6 @@ CREATE TABLE IF NOT EXISTS audit_logs (
 CREATE INDEX IF NOT EXISTS idx_audit_operator ON audit_logs(operator_id, created_at);
 CREATE INDEX IF NOT EXISTS idx_audit_employee ON audit_logs(target_employee_id, created_at);
 CREATE INDEX IF NOT EXISTS idx_audit_type ON audit_logs(operation_type, created_at);
-CREATE INDEX IF NOT EXISTS idx_audit_module ON audit_logs(operation_module, created_at);
 
 -- ==================== 需求2：工资管理系统 ====================
 
@@ -293,6 +292,7 @@ CREATE TABLE IF NOT EXISTS payroll_archives (
 -- 注意：需要手动执行 ALTER TABLE 修改 CHECK 约束
 
 -- 扩展employees表（添加保级挑战和银行信息字段）
+-- 已有数据库请使用 python3 migrate_database.py（core/migrations.py 0002，字段已存在时跳过）
 ALTER TABLE employees ADD COLUMN challenge_count_this_month INTEGER DEFAULT 0;
 ALTER TABLE employees ADD COLUMN current_challenge_id INTEGER;
 ALTER TABLE employees ADD COLUMN last_challenge_date DATE;
@@ -0,0 +1,4 @@
+"""
+进程内性能基准测试套件
+按可配置规模生成带随机种子的 SQLite 数据，通过 Flask test client 与核心引擎直接调用测量耗时与SQL语句数
+"""
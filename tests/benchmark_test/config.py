@@ -0,0 +1,62 @@
+"""
+基准测试配置文件
+"""
+from datetime import date
+
+# 随机种子（相同种子 + 相同规模 → 相同数据库）
+SEED = 20250101
+
+# 数据截止日期（固定，保证基准可复现）
+END_DATE = date(2026, 9, 30)
+
+# 数据规模：员工数 × 年数
+SCALES = {
+    'ci': {'employees': 200, 'years': 0.25},     # 快速回归（约1分钟内完成）
+    'small': {'employees': 1000, 'years': 1},
+    'medium': {'employees': 10000, 'years': 1},
+    'large': {'employees': 10000, 'years': 3}
+}
+
+# 团队配置
+TEAMS = ['A组', 'B组', 'C组']
+
+# 基准账号（密码统一）
+BENCH_PASSWORD = '123456'
+BENCH_USERS = {
+    'admin': 'admin',
+    'manager': 'manager',
+    'finance': 'finance',
+    'employee': 'employee'
+}
+
+# 员工能力分布：日均出单期望（对应快速成长/达标波动/待淘汰）
+SKILL_PROFILES = [
+    (0.25, 4.0),
+    (0.50, 2.5),
+    (0.25, 0.8)
+]
+
+# 每日出勤率、有效工作日比例
+ATTENDANCE_RATE = 0.93
+VALID_WORKDAY_RATE = 0.97
+
+# 每次测量的重复次数（首次调用作为预热，不计入统计）
+DEFAULT_ITERATIONS = 20
+WARMUP_ITERATIONS = 1
+
+# 回归判定：p50 超过基线的比例与最小绝对差值；SQL语句数增加即视为回归
+LATENCY_REGRESSION_RATIO = 0.30
+LATENCY_REGRESSION_MIN_MS = 2
+
+# 启动导入基准：重复次数；启动时不应导入的重型模块（导出、数值计算在首次使用时导入）
+IMPORT_TIME_RUNS = 5
+STARTUP_FORBIDDEN_MODULES = ['openpyxl', 'reportlab', 'PyPDF2', 'pandas', 'numpy']
+# 启动耗时/内存超过基线的比例与最小绝对差值（仅提示）
+IMPORT_TIME_REGRESSION_MIN_MS = 20
+RSS_REGRESSION_RATIO = 0.20
+
+# 输出路径配置
+BENCH_DIR = 'tests/benchmark_test'
+FIXTURE_DIR = f'{BENCH_DIR}/fixtures'
+BASELINE_DIR = f'{BENCH_DIR}/baselines'
+OUTPUT_DIR = f'{BENCH_DIR}/output'
@@ -0,0 +1,302 @@
+"""
+基准测试数据生成器
+按规模（员工数 × 年数）和随机种子生成独立的 SQLite 数据库：
+员工、状态变更历史、培训考核、工作日历、每日业绩、薪资台账，以及截止月份的薪资快照与工资单。
+同一规模与种子只生成一次，之后直接复用。
+"""
+import sys
+import os
+import sqlite3
+import time
+from datetime import timedelta
+
+import numpy as np
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from config import Config
+from tests.benchmark_test.config import *
+from core.auth import hash_password, encrypt_phone
+from core.commission import calculate_commission_array
+from core.migrations import MIGRATIONS
+
+# 状态晋升节奏：入职后第N天（trainee→C、C→B、B→A）
+PROMOTION_DAYS = (3, 9, 18)
+
+# 淘汰：低产出员工在C级停留N天后淘汰
+ELIMINATION_DAYS = 12
+
+# 固定节假日（月, 日）；春节按每年2月中旬近似
+HOLIDAYS = [(1, 1), (2, 16), (2, 17), (2, 18), (5, 1), (10, 1), (10, 2), (10, 3)]
+
+
+def fixture_path(scale, seed=SEED):
+    """基准数据库路径"""
+    return os.path.join(FIXTURE_DIR, f'bench_{scale}_{seed}.db')
+
+
+def _create_schema(conn):
+    """建表：schema.sql + schema_extensions.sql 与迁移（core/migrations.py）中的补充字段"""
+    with open('schema.sql', 'r', encoding='utf-8') as f:
+        conn.executescript(f.read())
+    statements = []
+    with open('schema_extensions.sql', 'r', encoding='utf-8') as f:
+        statements.extend(line for line in f if line.startswith('ALTER TABLE'))
+    statements.extend(
+        f"ALTER TABLE {step['table']} ADD COLUMN {step['column']} {step['definition']}"
+        for migration in MIGRATIONS for step in migration['steps'] if step['type'] == 'add_column'
+    )
+    for sql in statements:
+        try:
+            conn.execute(sql)
+        except sqlite3.OperationalError:
+            pass  # 字段已存在
+
+
+def _date_range(start, end):
+    return [start + timedelta(days=i) for i in range((end - start).days + 1)]
+
+
+def _plan_employee(rng, index, start_date, end_date):
+    """
+    生成一名员工的基础信息与状态轨迹
+
+    Returns:
+        dict: 员工信息，history 为 [(from_status, to_status, change_date), ...]
+    """
+    span = (end_date - start_date).days
+    join_date = start_date + timedelta(days=int(rng.integers(-30, max(span - 5, 1))))
+    profile = rng.choice(len(SKILL_PROFILES), p=[p for p, _ in SKILL_PROFILES])
+    skill = SKILL_PROFILES[profile][1] * float(rng.uniform(0.8, 1.2))
+    assessment_passed = rng.random() < 0.9
+
+    history = []
+    status = 'trainee'
+    leave_date = None
+    if assessment_passed:
+        steps = ['C', 'B', 'A'] if profile < 2 else ['C']
+        for to_status, days in zip(steps, PROMOTION_DAYS):
+            change_date = join_date + timedelta(days=days)
+            if change_date > end_date:
+                break
+            history.append((status, to_status, change_date))
+            status = to_status
+        if profile == 2 and status == 'C':
+            leave_date = history[-1][2] + timedelta(days=ELIMINATION_DAYS)
+            if leave_date <= end_date:
+                history.append(('C', 'eliminated', leave_date))
+                status = 'eliminated'
+            else:
+                leave_date = None
+
+    return {
+        'employee_no': f'BM{index:05d}',
+        'name': f'基准员工{index:05d}',
+        'phone': f'139{index:08d}',
+        'team': TEAMS[index % len(TEAMS)],
+        'status': status,
+        'join_date': join_date,
+        'leave_date': leave_date,
+        'skill': skill,
+        'assessment_passed': assessment_passed,
+        'history': history
+    }
+
+
+def build_fixture(scale, seed=SEED, force=False, verbose=True):
+    """
+    生成指定规模的基准数据库
+
+    Args:
+        scale: SCALES 中的规模名
+        seed: 随机种子
+        force: 已存在时是否重新生成
+        verbose: 是否打印进度
+
+    Returns:
+        str: 数据库路径
+    """
+    if scale not in SCALES:
+        raise ValueError(f'未知的数据规模：{scale}（可选：{", ".join(SCALES)}）')
+
+    path = fixture_path(scale, seed)
+    if os.path.exists(path) and not force:
+        # 已生成的数据库补建 schema.sql 中新增的表（建表语句均为 IF NOT EXISTS）
+        conn = sqlite3.connect(path)
+        _create_schema(conn)
+        conn.close()
+        return path
+
+    started = time.perf_counter()
+    settings = SCALES[scale]
+    end_date = END_DATE
+    start_date = end_date - timedelta(days=int(365 * settings['years']) - 1)
+    rng = np.random.default_rng(seed)
+
+    def log(message):
+        if verbose:
+            print(f"[{time.perf_counter() - started:6.1f}s] {message}")
+
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    tmp_path = path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    conn = sqlite3.connect(tmp_path)
+    conn.execute('PRAGMA journal_mode = OFF')
+    conn.execute('PRAGMA synchronous = OFF')
+    _create_schema(conn)
+
+    # 1. 团队、工作日历
+    for team in TEAMS:
+        conn.execute('INSERT INTO teams (team_name, team_leader) VALUES (?, ?)', (team, f'{team}主管'))
+    conn.execute(
+        'INSERT OR IGNORE INTO system_params (param_key, param_value, param_desc, is_core) VALUES (?, ?, ?, ?)',
+        ('revenue_per_order', '170', '每单收入（元）', 1)
+    )
+    conn.execute(
+        'INSERT OR IGNORE INTO system_params (param_key, param_value, param_desc, is_core) VALUES (?, ?, ?, ?)',
+        (f"manager_team_{BENCH_USERS['manager']}", TEAMS[0], '经理管理的团队', 0)
+    )
+    days = _date_range(start_date - timedelta(days=60), end_date)
+    holidays = [d for d in days if (d.month, d.day) in HOLIDAYS]
+    conn.executemany(
+        "INSERT INTO work_calendar (calendar_date, is_workday, day_type) VALUES (?, 0, 'holiday')",
+        [(d.isoformat(),) for d in holidays]
+    )
+    log(f'工作日历：{len(holidays)}个节假日')
+
+    # 2. 员工、状态历史、培训考核
+    plans = [_plan_employee(rng, i + 1, start_date, end_date) for i in range(settings['employees'])]
+    for plan in plans:
+        plan['id'] = conn.execute('''
+            INSERT INTO employees (employee_no, name, phone, phone_encrypted, team, status,
+                                   join_date, leave_date, is_active)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            plan['employee_no'], plan['name'], plan['phone'], encrypt_phone(plan['phone']),
+            plan['team'], plan['status'], plan['join_date'].isoformat(),
+            plan['leave_date'].isoformat() if plan['leave_date'] else None,
+            0 if plan['status'] == 'eliminated' else 1
+        )).lastrowid
+
+    conn.executemany('''
+        INSERT INTO status_history (employee_id, from_status, to_status, change_date, reason)
+        VALUES (?, ?, ?, ?, ?)
+    ''', [
+        (plan['id'], from_status, to_status, change_date.isoformat(), '基准数据')
+        for plan in plans
+        for from_status, to_status, change_date in plan['history']
+    ])
+    conn.executemany('''
+        INSERT INTO training_assessments (employee_id, employee_no, employee_name, assessment_date,
+                                          both_passed, recorded_by, recorder_name)
+        VALUES (?, ?, ?, ?, 1, 1, 'admin')
+    ''', [
+        (plan['id'], plan['employee_no'], plan['name'], (plan['join_date'] + timedelta(days=2)).isoformat())
+        for plan in plans if plan['assessment_passed']
+    ])
+    log(f'员工：{len(plans)}人')
+
+    # 3. 账号
+    password = hash_password(BENCH_PASSWORD)
+    # 经理按关联员工确定团队，员工账号关联第一名员工
+    linked = {
+        'manager': next(p['id'] for p in plans if p['team'] == TEAMS[0]),
+        'employee': plans[0]['id']
+    }
+    for role, username in BENCH_USERS.items():
+        employee_id = linked.get(role)
+        conn.execute(
+            'INSERT INTO users (username, password, role, employee_id) VALUES (?, ?, ?, ?)',
+            (username, password, role, employee_id)
+        )
+
+    # 4. 每日业绩（按员工整段生成）
+    date_strings = [d.isoformat() for d in _date_range(start_date, end_date)]
+    total_rows = 0
+    for plan in plans:
+        first = max((plan['join_date'] - start_date).days, 0)
+        last = len(date_strings) - 1
+        if plan['leave_date']:
+            last = min(last, (plan['leave_date'] - start_date).days - 1)
+        if first > last:
+            continue
+
+        n = last - first + 1
+        attended = np.flatnonzero(rng.random(n) < ATTENDANCE_RATE)
+        orders = rng.poisson(plan['skill'], len(attended))
+        valid = rng.random(len(attended)) < VALID_WORKDAY_RATE
+        commission = calculate_commission_array(orders)
+        conn.executemany('''
+            INSERT INTO performance (employee_id, work_date, orders_count, commission, is_valid_workday)
+            VALUES (?, ?, ?, ?, ?)
+        ''', zip(
+            [plan['id']] * len(attended),
+            [date_strings[first + i] for i in attended.tolist()],
+            orders.tolist(),
+            commission.tolist(),
+            valid.astype(int).tolist()
+        ))
+        total_rows += len(attended)
+    conn.commit()
+    conn.close()
+    log(f'业绩：{total_rows}条')
+
+    # 5. 薪资台账、薪资快照、工资单（使用系统自身的计算逻辑）
+    _populate_derived(tmp_path, start_date, end_date, log)
+
+    os.replace(tmp_path, path)
+    log(f'完成：{path}')
+    return path
+
+
+def _populate_derived(path, start_date, end_date, log):
+    """用业务模块生成薪资台账、薪资快照与工资单"""
+    from flask import g
+    from app import app
+    from core.database import get_db
+    from core.salary_ledger import rebuild_salary_ledger
+    from core.salary_engine import calculate_salary_realtime, get_calculation_detail
+    from core.payroll_engine import generate_payroll_for_month
+
+    original = Config.DATABASE
+    Config.DATABASE = path
+    try:
+        with app.app_context():
+            # 以管理员身份写入（与后台任务相同，操作日志取 g.job_operator）
+            admin = get_db().execute(
+                'SELECT id, username, role FROM users WHERE username = ?', (BENCH_USERS['admin'],)
+            ).fetchone()
+            g.job_operator = {'user_id': admin['id'], 'username': admin['username'], 'role': admin['role']}
+
+            months = sorted({d.strftime('%Y-%m') for d in _date_range(start_date, end_date)})
+            rows = sum(rebuild_salary_ledger(ym) for ym in months)
+            log(f'薪资台账：{rows}行')
+
+            # 截止月份薪资快照（工资单从 salary 表生成）
+            year_month = end_date.strftime('%Y-%m')
+            db = get_db()
+            snapshots = []
+            for row in db.execute('SELECT id FROM employees WHERE is_active = 1').fetchall():
+                salary = calculate_salary_realtime(row['id'], year_month)
+                snapshots.append((
+                    row['id'], year_month, salary['base_salary'], salary['attendance_bonus'],
+                    salary['performance_bonus'], salary['commission'], salary['total_salary'],
+                    get_calculation_detail(salary)
+                ))
+            db.executemany('''
+                INSERT INTO salary (employee_id, year_month, base_salary, attendance_bonus,
+                                    performance_bonus, commission, total_salary, calculation_detail)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', snapshots)
+            db.commit()
+            log(f'薪资快照（{year_month}）：{len(snapshots)}条')
+
+            result = generate_payroll_for_month(
+                year_month, operator_id=admin['id'], operator_name=admin['username']
+            )
+            log(f"工资单（{year_month}）：{result.get('message')}")
+    finally:
+        Config.DATABASE = original
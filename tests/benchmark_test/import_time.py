@@ -0,0 +1,184 @@
+"""
+启动导入基准
+在子进程中以 `python -X importtime -c "import app"` 冷启动应用，统计导入耗时、
+耗时最多的顶层包和进程峰值内存（RSS），并检查启动时是否导入了重型模块
+
+用法：
+    python3 tests/benchmark_test/import_time.py
+    python3 tests/benchmark_test/import_time.py --save-baseline
+"""
+import sys
+import os
+import json
+import argparse
+import platform
+import subprocess
+from collections import defaultdict
+from datetime import datetime
+
+# 添加项目根目录到路径
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../..'))
+sys.path.insert(0, ROOT_DIR)
+os.chdir(ROOT_DIR)
+
+import numpy as np
+from tests.benchmark_test.config import *
+
+# 子进程：导入应用后输出已导入的重型模块与峰值RSS（Linux 下 ru_maxrss 单位为 KB）
+PROBE = '''
+import json, resource, sys
+import app
+print(json.dumps({
+    "loaded": [m for m in %r if m in sys.modules],
+    "rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+}))
+''' % (STARTUP_FORBIDDEN_MODULES,)
+
+
+def run_probe(extra_env=None):
+    """
+    冷启动一次
+
+    Returns:
+        dict: {'total_ms', 'packages': {顶层包: ms}, 'loaded', 'rss_kb'}
+    """
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    env.update(extra_env or {})
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', PROBE],
+        cwd=ROOT_DIR, env=env, capture_output=True, text=True, check=True
+    )
+
+    # -X importtime 输出：import time: self [us] | cumulative | imported package
+    packages = defaultdict(float)
+    total_us = 0
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_part, cumulative_part, module = line.split('|')
+        module = module.strip()
+        packages[module.split('.')[0]] += int(self_part.split(':')[1]) / 1000
+        if module == 'app':
+            total_us = int(cumulative_part)
+
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    return {
+        'total_ms': total_us / 1000,
+        'packages': dict(packages),
+        'loaded': result['loaded'],
+        'rss_kb': result['rss_kb']
+    }
+
+
+def measure(runs, extra_env=None):
+    """多次冷启动取中位数"""
+    probes = [run_probe(extra_env) for _ in range(runs)]
+    package_names = set().union(*(p['packages'] for p in probes))
+    packages = {
+        name: round(float(np.median([p['packages'].get(name, 0) for p in probes])), 1)
+        for name in package_names
+    }
+    return {
+        'runs': runs,
+        'total_ms': round(float(np.median([p['total_ms'] for p in probes])), 1),
+        'total_ms_min': round(min(p['total_ms'] for p in probes), 1),
+        'rss_mb': round(float(np.median([p['rss_kb'] for p in probes])) / 1024, 1),
+        'loaded': probes[-1]['loaded'],
+        'top_packages': dict(sorted(packages.items(), key=lambda x: -x[1])[:10])
+    }
+
+
+def compare_with_baseline(results, baseline):
+    """
+    与基线对比
+
+    启动时导入了重型模块即为回归；耗时与内存受机器影响，只作提示
+
+    Returns:
+        list: [{'name', 'kind': 'modules' | 'latency' | 'rss', 'reason'}]
+    """
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get('results', {}).get(name)
+        if not base:
+            continue
+        new_modules = sorted(set(current['loaded']) - set(base['loaded']))
+        if new_modules:
+            regressions.append({'name': name, 'kind': 'modules', 'reason': f"启动时导入 {', '.join(new_modules)}"})
+        limit = base['total_ms'] * (1 + LATENCY_REGRESSION_RATIO)
+        if current['total_ms'] > limit and current['total_ms'] - base['total_ms'] > IMPORT_TIME_REGRESSION_MIN_MS:
+            regressions.append({
+                'name': name, 'kind': 'latency',
+                'reason': f"导入耗时 {base['total_ms']}ms → {current['total_ms']}ms"
+            })
+        if current['rss_mb'] > base['rss_mb'] * (1 + RSS_REGRESSION_RATIO):
+            regressions.append({
+                'name': name, 'kind': 'rss',
+                'reason': f"RSS {base['rss_mb']}MB → {current['rss_mb']}MB"
+            })
+    return regressions
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='启动导入基准')
+    parser.add_argument('--runs', type=int, default=IMPORT_TIME_RUNS, help='冷启动次数')
+    parser.add_argument('--save-baseline', action='store_true', help='将本次结果保存为基线')
+    args = parser.parse_args()
+
+    print("="*60)
+    print(f"启动导入基准（{args.runs}次冷启动取中位数）")
+    print("="*60)
+
+    results = {
+        'startup': measure(args.runs),
+        # 导出专用 worker：启动时预加载导出依赖
+        'startup.export_preload': measure(args.runs, {'EXPORT_PRELOAD': '1'})
+    }
+
+    for name, r in results.items():
+        print(f"\n{name}: 导入 {r['total_ms']}ms（最快 {r['total_ms_min']}ms），RSS {r['rss_mb']}MB")
+        print(f"  已导入重型模块: {', '.join(r['loaded']) or '无'}")
+        for package, ms in r['top_packages'].items():
+            print(f"  {package:30} {ms:8.1f}ms")
+
+    report = {
+        'generated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'results': results
+    }
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    output_path = f'{OUTPUT_DIR}/import_time.json'
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n结果: {output_path}")
+
+    baseline_path = f'{BASELINE_DIR}/import_time.json'
+    regressions = []
+    if os.path.exists(baseline_path):
+        with open(baseline_path, 'r', encoding='utf-8') as f:
+            regressions = compare_with_baseline(results, json.load(f))
+        if regressions:
+            print(f"\n⚠️  相对基线 {baseline_path} 的变化：")
+            for item in regressions:
+                label = '模块回归' if item['kind'] == 'modules' else '提示'
+                print(f"  [{label}] {item['name']}: {item['reason']}")
+        else:
+            print(f"\n✅ 与基线 {baseline_path} 相比无回归")
+
+    # 默认启动不允许导入重型模块
+    failed = bool(results['startup']['loaded']) or any(item['kind'] == 'modules' for item in regressions)
+
+    if args.save_baseline:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        with open(baseline_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"基线已保存: {baseline_path}")
+    elif failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+"""
+审计日志索引基准
+在基准数据库副本上还原合并前的 9 个 audit_logs 索引，运行操作日志的读取路径并记录语句形态，
+由索引顾问生成合并迁移；对比迁移前后的写入吞吐（log_operation）和读取执行计划
+
+用法：
+    python3 tests/benchmark_test/index_audit.py
+    python3 tests/benchmark_test/index_audit.py --scale small --rows 100000
+"""
+import sys
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+os.chdir(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from config import Config
+from tests.benchmark_test.config import *
+from tests.benchmark_test.fixtures import build_fixture
+from flask import g
+from app import app
+
+# 合并前 schema.sql / schema_extensions.sql / add_audit_indexes.py 创建的索引
+LEGACY_AUDIT_INDEXES = [
+    'CREATE INDEX IF NOT EXISTS idx_audit_logs_operation_type ON audit_logs(operation_type)',
+    'CREATE INDEX IF NOT EXISTS idx_audit_logs_operator_id ON audit_logs(operator_id)',
+    'CREATE INDEX IF NOT EXISTS idx_audit_logs_created_at ON audit_logs(created_at DESC)',
+    'CREATE INDEX IF NOT EXISTS idx_audit_logs_target_employee_id ON audit_logs(target_employee_id)',
+    'CREATE INDEX IF NOT EXISTS idx_audit_logs_operator_created ON audit_logs(operator_id, created_at DESC)',
+    'CREATE INDEX IF NOT EXISTS idx_audit_operator ON audit_logs(operator_id, created_at)',
+    'CREATE INDEX IF NOT EXISTS idx_audit_employee ON audit_logs(target_employee_id, created_at)',
+    'CREATE INDEX IF NOT EXISTS idx_audit_type ON audit_logs(operation_type, created_at)',
+    'CREATE INDEX IF NOT EXISTS idx_audit_module ON audit_logs(operation_module, created_at)'
+]
+
+# 每轮写入条数、批大小（每批提交一次）、轮数（取最快一轮）
+INSERT_ROWS = 5000
+INSERT_BATCH = 100
+INSERT_ROUNDS = 3
+
+OPERATION_TYPES = ['promotion', 'challenge', 'training', 'calendar', 'payroll', 'bank_info', 'status_change']
+
+
+def seed_audit_logs(db, rows):
+    """补足历史日志（索引维护成本与 B 树深度相关）"""
+    users = db.execute('SELECT id, username, role FROM users ORDER BY id').fetchall()
+    employees = db.execute('SELECT id, name FROM employees ORDER BY id').fetchall()
+    end = datetime.combine(END_DATE, datetime.min.time())
+    db.executemany('''
+        INSERT INTO audit_logs (operation_type, operation_module, operation_action,
+                                operator_id, operator_name, operator_role,
+                                target_employee_id, target_employee_name, reason, created_at)
+        VALUES (?, 'benchmark', 'seed', ?, ?, ?, ?, ?, '基准数据', ?)
+    ''', (
+        (OPERATION_TYPES[n % len(OPERATION_TYPES)],
+         *users[n % len(users)], *employees[n % len(employees)],
+         (end - timedelta(seconds=n * 600)).strftime('%Y-%m-%d %H:%M:%S'))
+        for n in range(rows)
+    ))
+    db.commit()
+
+
+def run_read_workload(operator_id, employee_id):
+    """操作日志页面、员工/操作人日志、最近日志的读取路径"""
+    from core.audit import (get_employee_logs, get_operator_logs, get_recent_logs,
+                            get_filtered_logs, get_operator_options)
+    get_employee_logs(employee_id)
+    get_operator_logs(operator_id)
+    get_recent_logs()
+    get_recent_logs('payroll')
+    get_operator_options()
+    get_filtered_logs(operator_id=operator_id, is_admin=False)
+    get_filtered_logs(operator_id=operator_id, operation_type='payroll', is_admin=False, page=2)
+    get_filtered_logs(operation_type='bank_info', is_admin=True)
+    get_filtered_logs(start_date='2026-09-01', end_date='2026-09-30', is_admin=True)
+    get_filtered_logs(search_keyword='A0', is_admin=True)
+
+
+def measure_inserts(db, operator):
+    """
+    log_operation 写入吞吐（每轮写入后删除，表大小保持不变）
+
+    Returns:
+        float: 最快一轮的每秒写入条数
+    """
+    from core.audit import log_operation
+    best = None
+    for _ in range(INSERT_ROUNDS):
+        max_id = db.execute('SELECT MAX(id) FROM audit_logs').fetchone()[0]
+        started = time.perf_counter()
+        for i in range(INSERT_ROWS):
+            log_operation(OPERATION_TYPES[i % len(OPERATION_TYPES)], 'benchmark', 'insert',
+                          target_employee_id=i % 200 + 1, target_employee_name='基准',
+                          changes_dict={'i': i}, reason='写入吞吐基准',
+                          operator_id=operator['user_id'], operator_name=operator['username'],
+                          operator_role=operator['role'], commit=False)
+            if (i + 1) % INSERT_BATCH == 0:
+                db.commit()
+        db.commit()
+        elapsed = time.perf_counter() - started
+        db.execute('DELETE FROM audit_logs WHERE id > ?', [max_id])
+        db.commit()
+        best = elapsed if best is None else min(best, elapsed)
+    return INSERT_ROWS / best
+
+
+def audit_plans(db, shapes):
+    """audit_logs 相关语句形态的执行计划（索引名归一化）"""
+    from core.index_advisor import explain_shape, normalize_plan
+    plans = {}
+    for shape in shapes:
+        if 'audit_logs' not in shape['sql'] or not shape['sql'].upper().startswith(('SELECT', 'WITH')):
+            continue
+        plan = explain_shape(db, shape)
+        if plan is not None:
+            plans[shape['sql']] = normalize_plan(plan)
+    return plans
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='审计日志索引基准')
+    parser.add_argument('--scale', default='ci', choices=list(SCALES), help='数据规模')
+    parser.add_argument('--seed', type=int, default=SEED, help='随机种子')
+    parser.add_argument('--rows', type=int, default=50000, help='补足的历史日志条数')
+    args = parser.parse_args()
+
+    from core.database import get_db
+    from core.index_advisor import (enable_shape_recording, reset_query_shapes, get_query_shapes,
+                                    advise_indexes, build_index_migration, get_index_inventory)
+
+    print("="*60)
+    print(f"审计日志索引基准（规模: {args.scale}，历史日志: {args.rows}）")
+    print("="*60)
+
+    workdir = tempfile.mkdtemp(prefix='index_audit_')
+    db_path = os.path.join(workdir, 'bench.db')
+    shutil.copy(build_fixture(args.scale, args.seed), db_path)
+    Config.DATABASE = db_path
+    Config.CACHE_ENABLED = False
+    app.config['TESTING'] = True
+
+    try:
+        with app.app_context():
+            db = get_db()
+            for sql in LEGACY_AUDIT_INDEXES:
+                db.execute(sql)
+            seed_audit_logs(db, args.rows)
+            operator = dict(db.execute(
+                'SELECT id AS user_id, username, role FROM users WHERE username = ?', [BENCH_USERS['manager']]
+            ).fetchone())
+            employee_id = db.execute('SELECT MIN(id) FROM employees').fetchone()[0]
+            g.job_operator = operator
+
+            enable_shape_recording()
+            reset_query_shapes()
+            run_read_workload(operator['user_id'], employee_id)
+            enable_shape_recording(False)
+            shapes = get_query_shapes()
+
+            before_indexes = len(get_index_inventory(db, 'audit_logs'))
+            before_plans = audit_plans(db, shapes)
+            before_rate = measure_inserts(db, operator)
+
+            report = advise_indexes(db, shapes, table='audit_logs')
+            migration = build_index_migration(report)
+            print(f"\n语句形态 {report['shapes']} 个，audit_logs 索引使用次数：")
+            for index in report['indexes']:
+                print(f"  {index['name']:36} ({', '.join(index['columns'])})  {index['uses']}")
+            print(f"\n{migration}")
+
+            db.executescript(migration)
+            after_indexes = len(get_index_inventory(db, 'audit_logs'))
+            after_plans = audit_plans(db, shapes)
+            after_rate = measure_inserts(db, operator)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    changed = [sql for sql in before_plans if before_plans[sql] != after_plans.get(sql)]
+    gain = (after_rate / before_rate - 1) * 100
+    print(f"索引数: {before_indexes} → {after_indexes}")
+    print(f"写入吞吐: {before_rate:,.0f} → {after_rate:,.0f} 条/秒（{gain:+.1f}%）")
+    print(f"读取计划: {len(before_plans)} 个语句形态，{len(changed)} 个发生变化")
+    for sql in changed:
+        print(f"  ✗ {sql[:120]}")
+        print(f"    合并前: {before_plans[sql]}")
+        print(f"    合并后: {after_plans.get(sql)}")
+
+    result = {
+        'scale': args.scale,
+        'rows': args.rows,
+        'generated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'indexes': {'before': before_indexes, 'after': after_indexes},
+        'inserts_per_sec': {'before': round(before_rate), 'after': round(after_rate)},
+        'migration': migration,
+        'redundant': report['redundant'],
+        'unused': report['unused'],
+        'plans_changed': changed
+    }
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    output_path = f'{OUTPUT_DIR}/index_audit_{args.scale}.json'
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"\n结果: {output_path}")
+
+    # 执行计划变化视为回归；吞吐受机器负载影响，只作展示
+    if changed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
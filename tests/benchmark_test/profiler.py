@@ -0,0 +1,102 @@
+"""
+测量工具
+在进程内多次调用被测对象，记录每次耗时与执行的SQL语句数，输出 p50/p95/p99 等统计
+"""
+import time
+from collections import Counter
+
+import numpy as np
+from flask import appcontext_pushed
+
+from core.database import get_db
+from core.sql_monitor import fingerprint
+
+
+class QueryRecorder:
+    """
+    SQL语句记录器
+
+    每次推入应用上下文时为该上下文的数据库连接挂上 trace 回调，
+    因此同时覆盖 test client 请求与直接调用核心引擎的场景。
+    """
+
+    def __init__(self, app):
+        self.statements = []
+        appcontext_pushed.connect(self._attach, app)
+
+    def _attach(self, sender, **kwargs):
+        get_db().set_trace_callback(self.statements.append)
+
+    def reset(self):
+        self.statements = []
+
+    def count(self):
+        # 连接的事务控制语句不计入；
+        # 触发器内的语句以触发它的写入语句原文回调，写入语句连续重复的只计一次
+        previous = None
+        total = 0
+        for s in self.statements:
+            if s.startswith(('BEGIN', 'COMMIT', 'ROLLBACK')):
+                continue
+            if s != previous or not s.lstrip().upper().startswith(('INSERT', 'UPDATE', 'DELETE')):
+                total += 1
+            previous = s
+        return total
+
+    def top_repeated(self, limit=3):
+        """重复次数最多的语句指纹"""
+        counter = Counter(fingerprint(s) for s in self.statements)
+        return [
+            {'count': count, 'sql': sql[:160]}
+            for sql, count in counter.most_common(limit) if count > 1
+        ]
+
+
+def summarize(durations_ms, query_counts):
+    """耗时与SQL语句数统计"""
+    values = np.array(durations_ms, dtype=float)
+    return {
+        'iterations': len(durations_ms),
+        'mean_ms': round(float(values.mean()), 2),
+        'min_ms': round(float(values.min()), 2),
+        'p50_ms': round(float(np.percentile(values, 50)), 2),
+        'p95_ms': round(float(np.percentile(values, 95)), 2),
+        'p99_ms': round(float(np.percentile(values, 99)), 2),
+        'max_ms': round(float(values.max()), 2),
+        'queries': int(np.median(query_counts)),
+        'queries_max': int(max(query_counts))
+    }
+
+
+def measure(recorder, call, iterations, warmup=1):
+    """
+    多次调用并统计
+
+    Args:
+        recorder: QueryRecorder
+        call: 无参可调用对象，返回状态码（路由）或任意值（引擎）
+        iterations: 统计次数
+        warmup: 预热次数（不计入统计）
+
+    Returns:
+        dict: summarize() 的结果，附带 status（最后一次返回的状态码）与 repeated（重复最多的SQL）
+    """
+    for _ in range(warmup):
+        call()
+
+    durations, query_counts = [], []
+    status = None
+    repeated = []
+    for _ in range(iterations):
+        recorder.reset()
+        started = time.perf_counter()
+        status = call()
+        durations.append((time.perf_counter() - started) * 1000)
+        query_counts.append(recorder.count())
+        repeated = recorder.top_repeated()
+
+    result = summarize(durations, query_counts)
+    if isinstance(status, int):
+        result['status'] = status
+    result['repeated'] = repeated
+    return result
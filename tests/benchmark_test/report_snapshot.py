@@ -0,0 +1,145 @@
+"""
+报表快照基准
+在基准数据库副本上生成报表只读快照，分别在主库与快照上运行团队对比、排行、趋势、热力图、收入成本，
+对比结果是否一致与耗时（快照带报表专用覆盖索引与 report_team_daily 汇总表）
+
+用法：
+    python3 tests/benchmark_test/report_snapshot.py
+    python3 tests/benchmark_test/report_snapshot.py --scale small
+"""
+import sys
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+from datetime import datetime
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+os.chdir(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from config import Config
+from tests.benchmark_test.config import *
+from tests.benchmark_test.fixtures import build_fixture
+from flask import g
+from app import app
+
+# 每个报表的重复次数（取最快一次）
+REPORT_ROUNDS = 5
+
+
+def build_cases(year_month, end_date, team):
+    """报表数据函数（与路由调用方式一致）"""
+    from datetime import timedelta
+    from routes.report_routes import (get_team_comparison_data, get_employee_ranking_data,
+                                      get_trend_data, get_heatmap_data)
+    from routes.admin_routes import (calculate_daily_revenue_cost, calculate_monthly_revenue_cost,
+                                     calculate_yearly_revenue_cost)
+    end = datetime.strptime(end_date, '%Y-%m-%d').date()
+    months = tuple((end - timedelta(days=30 * i)).strftime('%Y-%m') for i in range(11, -1, -1))
+    return [
+        ('reports.team_comparison', lambda: get_team_comparison_data(year_month)),
+        ('reports.employee_ranking', lambda: get_employee_ranking_data(year_month, 'orders')),
+        ('reports.employee_ranking.team', lambda: get_employee_ranking_data(year_month, 'commission', team)),
+        ('reports.trend_analysis', lambda: get_trend_data(months)),
+        ('reports.performance_heatmap', lambda: get_heatmap_data(year_month)),
+        ('revenue_cost.daily', lambda: [calculate_daily_revenue_cost(end - timedelta(days=i), team) for i in range(30)]),
+        ('revenue_cost.monthly', lambda: [calculate_monthly_revenue_cost(m) for m in months]),
+        ('revenue_cost.yearly', lambda: [calculate_yearly_revenue_cost(end.year - i) for i in range(3)])
+    ]
+
+
+def run_cases(cases):
+    """
+    运行报表并计时
+
+    Returns:
+        dict: {名称: (结果, 最快耗时毫秒)}
+    """
+    results = {}
+    for name, func in cases:
+        best = None
+        for _ in range(REPORT_ROUNDS):
+            started = time.perf_counter()
+            value = func()
+            elapsed = (time.perf_counter() - started) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        results[name] = (value, best)
+    return results
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='报表快照基准')
+    parser.add_argument('--scale', default='ci', choices=list(SCALES), help='数据规模')
+    parser.add_argument('--seed', type=int, default=SEED, help='随机种子')
+    args = parser.parse_args()
+
+    from core.database import get_db
+    from core.report_snapshot import build_report_snapshot, _snapshot_connection
+
+    print("="*60)
+    print(f"报表快照基准（规模: {args.scale}）")
+    print("="*60)
+
+    workdir = tempfile.mkdtemp(prefix='report_snapshot_')
+    db_path = os.path.join(workdir, 'bench.db')
+    shutil.copy(build_fixture(args.scale, args.seed), db_path)
+    Config.DATABASE = db_path
+    Config.REPORT_SNAPSHOT_PATH = os.path.join(workdir, 'report_snapshot.db')
+    Config.CACHE_ENABLED = False
+    app.config['TESTING'] = True
+
+    try:
+        snapshot = build_report_snapshot(db_path)
+        print(f"\n{snapshot['message']}，{snapshot['file_size'] / 1048576:.1f}MB")
+
+        with app.app_context():
+            db = get_db()
+            year_month, end_date = db.execute(
+                'SELECT substr(MAX(work_date), 1, 7), MAX(work_date) FROM performance'
+            ).fetchone()
+            team = db.execute('SELECT team FROM employees WHERE is_active = 1 GROUP BY team ORDER BY COUNT(*) DESC').fetchone()[0]
+            cases = build_cases(year_month, str(end_date)[:10], team)
+
+            live = run_cases(cases)
+            conn, meta = _snapshot_connection()
+            g.db = conn
+            g.report_snapshot = meta
+            try:
+                snap = run_cases(cases)
+            finally:
+                g.pop('db')
+                g.pop('report_snapshot')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    mismatched = [name for name in live if live[name][0] != snap[name][0]]
+    print(f"\n{'报表':32} {'主库(ms)':>10} {'快照(ms)':>10}")
+    for name in live:
+        flag = '  ✗ 结果不一致' if name in mismatched else ''
+        print(f"{name:32} {live[name][1]:>10.2f} {snap[name][1]:>10.2f}{flag}")
+
+    result = {
+        'scale': args.scale,
+        'generated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'snapshot_ms': snapshot['duration_ms'],
+        'snapshot_bytes': snapshot['file_size'],
+        'reports': {name: {'live_ms': round(live[name][1], 2), 'snapshot_ms': round(snap[name][1], 2)} for name in live},
+        'mismatched': mismatched
+    }
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    output_path = f'{OUTPUT_DIR}/report_snapshot_{args.scale}.json'
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"\n结果: {output_path}")
+
+    # 快照结果必须与主库一致；耗时受机器负载影响，只作展示
+    if mismatched:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
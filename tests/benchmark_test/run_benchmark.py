@@ -0,0 +1,298 @@
+"""
+基准测试主脚本
+在进程内通过 Flask test client 调用主要页面/API，并直接调用核心引擎，
+统计每项的 p50/p95/p99 耗时与SQL语句数，可保存为基线并与基线对比
+
+用法：
+    python3 tests/benchmark_test/run_benchmark.py --scale ci
+    python3 tests/benchmark_test/run_benchmark.py --scale small --save-baseline
+    python3 tests/benchmark_test/run_benchmark.py --scale ci --only reports
+"""
+import sys
+import os
+import json
+import argparse
+import platform
+from datetime import datetime, timedelta
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+os.chdir(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from config import Config
+from tests.benchmark_test.config import *
+from tests.benchmark_test.fixtures import build_fixture
+from tests.benchmark_test.profiler import QueryRecorder, measure
+from flask import g
+from app import app
+
+
+def route_cases(context):
+    """
+    路由测量项：(名称, 角色, 方法, URL, JSON请求体)
+    """
+    ym = context['year_month']
+    day = context['end_date']
+    week_ago = context['week_ago']
+    emp_id = context['employee_id']
+    return [
+        ('admin.dashboard', 'admin', 'GET', '/admin/dashboard', None),
+        ('admin.employees', 'admin', 'GET', '/admin/employees', None),
+        ('admin.employees.filtered', 'admin', 'GET', '/admin/employees?team=A组&status=A&page=2', None),
+        ('admin.performance', 'admin', 'GET', f'/admin/performance?date_start={week_ago}&date_end={day}', None),
+        ('admin.salary', 'admin', 'GET', f'/admin/salary?year_month={ym}', None),
+        ('admin.salary_detail', 'admin', 'GET', f'/admin/api/salary_detail/{emp_id}?year_month={ym}', None),
+        ('admin.revenue_cost.monthly', 'admin', 'GET', f'/admin/revenue_cost?dimension=monthly&date={day}', None),
+        ('admin.status_check', 'admin', 'GET', '/admin/status_check', None),
+        ('admin.payroll_preview', 'admin', 'GET', f'/admin/api/payroll_preview?year_month={ym}', None),
+        ('admin.payroll_management', 'admin', 'GET', f'/admin/payroll_management?year_month={ym}', None),
+        ('admin.work_calendar', 'admin', 'GET', '/admin/work_calendar', None),
+        ('reports.team_comparison', 'admin', 'GET', f'/reports/team_comparison?year_month={ym}', None),
+        ('reports.employee_ranking', 'admin', 'GET', f'/reports/employee_ranking?year_month={ym}', None),
+        ('reports.trend_analysis', 'admin', 'GET', '/reports/trend_analysis?days=30', None),
+        ('reports.performance_heatmap', 'admin', 'GET', f'/reports/performance_heatmap?year_month={ym}', None),
+        ('reports.salary_analysis', 'admin', 'GET', f'/reports/salary_analysis?month={ym}', None),
+        ('manager.promotions', 'manager', 'GET', '/manager/promotions', None),
+        ('manager.payroll', 'manager', 'GET', f'/manager/payroll?year_month={ym}', None),
+        ('manager.logs', 'manager', 'GET', '/manager/logs', None),
+        ('finance.dashboard', 'finance', 'GET', f'/finance/dashboard?year_month={ym}', None),
+        ('employee.performance', 'employee', 'GET', '/employee/performance', None),
+        ('employee.salary', 'employee', 'GET', '/employee/salary', None),
+        ('notifications.count', 'admin', 'GET', '/notifications/api/count', None),
+        ('jobs.list', 'admin', 'GET', '/jobs/api/list', None)
+    ]
+
+
+def engine_cases(context):
+    """
+    核心引擎测量项：(名称, 可调用对象, 最大统计次数)
+    均为只读或幂等调用，可重复执行
+    """
+    from core.performance_matrix import PerformanceMatrix
+    from core.replay import replay_rules
+    from core.rule_simulator import simulate_rules
+    from core.commission_recompute import recompute_commission
+    from core.salary_engine import calculate_salary_realtime
+    from core.status_engine import check_status_transition
+    from core.promotion_engine import check_c_to_b_eligible
+    from core.payroll_engine import generate_payroll_for_month, bulk_adjust_payroll
+    from core.payroll_reconciliation import reconcile_payroll_month
+
+    ym = context['year_month']
+    end = context['end_date']
+    month_start = context['month_start']
+    sample = context['sample_ids']
+    operator = context['operator']
+
+    return [
+        ('engine.salary_realtime.sample', lambda: [calculate_salary_realtime(e, ym) for e in sample], None),
+        ('engine.status_check.sample', lambda: [check_status_transition(e, end) for e in sample], None),
+        ('engine.promotion_c_to_b.sample', lambda: [check_c_to_b_eligible(e, end) for e in sample], None),
+        ('engine.performance_matrix.month', lambda: PerformanceMatrix(month_start, end), 5),
+        ('engine.replay.month', lambda: replay_rules(month_start, end, max_events=0), 5),
+        ('engine.simulate.month', lambda: simulate_rules(month_start, end, scenarios=[
+            {'name': 'C级门槛+1', 'rules': {'status': {'C': {'min_orders': 4}}}}
+        ]), 5),
+        ('engine.commission_recompute.dry_run', lambda: recompute_commission(dry_run=True), 5),
+        ('engine.payroll.bulk_adjust.dry_run', lambda: bulk_adjust_payroll(
+            context['adjustment_rows'], ym, operator['user_id'], operator['username'], operator['role'],
+            dry_run=True
+        ), None),
+        ('engine.payroll.reconcile', lambda: reconcile_payroll_month(ym), None),
+        ('engine.payroll.generate', lambda: generate_payroll_for_month(
+            ym, overwrite=True, operator_id=operator['user_id'], operator_name=operator['username']
+        ), 3)
+    ]
+
+
+def build_context():
+    """从基准数据库读取测量参数"""
+    from core.database import query_db
+    with app.app_context():
+        sample = [r['id'] for r in query_db(
+            'SELECT id FROM employees WHERE is_active = 1 ORDER BY id LIMIT 50'
+        )]
+        admin = query_db(
+            'SELECT id, username, role FROM users WHERE username = ?', (BENCH_USERS['admin'],), one=True
+        )
+        employee_nos = [r['employee_no'] for r in query_db(
+            'SELECT employee_no FROM employees WHERE is_active = 1 ORDER BY id'
+        )]
+    return {
+        'operator': {'user_id': admin['id'], 'username': admin['username'], 'role': admin['role']},
+        'end_date': END_DATE.isoformat(),
+        'week_ago': (END_DATE - timedelta(days=6)).isoformat(),
+        'month_start': END_DATE.replace(day=1).isoformat(),
+        'year_month': END_DATE.strftime('%Y-%m'),
+        'employee_id': sample[0],
+        'sample_ids': sample,
+        # 月末批量调整：每名在职员工一条扣款
+        'adjustment_rows': [
+            {'row_number': i + 2, 'employee_no': no, 'payroll_id': None,
+             'adjustment_type': 'deduction', 'amount': '10', 'reason': '基准测试'}
+            for i, no in enumerate(employee_nos)
+        ]
+    }
+
+
+def make_clients():
+    """按角色登录的 test client"""
+    from core.database import query_db
+    clients = {}
+    with app.app_context():
+        for role, username in BENCH_USERS.items():
+            user = query_db('SELECT * FROM users WHERE username = ?', (username,), one=True)
+            client = app.test_client()
+            with client.session_transaction() as session:
+                session['user_id'] = user['id']
+                session['username'] = user['username']
+                session['role'] = user['role']
+                session['employee_id'] = user['employee_id']
+            clients[role] = client
+    return clients
+
+
+def compare_with_baseline(results, baseline):
+    """
+    与基线对比
+
+    SQL语句数是确定值，增加即为回归；耗时受机器负载影响，只作提示
+
+    Returns:
+        list: 回归项 [{'name', 'kind': 'queries' | 'latency', 'reason'}]
+    """
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get('results', {}).get(name)
+        if not base:
+            continue
+        if current['queries'] > base['queries']:
+            regressions.append({
+                'name': name,
+                'kind': 'queries',
+                'reason': f"SQL语句数 {base['queries']} → {current['queries']}"
+            })
+        # 耗时按 p50 判定（统计次数少时 p95 接近最大值，受机器负载影响大）
+        limit = base['p50_ms'] * (1 + LATENCY_REGRESSION_RATIO)
+        if current['p50_ms'] > limit and current['p50_ms'] - base['p50_ms'] > LATENCY_REGRESSION_MIN_MS:
+            regressions.append({
+                'name': name,
+                'kind': 'latency',
+                'reason': f"p50 {base['p50_ms']}ms → {current['p50_ms']}ms"
+            })
+    return regressions
+
+
+def print_table(results):
+    print(f"{'测量项':40} {'p50':>9} {'p95':>9} {'p99':>9} {'SQL':>7}  状态")
+    print('-' * 86)
+    for name, r in results.items():
+        status = r.get('status', '')
+        print(f"{name:40} {r['p50_ms']:9.2f} {r['p95_ms']:9.2f} {r['p99_ms']:9.2f} {r['queries']:7d}  {status}")
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='进程内性能基准测试')
+    parser.add_argument('--scale', default='ci', choices=list(SCALES), help='数据规模')
+    parser.add_argument('--seed', type=int, default=SEED, help='随机种子')
+    parser.add_argument('--iterations', type=int, default=DEFAULT_ITERATIONS, help='每项统计次数')
+    parser.add_argument('--only', help='只运行名称包含该关键字的测量项')
+    parser.add_argument('--rebuild', action='store_true', help='重新生成基准数据库')
+    parser.add_argument('--save-baseline', action='store_true', help='将本次结果保存为基线')
+    parser.add_argument('--with-cache', action='store_true', help='启用查询缓存（默认关闭，测量未命中时的开销）')
+    args = parser.parse_args()
+
+    print("="*60)
+    print(f"性能基准测试（规模: {args.scale} {SCALES[args.scale]}，种子: {args.seed}）")
+    print("="*60)
+
+    db_path = build_fixture(args.scale, args.seed, force=args.rebuild)
+    Config.DATABASE = os.path.abspath(db_path)
+    # 同一请求重复调用会全部命中缓存，默认关闭以测量实际查询开销
+    Config.CACHE_ENABLED = args.with_cache
+    app.config['TESTING'] = True
+
+    recorder = QueryRecorder(app)
+    context = build_context()
+    clients = make_clients()
+
+    results = {}
+    for name, role, method, url, body in route_cases(context):
+        if args.only and args.only not in name:
+            continue
+        client = clients[role]
+        errors = []
+
+        def call():
+            try:
+                return client.open(url, method=method, json=body).status_code
+            except Exception as e:
+                # 视图异常记为500，不中断其余测量项
+                errors.append(f'{type(e).__name__}: {e}')
+                return 500
+
+        results[name] = measure(recorder, call, args.iterations, WARMUP_ITERATIONS)
+        if errors:
+            results[name]['error'] = errors[-1]
+        print(f"  {name:40} p95 {results[name]['p95_ms']:8.2f}ms  SQL {results[name]['queries']}")
+
+    for name, func, max_iterations in engine_cases(context):
+        if args.only and args.only not in name:
+            continue
+
+        def call():
+            # 引擎按后台任务方式调用（操作日志取 g.job_operator）
+            with app.app_context():
+                g.job_operator = context['operator']
+                func()
+
+        iterations = min(args.iterations, max_iterations or args.iterations)
+        results[name] = measure(recorder, call, iterations, WARMUP_ITERATIONS)
+        print(f"  {name:40} p95 {results[name]['p95_ms']:8.2f}ms  SQL {results[name]['queries']}")
+
+    report = {
+        'scale': args.scale,
+        'settings': SCALES[args.scale],
+        'seed': args.seed,
+        'iterations': args.iterations,
+        'cache': args.with_cache,
+        'generated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'results': results
+    }
+
+    print()
+    print_table(results)
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    output_path = f'{OUTPUT_DIR}/benchmark_{args.scale}.json'
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n结果: {output_path}")
+
+    baseline_path = f'{BASELINE_DIR}/{args.scale}.json'
+    regressions = []
+    if os.path.exists(baseline_path):
+        with open(baseline_path, 'r', encoding='utf-8') as f:
+            regressions = compare_with_baseline(results, json.load(f))
+        if regressions:
+            print(f"\n⚠️  相对基线 {baseline_path} 的变化：")
+            for item in regressions:
+                label = 'SQL回归' if item['kind'] == 'queries' else '耗时(提示)'
+                print(f"  [{label}] {item['name']}: {item['reason']}")
+        else:
+            print(f"\n✅ 与基线 {baseline_path} 相比无回归")
+
+    if args.save_baseline:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        with open(baseline_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"基线已保存: {baseline_path}")
+    elif any(item['kind'] == 'queries' for item in regressions):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
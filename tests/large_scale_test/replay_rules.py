@@ -0,0 +1,55 @@
+"""
+规则回放脚本
+在不写数据库的前提下，按日期回放状态流转、晋级、保级规则，
+输出回放事件与汇总（可通过 --rules 传入JSON格式的规则调整进行对比）
+"""
+import sys
+import os
+import json
+import argparse
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from app import app
+from tests.large_scale_test.config import *
+from core.replay import replay_rules
+
+REPLAY_RESULT = f'{OUTPUT_DIR}/replay_result.json'
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='规则历史回放')
+    parser.add_argument('--start', default=START_DATE.isoformat(), help='开始日期 YYYY-MM-DD')
+    parser.add_argument('--end', default=END_DATE.isoformat(), help='结束日期 YYYY-MM-DD')
+    parser.add_argument('--rules', help='规则调整（JSON），如 {"status": {"C": {"min_orders": 4}}}')
+    args = parser.parse_args()
+
+    print("="*60)
+    print("开始规则回放")
+    print("="*60)
+    print(f"回放时间范围: {args.start} - {args.end}")
+
+    with app.app_context():
+        result = replay_rules(args.start, args.end, rules=json.loads(args.rules) if args.rules else None)
+
+    if not result['success']:
+        print(f"回放失败: {result['message']}")
+        return
+
+    summary = result['summary']
+    print(f"员工数: {result['employees']}，天数: {result['days']}，耗时: {result['elapsed_ms']}ms")
+    print(f"事件统计: {summary['by_engine']}")
+    print(f"回放状态变更: {summary['transitions']}")
+    print(f"实际状态变更: {summary['baseline_transitions']}")
+    print(f"期末状态分布: {summary['final_status']}")
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    with open(REPLAY_RESULT, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"回放结果: {REPLAY_RESULT}")
+
+
+if __name__ == '__main__':
+    main()
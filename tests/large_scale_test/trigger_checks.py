@@ -55,10 +55,10 @@ class TriggerChecker:
         print(f"日志文件: {TRIGGER_LOG}")
     
     def _check_single_date(self, check_date: date):
-        """检测单个日期的触发事件"""
+        """检测单个日期的触发事件（以 check_date 为基准日期）"""
         # 检测晋级（简化：只记录检测事件）
         try:
-            check_all_employees_for_promotion()
+            check_all_employees_for_promotion(as_of=check_date)
             # 这个函数会自动创建晋级申请记录
             self.trigger_log.append({
                 'date': check_date.isoformat(),
@@ -75,7 +75,7 @@ class TriggerChecker:
         
         # 检测降级/保级
         try:
-            batch_check_challenges()
+            batch_check_challenges(as_of=check_date)
             # 这个函数会自动创建保级挑战记录
             self.trigger_log.append({
                 'date': check_date.isoformat(),
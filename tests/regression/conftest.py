@@ -0,0 +1,66 @@
+"""
+回归测试公共夹具
+每个测试使用基准数据库（ci 规模，固定种子）的独立副本，不需要启动服务
+
+运行：
+    python3 -m pytest -q tests/regression
+"""
+import os
+import sys
+import shutil
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '../..'))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from config import Config
+from tests.benchmark_test.config import BENCH_USERS
+from tests.benchmark_test.fixtures import build_fixture
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """指向基准数据库副本的应用（缓存为进程内缓存，测试前后清空）"""
+    db_path = tmp_path / 'callcenter.db'
+    shutil.copy(build_fixture('ci', verbose=False), db_path)
+    monkeypatch.setattr(Config, 'DATABASE', str(db_path))
+    monkeypatch.setattr(Config, 'REPORT_SNAPSHOT_PATH', str(tmp_path / 'report_snapshot.db'))
+    monkeypatch.setattr(Config, 'PAYROLL_ARCHIVE_DIR', str(tmp_path / 'archive'))
+
+    from app import app as flask_app
+    from core.cache import clear_cache
+    flask_app.config['TESTING'] = True
+    clear_cache()
+    yield flask_app
+    clear_cache()
+
+
+@pytest.fixture
+def login(app):
+    """按基准账号返回已登录的测试客户端：login('manager')"""
+    from core.database import query_db
+
+    def client(role='admin'):
+        c = app.test_client()
+        with app.app_context():
+            user = query_db('SELECT * FROM users WHERE username = ?', (BENCH_USERS[role],), one=True)
+        with c.session_transaction() as session:
+            session['user_id'] = user['id']
+            session['username'] = user['username']
+            session['role'] = user['role']
+        return c
+    return client
+
+
+@pytest.fixture
+def operator(app):
+    """后台任务/引擎调用所需的操作人（g.job_operator，同基准脚本）"""
+    from flask import g
+    from core.database import query_db
+
+    with app.app_context():
+        g.job_operator = dict(query_db(
+            'SELECT id AS user_id, username, role FROM users WHERE username = ?', (BENCH_USERS['admin'],), one=True
+        ))
+        yield g.job_operator
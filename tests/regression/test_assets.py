@@ -0,0 +1,46 @@
+"""第三方前端库检查"""
+import base64
+import hashlib
+
+import pytest
+
+from core import assets
+
+
+@pytest.fixture
+def vendor(tmp_path, monkeypatch):
+    asset = {'version': '1.0.0', 'file': 'vendor/lib.min.js', 'url': 'https://cdn.example.com/lib.min.js', 'sha384': None}
+    monkeypatch.setattr(assets, 'VENDOR_ASSETS', {'lib': asset})
+    return tmp_path, asset
+
+
+def _write(static_folder, content):
+    path = static_folder / 'vendor' / 'lib.min.js'
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(content)
+    return 'sha384-' + base64.b64encode(hashlib.sha384(content).digest()).decode()
+
+
+def test_missing_vendor_file_fails(vendor):
+    static_folder, _ = vendor
+    [result] = assets.check_vendor_assets(str(static_folder))
+    assert result['error'] and result['sha384'] is None
+
+
+def test_unpinned_or_mismatched_sha384_fails(vendor):
+    static_folder, asset = vendor
+    digest = _write(static_folder, b'console.log(1)')
+
+    [result] = assets.check_vendor_assets(str(static_folder))
+    assert result['error'] and result['sha384'] == digest
+
+    asset['sha384'] = 'sha384-other'
+    [result] = assets.check_vendor_assets(str(static_folder))
+    assert result['error'].startswith('校验失败')
+
+
+def test_pinned_vendor_file_passes(vendor):
+    static_folder, asset = vendor
+    asset['sha384'] = _write(static_folder, b'console.log(1)')
+    [result] = assets.check_vendor_assets(str(static_folder))
+    assert result['error'] is None
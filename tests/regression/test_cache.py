@@ -0,0 +1,18 @@
+"""缓存：计算期间标签失效"""
+from core.cache import cached, get_cache
+
+
+def test_value_computed_during_invalidation_is_not_served(app):
+    calls = []
+
+    @cached(tags=['regression:race'])
+    def load():
+        calls.append(1)
+        if len(calls) == 1:
+            # 计算期间其他进程写入并失效标签
+            get_cache().backend.bump_tags({'regression:race'})
+        return len(calls)
+
+    assert load() == 1
+    assert load() == 2
+    assert load() == 2
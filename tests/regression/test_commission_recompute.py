@@ -0,0 +1,33 @@
+"""提成重算：自定义阶梯只能试算"""
+from core.commission import COMMISSION_TIERS
+from core.commission_recompute import recompute_commission
+from core.database import query_db
+
+CUSTOM_TIERS = [[3, 15], [None, 40]]
+
+
+def _total_commission():
+    return query_db('SELECT SUM(commission) AS total FROM performance', one=True)['total']
+
+
+def test_custom_tiers_rejected_without_dry_run(operator):
+    before = _total_commission()
+    result = recompute_commission(tiers=CUSTOM_TIERS)
+    assert not result['success'] and 'dry_run' in result['message']
+    assert _total_commission() == before
+
+
+def test_custom_tiers_allowed_for_dry_run(operator):
+    result = recompute_commission(start_date='2026-09-01', end_date='2026-09-30', tiers=CUSTOM_TIERS, dry_run=True)
+    assert result['success'] and result['rows_changed'] > 0
+
+
+def test_current_tiers_may_be_passed_explicitly(operator):
+    result = recompute_commission(start_date='2026-09-01', end_date='2026-09-30',
+                                  tiers=[list(tier) for tier in COMMISSION_TIERS])
+    assert result['success']
+
+
+def test_api_rejects_async_custom_tiers(login):
+    response = login('admin').post('/admin/api/commission/recompute', json={'tiers': CUSTOM_TIERS, 'run_async': True})
+    assert response.status_code == 400
@@ -0,0 +1,15 @@
+"""数据库维护 API：参数校验"""
+import pytest
+
+
+@pytest.mark.parametrize('body', [{'tasks': 5}, {'tasks': [1, 2]}, {'tasks': {'analyze': 1}}, ['analyze']])
+def test_run_rejects_malformed_tasks(login, body):
+    response = login('admin').post('/admin/api/db_maintenance/run', json=body)
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
+
+
+def test_run_rejects_unknown_task(login):
+    response = login('admin').post('/admin/api/db_maintenance/run', json={'tasks': ['nope']})
+    assert response.status_code == 400
+    assert '未知的维护任务' in response.get_json()['message']
@@ -0,0 +1,35 @@
+"""业绩导入：失败行不留下部分写入"""
+import core.salary_ledger as salary_ledger
+from core.database import get_db
+from core.import_helper import ExcelImporter
+
+
+def test_failed_row_rolls_back_partial_writes(operator, monkeypatch):
+    db = get_db()
+    ok_id, bad_id = [r[0] for r in db.execute(
+        'SELECT id FROM employees WHERE is_active = 1 ORDER BY id LIMIT 2'
+    ).fetchall()]
+    work_date = '2026-10-05'  # 基准数据截止 2026-09-30，之后没有业绩
+
+    apply_change = salary_ledger.apply_performance_change
+
+    def failing_ledger(db, employee_id, *args, **kwargs):
+        # 业绩已写入后台账写入失败
+        if employee_id == bad_id:
+            raise RuntimeError('台账写入失败')
+        return apply_change(db, employee_id, *args, **kwargs)
+
+    monkeypatch.setattr(salary_ledger, 'apply_performance_change', failing_ledger)
+
+    importer = ExcelImporter()
+    importer.import_data([
+        {'row_number': 2, 'employee_id': ok_id, 'date': work_date, 'orders': 5},
+        {'row_number': 3, 'employee_id': bad_id, 'date': work_date, 'orders': 7},
+    ], operator['user_id'])
+
+    assert (importer.success_count, importer.fail_count) == (1, 1)
+    rows = {r[0]: r[1] for r in db.execute(
+        'SELECT employee_id, orders_count FROM performance WHERE work_date = ?', (work_date,)
+    ).fetchall()}
+    assert rows == {ok_id: 5}
+    assert not db.in_transaction
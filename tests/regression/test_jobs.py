@@ -0,0 +1,161 @@
+"""后台任务：幂等键、经理任务的团队范围、执行进程已退出的任务恢复"""
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from core import jobs
+from core.database import query_db, execute_db
+
+
+@pytest.fixture
+def submitted(monkeypatch):
+    """记录提交到线程池的任务（不实际执行）"""
+    calls = []
+    monkeypatch.setattr(jobs, '_get_executor', lambda: SimpleNamespace(submit=lambda *args: calls.append(args)))
+    yield calls
+    jobs.discard_executor()  # 丢弃心跳线程与本进程任务登记
+
+
+def _insert_job(job_type, status, key, params=None):
+    return execute_db(
+        'INSERT INTO jobs (job_type, params_json, status, idempotency_key) VALUES (?, ?, ?, ?)',
+        (job_type, json.dumps(params or {}), status, key)
+    )
+
+
+def test_archive_can_rerun_after_failure(app, login, submitted):
+    with app.app_context():
+        failed_id = _insert_job('archive_payroll', 'failed', 'archive_payroll:2024', {'archive_year': 2024})
+
+    response = login('admin').post('/admin/payroll_archive/create', data={'archive_year': '2024', 'run_async': '1'})
+    assert response.status_code == 302
+    assert len(submitted) == 1
+
+    with app.app_context():
+        rows = query_db('SELECT id, status, idempotency_key FROM jobs WHERE job_type = ? ORDER BY id', ('archive_payroll',))
+    assert [(r['id'], r['idempotency_key']) for r in rows][0] == (failed_id, None)
+    assert rows[-1]['status'] == 'queued' and rows[-1]['idempotency_key'] == 'archive_payroll:2024'
+
+
+@pytest.mark.parametrize('status', ['queued', 'running', 'succeeded'])
+def test_active_or_finished_key_is_deduplicated(operator, submitted, status):
+    job_id = _insert_job('archive_payroll', status, 'archive_payroll:2024')
+    result = jobs.enqueue_job('archive_payroll', {'archive_year': 2024}, idempotency_key='archive_payroll:2024')
+    assert result['success'] and result['duplicate'] and result['job_id'] == job_id
+    assert submitted == []
+
+
+def test_concurrent_insert_returns_duplicate(operator, submitted, monkeypatch):
+    job_id = _insert_job('archive_payroll', 'queued', 'archive_payroll:2024')
+    # 模拟另一请求在本请求查询幂等键之后插入
+    real_find = jobs._find_job_by_key
+    lookups = []
+
+    def find_job_by_key(key):
+        lookups.append(key)
+        return real_find(key) if len(lookups) > 1 else None
+
+    monkeypatch.setattr(jobs, '_find_job_by_key', find_job_by_key)
+
+    result = jobs.enqueue_job('archive_payroll', {'archive_year': 2024}, idempotency_key='archive_payroll:2024')
+    assert result['success'] and result['duplicate'] and result['job_id'] == job_id
+    assert submitted == []
+
+
+def test_manager_status_check_limited_to_own_team(app, login, submitted):
+    from core.auth import get_user_team
+
+    response = login('manager').post('/jobs/api/submit/status_check', json={'team': None})
+    assert response.status_code == 202
+    with app.app_context():
+        manager = query_db('SELECT * FROM users WHERE role = ? AND username = ?', ('manager', 'manager'), one=True)
+        team = get_user_team(dict(manager))
+        job = query_db('SELECT params_json FROM jobs WHERE id = ?', (response.get_json()['job_id'],), one=True)
+        params = json.loads(job['params_json'])
+        assert params['team'] == team
+
+        result = jobs._job_status_check(params, lambda *args: None)
+        other_teams = {c['team'] for c in jobs._job_status_check({}, lambda *args: None)['changes']} - {team}
+    assert other_teams, '基准数据应包含其他团队的状态变更'
+    assert {c['team'] for c in result['changes']} <= {team}
+
+
+def _dead_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+def _set_owner(job_id, owner, heartbeat_at, created_at=None):
+    execute_db('UPDATE jobs SET owner = ?, heartbeat_at = ?, created_at = COALESCE(?, created_at) WHERE id = ?',
+               (owner, heartbeat_at, created_at, job_id))
+
+
+def test_recover_only_jobs_whose_owner_is_gone(operator):
+    host, now = socket.gethostname(), time.time()
+    alive = _insert_job('status_check', 'running', None)
+    _set_owner(alive, f'{host}:{os.getppid()}', now)  # 平滑重载中的旧 worker
+    other_instance = _insert_job('status_check', 'running', None)
+    _set_owner(other_instance, 'other-host:123', now - 10)
+    legacy_recent = _insert_job('status_check', 'queued', None)
+    dead = _insert_job('status_check', 'running', None)
+    _set_owner(dead, f'{host}:{_dead_pid()}', now)
+    expired = _insert_job('status_check', 'queued', None)
+    _set_owner(expired, 'other-host:123', now - jobs.JOB_HEARTBEAT_TIMEOUT - 1)
+    legacy_old = _insert_job('status_check', 'running', None)
+    _set_owner(legacy_old, None, None, '2020-01-01 00:00:00')
+    done = _insert_job('status_check', 'succeeded', None)
+
+    assert jobs.recover_stale_jobs() == 3
+    statuses = {r['id']: r['status'] for r in query_db('SELECT id, status FROM jobs')}
+    assert {job_id for job_id, status in statuses.items() if status == 'failed'} == {dead, expired, legacy_old}
+    assert statuses[alive] == statuses[other_instance] == 'running'
+    assert statuses[legacy_recent] == 'queued' and statuses[done] == 'succeeded'
+
+
+def test_running_job_of_live_process_keeps_its_key(operator, submitted):
+    job_id = _insert_job('archive_payroll', 'running', 'archive_payroll:2024')
+    _set_owner(job_id, f'{socket.gethostname()}:{os.getppid()}', time.time())
+    result = jobs.enqueue_job('archive_payroll', {'archive_year': 2024}, idempotency_key='archive_payroll:2024')
+    assert result['duplicate'] and result['job_id'] == job_id
+    assert submitted == []
+
+
+def test_orphaned_job_key_can_be_resubmitted(operator, submitted):
+    job_id = _insert_job('archive_payroll', 'running', 'archive_payroll:2024')
+    _set_owner(job_id, f'{socket.gethostname()}:{_dead_pid()}', time.time())
+    result = jobs.enqueue_job('archive_payroll', {'archive_year': 2024}, idempotency_key='archive_payroll:2024')
+    assert result['success'] and not result['duplicate']
+    assert query_db('SELECT status FROM jobs WHERE id = ?', (job_id,), one=True)['status'] == 'failed'
+    new_job = query_db('SELECT owner, heartbeat_at FROM jobs WHERE id = ?', (result['job_id'],), one=True)
+    assert new_job['owner'] == f'{socket.gethostname()}:{os.getpid()}' and new_job['heartbeat_at']
+
+
+def test_list_jobs_limit_is_clamped(operator):
+    for _ in range(3):
+        _insert_job('status_check', 'succeeded', None)
+    assert len(jobs.list_jobs(limit=10 ** 9)) == 3
+    assert len(jobs.list_jobs(limit=-1)) == 1
+
+
+def test_heartbeat_refreshes_jobs_of_this_process(app, operator, monkeypatch):
+    monkeypatch.setattr(jobs, 'JOB_HEARTBEAT_INTERVAL', 0.05)
+    job_id = _insert_job('status_check', 'running', None)
+    _set_owner(job_id, f'{socket.gethostname()}:{os.getpid()}', 1.0)
+
+    jobs._track_job(app, job_id)
+    try:
+        for _ in range(40):
+            if query_db('SELECT heartbeat_at FROM jobs WHERE id = ?', (job_id,), one=True)['heartbeat_at'] > 1.0:
+                break
+            time.sleep(0.05)
+        assert query_db('SELECT heartbeat_at FROM jobs WHERE id = ?', (job_id,), one=True)['heartbeat_at'] > 1.0
+        assert jobs.recover_stale_jobs() == 0
+    finally:
+        jobs.discard_executor()
@@ -0,0 +1,90 @@
+"""代发批次：回盘对账"""
+from core.database import execute_db, query_db
+from core.payment_batch import create_payment_batch, reconcile_payment_batch
+
+
+def _confirmed_batch(count=2):
+    payrolls = query_db('SELECT id, employee_id FROM payroll_records ORDER BY id LIMIT ?', (count,))
+    for p in payrolls:
+        execute_db("UPDATE payroll_records SET status = 'confirmed' WHERE id = ?", (p['id'],))
+        execute_db("UPDATE employees SET bank_account_number = '6222000011112222', account_holder_name = name, "
+                   "bank_name = '测试银行' WHERE id = ?", (p['employee_id'],))
+    batch = create_payment_batch('2026-09')
+    assert batch['success'] and batch['record_count'] == count
+    return batch['batch_id'], [p['id'] for p in payrolls]
+
+
+def test_duplicate_return_line_keeps_first_line(operator):
+    batch_id, (first, second) = _confirmed_batch()
+    rows = [
+        {'line_no': 2, 'payroll_id': str(first), 'amount': None, 'result': 'S', 'bank_reference': 'REF1', 'message': None},
+        {'line_no': 3, 'payroll_id': str(first), 'amount': None, 'result': 'S', 'bank_reference': 'REF1', 'message': None},
+        {'line_no': 4, 'payroll_id': str(second), 'amount': None, 'result': 'F', 'bank_reference': None, 'message': '户名不符'}
+    ]
+    result = reconcile_payment_batch(batch_id, rows)
+
+    assert result['success']
+    assert [(r['line_no'], r['reason']) for r in result['rejected']] == [(3, '重复的回盘记录')]
+    statuses = {r['id']: r['status'] for r in query_db(
+        'SELECT id, status FROM payroll_records WHERE id IN (?, ?)', (first, second))}
+    assert statuses == {first: 'paid', second: 'failed'}
+    items = {r['payroll_id']: r['result'] for r in query_db(
+        'SELECT payroll_id, result FROM payment_batch_items WHERE batch_id = ?', (batch_id,))}
+    assert items == {first: 'paid', second: 'failed'}
+
+
+def test_amount_mismatch_line_is_not_applied(operator):
+    batch_id, (first, second) = _confirmed_batch()
+    rows = [
+        {'line_no': 2, 'payroll_id': str(first), 'amount': 0.01, 'result': 'S', 'bank_reference': None, 'message': None},
+        {'line_no': 3, 'payroll_id': str(second), 'amount': None, 'result': 'S', 'bank_reference': None, 'message': None}
+    ]
+    result = reconcile_payment_batch(batch_id, rows)
+
+    assert [r['line_no'] for r in result['rejected']] == [2]
+    statuses = {r['id']: r['status'] for r in query_db(
+        'SELECT id, status FROM payroll_records WHERE id IN (?, ?)', (first, second))}
+    assert statuses == {first: 'confirmed', second: 'paid'}
+
+
+def test_batched_payroll_is_locked(operator):
+    from core.payroll_engine import adjust_payroll, bulk_adjust_payroll, mark_payroll_payment, mark_payroll_payment_failed
+    batch_id, (first, _) = _confirmed_batch()
+
+    assert not adjust_payroll(first, 'allowance', 100, '补发', 1, 'admin', 'admin')['success']
+    result = bulk_adjust_payroll([{'row_number': 2, 'payroll_id': str(first), 'adjustment_type': 'allowance',
+                                   'amount': '100', 'reason': '补发'}], '2026-09', 1, 'admin', 'admin')
+    assert not result['success'] and result['rows'][0]['status'] == 'error'
+    assert not mark_payroll_payment(first, 'cash', '2026-10-10')['success']
+    assert not mark_payroll_payment_failed(first, '退票')['success']
+    assert query_db('SELECT status FROM payroll_records WHERE id = ?', (first,), one=True)['status'] == 'confirmed'
+
+    rows = [{'line_no': 2, 'payroll_id': str(first), 'amount': None, 'result': 'S', 'bank_reference': None, 'message': None}]
+    assert reconcile_payment_batch(batch_id, rows)['paid'] == 1
+
+
+def test_reconciliation_skips_batched_payroll(operator):
+    from core.payroll_reconciliation import reconcile_payroll_month
+    _, (first, _) = _confirmed_batch()
+    execute_db('UPDATE payroll_records SET base_salary = base_salary + 50, subtotal = subtotal + 50 WHERE id = ?', (first,))
+
+    result = reconcile_payroll_month('2026-09', apply_corrections=True, operator_id=1,
+                                     operator_name='admin', operator_role='admin')
+    assert result['locked'] >= 1
+    assert not query_db('SELECT 1 FROM payroll_adjustments WHERE payroll_id = ?', (first,))
+
+
+def test_changed_payroll_amount_is_not_applied(operator):
+    batch_id, (first, second) = _confirmed_batch()
+    execute_db('UPDATE payroll_records SET total_salary = total_salary + 100 WHERE id = ?', (first,))
+    rows = [
+        {'line_no': 2, 'payroll_id': str(first), 'amount': None, 'result': 'S', 'bank_reference': None, 'message': None},
+        {'line_no': 3, 'payroll_id': str(second), 'amount': None, 'result': 'S', 'bank_reference': None, 'message': None}
+    ]
+    result = reconcile_payment_batch(batch_id, rows)
+
+    assert [r['line_no'] for r in result['rejected']] == [2]
+    assert result['rejected'][0]['reason'].startswith('工资单金额已变更')
+    statuses = {r['id']: r['status'] for r in query_db(
+        'SELECT id, status FROM payroll_records WHERE id IN (?, ?)', (first, second))}
+    assert statuses == {first: 'confirmed', second: 'paid'}
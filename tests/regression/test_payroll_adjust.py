@@ -0,0 +1,16 @@
+"""批量调整工资：金额校验"""
+import pytest
+
+from core.database import query_db
+from core.payroll_engine import bulk_adjust_payroll
+
+
+@pytest.mark.parametrize('amount', ['nan', 'inf', '-inf', '1e400'])
+def test_non_finite_amount_is_row_error(operator, amount):
+    payroll = query_db('SELECT id, year_month FROM payroll_records ORDER BY id LIMIT 1', one=True)
+    rows = [{'row_number': 2, 'payroll_id': payroll['id'], 'employee_no': None,
+             'adjustment_type': '补贴', 'amount': amount, 'reason': '测试'}]
+    result = bulk_adjust_payroll(rows, payroll['year_month'], operator['user_id'], operator['username'],
+                                 operator['role'], dry_run=True)
+    assert not result['success']
+    assert '金额格式不正确' in result['rows'][0]['message']
@@ -0,0 +1,38 @@
+"""规则回放：期间内离职的员工"""
+from datetime import date
+
+from core.database import query_db
+from core.replay import load_replay_employees, replay_rules
+from core.rule_simulator import simulate_rules
+
+START, END = date(2026, 7, 2), date(2026, 9, 30)
+
+
+def test_replay_includes_employees_who_left_during_period(operator):
+    left = query_db('''
+        SELECT id, leave_date FROM employees
+        WHERE is_active = 0 AND leave_date >= ? AND join_date <= ?
+    ''', (START.isoformat(), END.isoformat()))
+    assert left, '基准数据应包含期间内离职的员工'
+
+    ids = {e['id'] for e in load_replay_employees(START, END)}
+    assert {e['id'] for e in left} <= ids
+
+    leave_dates = {e['id']: str(e['leave_date'])[:10] for e in left}
+    result = replay_rules(START, END)
+    assert result['employees'] == len(ids)
+    assert not [e for e in result['events']
+                if e['employee_id'] in leave_dates and e['date'] > leave_dates[e['employee_id']]]
+
+
+def test_replay_excludes_employees_who_left_before_period(operator):
+    left_before = {e['id'] for e in query_db(
+        'SELECT id FROM employees WHERE leave_date < ?', (START.isoformat(),))}
+    assert not left_before & {e['id'] for e in load_replay_employees(START, END)}
+
+
+def test_simulation_payroll_stops_after_leave(operator):
+    result = simulate_rules(START, END)
+    assert result['success']
+    active = query_db('SELECT COUNT(*) AS n FROM employees WHERE is_active = 1', one=True)['n']
+    assert sum(result['baseline']['totals']['headcount'].values()) <= active
@@ -0,0 +1,84 @@
+"""报表快照与报表缓存（缓存开启）"""
+import pytest
+from flask import g
+
+from config import Config
+from core.cache import invalidate_tags, performance_tag
+from core.database import execute_db, query_db
+from core.report_snapshot import build_report_snapshot, _snapshot_connection
+from routes.report_routes import get_team_comparison_data
+
+
+@pytest.fixture
+def snapshot(app, monkeypatch):
+    monkeypatch.setattr(Config, 'CACHE_ENABLED', True)
+    monkeypatch.setattr(Config, 'REPORT_SNAPSHOT_ENABLED', True)
+    build_report_snapshot(Config.DATABASE)
+    with app.app_context():
+        year_month = query_db('SELECT substr(MAX(work_date), 1, 7) AS ym FROM performance', one=True)['ym']
+    return year_month
+
+
+def _read_snapshot(app, func, *args):
+    with app.app_context():
+        conn, meta = _snapshot_connection()
+        g.db = conn
+        g.report_snapshot = meta
+        try:
+            return func(*args)
+        finally:
+            g.pop('db')
+
+
+def _read_live(app, func, *args):
+    with app.app_context():
+        return func(*args)
+
+
+def _write_after_snapshot(app, year_month):
+    with app.app_context():
+        execute_db('UPDATE performance SET orders_count = orders_count + 5 WHERE work_date >= ?', (year_month + '-01',))
+        invalidate_tags(performance_tag(year_month))
+
+
+def test_snapshot_result_not_served_to_live_reads(app, snapshot):
+    year_month = snapshot
+    _write_after_snapshot(app, year_month)
+
+    stale = _read_snapshot(app, get_team_comparison_data, year_month)
+    live = _read_live(app, get_team_comparison_data, year_month)
+
+    assert live == _read_live(app, get_team_comparison_data.uncached, year_month)
+    assert live != stale
+
+
+def test_live_result_not_served_to_snapshot_reads(app, snapshot):
+    year_month = snapshot
+    _write_after_snapshot(app, year_month)
+
+    live = _read_live(app, get_team_comparison_data, year_month)
+    snap = _read_snapshot(app, get_team_comparison_data, year_month)
+
+    assert snap == _read_snapshot(app, get_team_comparison_data.uncached, year_month)
+    assert snap != live
+
+
+def test_manager_team_resolved_from_live_database(app, snapshot, login, monkeypatch):
+    from routes import report_routes
+    from tests.benchmark_test.config import BENCH_USERS
+
+    with app.app_context():
+        key = f"manager_team_{BENCH_USERS['manager']}"
+        teams = [r['team'] for r in query_db('SELECT DISTINCT team FROM employees ORDER BY team')]
+        current = query_db('SELECT param_value FROM system_params WHERE param_key = ?', (key,), one=True)
+        team = next(t for t in teams if not current or t != current['param_value'])
+        execute_db('DELETE FROM system_params WHERE param_key = ?', (key,))
+        execute_db('INSERT INTO system_params (param_key, param_value) VALUES (?, ?)', (key, team))
+
+    scopes = []
+    monkeypatch.setattr(report_routes, 'get_trend_data', lambda months, team=None: scopes.append(team) or [])
+    monkeypatch.setattr(report_routes, 'render_template', lambda name, **context: name)
+    response = login('manager').get('/reports/trend_analysis')
+
+    assert response.headers.get('X-Report-Snapshot-At')
+    assert scopes == [team]
@@ -0,0 +1,36 @@
+"""报表页面：查询参数校验"""
+from datetime import datetime
+
+import pytest
+
+from routes import report_routes
+
+
+@pytest.fixture
+def rendered(monkeypatch):
+    """记录视图传给模板的参数（部分报表模板尚未提供）"""
+    calls = []
+
+    def render_template(name, **context):
+        calls.append(context)
+        return name
+    monkeypatch.setattr(report_routes, 'render_template', render_template)
+    return calls
+
+
+@pytest.mark.parametrize('path', ['/reports/team_comparison', '/reports/employee_ranking', '/reports/performance_heatmap'])
+@pytest.mark.parametrize('year_month', ['bad', '2026-13', ''])
+def test_malformed_year_month_falls_back_to_current_month(login, rendered, path, year_month):
+    response = login('admin').get(f'{path}?year_month={year_month}')
+    assert response.status_code == 200
+    assert rendered[-1]['year_month'] == datetime.now().strftime('%Y-%m')
+
+
+def test_valid_year_month_is_kept(login, rendered):
+    assert login('admin').get('/reports/team_comparison?year_month=2026-09').status_code == 200
+    assert rendered[-1]['year_month'] == '2026-09'
+
+
+def test_malformed_days_uses_default(login, rendered):
+    assert login('admin').get('/reports/status_flow?days=abc').status_code == 200
+    assert rendered[-1]['days'] == 30
@@ -0,0 +1,16 @@
+"""规则仿真 API：错误信息"""
+
+
+def test_bad_date_reports_date_error(login):
+    response = login('admin').post('/admin/api/rule_simulation', json={'start_date': '2026-13-01', 'end_date': '2026-09-30'})
+    assert response.status_code == 400
+    assert '日期格式错误' in response.get_json()['message']
+
+
+def test_bad_scenario_reports_scenario_error(login):
+    response = login('admin').post('/admin/api/rule_simulation', json={
+        'start_date': '2026-09-01', 'end_date': '2026-09-30', 'scenarios': [{'driver': 'nope'}]
+    })
+    assert response.status_code == 400
+    message = response.get_json()['message']
+    assert '未知的推演方式' in message and '日期格式错误' not in message
@@ -0,0 +1,42 @@
+"""薪资明细 API 与薪资页面：年月参数校验"""
+import pytest
+from core.database import query_db
+
+
+@pytest.mark.parametrize('year_month', ['2025-13', 'abc', '2025-1', ''])
+def test_admin_salary_detail_rejects_bad_year_month(app, login, year_month):
+    with app.app_context():
+        employee_id = query_db('SELECT MIN(id) AS id FROM employees', one=True)['id']
+    response = login('admin').get(f'/admin/api/salary_detail/{employee_id}?year_month={year_month}')
+    assert response.status_code == 400
+    assert '年月格式错误' in response.get_json()['error']
+
+
+def test_admin_salary_detail_accepts_valid_year_month(app, login):
+    with app.app_context():
+        employee_id = query_db('SELECT MIN(id) AS id FROM employees', one=True)['id']
+    response = login('admin').get(f'/admin/api/salary_detail/{employee_id}?year_month=2026-09')
+    assert response.status_code == 200
+    assert response.get_json()['year_month'] == '2026-09'
+
+
+@pytest.mark.parametrize('year_month', ['2025-13', 'abc'])
+def test_employee_salary_detail_rejects_bad_year_month(login, year_month):
+    response = login('employee').get(f'/employee/api/salary_detail/{year_month}')
+    assert response.status_code == 400
+
+
+def test_employee_salary_detail_accepts_valid_year_month(login):
+    response = login('employee').get('/employee/api/salary_detail/2026-09')
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize('year_month', ['bad', '2025-13'])
+def test_salary_page_falls_back_to_current_month(login, year_month):
+    response = login('admin').get(f'/admin/salary?year_month={year_month}')
+    assert response.status_code == 200
+
+
+def test_salary_export_falls_back_to_current_month(login):
+    response = login('admin').get('/export/salary/excel?year_month=bad')
+    assert response.status_code == 200
@@ -0,0 +1,56 @@
+"""工作日索引与节假日文件导入回归测试"""
+import io
+import json
+
+import pytest
+
+from core import workday
+from core.workday import get_calendar_index, invalidate_calendar_index, parse_holiday_file
+
+
+def test_parse_holiday_file_rejects_non_object_rows():
+    content = json.dumps(['2026-10-01', '2026-10-02']).encode('utf-8')
+    with pytest.raises(ValueError, match='第2行'):
+        parse_holiday_file(content, 'holidays.json')
+
+
+def test_import_non_object_rows_is_row_error(login):
+    client = login()
+    content = json.dumps([{'date': '2026-10-01', 'is_workday': 0}, 'bad']).encode('utf-8')
+    resp = client.post('/admin/work_calendar/import',
+                       data={'file': (io.BytesIO(content), 'holidays.json')},
+                       content_type='multipart/form-data')
+    assert resp.status_code == 400
+    assert '第3行' in resp.get_json()['message']
+
+
+def test_invalidate_keeps_previous_index_until_rebuilt(operator):
+    days = get_calendar_index()
+    index = workday._calendar_index
+    invalidate_calendar_index()
+    # 失效只换掉版本，其他线程在重建完成前读到的仍是旧映射，不会是空表
+    assert workday._calendar_index is not index
+    assert workday._calendar_index['days'] is days
+    assert workday._calendar_index['version'] is None
+    assert get_calendar_index() == days
+
+
+@pytest.mark.parametrize('body', [
+    {'ranges': '2026-10-01'},
+    {'ranges': [5]},
+    {'ranges': [[1, 2]]},
+    {'dates': [20261001]},
+    {'ranges': [['2026-01-01', '2030-12-31']]},
+    {'ranges': [['2026-01-01', '2026-09-30'], ['2027-01-01', '2027-09-30']]},
+    ['2026-10-01']
+])
+def test_batch_save_rejects_malformed_or_oversized_payload(login, body):
+    response = login().post('/admin/work_calendar/batch_save', json=body)
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
+
+
+def test_holiday_file_range_over_limit_is_row_error():
+    content = json.dumps([{'date': '2026-01-01 ~ 2028-01-01', 'is_workday': 0}]).encode('utf-8')
+    with pytest.raises(ValueError, match='第2行: 日期区间超过'):
+        parse_holiday_file(content, 'holidays.json')
@@ -0,0 +1,16 @@
+"""
+生产模式入口（gunicorn -c gunicorn.conf.py wsgi:app）
+
+多 worker 部署的默认配置：缓存使用 SQLite 后端（各 worker 共享标签失效），
+数据库连接在线程内复用；均可通过环境变量覆盖。
+主进程导入本模块时完成预热，随后由 gunicorn fork 出各 worker（见 gunicorn.conf.py）。
+"""
+import os
+
+os.environ.setdefault('CACHE_BACKEND', 'sqlite')
+os.environ.setdefault('DB_PERSISTENT_CONNECTIONS', '1')
+
+from app import app  # noqa: E402
+from core.warmup import warmup_app  # noqa: E402
+
+warmup_app(app)